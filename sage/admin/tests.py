@@ -1,7 +1,7 @@
 """
 Testes para as views de supervisor e coordenador do sistema de estágios
 """
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.messages import get_messages
 from datetime import date, timedelta
@@ -260,6 +260,142 @@ class AprovarDocumentosCoordenadorViewTest(TestCase):
         self.assertEqual(response.status_code, 302)
 
 
+class AvaliarDocumentosLoteViewTest(TestCase):
+    """Aprovação, pedido de ajustes e reprovação em lote nas listas do supervisor e do coordenador"""
+
+    def setUp(self):
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Lote", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            razao_social="Empresa Lote", cnpj="11222333000166", numero=2, bairro="Centro", rua="Av"
+        )
+        self.supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor_lote@test.com', email='supervisor_lote@test.com',
+                password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Lote", contato="11988888888", cargo="Gerente", empresa=empresa
+        )
+        outro_supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='outro_supervisor_lote@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Outro Supervisor", contato="11988887777", cargo="Gerente", empresa=empresa
+        )
+        self.coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_lote@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Lote", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977777777", instituicao=instituicao
+        )
+        self.estagio = Estagio.objects.create(
+            titulo="Estágio Lote", cargo="Dev", empresa=empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+            status='analise',
+        )
+        outro_estagio = Estagio.objects.create(
+            titulo="Outro Estágio", cargo="QA", empresa=empresa, supervisor=outro_supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+        )
+        Aluno.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='aluno_lote@test.com', email='aluno_lote@test.com', password='senha123', tipo='aluno'
+            ),
+            nome="Aluno Lote", matricula="20237777", contato="11999997777",
+            instituicao=instituicao, estagio=self.estagio
+        )
+
+        self.termo = self._documento(self.estagio, "termo.pdf")
+        self.plano = self._documento(self.estagio, "plano.pdf", status='corrigido')
+        self.ja_aprovado = self._documento(self.estagio, "relatorio.pdf", status='aprovado')
+        self.de_outro = self._documento(outro_estagio, "outro.pdf")
+
+    def _documento(self, estagio, nome, status='enviado'):
+        return Documento.objects.create(
+            estagio=estagio, supervisor=estagio.supervisor, coordenador=self.coordenador,
+            data_envio=date.today(), versao=1.0, nome_arquivo=nome, tipo="termo_compromisso", status=status,
+        )
+
+    def _post(self, url, documentos, acao, observacoes=''):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {
+                'documentos': [d.id for d in documentos], 'acao': acao, 'observacoes': observacoes,
+            })
+
+    def test_supervisor_aprova_apenas_documentos_pendentes_dele(self):
+        from estagio.models import EmailOutbox, Notificacao
+
+        self.client.login(username='supervisor_lote@test.com', password='senha123')
+        documentos = [self.termo, self.plano, self.ja_aprovado, self.de_outro]
+        response = self._post(reverse('supervisor:avaliar_documentos_lote'), documentos, 'aprovar')
+        self.assertRedirects(response, reverse('supervisor:documentos'), fetch_redirect_response=False)
+
+        status = dict(Documento.objects.values_list('id', 'status'))
+        self.assertEqual(status[self.termo.id], 'aprovado')
+        self.assertEqual(status[self.plano.id], 'aprovado')
+        self.assertEqual(status[self.de_outro.id], 'enviado')
+        self.assertEqual(
+            set(DocumentoHistorico.objects.filter(acao='aprovado').values_list('documento_id', flat=True)),
+            {self.termo.id, self.plano.id}
+        )
+        self.assertEqual(Documento.objects.get(pk=self.termo.pk).aprovado_por.username, 'supervisor_lote@test.com')
+
+        # Uma única notificação (e e-mail) para o aluno com os dois documentos
+        notificacao = Notificacao.objects.get(destinatario='aluno_lote@test.com')
+        self.assertIn('termo.pdf', notificacao.mensagem)
+        self.assertIn('plano.pdf', notificacao.mensagem)
+        self.assertEqual(EmailOutbox.objects.filter(destinatario='aluno_lote@test.com').count(), 1)
+
+        mensagens = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertTrue(any('2 documento(s)' in m for m in mensagens))
+
+    def test_reprovacao_em_lote_exige_observacoes(self):
+        self.client.login(username='supervisor_lote@test.com', password='senha123')
+        url = reverse('supervisor:avaliar_documentos_lote')
+        self._post(url, [self.termo, self.plano], 'reprovar')
+        self.assertFalse(Documento.objects.filter(status='reprovado').exists())
+
+        self._post(url, [self.termo, self.plano], 'reprovar', 'Assinatura ausente')
+        reprovados = Documento.objects.filter(status='reprovado')
+        self.assertEqual(reprovados.count(), 2)
+        self.assertTrue(all(d.observacoes_supervisor == 'Assinatura ausente' for d in reprovados))
+
+    def test_coordenador_finaliza_em_lote(self):
+        from estagio.models import Notificacao
+
+        self.client.login(username='coordenador_lote@test.com', password='senha123')
+        response = self._post(
+            reverse('coordenador:avaliar_documentos_lote'), [self.termo, self.ja_aprovado], 'aprovar'
+        )
+        self.assertRedirects(response, reverse('coordenador:documentos'), fetch_redirect_response=False)
+
+        self.assertEqual(Documento.objects.get(pk=self.ja_aprovado.pk).status, 'finalizado')
+        # Documento ainda não aprovado pelo supervisor não é finalizado
+        self.assertEqual(Documento.objects.get(pk=self.termo.pk).status, 'enviado')
+        self.assertEqual(Estagio.objects.get(pk=self.estagio.pk).status, 'em_andamento')
+        self.assertTrue(DocumentoHistorico.objects.filter(documento=self.ja_aprovado, acao='finalizado').exists())
+        self.assertTrue(Notificacao.objects.filter(destinatario='supervisor_lote@test.com').exists())
+        self.assertTrue(Notificacao.objects.filter(destinatario='aluno_lote@test.com').exists())
+
+
+    def test_finalizacao_em_lote_aparece_no_delta_do_painel(self):
+        from django.utils import timezone
+        from estagio.painel import delta_estagios
+        from estagio.validacao_documentos import validar_documentos_em_lote
+
+        Estagio.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        cursor = timezone.now() - timedelta(minutes=10)
+
+        validar_documentos_em_lote(
+            Documento.objects.filter(pk=self.ja_aprovado.pk), 'finalizado', self.coordenador.usuario, coordenador=True
+        )
+
+        delta = delta_estagios(self.coordenador.usuario, {}, Estagio.objects.all(), cursor)
+        alterados = {linha['id']: linha['status'] for linha in delta['alterados']}
+        self.assertEqual(alterados, {self.estagio.id: 'em_andamento'})
+
 class AprovarEstagioViewTest(TestCase):
     """Testes para as views de aprovação/reprovação de estágio"""
     
@@ -2677,6 +2813,138 @@ class VinculoHistoricoModelTest(TestCase):
         self.assertEqual(self.vaga.status_vaga, 'disponivel')
 
 
+class VinculoConcorrenteTest(TransactionTestCase):
+    """Vínculos e aprovações simultâneos não ocupam a mesma vaga duas vezes"""
+
+    THREADS = 8
+
+    def setUp(self):
+        from estagio.vinculos import metricas
+
+        metricas.resetar()
+        self.instituicao = Instituicao.objects.create(
+            nome="Universidade Concorrência", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            cnpj="11222333000166", razao_social="Empresa Concorrência", rua="Rua", numero=1, bairro="Centro"
+        )
+        supervisor = Supervisor.objects.create(
+            nome='Supervisor Concorrência', contato='11999999999', cargo='Gerente', empresa=empresa,
+            usuario=Usuario.objects.create_user(
+                username='supervisor_concorrencia@test.com', password='senha123', tipo='supervisor'
+            )
+        )
+        self.coordenador = Usuario.objects.create_user(
+            username='coordenador_concorrencia@test.com', password='senha123', tipo='coordenador'
+        )
+        self.vaga = Estagio.objects.create(
+            titulo="Vaga Disputada", cargo="Dev", empresa=empresa, supervisor=supervisor,
+            data_inicio=date.today() + timedelta(days=7), data_fim=date.today() + timedelta(days=90),
+            carga_horaria=20, status='aprovado', status_vaga='disponivel'
+        )
+        self.alunos = [
+            Aluno.objects.create(
+                usuario=Usuario.objects.create_user(
+                    username=f'aluno_concorrencia{i}@test.com', password='senha123', tipo='aluno'
+                ),
+                nome=f"Aluno Concorrência {i}", matricula=f"2023900{i}", contato="11999990000",
+                instituicao=self.instituicao,
+            )
+            for i in range(self.THREADS)
+        ]
+
+    def _disputar(self, operacoes):
+        """
+        Executa as operações ao mesmo tempo, uma por thread. Falhas do banco
+        por escrita concorrente (SQLite, sem travas de linha) são repetidas,
+        como faria o usuário; o resultado de cada uma é 'ok' ou 'conflito'.
+        """
+        import threading
+        import time
+        from django.db import OperationalError, connection
+        from estagio.vinculos import ConflitoVinculo
+
+        barreira = threading.Barrier(len(operacoes))
+        resultados = []
+        erros_banco = []
+
+        def executar(operacao):
+            try:
+                barreira.wait()
+                while True:
+                    try:
+                        operacao()
+                    except ConflitoVinculo:
+                        resultados.append('conflito')
+                    except OperationalError as e:
+                        erros_banco.append(e)
+                        time.sleep(0.01)
+                        continue
+                    else:
+                        resultados.append('ok')
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=executar, args=(operacao,)) for operacao in operacoes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+        if connection.vendor == 'postgresql':
+            # Com travas de linha, quem chega depois espera e recebe um conflito limpo
+            self.assertEqual(erros_banco, [])
+        return resultados
+
+    def test_vinculos_simultaneos_a_mesma_vaga(self):
+        from estagio.models import VinculoHistorico
+        from estagio.vinculos import obter_metricas
+
+        def vincular(aluno_id):
+            return lambda: Estagio.objects.get(pk=self.vaga.pk).vincular_aluno(
+                Aluno.objects.get(pk=aluno_id), realizado_por=self.coordenador
+            )
+
+        resultados = self._disputar([vincular(aluno.pk) for aluno in self.alunos])
+
+        self.assertEqual(sorted(resultados), ['conflito'] * (self.THREADS - 1) + ['ok'])
+        self.assertEqual(Aluno.objects.filter(estagio=self.vaga).count(), 1)
+        self.assertEqual(VinculoHistorico.objects.filter(estagio=self.vaga, acao='vinculado').count(), 1)
+        self.assertEqual(Estagio.objects.get(pk=self.vaga.pk).status_vaga, 'ocupada')
+        self.assertEqual(obter_metricas()['conflitos'], self.THREADS - 1)
+
+    def test_aprovacoes_simultaneas_do_mesmo_estagio(self):
+        from estagio.models import VinculoHistorico
+        from estagio.vinculos import aprovar
+
+        aluno = self.alunos[0]
+        Estagio.objects.filter(pk=self.vaga.pk).update(status='analise', aluno_solicitante=aluno)
+
+        def aprovar_estagio():
+            aprovar(Estagio.objects.get(pk=self.vaga.pk), realizado_por=self.coordenador)
+
+        resultados = self._disputar([aprovar_estagio] * 4)
+
+        self.assertEqual(sorted(resultados), ['conflito'] * 3 + ['ok'])
+        vaga = Estagio.objects.get(pk=self.vaga.pk)
+        self.assertEqual((vaga.status, vaga.status_vaga), ('aprovado', 'ocupada'))
+        self.assertEqual(Aluno.objects.get(pk=aluno.pk).estagio_id, vaga.pk)
+        self.assertEqual(VinculoHistorico.objects.filter(aluno=aluno, acao='vinculado').count(), 1)
+
+    def test_desvincular_aluno_ja_desvinculado_e_conflito(self):
+        from estagio.vinculos import ConflitoVinculo
+
+        aluno = self.alunos[0]
+        self.vaga.vincular_aluno(aluno)
+        outra_copia = Estagio.objects.get(pk=self.vaga.pk)
+        self.vaga.desvincular_aluno(aluno)
+
+        with self.assertRaises(ConflitoVinculo):
+            outra_copia.desvincular_aluno(Aluno.objects.get(pk=aluno.pk))
+        self.assertEqual(Estagio.objects.get(pk=self.vaga.pk).status_vaga, 'disponivel')
+
+
 class EstagioVagaModelTest(TestCase):
     """Testes para os métodos de vaga no modelo Estagio"""
     
@@ -4458,6 +4726,366 @@ class CalculoNotaFinalTest(TestCase):
         self.assertIn('notas suficientes', str(context.exception))
 
 
+class AvaliacaoWithScoresTest(TestCase):
+    """Nota ponderada e completude calculadas no banco (Avaliacao.objects.with_scores)"""
+
+    def setUp(self):
+        from estagio.models import Avaliacao, CriterioAvaliacao
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Scores", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            cnpj="11222333000155", razao_social="Empresa Scores", rua="Rua", numero=1, bairro="Centro"
+        )
+        self.supervisor = Supervisor.objects.create(
+            nome='Supervisor Scores', contato='11999999999', cargo='Gerente', empresa=empresa,
+            usuario=Usuario.objects.create_user(
+                username='supervisor_scores@test.com', password='senha123', tipo='supervisor'
+            )
+        )
+        self.estagio = Estagio.objects.create(
+            titulo="Estágio Scores", cargo="Dev", empresa=empresa, supervisor=self.supervisor,
+            data_inicio=date.today() - timedelta(days=60), data_fim=date.today() + timedelta(days=60),
+            carga_horaria=20, status='em_andamento'
+        )
+        self.tecnico = CriterioAvaliacao.objects.create(nome='Técnico', peso=3.0, obrigatorio=True)
+        self.postura = CriterioAvaliacao.objects.create(nome='Postura', peso=1.0, obrigatorio=True)
+        self.extra = CriterioAvaliacao.objects.create(nome='Extra', peso=1.0, obrigatorio=False)
+        self.avaliacoes = [
+            Avaliacao.objects.create(
+                supervisor=self.supervisor, estagio=self.estagio, data_avaliacao=date.today(),
+                periodo_inicio=date.today() - timedelta(days=30 * (i + 1)),
+                periodo_fim=date.today() - timedelta(days=30 * i),
+            )
+            for i in range(3)
+        ]
+
+    def _notas(self, avaliacao, **notas):
+        from estagio.models import NotaCriterio
+
+        for nome, nota in notas.items():
+            NotaCriterio.objects.create(avaliacao=avaliacao, criterio=getattr(self, nome), nota=nota)
+
+    def test_anotacoes_para_varias_avaliacoes(self):
+        from estagio.models import Avaliacao
+
+        completa, incompleta, vazia = self.avaliacoes
+        self._notas(completa, tecnico=8, postura=6, extra=10)
+        self._notas(incompleta, tecnico=9, postura=None)
+
+        with self.assertNumQueries(1):
+            scores = {
+                a.pk: (a.nota_ponderada, a.criterios_faltantes_total, a.avaliacao_completa)
+                for a in Avaliacao.objects.with_scores()
+            }
+        self.assertAlmostEqual(scores[completa.pk][0], (8 * 3 + 6 + 10) / 5)
+        self.assertEqual(scores[completa.pk][1:], (0, True))
+        self.assertAlmostEqual(scores[incompleta.pk][0], 9.0)
+        self.assertEqual(scores[incompleta.pk][1:], (1, False))
+        self.assertEqual(scores[vazia.pk], (None, 2, False))
+
+    def test_metodos_reaproveitam_anotacoes(self):
+        from estagio.models import Avaliacao
+
+        self._notas(self.avaliacoes[0], tecnico=8, postura=6)
+        avaliacao = Avaliacao.objects.with_scores().get(pk=self.avaliacoes[0].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(avaliacao.calcular_nota_media(), 7.5)
+            self.assertTrue(avaliacao.is_completa())
+            self.assertFalse(avaliacao.get_criterios_faltantes())
+
+    def test_metodos_sem_anotacoes(self):
+        avaliacao = self.avaliacoes[1]
+        self._notas(avaliacao, postura=5)
+        self.assertFalse(avaliacao.is_completa())
+        self.assertEqual(list(avaliacao.get_criterios_faltantes()), [self.tecnico])
+        self.assertEqual(avaliacao.calcular_nota_media(), 5.0)
+
+        # Critério inativo deixa de ser exigido
+        self.tecnico.ativo = False
+        self.tecnico.save()
+        self.assertTrue(avaliacao.is_completa())
+
+
+class SalvarNotasAvaliacaoTest(TestCase):
+    """Notas dos critérios validadas em memória e gravadas com um único upsert"""
+
+    def setUp(self):
+        from estagio.models import Avaliacao, CriterioAvaliacao
+        from estagio.notas_avaliacao import criar_notas_vazias
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Notas", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            cnpj="11222333000144", razao_social="Empresa Notas", rua="Rua", numero=1, bairro="Centro"
+        )
+        supervisor = Supervisor.objects.create(
+            nome='Supervisor Notas', contato='11999999999', cargo='Gerente', empresa=empresa,
+            usuario=Usuario.objects.create_user(
+                username='supervisor_notas@test.com', password='senha123', tipo='supervisor'
+            )
+        )
+        estagio = Estagio.objects.create(
+            titulo="Estágio Notas", cargo="Dev", empresa=empresa, supervisor=supervisor,
+            data_inicio=date.today() - timedelta(days=60), data_fim=date.today() + timedelta(days=60),
+            carga_horaria=20, status='em_andamento'
+        )
+        aluno = Aluno.objects.create(
+            usuario=Usuario.objects.create_user(username='aluno_notas@test.com', password='senha123', tipo='aluno'),
+            nome="Aluno Notas", matricula="20236666", contato="11999996666",
+            instituicao=instituicao, estagio=estagio
+        )
+        self.criterios = [
+            CriterioAvaliacao.objects.create(nome=f'Critério {i}', peso=float(i), ordem=i, obrigatorio=i < 4)
+            for i in range(1, 5)
+        ]
+        self.avaliacao = Avaliacao.objects.create(
+            supervisor=supervisor, estagio=estagio, aluno=aluno, data_avaliacao=date.today(),
+            periodo='mensal', periodo_inicio=date.today() - timedelta(days=30), periodo_fim=date.today(),
+        )
+        criar_notas_vazias(self.avaliacao, self.criterios)
+        self.client.login(username='supervisor_notas@test.com', password='senha123')
+
+    def _post(self, notas):
+        dados = {
+            'periodo': 'mensal',
+            'periodo_inicio': self.avaliacao.periodo_inicio.isoformat(),
+            'periodo_fim': self.avaliacao.periodo_fim.isoformat(),
+        }
+        for criterio, nota in zip(self.criterios, notas):
+            dados[f'nota_{criterio.id}'] = nota
+        return self.client.post(reverse('supervisor:editar_avaliacao', args=[self.avaliacao.id]), dados)
+
+    def test_validar_notas_em_memoria(self):
+        from estagio.notas_avaliacao import validar_notas
+
+        valores = {c.id: (nota, '') for c, nota in zip(self.criterios, ['8', 'abc', '11', ''])}
+        with self.assertNumQueries(0):
+            notas, erros = validar_notas(self.criterios, valores)
+        self.assertEqual(len(erros), 2)
+        self.assertEqual([(c.id, n) for c, n, _ in notas], [(self.criterios[0].id, 8.0), (self.criterios[3].id, None)])
+
+    def test_editar_grava_notas_e_completa(self):
+        from estagio.models import Avaliacao, NotaCriterio
+
+        response = self._post(['10', '7', '4', ''])
+        self.assertEqual(response.status_code, 302)
+
+        notas = dict(NotaCriterio.objects.filter(avaliacao=self.avaliacao).values_list('criterio_id', 'nota'))
+        self.assertEqual(len(notas), 4)
+        self.assertEqual(notas[self.criterios[0].id], 10.0)
+        self.assertIsNone(notas[self.criterios[3].id])
+
+        avaliacao = Avaliacao.objects.get(pk=self.avaliacao.pk)
+        self.assertEqual(avaliacao.status, 'completa')
+        self.assertEqual(avaliacao.nota, round((10 * 1 + 7 * 2 + 4 * 3) / 6, 2))
+
+    def test_salvar_notas_incompletas_mantem_rascunho(self):
+        from estagio.models import Avaliacao, NotaCriterio
+        from estagio.notas_avaliacao import salvar_notas, validar_notas
+
+        valores = {self.criterios[0].id: ('9', 'Bom'), self.criterios[1].id: ('6', '')}
+        notas, erros = validar_notas(self.criterios, valores, exigir_obrigatorios=False)
+        self.assertEqual(erros, [])
+
+        self.assertFalse(salvar_notas(self.avaliacao, notas))
+        self.assertEqual(
+            NotaCriterio.objects.get(avaliacao=self.avaliacao, criterio=self.criterios[0]).observacao, 'Bom'
+        )
+        self.assertEqual(NotaCriterio.objects.filter(avaliacao=self.avaliacao).count(), 4)
+        avaliacao = Avaliacao.objects.get(pk=self.avaliacao.pk)
+        self.assertEqual(avaliacao.status, 'rascunho')
+        self.assertIsNone(avaliacao.nota)
+
+
+class RecalcularNotasAvaliacoesTest(TestCase):
+    """Recálculo em lote de nota e completude após mudanças nos critérios"""
+
+    def setUp(self):
+        from estagio.models import Avaliacao, CriterioAvaliacao, NotaCriterio
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Recálculo", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            cnpj="11222333000155", razao_social="Empresa Recálculo", rua="Rua", numero=1, bairro="Centro"
+        )
+        supervisor = Supervisor.objects.create(
+            nome='Supervisor Recálculo', contato='11999999999', cargo='Gerente', empresa=empresa,
+            usuario=Usuario.objects.create_user(
+                username='supervisor_recalculo@test.com', password='senha123', tipo='supervisor'
+            )
+        )
+        estagio = Estagio.objects.create(
+            titulo="Estágio Recálculo", cargo="Dev", empresa=empresa, supervisor=supervisor,
+            data_inicio=date.today() - timedelta(days=90), data_fim=date.today() + timedelta(days=60),
+            carga_horaria=20, status='em_andamento'
+        )
+        aluno = Aluno.objects.create(
+            usuario=Usuario.objects.create_user(username='aluno_recalculo@test.com', password='senha123', tipo='aluno'),
+            nome="Aluno Recálculo", matricula="20237777", contato="11999997777",
+            instituicao=instituicao, estagio=estagio
+        )
+        self.criterios = [
+            CriterioAvaliacao.objects.create(nome='Técnica', peso=1.0, ordem=1),
+            CriterioAvaliacao.objects.create(nome='Postura', peso=1.0, ordem=2),
+        ]
+
+        def avaliacao(dias, **campos):
+            avaliacao = Avaliacao.objects.create(
+                supervisor=supervisor, estagio=estagio, aluno=aluno, data_avaliacao=date.today(),
+                periodo_inicio=date.today() - timedelta(days=dias), periodo_fim=date.today() - timedelta(days=dias - 29),
+                nota=7.0, **campos
+            )
+            for criterio, nota in zip(self.criterios, (10, 4)):
+                NotaCriterio.objects.create(avaliacao=avaliacao, criterio=criterio, nota=nota)
+            return avaliacao
+
+        self.completa = avaliacao(30, status='completa')
+        self.com_parecer = avaliacao(
+            60, status='parecer_emitido', nota_final=7.0, parecer_final='Parecer final emitido. ' * 3
+        )
+        # Peso alterado direto no banco: nenhuma avaliação foi regravada
+        CriterioAvaliacao.objects.filter(pk=self.criterios[1].pk).update(peso=3.0)
+
+    def _recarregar(self):
+        self.completa.refresh_from_db()
+        self.com_parecer.refresh_from_db()
+
+    def test_dry_run_nao_grava(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command('recalcular_notas_avaliacoes', '--dry-run', stdout=saida)
+        self.assertIn('Avaliações a atualizar: 1 de 1', saida.getvalue())
+        self._recarregar()
+        self.assertEqual(self.completa.nota, 7.0)
+
+    def test_recalcula_nota_sem_tocar_pareceres(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recalcular_notas_avaliacoes', '--batch-size', '1', stdout=saida)
+        self.assertIn('Avaliações atualizadas: 1 de 1', saida.getvalue())
+        self._recarregar()
+        self.assertEqual(self.completa.nota, 5.5)
+        self.assertEqual(self.completa.status, 'completa')
+        self.assertEqual(self.com_parecer.nota, 7.0)
+        self.assertEqual(self.com_parecer.nota_final, 7.0)
+
+        # Segunda execução: nada mais a atualizar
+        saida = StringIO()
+        call_command('recalcular_notas_avaliacoes', stdout=saida)
+        self.assertIn('Avaliações atualizadas: 0 de 1', saida.getvalue())
+
+    def test_incluir_pareceres(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('recalcular_notas_avaliacoes', '--incluir-pareceres', stdout=StringIO())
+        self._recarregar()
+        self.assertEqual(self.com_parecer.nota, 5.5)
+        self.assertEqual(self.com_parecer.nota_final, 5.5)
+
+    def test_arredondamento_igual_ao_do_formulario(self):
+        from estagio.notas_avaliacao import recalcular_avaliacoes, salvar_notas
+
+        # Pesos 1 e 3: (7.5 + 3 * 7.0) / 4 = 7.125, metade exata na terceira casa
+        with self.captureOnCommitCallbacks(execute=True):
+            salvar_notas(self.completa, [(self.criterios[0], 7.5, ''), (self.criterios[1], 7.0, '')])
+        self._recarregar()
+        self.assertEqual(self.completa.nota, 7.13)
+        self.assertEqual(self.completa.calcular_nota_final(), 7.13)
+
+        # O recálculo no banco arredonda do mesmo jeito e não regrava a nota
+        self.assertEqual(recalcular_avaliacoes(dry_run=True), (1, 0))
+        self.assertEqual(self.com_parecer.status, 'parecer_emitido')
+
+    def test_novo_criterio_obrigatorio_volta_para_rascunho(self):
+        from estagio.models import CriterioAvaliacao, Pendencia
+        from estagio.notas_avaliacao import recalcular_avaliacoes
+
+        CriterioAvaliacao.objects.create(nome='Pontualidade', peso=1.0, ordem=3)
+        self.assertEqual(recalcular_avaliacoes(), (1, 1))
+        self._recarregar()
+        self.assertEqual(self.completa.status, 'rascunho')
+        self.assertIsNone(self.completa.nota)
+        self.assertTrue(Pendencia.objects.filter(referencia_tipo='avaliacao', referencia_id=self.completa.pk).exists())
+
+
+class CriteriosCacheTest(TestCase):
+    """Retrato versionado dos critérios de avaliação ativos"""
+
+    def setUp(self):
+        from estagio.models import CriterioAvaliacao
+
+        self.tecnica = CriterioAvaliacao.objects.create(nome='Técnica', peso=2.0, ordem=2)
+        self.postura = CriterioAvaliacao.objects.create(nome='Postura', peso=1.0, ordem=1, obrigatorio=False)
+        CriterioAvaliacao.objects.create(nome='Inativo', ordem=0, ativo=False)
+
+    def test_retrato_imutavel_e_reaproveitado(self):
+        from dataclasses import FrozenInstanceError
+        from estagio.criterios_cache import criterios_ativos
+
+        retrato = criterios_ativos()
+        self.assertEqual([c.nome for c in retrato], ['Postura', 'Técnica'])
+        self.assertEqual(retrato.ids_obrigatorios, {self.tecnica.id})
+        self.assertEqual(retrato.get(self.tecnica.id).peso, 2.0)
+        with self.assertRaises(FrozenInstanceError):
+            retrato.criterios[0].peso = 5.0
+
+        with self.assertNumQueries(0):
+            self.assertIs(criterios_ativos(), retrato)
+
+    def test_save_e_delete_trocam_a_versao(self):
+        from estagio.criterios_cache import criterios_ativos
+
+        versao = criterios_ativos().versao
+        self.tecnica.peso = 3.0
+        self.tecnica.save()
+        retrato = criterios_ativos()
+        self.assertNotEqual(retrato.versao, versao)
+        self.assertEqual(retrato.get(self.tecnica.id).peso, 3.0)
+
+        self.postura.delete()
+        self.assertEqual(criterios_ativos().ids, {self.tecnica.id})
+
+    def test_cache_indisponivel_usa_versao_local(self):
+        from estagio import criterios_cache
+
+        with patch.object(criterios_cache, 'cache_compartilhado', return_value=True), \
+                patch.object(criterios_cache, 'cache') as cache:
+            cache.get.side_effect = ConnectionError('cache fora do ar')
+            cache.set.side_effect = ConnectionError('cache fora do ar')
+            retrato = criterios_cache.criterios_ativos()
+            self.assertTrue(retrato.versao.startswith('local:'))
+            with self.assertNumQueries(0):
+                self.assertIs(criterios_cache.criterios_ativos(), retrato)
+
+            self.tecnica.delete()
+            self.assertEqual(criterios_cache.criterios_ativos().ids, {self.postura.id})
+
+    def test_cache_por_processo_expira_o_retrato(self):
+        from estagio import criterios_cache
+        from estagio.models import CriterioAvaliacao
+
+        retrato = criterios_cache.criterios_ativos()
+        self.assertTrue(retrato.versao.startswith('local:'))
+
+        # Alteração feita por outro processo: os signals daqui não a veem
+        CriterioAvaliacao.objects.filter(pk=self.tecnica.pk).update(peso=4.0)
+        self.assertIs(criterios_cache.criterios_ativos(), retrato)
+
+        agora = criterios_cache.time.monotonic() + criterios_cache.ttl_local() + 1
+        with patch.object(criterios_cache.time, 'monotonic', return_value=agora):
+            self.assertEqual(criterios_cache.criterios_ativos().get(self.tecnica.id).peso, 4.0)
+
+
 class ParecerObrigatorioTest(TestCase):
     """
     Testes para validação de parecer obrigatório - CA5
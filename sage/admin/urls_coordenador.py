@@ -9,6 +9,8 @@ urlpatterns = [
     path('reprovar/<int:estagio_id>/', views.reprovar_estagio, name='reprovar_estagio'),
     path('documentos/', views.aprovar_documentos_coordenador, name='documentos'),
     path('documentos/<int:documento_id>/aprovar/', views.aprovar_documento_coordenador, name='aprovar_documento'),
+    path('documentos/lote/', views.avaliar_documentos_coordenador_lote, name='avaliar_documentos_lote'),
+    path('documentos/<int:documento_id>/arquivo/', views.arquivo_documento_coordenador, name='arquivo_documento'),
     
     # URLs de vínculo aluno-vaga
     path('vagas/', views.listar_vagas_disponiveis, name='listar_vagas_disponiveis'),
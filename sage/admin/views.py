@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count, Q
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -11,6 +12,11 @@ from .models import CursoCoordenador, Supervisor, Empresa, Instituicao
 from .forms import SupervisorForm, SupervisorEditForm, EmpresaForm, EmpresaEditForm, InstituicaoForm, InstituicaoEditForm
 from users.models import Usuario
 from utils.email import enviar_notificacao_email
+from estagio.downloads import servir_arquivo
+from estagio.validacao_documentos import (
+    STATUS_PENDENTES_COORDENADOR, STATUS_PENDENTES_SUPERVISOR, STATUS_POR_ACAO, STATUS_POR_ACAO_COORDENADOR,
+    registrar_historico, validar_documento, validar_documentos_em_lote,
+)
 from utils.decorators import supervisor_required, coordenador_required, coordenador_only_required, admin_required
 import logging
 
@@ -354,15 +360,6 @@ def editar_supervisor(request, supervisor_id):
     return render(request, 'admin/editar_supervisor.html', context)
 
 
-def registrar_historico(documento, acao, usuario, observacoes=None):
-    """Função auxiliar para registrar ações no histórico de documentos"""
-    DocumentoHistorico.objects.create(
-        documento=documento,
-        acao=acao,
-        usuario=usuario,
-        observacoes=observacoes
-    )
-
 @login_required
 @coordenador_required
 def aprovar_estagio(request, estagio_id):
@@ -377,8 +374,8 @@ def aprovar_estagio(request, estagio_id):
     """
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        usuario = request.user
+        coordenador = request.perfil.coordenador
         
         estagio = get_object_or_404(Estagio, id=estagio_id)
         
@@ -392,25 +389,17 @@ def aprovar_estagio(request, estagio_id):
             )
             return redirect('coordenador:listar_solicitacoes_coordenador')
         
-        # Aprova o estágio
-        estagio.status = "aprovado"
-        estagio.status_vaga = "ocupada"  # Vaga fica ocupada
-        estagio.save()
-        
-        # VINCULA o aluno ao estágio
-        if aluno:
-            aluno.estagio = estagio
-            aluno.save()
-            
-            # Registra no histórico de vínculos
-            from estagio.models import VinculoHistorico
-            VinculoHistorico.objects.create(
-                aluno=aluno,
-                estagio=estagio,
-                acao='vinculado',
+        # Aprova o estágio, ocupa a vaga e VINCULA o aluno, com vaga e aluno travados
+        from estagio.vinculos import ConflitoVinculo, aprovar
+        try:
+            aluno = aprovar(
+                estagio,
                 realizado_por=usuario,
                 observacoes=f'Estágio aprovado pelo coordenador {coordenador.nome}'
             )
+        except ConflitoVinculo as e:
+            messages.error(request, str(e))
+            return redirect('coordenador:listar_solicitacoes_coordenador')
         
         messages.success(
             request, 
@@ -462,8 +451,7 @@ def reprovar_estagio(request, estagio_id):
     """
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         
         estagio = get_object_or_404(Estagio, id=estagio_id)
         
@@ -521,8 +509,7 @@ def listar_solicitacoes_coordenador(request):
     """
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         
         # Busca estágios em análise de alunos da instituição do coordenador
         estagios = Estagio.objects.filter(
@@ -582,8 +569,7 @@ def aprovar_documentos_supervisor(request):
     """View para o supervisor visualizar e gerenciar documentos"""
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Filtros
         status_filtro = request.GET.get('status', '')
@@ -645,8 +631,8 @@ def avaliar_documento(request, documento_id):
     
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        usuario = request.user
+        supervisor = request.perfil.supervisor
         
         # Busca o documento e verifica se pertence a um estágio supervisionado por este supervisor
         documento = get_object_or_404(
@@ -659,61 +645,26 @@ def avaliar_documento(request, documento_id):
         acao = request.POST.get('acao')
         observacoes = request.POST.get('observacoes', '')
         
-        # Capturar valores antes de modificar o documento
-        tipo_documento = documento.tipo if documento.tipo else 'Documento'
         nome_arquivo = documento.nome_arquivo
-        
+        status = STATUS_POR_ACAO.get(acao)
+        if status is None:
+            messages.error(request, "Ação inválida!")
+            return redirect('aprovar_documentos_supervisor')
+
         # Valida observações obrigatórias para reprovação e ajustes
-        if acao in ['reprovar', 'solicitar_ajustes'] and not observacoes.strip():
+        if status in ['reprovado', 'ajustes_solicitados'] and not observacoes.strip():
             messages.error(request, "Observações são obrigatórias ao reprovar ou solicitar ajustes!")
             return redirect('aprovar_documentos_supervisor')
-        
-        # Atualiza o documento
-        if acao == 'aprovar':
-            documento.status = 'aprovado'
-            registrar_historico(documento, 'aprovado', usuario, None)
+
+        # Atualiza o documento, registra o histórico e notifica o aluno
+        validar_documento(documento, status, usuario, observacoes)
+        if status == 'aprovado':
             messages.success(request, f"Documento '{nome_arquivo}' aprovado com sucesso!")
-        elif acao == 'reprovar':
-            documento.status = 'reprovado'
-            documento.observacoes_supervisor = observacoes
-            registrar_historico(documento, 'reprovado', usuario, observacoes)
+        elif status == 'reprovado':
             messages.warning(request, f"Documento '{nome_arquivo}' reprovado.")
-        elif acao == 'solicitar_ajustes':
-            documento.status = 'ajustes_solicitados'
-            documento.observacoes_supervisor = observacoes
-            registrar_historico(documento, 'ajustes_solicitados', usuario, observacoes)
+        else:
             messages.info(request, f"Ajustes solicitados para o documento '{nome_arquivo}'.")
         
-        # Capturar status display após a modificação
-        status_display = documento.get_status_display()
-        
-        documento.aprovado_por = usuario
-        from django.utils import timezone
-        documento.data_aprovacao = timezone.now()
-        documento.save()
-        
-        # Enviar notificação ao aluno
-        aluno = documento.estagio.aluno_set.first()
-        if aluno:
-            aluno_email = aluno.usuario.email
-            assunto = f"Documento {tipo_documento} - {status_display}"
-            mensagem = f"Seu documento '{nome_arquivo}' foi {status_display.lower()}.\n\n{observacoes if observacoes else ''}"
-            enviar_notificacao_email(
-                destinatario=aluno_email,
-                assunto=assunto,
-                mensagem=mensagem
-            )
-            # Criar notificação no sistema
-            try:
-                Notificacao.objects.get_or_create(
-                    destinatario=aluno_email,
-                    assunto=assunto,
-                    referencia=f"doc_{status_display.lower().replace(' ', '_')}_{documento.id}",
-                    defaults={'mensagem': mensagem}
-                )
-            except Exception as e:
-                logger.warning(f"Erro ao criar notificação: {str(e)}")
-        
         return redirect('supervisor:documentos')
         
     except (Usuario.DoesNotExist, Supervisor.DoesNotExist):
@@ -721,14 +672,70 @@ def avaliar_documento(request, documento_id):
         return redirect('dashboard')
 
 
+def _documentos_selecionados(request):
+    """Ids marcados na lista de documentos (campo `documentos`)"""
+    ids = set()
+    for valor in request.POST.getlist('documentos'):
+        try:
+            ids.add(int(valor))
+        except ValueError:
+            continue
+    return ids
+
+
+def _mensagem_lote(request, status, alterados, selecionados):
+    status_display = dict(Documento.STATUS_CHOICES).get(status, status).lower()
+    if alterados:
+        messages.success(request, f"{alterados} documento(s) marcado(s) como '{status_display}'.")
+    if selecionados > alterados:
+        messages.warning(
+            request,
+            f"{selecionados - alterados} documento(s) ignorado(s): já avaliados ou fora da sua responsabilidade."
+        )
+
+
+@login_required
+@supervisor_required
+def avaliar_documentos_lote(request):
+    """View para aprovar, solicitar ajustes ou reprovar de uma vez os documentos selecionados"""
+    if request.method != 'POST':
+        return redirect('supervisor:documentos')
+
+    try:
+        supervisor = request.perfil.supervisor
+    except Supervisor.DoesNotExist:
+        messages.error(request, "Supervisor não encontrado!")
+        return redirect('dashboard')
+
+    status = STATUS_POR_ACAO.get(request.POST.get('acao'))
+    observacoes = request.POST.get('observacoes', '')
+    ids = _documentos_selecionados(request)
+    if status is None:
+        messages.error(request, "Ação inválida!")
+        return redirect('supervisor:documentos')
+    if not ids:
+        messages.error(request, "Selecione ao menos um documento.")
+        return redirect('supervisor:documentos')
+    if status in ['reprovado', 'ajustes_solicitados'] and not observacoes.strip():
+        messages.error(request, "Observações são obrigatórias ao reprovar ou solicitar ajustes!")
+        return redirect('supervisor:documentos')
+
+    # A permissão é um filtro do conjunto: documentos de outros supervisores são ignorados
+    documentos = Documento.objects.filter(
+        pk__in=ids, estagio__supervisor=supervisor, status__in=STATUS_PENDENTES_SUPERVISOR
+    )
+    alterados = validar_documentos_em_lote(documentos, status, request.user, observacoes)
+    _mensagem_lote(request, status, len(alterados), len(ids))
+    return redirect('supervisor:documentos')
+
+
 @login_required
 @supervisor_required
 def visualizar_documento_supervisor(request, documento_id):
     """View para visualizar um documento específico"""
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Busca o documento e verifica permissão
         documento = get_object_or_404(
@@ -754,14 +761,47 @@ def visualizar_documento_supervisor(request, documento_id):
         return redirect('dashboard')
 
 
+@login_required
+@supervisor_required
+def arquivo_documento_supervisor(request, documento_id):
+    """Arquivo de um documento de estágio supervisionado (?download=1 para baixar)"""
+    try:
+        supervisor = request.perfil.supervisor
+    except Supervisor.DoesNotExist:
+        messages.error(request, "Supervisor não encontrado!")
+        return redirect('dashboard')
+
+    documento = get_object_or_404(Documento, id=documento_id, estagio__supervisor=supervisor)
+    return servir_arquivo(
+        request, documento.arquivo, documento.nome_arquivo,
+        as_attachment=bool(request.GET.get('download')),
+    )
+
+
+@login_required
+@coordenador_required
+def arquivo_documento_coordenador(request, documento_id):
+    """Arquivo de um documento sob responsabilidade do coordenador (?download=1 para baixar)"""
+    try:
+        coordenador = request.perfil.coordenador
+    except CursoCoordenador.DoesNotExist:
+        messages.error(request, "Coordenador não encontrado!")
+        return redirect('dashboard')
+
+    documento = get_object_or_404(Documento, id=documento_id, coordenador=coordenador)
+    return servir_arquivo(
+        request, documento.arquivo, documento.nome_arquivo,
+        as_attachment=bool(request.GET.get('download')),
+    )
+
+
 @login_required
 @coordenador_required
 def aprovar_documentos_coordenador(request):
     """View para o coordenador visualizar e aprovar documentos já validados pelo supervisor"""
     try:
         # Busca o usuário e o coordenador vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         
         # Filtros
         status_filtro = request.GET.get('status', '')
@@ -824,8 +864,8 @@ def aprovar_documento_coordenador(request, documento_id):
     
     try:
         # Busca o usuário e o coordenador vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        usuario = request.user
+        coordenador = request.perfil.coordenador
         
         # Busca o documento e verifica se pertence a este coordenador e está aprovado pelo supervisor
         documento = get_object_or_404(
@@ -872,11 +912,12 @@ def aprovar_documento_coordenador(request, documento_id):
             )
             # Criar notificação no sistema
             try:
-                Notificacao.objects.get_or_create(
+                Notificacao.objects.registrar(
                     destinatario=aluno_email,
                     assunto=assunto_aluno,
+                    mensagem=mensagem_aluno,
                     referencia=f"doc_finalizado_{documento.id}",
-                    defaults={'mensagem': mensagem_aluno}
+                    usuario=aluno.usuario,
                 )
             except Exception as e:
                 logger.warning(f"Erro ao criar notificação: {str(e)}")
@@ -892,11 +933,12 @@ def aprovar_documento_coordenador(request, documento_id):
         )
         # Criar notificação no sistema
         try:
-            Notificacao.objects.get_or_create(
+            Notificacao.objects.registrar(
                 destinatario=supervisor_email,
                 assunto=assunto_sup,
+                mensagem=mensagem_sup,
                 referencia=f"doc_finalizado_{documento.id}",
-                defaults={'mensagem': mensagem_sup}
+                usuario=documento.estagio.supervisor.usuario,
             )
         except Exception as e:
             logger.warning(f"Erro ao criar notificação: {str(e)}")
@@ -908,6 +950,40 @@ def aprovar_documento_coordenador(request, documento_id):
         return redirect('dashboard')
 
 
+@login_required
+@coordenador_required
+def avaliar_documentos_coordenador_lote(request):
+    """View para o coordenador finalizar, solicitar ajustes ou reprovar de uma vez os documentos selecionados"""
+    if request.method != 'POST':
+        return redirect('coordenador:documentos')
+
+    try:
+        coordenador = request.perfil.coordenador
+    except CursoCoordenador.DoesNotExist:
+        messages.error(request, "Coordenador não encontrado!")
+        return redirect('dashboard')
+
+    status = STATUS_POR_ACAO_COORDENADOR.get(request.POST.get('acao'))
+    observacoes = request.POST.get('observacoes', '')
+    ids = _documentos_selecionados(request)
+    if status is None:
+        messages.error(request, "Ação inválida!")
+        return redirect('coordenador:documentos')
+    if not ids:
+        messages.error(request, "Selecione ao menos um documento.")
+        return redirect('coordenador:documentos')
+    if status in ['reprovado', 'ajustes_solicitados'] and not observacoes.strip():
+        messages.error(request, "Observações são obrigatórias ao reprovar ou solicitar ajustes!")
+        return redirect('coordenador:documentos')
+
+    documentos = Documento.objects.filter(
+        pk__in=ids, coordenador=coordenador, status__in=STATUS_PENDENTES_COORDENADOR
+    )
+    alterados = validar_documentos_em_lote(documentos, status, request.user, observacoes, coordenador=True)
+    _mensagem_lote(request, status, len(alterados), len(ids))
+    return redirect('coordenador:documentos')
+
+
 @login_required
 @supervisor_required
 def alterar_status_estagio(request, estagio_id):
@@ -917,8 +993,7 @@ def alterar_status_estagio(request, estagio_id):
     
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Busca o estágio e verifica se pertence a este supervisor
         estagio = get_object_or_404(
@@ -984,8 +1059,7 @@ def listar_atividades_pendentes(request):
     """
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Importa o modelo de Atividade
         from estagio.models import Atividade
@@ -1056,8 +1130,7 @@ def confirmar_atividade(request, atividade_id):
     
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Importa o modelo de Atividade
         from estagio.models import Atividade
@@ -1085,13 +1158,12 @@ def confirmar_atividade(request, atividade_id):
         
         # Cria notificação no sistema
         try:
-            Notificacao.objects.get_or_create(
+            Notificacao.objects.registrar(
                 destinatario=aluno_email,
                 assunto="Atividade Confirmada",
+                mensagem=f"Sua atividade '{atividade.titulo}' foi confirmada pelo supervisor.",
                 referencia=f"atividade_confirmada_{atividade.id}",
-                defaults={
-                    'mensagem': f"Sua atividade '{atividade.titulo}' foi confirmada pelo supervisor."
-                }
+                usuario=atividade.aluno.usuario,
             )
         except Exception as e:
             logger.warning(f"Erro ao criar notificação: {str(e)}")
@@ -1115,8 +1187,7 @@ def rejeitar_atividade(request, atividade_id):
     
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Importa o modelo e formulário
         from estagio.models import Atividade
@@ -1157,13 +1228,12 @@ def rejeitar_atividade(request, atividade_id):
         
         # Cria notificação no sistema
         try:
-            Notificacao.objects.get_or_create(
+            Notificacao.objects.registrar(
                 destinatario=aluno_email,
                 assunto="Atividade Rejeitada",
+                mensagem=f"Sua atividade '{atividade.titulo}' foi rejeitada.\n\nMotivo: {justificativa}",
                 referencia=f"atividade_rejeitada_{atividade.id}",
-                defaults={
-                    'mensagem': f"Sua atividade '{atividade.titulo}' foi rejeitada.\n\nMotivo: {justificativa}"
-                }
+                usuario=atividade.aluno.usuario,
             )
         except Exception as e:
             logger.warning(f"Erro ao criar notificação: {str(e)}")
@@ -1183,8 +1253,7 @@ def visualizar_atividade(request, atividade_id):
     """
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Importa o modelo de Atividade
         from estagio.models import Atividade
@@ -1219,8 +1288,7 @@ def historico_atividade(request, atividade_id):
     """
     try:
         # Busca o usuário e o supervisor vinculado
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Importa o modelo de Atividade
         from estagio.models import Atividade
@@ -1266,8 +1334,7 @@ def listar_vagas_disponiveis(request):
     
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         
         # CA4 - Busca apenas vagas disponíveis
         vagas = Estagio.objects.filter(
@@ -1320,11 +1387,11 @@ def vincular_aluno_vaga(request):
     """
     from estagio.forms import VinculoAlunoVagaForm
     from estagio.models import Aluno
+    from estagio.vinculos import ConflitoVinculo
     
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         
         if request.method == 'POST':
             form = VinculoAlunoVagaForm(request.POST, instituicao=coordenador.instituicao)
@@ -1354,7 +1421,12 @@ def vincular_aluno_vaga(request):
                     
                     # CA7 - Vincula o aluno à vaga (atualiza status_vaga automaticamente)
                     # CA8 - Registra histórico (feito dentro do método)
-                    vaga.vincular_aluno(aluno, realizado_por=request.user)
+                    try:
+                        vaga.vincular_aluno(aluno, realizado_por=request.user)
+                    except ConflitoVinculo as e:
+                        # Outro coordenador ocupou a vaga ou vinculou o aluno ao mesmo tempo
+                        messages.error(request, str(e))
+                        return redirect('coordenador:vincular_aluno_vaga')
                     
                     messages.success(
                         request,
@@ -1416,11 +1488,11 @@ def desvincular_aluno_vaga(request, aluno_id):
     Apenas coordenador da mesma instituição pode desvincular.
     """
     from estagio.models import Aluno
+    from estagio.vinculos import ConflitoVinculo
     
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         
         aluno = get_object_or_404(Aluno.objects.select_related('estagio', 'instituicao'), id=aluno_id)
         
@@ -1452,6 +1524,10 @@ def desvincular_aluno_vaga(request, aluno_id):
                 
                 return redirect('coordenador:listar_vinculos')
                 
+            except ConflitoVinculo as e:
+                # Desvinculado por outro coordenador enquanto a página estava aberta
+                messages.error(request, str(e))
+                return redirect('coordenador:listar_vinculos')
             except Exception as e:
                 logger.error(f"Erro ao desvincular aluno: {e}")
                 messages.error(request, f'Erro ao desvincular aluno: {str(e)}')
@@ -1478,8 +1554,8 @@ def listar_vinculos(request):
     
     try:
         # Busca o coordenador logado
-        usuario = Usuario.objects.get(id=request.user.id)
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        usuario = request.user
+        coordenador = request.perfil.coordenador
         
         # Busca alunos com vínculo ativo DA INSTITUIÇÃO DO COORDENADOR
         alunos_vinculados = Aluno.objects.filter(
@@ -1594,8 +1670,7 @@ def listar_avaliacoes(request):
     from estagio.models import Avaliacao, Aluno
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Busca avaliações do supervisor
         avaliacoes = Avaliacao.objects.filter(
@@ -1648,13 +1723,14 @@ def criar_avaliacao(request, aluno_id):
     """
     View para criar nova avaliação de desempenho - CA1, CA2
     """
-    from estagio.models import Avaliacao, Aluno, CriterioAvaliacao, NotaCriterio
+    from estagio.models import Avaliacao, Aluno
     from estagio.forms import AvaliacaoForm
+    from estagio.criterios_cache import criterios_ativos
+    from estagio.notas_avaliacao import criar_notas_vazias
     from datetime import date
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Busca o aluno e verifica se está vinculado ao supervisor
         aluno = get_object_or_404(
@@ -1677,13 +1753,7 @@ def criar_avaliacao(request, aluno_id):
                 avaliacao.save()
                 
                 # Cria as notas de critérios vazias para preenchimento posterior
-                criterios = CriterioAvaliacao.objects.filter(ativo=True)
-                for criterio in criterios:
-                    NotaCriterio.objects.create(
-                        avaliacao=avaliacao,
-                        criterio=criterio,
-                        nota=None
-                    )
+                criar_notas_vazias(avaliacao, criterios_ativos())
                 
                 messages.success(
                     request,
@@ -1715,16 +1785,17 @@ def editar_avaliacao(request, avaliacao_id):
     """
     View para editar avaliação e preencher critérios - CA1, CA2, CA3
     """
-    from estagio.models import Avaliacao, CriterioAvaliacao, NotaCriterio
-    from estagio.forms import AvaliacaoForm, NotaCriterioForm
+    from estagio.models import Avaliacao
+    from estagio.forms import AvaliacaoForm
+    from estagio.criterios_cache import criterios_ativos
+    from estagio.notas_avaliacao import salvar_notas, validar_notas
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
-        # Busca a avaliação
+        # Busca a avaliação (nota e completude anotadas; nada é gravado quando o POST tem erros)
         avaliacao = get_object_or_404(
-            Avaliacao.objects.select_related('aluno', 'estagio'),
+            Avaliacao.objects.with_scores().select_related('aluno', 'estagio'),
             id=avaliacao_id,
             supervisor=supervisor
         )
@@ -1735,69 +1806,27 @@ def editar_avaliacao(request, avaliacao_id):
             return redirect('supervisor:visualizar_avaliacao', avaliacao_id=avaliacao.id)
         
         # Busca os critérios e notas existentes
-        criterios = CriterioAvaliacao.objects.filter(ativo=True).order_by('ordem')
+        criterios = criterios_ativos()
         notas_existentes = {nc.criterio_id: nc for nc in avaliacao.notas_criterios.all()}
         
         if request.method == 'POST':
             # Atualiza dados da avaliação
             form = AvaliacaoForm(request.POST, instance=avaliacao)
             
-            erros = False
-            
             if form.is_valid():
-                form.save()
-                
-                # Processa as notas dos critérios
-                for criterio in criterios:
-                    nota_valor = request.POST.get(f'nota_{criterio.id}')
-                    observacao = request.POST.get(f'observacao_{criterio.id}', '')
-                    
-                    # Converte nota para float ou None
-                    try:
-                        nota_float = float(nota_valor) if nota_valor else None
-                    except ValueError:
-                        nota_float = None
-                    
-                    # Valida nota
-                    if nota_float is not None:
-                        if nota_float < criterio.nota_minima or nota_float > criterio.nota_maxima:
-                            messages.error(
-                                request,
-                                f'Nota do critério "{criterio.nome}" deve estar entre '
-                                f'{criterio.nota_minima} e {criterio.nota_maxima}.'
-                            )
-                            erros = True
-                            continue
-                    
-                    # CA3 - Valida critério obrigatório
-                    if criterio.obrigatorio and nota_float is None:
-                        messages.error(
-                            request,
-                            f'O critério "{criterio.nome}" é obrigatório.'
-                        )
-                        erros = True
-                        continue
-                    
-                    # Atualiza ou cria a nota
-                    if criterio.id in notas_existentes:
-                        nota_criterio = notas_existentes[criterio.id]
-                        nota_criterio.nota = nota_float
-                        nota_criterio.observacao = observacao
-                        nota_criterio.save()
-                    else:
-                        NotaCriterio.objects.create(
-                            avaliacao=avaliacao,
-                            criterio=criterio,
-                            nota=nota_float,
-                            observacao=observacao
-                        )
+                # Valida todas as notas antes de gravar qualquer uma
+                notas, erros = validar_notas(criterios, {
+                    criterio.id: (request.POST.get(f'nota_{criterio.id}'), request.POST.get(f'observacao_{criterio.id}', ''))
+                    for criterio in criterios
+                })
+                for erro in erros:
+                    messages.error(request, erro)
                 
                 if not erros:
-                    # Atualiza status se todos os critérios foram preenchidos
-                    if avaliacao.is_completa():
-                        avaliacao.status = 'completa'
-                        avaliacao.nota = avaliacao.calcular_nota_media()
-                        avaliacao.save()
+                    with transaction.atomic():
+                        form.save()
+                        completa = salvar_notas(avaliacao, notas)
+                    if completa:
                         messages.success(request, 'Avaliação salva e completa!')
                     else:
                         messages.success(request, 'Avaliação salva como rascunho.')
@@ -1849,8 +1878,7 @@ def enviar_avaliacao(request, avaliacao_id):
     from estagio.models import Avaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         avaliacao = get_object_or_404(
             Avaliacao.objects.select_related('aluno', 'estagio'),
@@ -1930,8 +1958,7 @@ def visualizar_avaliacao(request, avaliacao_id):
     from estagio.models import Avaliacao, CriterioAvaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         avaliacao = get_object_or_404(
             Avaliacao.objects.select_related('aluno', 'estagio__empresa').prefetch_related(
@@ -1962,8 +1989,7 @@ def excluir_avaliacao(request, avaliacao_id):
     from estagio.models import Avaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         avaliacao = get_object_or_404(
             Avaliacao,
@@ -2012,8 +2038,7 @@ def emitir_parecer_final(request, avaliacao_id):
     from estagio.forms import ParecerFinalForm
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         avaliacao = get_object_or_404(
             Avaliacao.objects.select_related('aluno', 'estagio__empresa').prefetch_related(
@@ -2120,8 +2145,7 @@ def visualizar_parecer(request, avaliacao_id):
     from estagio.models import Avaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         avaliacao = get_object_or_404(
             Avaliacao.objects.select_related('aluno', 'estagio__empresa').prefetch_related(
@@ -2158,8 +2182,7 @@ def alternar_disponibilidade_parecer(request, avaliacao_id):
     from estagio.models import Avaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         avaliacao = get_object_or_404(
             Avaliacao,
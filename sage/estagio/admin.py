@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Aluno, Estagio, Avaliacao, Documento
+from .models import (
+    Aluno, Estagio, Avaliacao, CriterioAvaliacao, Documento, EmailOutbox, RelatorioJob, ArquivoConteudo
+)
+from .notas_avaliacao import recalcular_avaliacoes
 
 @admin.register(Aluno)
 class AlunoAdmin(admin.ModelAdmin):
@@ -19,9 +22,46 @@ class AvaliacaoAdmin(admin.ModelAdmin):
     list_display = ('estagio', 'supervisor', 'nota', 'data_avaliacao')
     list_filter = ('data_avaliacao',)
     search_fields = ('estagio__titulo',)
+    actions = ('recalcular_notas',)
+
+    @admin.action(description='Recalcular nota e completude (sem parecer final)')
+    def recalcular_notas(self, request, queryset):
+        analisadas, alteradas = recalcular_avaliacoes(queryset)
+        self.message_user(request, f"{alteradas} de {analisadas} avaliações atualizadas.")
+
+@admin.register(CriterioAvaliacao)
+class CriterioAvaliacaoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'peso', 'obrigatorio', 'ativo', 'ordem')
+    list_filter = ('ativo', 'obrigatorio')
+    search_fields = ('nome',)
+    actions = ('recalcular_avaliacoes',)
+
+    @admin.action(description='Recalcular todas as avaliações sem parecer final')
+    def recalcular_avaliacoes(self, request, queryset):
+        # Peso e obrigatoriedade de qualquer critério afetam todas as avaliações
+        analisadas, alteradas = recalcular_avaliacoes()
+        self.message_user(request, f"{alteradas} de {analisadas} avaliações atualizadas.")
 
 @admin.register(Documento)
 class DocumentoAdmin(admin.ModelAdmin):
     list_display = ('nome_arquivo', 'tipo', 'estagio', 'coordenador', 'data_envio', 'versao')
     list_filter = ('tipo', 'data_envio')
     search_fields = ('nome_arquivo', 'estagio__titulo')
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('destinatario', 'assunto', 'status', 'tentativas', 'proxima_tentativa', 'enviado_em')
+    list_filter = ('status',)
+    search_fields = ('destinatario', 'assunto')
+
+@admin.register(RelatorioJob)
+class RelatorioJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'solicitante', 'formato', 'status', 'total_linhas', 'duracao', 'criado_em', 'concluido_em')
+    list_filter = ('status', 'formato')
+    search_fields = ('solicitante__username',)
+
+@admin.register(ArquivoConteudo)
+class ArquivoConteudoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'tamanho', 'referencias', 'sem_referencias_desde', 'criado_em')
+    readonly_fields = ('nome', 'hash', 'tamanho', 'referencias', 'sem_referencias_desde', 'criado_em')
+    search_fields = ('nome', 'hash')
@@ -0,0 +1,197 @@
+"""
+Distribuição das notas finais das avaliações para os coordenadores.
+
+Uma única consulta traz, para cada avaliação com nota final, a nota de cada
+critério e as chaves de agrupamento (empresa, supervisor, instituição do aluno
+e período). Sobre essas linhas são calculados, em memória:
+
+- percentis e histograma das notas finais, no total e por grupo;
+- média e desvio padrão das notas de cada critério;
+- o z-score de leniência de cada supervisor: (média do supervisor − média
+  geral) / (desvio geral / √n), positivo para quem avalia acima da coorte.
+
+Os cálculos usam `statistics` e `bisect` da biblioteca padrão sobre listas
+ordenadas uma vez por grupo. O resultado fica no cache do Django por versão
+global dos dados (`VersaoDados`): só é recalculado depois de alguma alteração.
+"""
+import hashlib
+import json
+import math
+import statistics
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from estagio.models import Avaliacao
+from estagio.versao_dados import ESCOPO_GLOBAL, obter_versoes
+
+CACHE_PREFIXO = 'analise_notas'
+
+# Chave de agrupamento -> campo da consulta
+AGRUPAMENTOS = {
+    'empresa': 'estagio__empresa_id',
+    'supervisor': 'supervisor_id',
+    'instituicao': 'aluno__instituicao_id',
+    'periodo': 'periodo',
+}
+
+PERCENTIS = (10, 25, 50, 75, 90)
+
+
+def ttl():
+    return getattr(settings, 'ANALISE_NOTAS_CACHE_TTL', 60 * 60)
+
+
+def faixas_histograma():
+    """Limites das faixas do histograma: de 0 à nota máxima, de 1 em 1"""
+    return list(range(0, int(getattr(settings, 'ANALISE_NOTAS_NOTA_MAXIMA', 10)) + 1))
+
+
+def percentis(ordenadas):
+    """Percentis (interpolação linear) de uma lista já ordenada"""
+    if len(ordenadas) == 1:
+        return {f'p{p}': ordenadas[0] for p in PERCENTIS}
+    cortes = statistics.quantiles(ordenadas, n=100, method='inclusive')
+    return {f'p{p}': round(cortes[p - 1], 2) for p in PERCENTIS}
+
+
+def histograma(ordenadas, faixas):
+    """
+    Quantidade de notas em cada faixa [de, ate) de uma lista já ordenada; a
+    última faixa inclui a nota máxima e notas fora dos limites vão para as faixas das pontas.
+    """
+    posicoes = [0] + [bisect_left(ordenadas, limite) for limite in faixas[1:-1]] + [len(ordenadas)]
+    return [
+        {'de': de, 'ate': ate, 'quantidade': posicoes[i + 1] - posicoes[i]}
+        for i, (de, ate) in enumerate(zip(faixas, faixas[1:]))
+    ]
+
+
+def resumo(notas, faixas):
+    """Quantidade, média, desvio padrão, percentis e histograma das notas"""
+    ordenadas = sorted(notas)
+    if not ordenadas:
+        return {'quantidade': 0, 'media': None, 'desvio_padrao': None, 'percentis': {}, 'histograma': []}
+    return {
+        'quantidade': len(ordenadas),
+        'media': round(statistics.fmean(ordenadas), 2),
+        'desvio_padrao': round(statistics.pstdev(ordenadas), 2),
+        'percentis': percentis(ordenadas),
+        'histograma': histograma(ordenadas, faixas),
+    }
+
+
+def _nomes(agrupamento, ids):
+    """Rótulos dos grupos (uma consulta); períodos usam o rótulo das choices"""
+    from admin.models import Empresa, Instituicao, Supervisor
+
+    if agrupamento == 'periodo':
+        return dict(Avaliacao.PERIODO_CHOICES)
+    modelo, campo = {
+        'empresa': (Empresa, 'razao_social'),
+        'supervisor': (Supervisor, 'nome'),
+        'instituicao': (Instituicao, 'nome'),
+    }[agrupamento]
+    return dict(modelo.objects.filter(pk__in=[i for i in ids if i is not None]).values_list('pk', campo))
+
+
+def _linhas(filtros):
+    """Uma linha por nota de critério (ou uma sem critério) de cada avaliação com nota final"""
+    avaliacoes = Avaliacao.objects.filter(nota_final__isnull=False)
+    for agrupamento, valor in filtros.items():
+        avaliacoes = avaliacoes.filter(**{AGRUPAMENTOS[agrupamento]: valor})
+    return avaliacoes.order_by().values_list(
+        'id', 'nota_final', *AGRUPAMENTOS.values(),
+        'notas_criterios__criterio_id', 'notas_criterios__criterio__nome', 'notas_criterios__nota',
+    )
+
+
+def calcular_analise(filtros=None, agrupar=None):
+    """
+    Análise das notas finais das avaliações que atendem `filtros`
+    ({agrupamento: valor}, ver AGRUPAMENTOS), com os grupos de `agrupar`.
+    """
+    filtros = filtros or {}
+    faixas = faixas_histograma()
+
+    notas_finais = {}
+    grupos_da_avaliacao = {}
+    notas_por_criterio = defaultdict(list)
+    nomes_criterios = {}
+    for avaliacao_id, nota_final, *grupo, criterio_id, criterio_nome, nota in _linhas(filtros).iterator(chunk_size=2000):
+        if avaliacao_id not in notas_finais:
+            notas_finais[avaliacao_id] = nota_final
+            grupos_da_avaliacao[avaliacao_id] = dict(zip(AGRUPAMENTOS, grupo))
+        if criterio_id is not None and nota is not None:
+            notas_por_criterio[criterio_id].append(nota)
+            nomes_criterios[criterio_id] = criterio_nome
+
+    analise = {
+        'filtros': filtros,
+        'agrupar': agrupar,
+        'geral': resumo(notas_finais.values(), faixas),
+        'criterios': [
+            {
+                'id': criterio_id,
+                'nome': nomes_criterios[criterio_id],
+                'quantidade': len(notas),
+                'media': round(statistics.fmean(notas), 2),
+                'desvio_padrao': round(statistics.pstdev(notas), 2),
+            }
+            for criterio_id, notas in sorted(notas_por_criterio.items(), key=lambda item: nomes_criterios[item[0]])
+        ],
+        'grupos': [],
+        'supervisores': _leniencia_supervisores(notas_finais, grupos_da_avaliacao),
+    }
+
+    if agrupar:
+        notas_por_grupo = defaultdict(list)
+        for avaliacao_id, nota_final in notas_finais.items():
+            notas_por_grupo[grupos_da_avaliacao[avaliacao_id][agrupar]].append(nota_final)
+        nomes = _nomes(agrupar, notas_por_grupo)
+        analise['grupos'] = [
+            {'id': grupo, 'nome': nomes.get(grupo), **resumo(notas, faixas)}
+            for grupo, notas in sorted(notas_por_grupo.items(), key=lambda item: str(item[0]))
+        ]
+    return analise
+
+
+def _leniencia_supervisores(notas_finais, grupos_da_avaliacao):
+    """Média e z-score da média de cada supervisor em relação à coorte inteira"""
+    if not notas_finais:
+        return []
+    media_geral = statistics.fmean(notas_finais.values())
+    desvio_geral = statistics.pstdev(notas_finais.values())
+
+    notas_por_supervisor = defaultdict(list)
+    for avaliacao_id, nota_final in notas_finais.items():
+        notas_por_supervisor[grupos_da_avaliacao[avaliacao_id]['supervisor']].append(nota_final)
+    nomes = _nomes('supervisor', notas_por_supervisor)
+
+    supervisores = []
+    for supervisor_id, notas in notas_por_supervisor.items():
+        media = statistics.fmean(notas)
+        z = (media - media_geral) / (desvio_geral / math.sqrt(len(notas))) if desvio_geral else 0.0
+        supervisores.append({
+            'id': supervisor_id,
+            'nome': nomes.get(supervisor_id),
+            'quantidade': len(notas),
+            'media': round(media, 2),
+            'z_score': round(z, 2),
+        })
+    supervisores.sort(key=lambda item: item['z_score'], reverse=True)
+    return supervisores
+
+
+def obter_analise(filtros=None, agrupar=None):
+    """`calcular_analise` guardada no cache enquanto a versão global dos dados não mudar"""
+    versao = obter_versoes([ESCOPO_GLOBAL])[ESCOPO_GLOBAL]
+    bruto = json.dumps({'filtros': filtros or {}, 'agrupar': agrupar, 'versao': versao}, sort_keys=True)
+    chave = f'{CACHE_PREFIXO}:{hashlib.sha256(bruto.encode("utf-8")).hexdigest()}'
+    analise = cache.get(chave)
+    if analise is None:
+        analise = calcular_analise(filtros, agrupar)
+        cache.set(chave, analise, ttl())
+    return analise
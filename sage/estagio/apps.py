@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EstagioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'estagio'
+
+    def ready(self):
+        from estagio import signals  # noqa: F401
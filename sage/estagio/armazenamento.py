@@ -0,0 +1,327 @@
+"""
+Armazenamento dos arquivos de `Documento` endereçado por conteúdo.
+
+Cada upload é gravado em blocos num arquivo temporário enquanto o SHA-256 é
+calculado; o arquivo definitivo fica em `documentos/ab/cd/<hash><extensão>`
+(dois níveis de diretório pelo prefixo do hash) e é gravado uma única vez:
+reenvios do mesmo conteúdo reaproveitam o arquivo existente.
+
+`ArquivoConteudo` guarda a quantidade de documentos que apontam para cada
+arquivo. Os sinais de `Documento` incrementam e decrementam essa contagem.
+Antes de gravar ou reaproveitar um arquivo, o upload trava (ou cria) o registro
+dele na mesma transação. Um arquivo sem documentos não é apagado na hora: a
+contagem zerada marca `sem_referencias_desde`, e só a varredura
+`limpar_arquivos_sem_referencia` (comando `limpar_arquivos_documentos`) apaga,
+com o registro travado, os arquivos que seguem sem documentos depois da
+carência (`DOCUMENTOS_ARQUIVOS_CARENCIA_HORAS`). Um upload concorrente do mesmo
+conteúdo recomeça a carência. A varredura também registra os arquivos que
+ficaram no disco sem registro (upload cuja transação foi desfeita), que então
+seguem a mesma carência.
+
+Arquivos gravados antes deste armazenamento (diretório plano `documentos/`)
+são convertidos pelo comando `migrar_armazenamento_documentos`.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PASTA_DOCUMENTOS = 'documentos'
+
+# Arquivos temporários ficam sob MEDIA_ROOT para que o rename final seja atômico
+PASTA_TEMPORARIA = '.envios'
+
+TAMANHO_BLOCO = 64 * 1024
+
+# A extensão é mantida no nome (templates e navegador usam o sufixo .pdf)
+TAMANHO_MAX_EXTENSAO = 10
+
+_NOME_CONTEUDO = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(?:\.[^/]*)?$')
+
+
+def caminho_conteudo(hash_hex, extensao='', pasta=PASTA_DOCUMENTOS):
+    """Nome do arquivo no armazenamento: <pasta>/ab/cd/<hash><extensão>"""
+    return posixpath.join(pasta, hash_hex[:2], hash_hex[2:4], f'{hash_hex}{extensao}')
+
+
+def hash_do_nome(nome):
+    """SHA-256 de um nome endereçado por conteúdo, ou None para nomes legados"""
+    encontrado = _NOME_CONTEUDO.search(nome or '')
+    if encontrado is None:
+        return None
+    prefixo, meio, hash_hex = encontrado.groups()
+    if hash_hex[:2] != prefixo or hash_hex[2:4] != meio:
+        return None
+    return hash_hex
+
+
+def eh_endereco_conteudo(nome):
+    return hash_do_nome(nome) is not None
+
+
+class ArmazenamentoConteudo(FileSystemStorage):
+    """FileSystemStorage que nomeia os arquivos pelo SHA-256 do conteúdo"""
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo depende do conteúdo e é calculado em _save;
+        # um nome já existente significa o mesmo conteúdo, não uma colisão.
+        return name
+
+    def _save(self, name, content):
+        pasta = posixpath.dirname(name) or PASTA_DOCUMENTOS
+        extensao = os.path.splitext(name)[1].lower()[:TAMANHO_MAX_EXTENSAO]
+
+        temporarios = self.path(PASTA_TEMPORARIA)
+        os.makedirs(temporarios, exist_ok=True)
+        fd, caminho_temporario = tempfile.mkstemp(dir=temporarios)
+        try:
+            digest = hashlib.sha256()
+            tamanho = 0
+            with os.fdopen(fd, 'wb') as destino:
+                for bloco in content.chunks(TAMANHO_BLOCO):
+                    if isinstance(bloco, str):
+                        bloco = bloco.encode('utf-8')
+                    digest.update(bloco)
+                    destino.write(bloco)
+                    tamanho += len(bloco)
+
+            nome = caminho_conteudo(digest.hexdigest(), extensao, pasta)
+            with transaction.atomic():
+                # Com o registro travado a varredura não apaga o arquivo que vai ser reaproveitado
+                _travar_registro(nome, digest.hexdigest(), tamanho)
+                caminho_final = self.path(nome)
+                if os.path.exists(caminho_final):
+                    os.remove(caminho_temporario)
+                else:
+                    os.makedirs(os.path.dirname(caminho_final), exist_ok=True)
+                    os.chmod(caminho_temporario, self.file_permissions_mode or 0o644)
+                    # Uploads simultâneos do mesmo conteúdo substituem o arquivo por bytes idênticos
+                    os.replace(caminho_temporario, caminho_final)
+        except BaseException:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+        return nome
+
+
+_armazenamento = ArmazenamentoConteudo()
+
+
+def armazenamento_documentos():
+    """Storage de `Documento.arquivo` (callable para não fixar a instância nas migrations)"""
+    return _armazenamento
+
+
+class ArmazenamentoRelatorios(FileSystemStorage):
+    """
+    Arquivos de `RelatorioJob` em RELATORIOS_ROOT, fora de MEDIA_ROOT: não têm
+    URL pública e só saem pela view de download, depois da checagem de acesso.
+    """
+
+    @property
+    def base_location(self):
+        return getattr(settings, 'RELATORIOS_ROOT', os.path.join(settings.BASE_DIR, 'relatorios'))
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+    @property
+    def x_accel_prefixo(self):
+        """Location interna do nginx que aponta para RELATORIOS_ROOT"""
+        return getattr(settings, 'RELATORIOS_X_ACCEL_PREFIXO', '/relatorios-protegidos/')
+
+
+_armazenamento_relatorios = ArmazenamentoRelatorios()
+
+
+def armazenamento_relatorios():
+    """Storage de `RelatorioJob.arquivo` (callable para não fixar a instância nas migrations)"""
+    return _armazenamento_relatorios
+
+
+# ---------------------------------------------------------------------------
+# Contagem de referências
+# ---------------------------------------------------------------------------
+
+def carencia():
+    """Tempo sem documentos até a varredura apagar um arquivo"""
+    return timedelta(hours=getattr(settings, 'DOCUMENTOS_ARQUIVOS_CARENCIA_HORAS', 24))
+
+
+def _travar_registro(nome, hash_hex, tamanho=None):
+    """
+    `ArquivoConteudo` do nome travado até o fim da transação (criado, sem
+    referências, se não existir). Um registro sem referências recomeça a
+    carência: o arquivo está sendo reaproveitado.
+    """
+    from estagio.models import ArquivoConteudo
+
+    arquivo = ArquivoConteudo.objects.select_for_update().filter(nome=nome).first()
+    if arquivo is None:
+        if tamanho is None:
+            try:
+                tamanho = armazenamento_documentos().size(nome)
+            except OSError:
+                tamanho = None
+        try:
+            with transaction.atomic():
+                return ArquivoConteudo.objects.create(
+                    nome=nome, hash=hash_hex, tamanho=tamanho, referencias=0,
+                    sem_referencias_desde=timezone.now(),
+                )
+        except IntegrityError:
+            # Criado por outra transação entre a consulta e o INSERT
+            arquivo = ArquivoConteudo.objects.select_for_update().get(nome=nome)
+    if arquivo.referencias == 0:
+        arquivo.sem_referencias_desde = timezone.now()
+        arquivo.save(update_fields=['sem_referencias_desde'])
+    return arquivo
+
+
+def registrar_referencia(nome, quantidade=1):
+    """Soma `quantidade` documentos às referências do arquivo (apenas nomes endereçados por conteúdo)"""
+    hash_hex = hash_do_nome(nome)
+    if hash_hex is None or quantidade <= 0:
+        return
+    with transaction.atomic():
+        arquivo = _travar_registro(nome, hash_hex)
+        arquivo.referencias += quantidade
+        arquivo.sem_referencias_desde = None
+        arquivo.save(update_fields=['referencias', 'sem_referencias_desde'])
+
+
+def liberar_referencia(nome):
+    """
+    Desconta um documento das referências do arquivo. Sem referências, o
+    arquivo fica no disco até a varredura, depois da carência.
+    """
+    from estagio.models import ArquivoConteudo, Documento
+
+    if not eh_endereco_conteudo(nome):
+        return
+    with transaction.atomic():
+        arquivo = ArquivoConteudo.objects.select_for_update().filter(nome=nome).first()
+        if arquivo is None:
+            return
+        if arquivo.referencias > 1:
+            arquivo.referencias -= 1
+        else:
+            # Última referência contabilizada: confere com os documentos existentes
+            arquivo.referencias = Documento.objects.filter(arquivo=nome).count()
+            if not arquivo.referencias:
+                arquivo.sem_referencias_desde = timezone.now()
+        arquivo.save(update_fields=['referencias', 'sem_referencias_desde'])
+
+
+def limpar_arquivos_sem_referencia():
+    """
+    Apaga os arquivos que seguem sem documentos depois da carência e registra
+    os arquivos do disco sem `ArquivoConteudo` (apagados numa próxima varredura).
+    Retorna (removidos, orfaos_registrados).
+    """
+    from estagio.models import ArquivoConteudo, Documento
+
+    limite = timezone.now() - carencia()
+    removidos = 0
+    candidatos = list(
+        ArquivoConteudo.objects.filter(referencias=0, sem_referencias_desde__lt=limite).values_list('pk', flat=True)
+    )
+    for pk in candidatos:
+        with transaction.atomic():
+            arquivo = ArquivoConteudo.objects.select_for_update().filter(
+                pk=pk, referencias=0, sem_referencias_desde__lt=limite
+            ).first()
+            if arquivo is None:
+                # Reaproveitado por um upload depois da consulta
+                continue
+            referencias = Documento.objects.filter(arquivo=arquivo.nome).count()
+            if referencias:
+                # Documentos gravados sem os sinais (fixtures, update()): corrige a contagem
+                arquivo.referencias = referencias
+                arquivo.sem_referencias_desde = None
+                arquivo.save(update_fields=['referencias', 'sem_referencias_desde'])
+                continue
+            # Apagado com o registro travado: um upload do mesmo conteúdo espera e grava de novo
+            armazenamento_documentos().delete(arquivo.nome)
+            arquivo.delete()
+        removidos += 1
+        logger.info(f"Arquivo sem referências removido: {arquivo.nome}")
+    return removidos, _registrar_orfaos(limite)
+
+
+def _registrar_orfaos(limite):
+    """Registra, sem referências, os arquivos do disco sem registro modificados antes de `limite`"""
+    from estagio.models import ArquivoConteudo, Documento
+
+    armazenamento = armazenamento_documentos()
+    raiz = armazenamento.path(PASTA_DOCUMENTOS)
+    registrados = 0
+    for pasta, _, arquivos in os.walk(raiz):
+        nomes = {}
+        for arquivo in arquivos:
+            caminho = os.path.join(pasta, arquivo)
+            nome = posixpath.join(PASTA_DOCUMENTOS, *os.path.relpath(caminho, raiz).split(os.sep))
+            modificado_em = datetime.fromtimestamp(os.path.getmtime(caminho), tz=dt_timezone.utc)
+            if eh_endereco_conteudo(nome) and modificado_em < limite:
+                nomes[nome] = os.path.getsize(caminho)
+        if not nomes:
+            continue
+        nomes_registrados = set(ArquivoConteudo.objects.filter(nome__in=nomes).values_list('nome', flat=True))
+        for nome, tamanho in nomes.items():
+            if nome in nomes_registrados:
+                continue
+            referencias = Documento.objects.filter(arquivo=nome).count()
+            try:
+                with transaction.atomic():
+                    ArquivoConteudo.objects.create(
+                        nome=nome, hash=hash_do_nome(nome), tamanho=tamanho, referencias=referencias,
+                        sem_referencias_desde=None if referencias else timezone.now(),
+                    )
+            except IntegrityError:
+                # Registrado por um upload concorrente
+                continue
+            registrados += 1
+    return registrados
+
+
+# ---------------------------------------------------------------------------
+# Migração dos arquivos legados
+# ---------------------------------------------------------------------------
+
+def migrar_arquivo(nome, manter_original=False):
+    """
+    Copia um arquivo legado para o endereço de conteúdo e aponta para ele
+    todos os documentos que usavam o nome antigo.
+
+    Retorna (novo_nome, documentos_atualizados); novo_nome é None se o
+    arquivo não existir no disco.
+    """
+    from estagio.models import Documento
+
+    armazenamento = armazenamento_documentos()
+    if not armazenamento.exists(nome):
+        return None, 0
+    with armazenamento.open(nome, 'rb') as original:
+        novo = armazenamento.save(posixpath.join(PASTA_DOCUMENTOS, posixpath.basename(nome)), original)
+
+    with transaction.atomic():
+        atualizados = Documento.objects.filter(arquivo=nome).update(arquivo=novo)
+        registrar_referencia(novo, atualizados)
+    if not manter_original and novo != nome:
+        armazenamento.delete(nome)
+    return novo, atualizados
@@ -0,0 +1,179 @@
+"""
+Cache dos critérios de avaliação ativos.
+
+`criterios_ativos()` devolve um retrato imutável (`CriteriosAtivos`) dos
+critérios ativos — ids, pesos, limites, obrigatoriedade e ordem — usado pelos
+formulários de avaliação no lugar de consultar `CriterioAvaliacao` a cada
+requisição.
+
+O retrato é identificado por uma versão guardada no cache do Django e trocada
+pelos signals de post_save e post_delete de `CriterioAvaliacao`. Cada processo
+mantém os últimos retratos num LRU por versão, de modo que a leitura normal
+custa apenas a consulta da versão ao cache. Alterações feitas com `update()`
+não disparam signals: chame `invalidar()` depois delas.
+
+A versão só é vista pelos outros processos quando o cache do Django é
+compartilhado (Redis, Memcached, banco). Com um cache por processo — o
+LocMemCache padrão, já que o projeto não configura CACHES — ou com o cache
+fora do ar, vale uma versão local: o processo que altera um critério recarrega
+na hora, e os demais releem o banco quando o retrato local completa
+`CRITERIOS_AVALIACAO_CACHE_LOCAL_TTL` segundos. A defasagem entre workers fica
+limitada a esse prazo, sem exigir um cache compartilhado para funcionar.
+"""
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIXO = 'criterios_avaliacao'
+CHAVE_VERSAO = f'{CACHE_PREFIXO}:versao'
+
+CAMPOS_CRITERIO = ('id', 'nome', 'descricao', 'peso', 'nota_minima', 'nota_maxima', 'obrigatorio', 'ordem')
+
+# Backends do cache do Django que os outros processos não enxergam
+CACHES_POR_PROCESSO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Versão usada com cache por processo ou indisponível: trocada por `invalidar`
+# neste processo e, nos demais, ao fim de cada janela de `ttl_local()` segundos
+_versao_local = 0
+_janela_local = 0
+_janela_expira_em = 0.0
+
+
+@dataclass(frozen=True)
+class Criterio:
+    """Dados de um `CriterioAvaliacao` ativo (mesmos nomes de atributo do modelo)"""
+    id: int
+    nome: str
+    descricao: str
+    peso: float
+    nota_minima: float
+    nota_maxima: float
+    obrigatorio: bool
+    ordem: int
+
+
+@dataclass(frozen=True)
+class CriteriosAtivos:
+    """Critérios ativos na ordem de exibição, com os ids e os obrigatórios já separados"""
+    versao: str
+    criterios: tuple
+    obrigatorios: tuple
+    ids: frozenset
+    ids_obrigatorios: frozenset
+
+    def __iter__(self):
+        return iter(self.criterios)
+
+    def __len__(self):
+        return len(self.criterios)
+
+    def get(self, criterio_id):
+        for criterio in self.criterios:
+            if criterio.id == criterio_id:
+                return criterio
+        return None
+
+
+def ttl():
+    """Segundos que cada retrato fica no cache do Django (a versão não expira)"""
+    return getattr(settings, 'CRITERIOS_AVALIACAO_CACHE_TTL', 24 * 60 * 60)
+
+
+def ttl_local():
+    """Segundos que um retrato local vale antes de ser relido do banco"""
+    return getattr(settings, 'CRITERIOS_AVALIACAO_CACHE_LOCAL_TTL', 60)
+
+
+def cache_compartilhado():
+    """Se o cache padrão do Django é visto por todos os processos"""
+    return settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get('BACKEND') not in CACHES_POR_PROCESSO
+
+
+def _versao_local_atual():
+    global _janela_local, _janela_expira_em
+    agora = time.monotonic()
+    if agora >= _janela_expira_em:
+        _janela_local += 1
+        _janela_expira_em = agora + ttl_local()
+    return f'local:{_versao_local}:{_janela_local}'
+
+
+def carregar(versao):
+    """Retrato dos critérios ativos lido do banco (uma consulta)"""
+    from estagio.models import CriterioAvaliacao
+
+    criterios = tuple(
+        Criterio(*linha) for linha in CriterioAvaliacao.objects.filter(ativo=True)
+        .order_by('ordem', 'nome', 'id').values_list(*CAMPOS_CRITERIO)
+    )
+    obrigatorios = tuple(criterio for criterio in criterios if criterio.obrigatorio)
+    return CriteriosAtivos(
+        versao=versao,
+        criterios=criterios,
+        obrigatorios=obrigatorios,
+        ids=frozenset(criterio.id for criterio in criterios),
+        ids_obrigatorios=frozenset(criterio.id for criterio in obrigatorios),
+    )
+
+
+def versao_atual():
+    if not cache_compartilhado():
+        return _versao_local_atual()
+    try:
+        versao = cache.get(CHAVE_VERSAO)
+        if versao is None:
+            # Versão perdida (cache reiniciado ou chave removida): qualquer retrato antigo deixa de valer
+            cache.add(CHAVE_VERSAO, uuid.uuid4().hex, None)
+            versao = cache.get(CHAVE_VERSAO)
+    except Exception as e:
+        logger.warning(f"Cache indisponível para a versão dos critérios de avaliação: {e}")
+        versao = None
+    return versao or _versao_local_atual()
+
+
+@lru_cache(maxsize=8)
+def _retrato(versao):
+    chave = f'{CACHE_PREFIXO}:{versao}'
+    compartilhado = not versao.startswith('local:')
+    if compartilhado:
+        try:
+            retrato = cache.get(chave)
+        except Exception as e:
+            logger.warning(f"Cache indisponível para os critérios de avaliação: {e}")
+            compartilhado = False
+        else:
+            if retrato is not None:
+                return retrato
+
+    retrato = carregar(versao)
+    if compartilhado:
+        try:
+            cache.set(chave, retrato, ttl())
+        except Exception as e:
+            logger.warning(f"Não foi possível guardar os critérios de avaliação no cache: {e}")
+    return retrato
+
+
+def criterios_ativos():
+    """Retrato imutável dos critérios de avaliação ativos da versão atual"""
+    return _retrato(versao_atual())
+
+
+def invalidar():
+    """Troca a versão: os próximos `criterios_ativos()` de todos os processos recarregam do banco"""
+    global _versao_local
+    _versao_local += 1
+    try:
+        cache.set(CHAVE_VERSAO, uuid.uuid4().hex, None)
+    except Exception as e:
+        logger.warning(f"Não foi possível invalidar o cache dos critérios de avaliação: {e}")
@@ -0,0 +1,112 @@
+"""
+Dossiê dos documentos de estágios em ZIP, gerado em streaming.
+
+O ZIP é escrito por `zipfile` sobre `SaidaStreaming` (destino não
+posicionável) e os bytes vão para a resposta a cada bloco lido do
+armazenamento: nem o arquivo compactado nem os documentos ficam inteiros em
+memória ou em arquivos temporários. Por padrão as entradas não são
+recompactadas (ZIP_STORED), já que PDF e DOCX já são compactados; 'deflate'
+está disponível.
+
+Sem histórico entra apenas a versão mais recente de cada documento
+(`is_latest`); com histórico entram todas as versões, prefixadas pelo número
+da versão. No dossiê de vários estágios cada estágio tem a própria pasta.
+"""
+import logging
+import posixpath
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils import timezone
+from django.utils.text import get_valid_filename, slugify
+
+from estagio.armazenamento import TAMANHO_BLOCO
+from estagio.exportacao import SaidaStreaming
+from estagio.models import Documento
+
+logger = logging.getLogger(__name__)
+
+COMPRESSOES = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+}
+
+CAMPOS_DOCUMENTO = ('id', 'estagio', 'estagio__titulo', 'tipo', 'nome_arquivo', 'versao', 'arquivo', 'created_at')
+
+
+def documentos_do_dossie(estagios, com_historico=False, coordenador=None):
+    """Documentos com arquivo dos estágios, agrupados por estágio e tipo, da versão mais antiga à atual"""
+    documentos = Documento.objects.filter(estagio__in=estagios).exclude(arquivo='')
+    if not com_historico:
+        documentos = documentos.filter(is_latest=True)
+    if coordenador is not None:
+        documentos = documentos.filter(coordenador=coordenador)
+    return documentos.select_related('estagio').only(*CAMPOS_DOCUMENTO).order_by(
+        'estagio_id', 'tipo', 'root_id', 'depth', 'id'
+    )
+
+
+def _nome_seguro(texto, padrao):
+    try:
+        return get_valid_filename(texto)
+    except SuspiciousFileOperation:
+        return padrao
+
+
+def nome_entrada(documento, com_historico=False, por_estagio=False):
+    """Caminho do documento dentro do ZIP: [estagio_<id>_<titulo>/]<tipo>/[v<versão>_]<nome>"""
+    nome = _nome_seguro(documento.nome_arquivo or '', f'documento_{documento.id}')
+    if not posixpath.splitext(nome)[1]:
+        nome += posixpath.splitext(documento.arquivo.name)[1]
+    if com_historico:
+        nome = f'v{documento.versao:g}_{nome}'
+    partes = [_nome_seguro(documento.tipo or '', 'documentos'), nome]
+    if por_estagio:
+        titulo = slugify(documento.estagio.titulo)[:40]
+        partes.insert(0, f'estagio_{documento.estagio_id}_{titulo}'.rstrip('_'))
+    return posixpath.join(*partes)
+
+
+def _nome_livre(nome, documento_id, usados):
+    """Evita entradas repetidas (documentos diferentes com o mesmo nome e tipo)"""
+    if nome in usados:
+        raiz, extensao = posixpath.splitext(nome)
+        nome = f'{raiz}_{documento_id}{extensao}'
+    usados.add(nome)
+    return nome
+
+
+def gerar_dossie(documentos, com_historico=False, compressao='stored', por_estagio=False):
+    """Gerador dos bytes do ZIP com os arquivos de `documentos` (ver `documentos_do_dossie`)"""
+    metodo = COMPRESSOES[compressao]
+    saida = SaidaStreaming()
+    usados = set()
+    ausentes = []
+    with zipfile.ZipFile(saida, mode='w', compression=metodo, allowZip64=True) as arquivo_zip:
+        for documento in documentos.iterator(chunk_size=500):
+            nome = _nome_livre(nome_entrada(documento, com_historico, por_estagio), documento.id, usados)
+            try:
+                origem = documento.arquivo.storage.open(documento.arquivo.name, 'rb')
+            except OSError:
+                logger.warning(f"Arquivo do documento {documento.id} ausente no dossiê: {documento.arquivo.name}")
+                ausentes.append(nome)
+                continue
+
+            info = zipfile.ZipInfo(nome, date_time=timezone.localtime(documento.created_at).timetuple()[:6])
+            info.compress_type = metodo
+            with origem, arquivo_zip.open(info, mode='w', force_zip64=True) as destino:
+                while True:
+                    bloco = origem.read(TAMANHO_BLOCO)
+                    if not bloco:
+                        break
+                    destino.write(bloco)
+                    dados = saida.drenar()
+                    if dados:
+                        yield dados
+            dados = saida.drenar()
+            if dados:
+                yield dados
+
+        if ausentes:
+            arquivo_zip.writestr('arquivos_ausentes.txt', '\n'.join(ausentes) + '\n')
+    yield saida.drenar()
@@ -0,0 +1,170 @@
+"""
+Entrega dos arquivos de documentos, chamada pelas views depois da checagem de permissão.
+
+O envio dos bytes pode ser delegado ao proxy (`DOCUMENTOS_DOWNLOAD_BACKEND`):
+'django' (padrão) transmite o arquivo pelo worker; 'x-accel-redirect' (nginx)
+e 'x-sendfile' (Apache/lighttpd) devolvem apenas os cabeçalhos e o proxy envia
+o arquivo, atendendo ele mesmo os pedidos de Range.
+
+As respostas levam ETag forte (o SHA-256 dos nomes endereçados por conteúdo ou,
+nos arquivos legados, um hash de nome, tamanho e data) e Last-Modified; os
+pedidos condicionais (If-None-Match / If-Modified-Since) recebem 304. Um único
+intervalo `Range: bytes=...` recebe 206 com Content-Range, e um intervalo fora
+do arquivo recebe 416.
+"""
+import hashlib
+import mimetypes
+import posixpath
+import re
+from calendar import timegm
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+from estagio.armazenamento import TAMANHO_BLOCO, hash_do_nome
+
+BACKENDS = ('django', 'x-accel-redirect', 'x-sendfile')
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class IntervaloInvalido(ValueError):
+    """Range sintaticamente válido, mas fora do tamanho do arquivo (416)"""
+
+
+def backend_download():
+    backend = getattr(settings, 'DOCUMENTOS_DOWNLOAD_BACKEND', 'django')
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f"DOCUMENTOS_DOWNLOAD_BACKEND deve ser um de {', '.join(BACKENDS)}.")
+    return backend
+
+
+def calcular_etag(nome, tamanho, modificado_em):
+    hash_hex = hash_do_nome(nome)
+    if hash_hex is None:
+        bruto = f'{nome}:{tamanho}:{modificado_em}'
+        hash_hex = hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+    return f'"{hash_hex}"'
+
+
+def intervalo_solicitado(cabecalho, tamanho):
+    """
+    (início, fim) inclusivos do cabeçalho Range, ou None quando ausente ou não
+    suportado (vários intervalos, outra unidade) — nesse caso o arquivo vai inteiro.
+    """
+    encontrado = _RANGE.match((cabecalho or '').strip())
+    if encontrado is None:
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        sufixo = int(fim)
+        if sufixo == 0 or tamanho == 0:
+            raise IntervaloInvalido(cabecalho)
+        return max(tamanho - sufixo, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = int(fim) if fim else tamanho - 1
+    if inicio >= tamanho:
+        raise IntervaloInvalido(cabecalho)
+    if fim < inicio:
+        return None
+    return inicio, min(fim, tamanho - 1)
+
+
+def _ler_intervalo(arquivo, inicio, fim):
+    restante = fim - inicio + 1
+    with arquivo.storage.open(arquivo.name, 'rb') as origem:
+        origem.seek(inicio)
+        while restante > 0:
+            bloco = origem.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def _tipo_conteudo(nome_download, nome_arquivo):
+    return (
+        mimetypes.guess_type(nome_download or '')[0]
+        or mimetypes.guess_type(nome_arquivo)[0]
+        or 'application/octet-stream'
+    )
+
+
+def servir_arquivo(request, arquivo, nome_download=None, as_attachment=True):
+    """
+    Resposta com o conteúdo de `arquivo` (FieldFile) para um usuário já autorizado.
+
+    `nome_download` é o nome sugerido ao navegador; `as_attachment=False` exibe
+    o arquivo no navegador (visualização de PDF).
+    """
+    if not arquivo:
+        raise Http404("Documento sem arquivo.")
+    armazenamento = arquivo.storage
+    try:
+        tamanho = armazenamento.size(arquivo.name)
+        modificado_em = timegm(armazenamento.get_modified_time(arquivo.name).utctimetuple())
+    except OSError:
+        raise Http404("Arquivo não encontrado.")
+
+    nome_download = nome_download or posixpath.basename(arquivo.name)
+    etag = calcular_etag(arquivo.name, tamanho, modificado_em)
+
+    def com_cabecalhos(resposta):
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = http_date(modificado_em)
+        resposta['Accept-Ranges'] = 'bytes'
+        resposta['Cache-Control'] = 'private, no-cache'
+        return resposta
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=modificado_em)
+    if condicional is not None:
+        return com_cabecalhos(condicional)
+
+    tipo = _tipo_conteudo(nome_download, arquivo.name)
+    disposicao = content_disposition_header(as_attachment, nome_download)
+
+    backend = backend_download()
+    if backend != 'django':
+        resposta = HttpResponse(content_type=tipo)
+        if backend == 'x-accel-redirect':
+            # Storages fora de MEDIA_ROOT (relatórios) informam a própria location interna
+            prefixo = getattr(armazenamento, 'x_accel_prefixo', None) or getattr(
+                settings, 'DOCUMENTOS_X_ACCEL_PREFIXO', '/media-protegida/'
+            )
+            resposta['X-Accel-Redirect'] = quote(posixpath.join(prefixo, arquivo.name))
+        else:
+            resposta['X-Sendfile'] = armazenamento.path(arquivo.name)
+        resposta['Content-Disposition'] = disposicao
+        return com_cabecalhos(resposta)
+
+    # Range só vale se o If-Range (quando enviado) ainda corresponde ao arquivo
+    if_range = request.headers.get('If-Range')
+    cabecalho_range = request.headers.get('Range')
+    if if_range and if_range not in (etag, http_date(modificado_em)):
+        cabecalho_range = None
+    try:
+        intervalo = intervalo_solicitado(cabecalho_range, tamanho)
+    except IntervaloInvalido:
+        resposta = HttpResponse(status=416)
+        resposta['Content-Range'] = f'bytes */{tamanho}'
+        return com_cabecalhos(resposta)
+
+    if intervalo is None:
+        resposta = FileResponse(
+            armazenamento.open(arquivo.name, 'rb'), as_attachment=as_attachment,
+            filename=nome_download, content_type=tipo,
+        )
+        return com_cabecalhos(resposta)
+
+    inicio, fim = intervalo
+    resposta = StreamingHttpResponse(_ler_intervalo(arquivo, inicio, fim), status=206, content_type=tipo)
+    resposta['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+    resposta['Content-Length'] = str(fim - inicio + 1)
+    resposta['Content-Disposition'] = disposicao
+    return com_cabecalhos(resposta)
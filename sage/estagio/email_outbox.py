@@ -0,0 +1,220 @@
+"""
+Outbox transacional de e-mails.
+
+As views apenas gravam uma linha em `EmailOutbox` após o commit da transação
+corrente; o envio real é feito pelo comando `enviar_emails`, que drena a fila
+em lotes reaproveitando uma única conexão SMTP.
+
+Nenhuma transação fica aberta durante o SMTP: o lote é reservado numa
+transação curta (status 'enviando' com prazo de reserva em `reservado_ate`),
+os e-mails são enviados fora dela e cada resultado é gravado com um UPDATE
+próprio, condicionado à reserva. Reservas vencidas (worker interrompido)
+voltam a ser elegíveis.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from estagio.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = getattr(settings, 'EMAIL_OUTBOX_MAX_TENTATIVAS', 5)
+BACKOFF_BASE_SEGUNDOS = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_BASE', 30)
+BACKOFF_MAX_SEGUNDOS = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_MAX', 3600)
+RESERVA_SEGUNDOS = getattr(settings, 'EMAIL_OUTBOX_RESERVA_SEGUNDOS', 300)
+
+
+class _Metricas:
+    """Contadores de envio do processo (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.resetar()
+
+    def resetar(self):
+        with self._lock:
+            self.enviados = 0
+            self.falhas = 0
+            self.latencia_total = 0.0
+            self.latencia_max = 0.0
+
+    def registrar_envio(self, latencia):
+        with self._lock:
+            self.enviados += 1
+            self.latencia_total += latencia
+            self.latencia_max = max(self.latencia_max, latencia)
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+
+    def snapshot(self):
+        with self._lock:
+            media = self.latencia_total / self.enviados if self.enviados else 0.0
+            return {
+                'enviados': self.enviados,
+                'falhas': self.falhas,
+                'latencia_media_ms': round(media * 1000, 2),
+                'latencia_max_ms': round(self.latencia_max * 1000, 2),
+            }
+
+
+metricas = _Metricas()
+
+
+def enfileirar_email(destinatario, assunto, mensagem):
+    """Grava o e-mail na outbox somente após o commit da transação atual"""
+    def _gravar():
+        EmailOutbox.objects.create(
+            destinatario=destinatario,
+            assunto=assunto[:255],
+            mensagem=mensagem,
+        )
+
+    transaction.on_commit(_gravar)
+
+
+def enfileirar_emails_em_lote(emails):
+    """Grava vários e-mails (destinatario, assunto, mensagem) com um único INSERT após o commit"""
+    emails = list(emails)
+    if not emails:
+        return
+
+    def _gravar():
+        EmailOutbox.objects.bulk_create([
+            EmailOutbox(destinatario=destinatario, assunto=assunto[:255], mensagem=mensagem)
+            for destinatario, assunto, mensagem in emails
+        ])
+
+    transaction.on_commit(_gravar)
+
+
+def profundidade_fila():
+    """Quantidade de e-mails pendentes na outbox"""
+    return EmailOutbox.objects.filter(status='pendente').count()
+
+
+def obter_metricas():
+    """Profundidade da fila e contadores de envio/latência do processo"""
+    dados = metricas.snapshot()
+    dados['fila_pendente'] = profundidade_fila()
+    return dados
+
+
+def calcular_backoff(tentativas):
+    """Backoff exponencial limitado a BACKOFF_MAX_SEGUNDOS"""
+    return min(BACKOFF_BASE_SEGUNDOS * (2 ** max(tentativas - 1, 0)), BACKOFF_MAX_SEGUNDOS)
+
+
+def reservar_lote(batch_size=50):
+    """
+    Marca como 'enviando' até `batch_size` e-mails pendentes (ou de reservas
+    vencidas) numa transação curta. As linhas são travadas com `skip_locked`,
+    permitindo vários workers em paralelo sem reservar o mesmo e-mail.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        lote = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pendente', proxima_tentativa__lte=agora)
+                | Q(status='enviando', reservado_ate__lt=agora)
+            )
+            .order_by('proxima_tentativa', 'id')[:batch_size]
+        )
+        if not lote:
+            return []
+        reservado_ate = agora + timedelta(seconds=RESERVA_SEGUNDOS)
+        EmailOutbox.objects.filter(pk__in=[item.pk for item in lote]).update(
+            status='enviando', reservado_ate=reservado_ate
+        )
+    for item in lote:
+        item.status = 'enviando'
+        item.reservado_ate = reservado_ate
+    return lote
+
+
+def _da_reserva(item):
+    """A linha do e-mail enquanto a reserva feita por este worker ainda vale"""
+    return EmailOutbox.objects.filter(pk=item.pk, status='enviando', reservado_ate=item.reservado_ate)
+
+
+def _registrar_envio(item, latencia):
+    metricas.registrar_envio(latencia)
+    _da_reserva(item).update(
+        status='enviado',
+        tentativas=item.tentativas + 1,
+        enviado_em=timezone.now(),
+        ultimo_erro=None,
+        reservado_ate=None,
+    )
+
+
+def _registrar_falha(item, erro):
+    metricas.registrar_falha()
+    tentativas = item.tentativas + 1
+    if tentativas >= MAX_TENTATIVAS:
+        logger.error(f"E-mail {item.id} para {item.destinatario} descartado após {tentativas} tentativas: {erro}")
+        campos = {'status': 'falhou'}
+    else:
+        logger.warning(f"Falha ao enviar e-mail {item.id} (tentativa {tentativas}): {erro}")
+        campos = {
+            'status': 'pendente',
+            'proxima_tentativa': timezone.now() + timedelta(seconds=calcular_backoff(tentativas)),
+        }
+    _da_reserva(item).update(tentativas=tentativas, ultimo_erro=str(erro), reservado_ate=None, **campos)
+
+
+def processar_lote(connection=None, batch_size=50):
+    """
+    Reserva e envia um lote de e-mails reaproveitando a mesma conexão, sem
+    transação aberta durante o SMTP. Retorna a quantidade de e-mails processados.
+    """
+    lote = reservar_lote(batch_size)
+    if not lote:
+        return 0
+
+    abrir_conexao = connection is None
+    if abrir_conexao:
+        connection = get_connection()
+    try:
+        try:
+            connection.open()
+        except Exception as e:
+            # Servidor indisponível: o lote inteiro conta como tentativa e recebe backoff
+            for item in lote:
+                _registrar_falha(item, e)
+            raise
+
+        for item in lote:
+            inicio = time.monotonic()
+            try:
+                EmailMessage(
+                    subject=item.assunto,
+                    body=item.mensagem,
+                    to=[item.destinatario],
+                    connection=connection,
+                ).send(fail_silently=False)
+            except Exception as e:
+                _registrar_falha(item, e)
+                # Conexão pode ter ficado inválida; reabre para o restante do lote
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception:
+                    logger.exception("Não foi possível reabrir a conexão de e-mail")
+            else:
+                _registrar_envio(item, time.monotonic() - inicio)
+    finally:
+        if abrir_conexao:
+            connection.close()
+
+    return len(lote)
@@ -0,0 +1,284 @@
+"""
+Exportação do relatório de estágios em streaming (CSV e XLSX).
+
+Os estágios são lidos com `.iterator(chunk_size)` (cursor no servidor no
+PostgreSQL) e os agregados de documentos/avaliações são consultados por lote;
+cada linha é serializada assim que lida. A memória ocupada depende do tamanho
+do lote, não do número de linhas exportadas.
+
+O XLSX é um SpreadsheetML mínimo (uma planilha, textos inline) escrito por
+`zipfile` sobre um destino não posicionável, de modo que os bytes do arquivo
+compactado são entregues à resposta à medida que são gerados.
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Count
+
+from estagio.models import Estagio
+from estagio.relatorios import agregados_avaliacoes, agregados_documentos
+
+CAMPOS_EXPORTACAO = (
+    'id', 'titulo', 'cargo', 'status', 'data_inicio', 'data_fim', 'carga_horaria',
+    'empresa__razao_social', 'supervisor__nome', 'aluno_solicitante__nome', 'aluno_solicitante__matricula',
+)
+
+COLUNAS_CSV = [
+    'ID', 'Título', 'Cargo', 'Status', 'Data Início', 'Data Fim',
+    'Carga Horária', 'Empresa', 'Supervisor', 'Aluno', 'Matrícula',
+    'Total Documentos', 'Docs Aprovados', 'Total Avaliações', 'Nota Média'
+]
+
+COLUNAS_EXCEL = ['ID', 'Título', 'Cargo', 'Status', 'Empresa', 'Supervisor', 'Data Início', 'Data Fim']
+
+
+def tamanho_lote():
+    return getattr(settings, 'RELATORIO_EXPORTACAO_LOTE', 2000)
+
+
+def _em_lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def linhas_estagios(estagios, opcoes, lote=None):
+    """
+    Dicionários de `CAMPOS_EXPORTACAO` com `status_display` e, conforme as
+    opções de inclusão, os agregados de documentos e avaliações do estágio.
+    """
+    lote = lote or tamanho_lote()
+    status_display = dict(Estagio.STATUS_CHOICES)
+    cursor = estagios.order_by('id').values(*CAMPOS_EXPORTACAO).iterator(chunk_size=lote)
+    for bloco in _em_lotes(cursor, lote):
+        ids = [linha['id'] for linha in bloco]
+        documentos = agregados_documentos(ids) if opcoes.get('documentos') else {}
+        avaliacoes = agregados_avaliacoes(ids) if opcoes.get('avaliacoes') else {}
+        for linha in bloco:
+            linha['status_display'] = status_display.get(linha['status'], linha['status'])
+            linha['documentos'] = documentos.get(linha['id'], {})
+            linha['avaliacoes'] = avaliacoes.get(linha['id'], {})
+            yield linha
+
+
+def linha_csv(linha, opcoes):
+    """Colunas de `COLUNAS_CSV` para um estágio (mesmos valores da exportação em memória)"""
+    if opcoes.get('aluno') and linha['aluno_solicitante__nome'] is not None:
+        aluno_nome, aluno_matricula = linha['aluno_solicitante__nome'], linha['aluno_solicitante__matricula']
+    else:
+        aluno_nome = aluno_matricula = '-'
+    nota_media = '-'
+    if opcoes.get('avaliacoes'):
+        media = linha['avaliacoes'].get('nota_media')
+        nota_media = round(media, 2) if media else None
+    return [
+        linha['id'],
+        linha['titulo'],
+        linha['cargo'],
+        linha['status_display'],
+        linha['data_inicio'],
+        linha['data_fim'],
+        linha['carga_horaria'],
+        linha['empresa__razao_social'],
+        linha['supervisor__nome'],
+        aluno_nome,
+        aluno_matricula,
+        linha['documentos'].get('total', 0),
+        linha['documentos'].get('aprovados', 0),
+        linha['avaliacoes'].get('total', 0),
+        nota_media,
+    ]
+
+
+class _Eco:
+    """Pseudo-arquivo para `csv.writer`: devolve a linha formatada em vez de guardá-la"""
+
+    def write(self, valor):
+        return valor
+
+
+def serializar_csv(linhas, opcoes):
+    """Gerador do texto CSV (com BOM para o Excel reconhecer UTF-8) a partir de `linhas_estagios`"""
+    writer = csv.writer(_Eco())
+    yield '\ufeff'
+    yield writer.writerow(COLUNAS_CSV)
+    for linha in linhas:
+        yield writer.writerow(linha_csv(linha, opcoes))
+
+
+def gerar_csv(estagios, opcoes, lote=None):
+    return serializar_csv(linhas_estagios(estagios, opcoes, lote), opcoes)
+
+
+def contagem_por_status(estagios):
+    """Resumo por status (rótulo -> quantidade) com uma consulta agrupada"""
+    contagens = dict(estagios.order_by().values_list('status').annotate(total=Count('id')))
+    return {
+        nome: contagens[codigo]
+        for codigo, nome in Estagio.STATUS_CHOICES
+        if contagens.get(codigo)
+    }
+
+
+def linhas_excel(estagios, data_geracao, lote=None):
+    """Linhas da planilha: cabeçalho, resumo por status e um estágio por linha"""
+    por_status = contagem_por_status(estagios)
+    yield ['Relatório de Estágios']
+    yield ['Data de Geração', data_geracao]
+    yield []
+    yield ['RESUMO']
+    yield ['Total de Estágios', sum(por_status.values())]
+    yield []
+    yield ['Por Status']
+    for status, total in por_status.items():
+        yield [status, total]
+    yield []
+    yield ['ESTÁGIOS']
+    yield COLUNAS_EXCEL
+    # A planilha não traz colunas de documentos/avaliações: dispensa os agregados
+    for linha in linhas_estagios(estagios, {}, lote):
+        yield [
+            linha['id'],
+            linha['titulo'],
+            linha['cargo'],
+            linha['status_display'],
+            linha['empresa__razao_social'],
+            linha['supervisor__nome'],
+            linha['data_inicio'],
+            linha['data_fim'],
+        ]
+
+
+# ---------------------------------------------------------------------------
+# XLSX mínimo em streaming
+# ---------------------------------------------------------------------------
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name={nome} sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+_INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_PLANILHA = '</sheetData></worksheet>'
+
+# Caracteres de controle não permitidos em XML 1.0
+_CONTROLE_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Linhas serializadas entre cada entrega de bytes à resposta
+LINHAS_POR_ENTREGA = 200
+
+
+class SaidaStreaming:
+    """
+    Destino não posicionável do ZipFile: acumula os bytes escritos até serem
+    drenados pelo gerador (o zipfile grava descritores de dados após cada entrada).
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _coluna(indice):
+    """Letra(s) da coluna a partir do índice 0 (A, B, ..., Z, AA, ...)"""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celula(referencia, valor):
+    if isinstance(valor, bool):
+        valor = 'Sim' if valor else 'Não'
+    if isinstance(valor, (int, float)):
+        return f'<c r="{referencia}"><v>{valor}</v></c>'
+    texto = escape(_CONTROLE_INVALIDO.sub('', str(valor)))
+    return f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xml(numero, valores):
+    celulas = ''.join(
+        _celula(f'{_coluna(i)}{numero}', valor)
+        for i, valor in enumerate(valores)
+        if valor is not None and valor != ''
+    )
+    return f'<row r="{numero}">{celulas}</row>'
+
+
+def gerar_xlsx(linhas, nome_planilha='Relatório'):
+    """Gerador dos bytes de um .xlsx com uma planilha, escrito à medida que `linhas` é consumido"""
+    saida = SaidaStreaming()
+    with zipfile.ZipFile(saida, mode='w', compression=zipfile.ZIP_DEFLATED) as arquivo:
+        arquivo.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        arquivo.writestr('_rels/.rels', _RELS)
+        arquivo.writestr('xl/workbook.xml', _WORKBOOK.format(nome=quoteattr(nome_planilha[:31])))
+        arquivo.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield saida.drenar()
+
+        with arquivo.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as planilha:
+            planilha.write(_INICIO_PLANILHA.encode('utf-8'))
+            for numero, valores in enumerate(linhas, start=1):
+                planilha.write(_linha_xml(numero, valores).encode('utf-8'))
+                if numero % LINHAS_POR_ENTREGA == 0:
+                    dados = saida.drenar()
+                    if dados:
+                        yield dados
+            planilha.write(_FIM_PLANILHA.encode('utf-8'))
+    yield saida.drenar()
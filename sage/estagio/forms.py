@@ -871,4 +871,23 @@ class RelatorioEstagiosForm(forms.Form):
             'avaliacoes': self.cleaned_data.get('incluir_avaliacoes', True),
             'horas': self.cleaned_data.get('incluir_horas', True),
             'aluno': self.cleaned_data.get('incluir_aluno', True),
-        }
\ No newline at end of file
+        }
+    
+    def get_dados_normalizados(self):
+        """
+        Filtros validados em forma serializável (JSON), aceita de volta pelo
+        próprio formulário. Usado pelos relatórios gerados em segundo plano.
+        """
+        dados = {}
+        for campo in ('data_inicio', 'data_fim'):
+            if self.cleaned_data.get(campo):
+                dados[campo] = self.cleaned_data[campo].isoformat()
+        for campo in ('empresa', 'supervisor', 'instituicao'):
+            if self.cleaned_data.get(campo):
+                dados[campo] = self.cleaned_data[campo].pk
+        if self.cleaned_data.get('status'):
+            dados['status'] = self.cleaned_data['status']
+        for campo in ('incluir_documentos', 'incluir_avaliacoes', 'incluir_horas', 'incluir_aluno'):
+            dados[campo] = bool(self.cleaned_data.get(campo))
+        dados['formato'] = self.cleaned_data.get('formato') or 'json'
+        return dados
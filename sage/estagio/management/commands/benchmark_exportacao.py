@@ -0,0 +1,98 @@
+from datetime import date
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estagio.exportacao import (
+    COLUNAS_EXCEL, gerar_csv, gerar_xlsx, linhas_excel, serializar_csv,
+)
+
+OPCOES = {'documentos': True, 'avaliacoes': True, 'horas': True, 'aluno': True}
+
+
+def _linhas_sinteticas(total):
+    """Linhas no formato de `linhas_estagios`, sem acesso ao banco"""
+    for i in range(1, total + 1):
+        yield {
+            'id': i,
+            'titulo': f'Estágio {i}',
+            'cargo': 'Desenvolvedor',
+            'status': 'em_andamento',
+            'status_display': 'Em andamento',
+            'data_inicio': date(2025, 1, 1),
+            'data_fim': date(2025, 12, 31),
+            'carga_horaria': 20,
+            'empresa__razao_social': f'Empresa {i % 50}',
+            'supervisor__nome': f'Supervisor {i % 200}',
+            'aluno_solicitante__nome': f'Aluno {i}',
+            'aluno_solicitante__matricula': f'{i:011d}',
+            'documentos': {'total': 5, 'aprovados': 3},
+            'avaliacoes': {'total': 2, 'nota_media': 8.25},
+        }
+
+
+def _planilha_sintetica(total):
+    yield COLUNAS_EXCEL
+    for linha in _linhas_sinteticas(total):
+        yield [
+            linha['id'], linha['titulo'], linha['cargo'], linha['status_display'],
+            linha['empresa__razao_social'], linha['supervisor__nome'], linha['data_inicio'], linha['data_fim'],
+        ]
+
+
+def medir(gerador):
+    """Consome o gerador descartando os pedaços; retorna (bytes, pico de memória, segundos)"""
+    tracemalloc.start()
+    inicio = time.monotonic()
+    tamanho = 0
+    for pedaco in gerador:
+        tamanho += len(pedaco)
+    duracao = time.monotonic() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tamanho, pico, duracao
+
+
+class Command(BaseCommand):
+    help = 'Mede o pico de memória das exportações CSV/XLSX em streaming para volumes crescentes de linhas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas', type=int, nargs='+', default=[1000, 10000, 100000, 500000],
+            help='Quantidades de linhas sintéticas a exportar'
+        )
+        parser.add_argument('--formato', choices=['csv', 'xlsx', 'todos'], default='todos')
+        parser.add_argument(
+            '--banco', action='store_true',
+            help='Exporta os estágios existentes no banco (consultas reais) em vez de linhas sintéticas'
+        )
+
+    def handle(self, *args, **options):
+        if any(total <= 0 for total in options['linhas']):
+            raise CommandError('--linhas deve conter apenas valores maiores que zero.')
+        formatos = ['csv', 'xlsx'] if options['formato'] == 'todos' else [options['formato']]
+
+        if options['banco']:
+            from estagio.models import Estagio
+            for formato in formatos:
+                if formato == 'csv':
+                    gerador = gerar_csv(Estagio.objects.all(), OPCOES)
+                else:
+                    gerador = gerar_xlsx(linhas_excel(Estagio.objects.all(), date.today().isoformat()))
+                self._relatar(formato, Estagio.objects.count(), *medir(gerador))
+            return
+
+        for formato in formatos:
+            for total in options['linhas']:
+                if formato == 'csv':
+                    gerador = serializar_csv(_linhas_sinteticas(total), OPCOES)
+                else:
+                    gerador = gerar_xlsx(_planilha_sintetica(total))
+                self._relatar(formato, total, *medir(gerador))
+
+    def _relatar(self, formato, total, tamanho, pico, duracao):
+        self.stdout.write(
+            f"{formato:>4} | {total:>8} linhas | {tamanho / 1024 / 1024:8.1f} MiB gerados "
+            f"| pico {pico / 1024:8.1f} KiB | {duracao:6.2f}s"
+        )
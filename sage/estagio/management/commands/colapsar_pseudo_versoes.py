@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from estagio.validacao_documentos import colapsar_lote, pseudo_versoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Converte em DocumentoHistorico as validações antigas gravadas como Documento filho '
+        '(mesmo arquivo e versão do pai) e remove as linhas duplicadas, em lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Pseudo-versões convertidas por transação')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta as pseudo-versões, sem alterar nada')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        if options['dry_run']:
+            total = pseudo_versoes().count()
+            self.stdout.write(f"Pseudo-versões encontradas: {total}")
+            return
+
+        total = 0
+        while True:
+            removidas = colapsar_lote(batch_size=options['batch_size'])
+            if not removidas:
+                break
+            total += removidas
+            self.stdout.write(f"Lote convertido: {removidas} (total {total})")
+
+        self.stdout.write(self.style.SUCCESS(f"Pseudo-versões convertidas em histórico: {total}"))
@@ -0,0 +1,63 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from estagio.email_outbox import processar_lote, obter_metricas
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Worker que drena a outbox de e-mails em lotes, reaproveitando a conexão SMTP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Quantidade de e-mails por lote')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--once', action='store_true', help='Drena a fila uma única vez e encerra')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        intervalo = options['intervalo']
+        connection = get_connection()
+
+        try:
+            while True:
+                try:
+                    processados = processar_lote(connection=connection, batch_size=batch_size)
+                except Exception as e:
+                    # Falha de conexão/banco: fecha a conexão e tenta de novo no próximo ciclo
+                    logger.error(f"Erro ao processar lote da outbox: {e}")
+                    self.stdout.write(self.style.ERROR(f"Erro ao processar lote: {e}"))
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                    processados = 0
+                    if options['once']:
+                        break
+
+                if processados:
+                    dados = obter_metricas()
+                    logger.info(f"Outbox: {processados} processados, métricas {dados}")
+                    self.stdout.write(
+                        f"Lote: {processados} | fila={dados['fila_pendente']} enviados={dados['enviados']} "
+                        f"falhas={dados['falhas']} latencia_media={dados['latencia_media_ms']}ms"
+                    )
+                    # Fila pode ter mais itens: continua sem esperar
+                    continue
+
+                if options['once']:
+                    break
+
+                # Fila vazia: libera a conexão SMTP enquanto aguarda
+                connection.close()
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        dados = obter_metricas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Total enviados: {dados['enviados']} | falhas: {dados['falhas']} | fila pendente: {dados['fila_pendente']}"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from estagio.armazenamento import limpar_arquivos_sem_referencia
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Remove os arquivos de documentos sem referências há mais que a carência (DOCUMENTOS_ARQUIVOS_CARENCIA_HORAS).'
+
+    def handle(self, *args, **options):
+        removidos, orfaos = limpar_arquivos_sem_referencia()
+        logger.info(f"Arquivos de documentos removidos: {removidos}; órfãos registrados: {orfaos}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Arquivos removidos: {removidos}; arquivos órfãos registrados para a próxima varredura: {orfaos}"
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from estagio.painel import limpar_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Remove tombstones de estágios mais antigos que PAINEL_ESTAGIOS_RETENCAO_TOMBSTONES_DIAS.'
+
+    def handle(self, *args, **options):
+        removidos = limpar_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Tombstones removidos: {removidos}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from estagio.uploads import limpar_expirados
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Remove os uploads em partes sem atividade dentro do prazo (UPLOAD_PARCIAL_EXPIRACAO_HORAS) e seus arquivos.'
+
+    def handle(self, *args, **options):
+        removidos = limpar_expirados()
+        logger.info(f"Uploads parciais expirados removidos: {removidos}")
+        self.stdout.write(self.style.SUCCESS(f"Uploads expirados removidos: {removidos}"))
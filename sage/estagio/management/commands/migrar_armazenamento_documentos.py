@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from estagio.armazenamento import eh_endereco_conteudo, migrar_arquivo
+from estagio.models import Documento
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move os arquivos de documentos do diretório plano documentos/ para o armazenamento '
+        'endereçado por conteúdo (documentos/ab/cd/<sha256>), deduplicando-os, em lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Documentos lidos por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os arquivos a migrar')
+        parser.add_argument(
+            '--manter-originais', action='store_true',
+            help='Não remove os arquivos do diretório antigo após a migração'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        ultimo_id = 0
+        # Nomes já contados (dry-run) ou que falharam: os migrados deixam de aparecer nos lotes seguintes
+        vistos = set()
+        migrados = documentos = ausentes = 0
+        while True:
+            lote = list(
+                Documento.objects.filter(pk__gt=ultimo_id).exclude(arquivo='')
+                .order_by('id').values_list('id', 'arquivo')[:options['batch_size']]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1][0]
+
+            for nome in dict.fromkeys(nome for _, nome in lote):
+                if eh_endereco_conteudo(nome) or nome in vistos:
+                    continue
+                if options['dry_run']:
+                    vistos.add(nome)
+                    migrados += 1
+                    continue
+                try:
+                    novo, atualizados = migrar_arquivo(nome, manter_original=options['manter_originais'])
+                except Exception as e:
+                    vistos.add(nome)
+                    logger.error(f"Erro ao migrar o arquivo {nome}: {e}")
+                    self.stdout.write(self.style.ERROR(f"Erro ao migrar {nome}: {e}"))
+                    continue
+                if novo is None:
+                    vistos.add(nome)
+                    ausentes += 1
+                    self.stdout.write(self.style.WARNING(f"Arquivo ausente no disco: {nome}"))
+                    continue
+                migrados += 1
+                documentos += atualizados
+
+            self.stdout.write(f"Documentos lidos até o id {ultimo_id}: {migrados} arquivos migrados")
+
+        if options['dry_run']:
+            self.stdout.write(f"Arquivos a migrar: {migrados}")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Arquivos migrados: {migrados} | documentos atualizados: {documentos} | ausentes: {ausentes}"
+        ))
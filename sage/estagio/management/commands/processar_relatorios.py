@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from estagio.relatorio_jobs import processar_lote
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Worker que gera em MEDIA_ROOT os relatórios de estágios enfileirados (RelatorioJob).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1, help='Relatórios reservados por ciclo')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--once', action='store_true', help='Processa a fila uma única vez e encerra')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        concluidos = falhas = 0
+        try:
+            while True:
+                try:
+                    jobs = processar_lote(batch_size=options['batch_size'])
+                except Exception as e:
+                    # Falha de banco: tenta de novo no próximo ciclo
+                    logger.error(f"Erro ao reservar relatórios: {e}")
+                    self.stdout.write(self.style.ERROR(f"Erro ao reservar relatórios: {e}"))
+                    jobs = []
+                    if options['once']:
+                        break
+
+                for job in jobs:
+                    if job.status == 'concluido':
+                        concluidos += 1
+                        self.stdout.write(
+                            f"Relatório {job.pk} ({job.formato}): {job.total_linhas} linhas em {job.duracao * 1000:.1f}ms"
+                        )
+                    else:
+                        falhas += 1
+                        self.stdout.write(self.style.ERROR(f"Relatório {job.pk} falhou: {job.ultimo_erro}"))
+                if jobs:
+                    # Fila pode ter mais itens: continua sem esperar
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Relatórios concluídos: {concluidos} | falhas: {falhas}"))
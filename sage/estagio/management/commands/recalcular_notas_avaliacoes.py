@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from estagio.notas_avaliacao import recalcular_avaliacoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula nota e completude das avaliações já gravadas (após alterar o peso ou a '
+        'obrigatoriedade de critérios), com UPDATEs em lote no banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Avaliações por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta as avaliações que mudariam')
+        parser.add_argument(
+            '--incluir-pareceres', action='store_true',
+            help='Recalcula também avaliações com parecer final emitido (inclusive a nota final)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        def progresso(ultimo_id, analisadas, alteradas):
+            self.stdout.write(f"Avaliações lidas até o id {ultimo_id}: {analisadas} analisadas, {alteradas} a atualizar")
+
+        analisadas, alteradas = recalcular_avaliacoes(
+            incluir_pareceres=options['incluir_pareceres'],
+            dry_run=options['dry_run'],
+            tamanho_lote=options['batch_size'],
+            progresso=progresso,
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"Avaliações a atualizar: {alteradas} de {analisadas}")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Avaliações atualizadas: {alteradas} de {analisadas}"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from estagio.pendencias import reconstruir
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recria a tabela de pendências materializadas a partir dos estágios, documentos e avaliações.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Referências processadas por lote')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        inicio = time.monotonic()
+        with transaction.atomic():
+            total = reconstruir(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Pendências reconstruídas: {total} em {(time.monotonic() - inicio) * 1000:.1f}ms"
+        ))
@@ -0,0 +1,34 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0010_email_outbox'),
+        ('users', '0006_usuario_notificacoes_nao_lidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='lida',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='data_leitura',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='chave_dedup',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+    ]
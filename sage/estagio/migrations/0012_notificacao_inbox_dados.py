@@ -0,0 +1,78 @@
+"""
+Migração de dados do inbox de notificações:
+- calcula a chave de deduplicação (hash) de cada linha existente;
+- associa cada notificação ao usuário destinatário a partir do texto `destinatario`
+  (e-mail/username do usuário ou contato de Aluno, Supervisor e Coordenador);
+- recalcula o contador de não lidas de cada usuário.
+"""
+import hashlib
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+LOTE = 1000
+
+
+def _chave(destinatario, assunto, referencia):
+    bruto = "\x1f".join([destinatario or '', assunto or '', referencia or ''])
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+def mapear_notificacoes(apps, schema_editor):
+    Notificacao = apps.get_model('estagio', 'Notificacao')
+    Usuario = apps.get_model('users', 'Usuario')
+    Aluno = apps.get_model('estagio', 'Aluno')
+    Supervisor = apps.get_model('coordenador', 'Supervisor')
+    CursoCoordenador = apps.get_model('coordenador', 'CursoCoordenador')
+
+    # Mapa endereço -> usuário montado uma única vez (precedência: usuário, aluno, supervisor, coordenador)
+    mapa = {}
+    for modelo in (CursoCoordenador, Supervisor, Aluno):
+        for contato, usuario_id in modelo.objects.values_list('contato', 'usuario_id').iterator():
+            if contato:
+                mapa[contato] = usuario_id
+    for usuario_id, email, username in Usuario.objects.values_list('id', 'email', 'username').iterator():
+        if username:
+            mapa[username] = usuario_id
+        if email:
+            mapa[email] = usuario_id
+
+    pendentes = []
+    vistas = set()
+    duplicadas = []
+    for notificacao in Notificacao.objects.only('id', 'destinatario', 'assunto', 'referencia').order_by('id').iterator():
+        chave = _chave(notificacao.destinatario, notificacao.assunto, notificacao.referencia)
+        if chave in vistas:
+            # unique_together tratava NULL em referencia como distinto; mantém apenas a mais antiga
+            duplicadas.append(notificacao.id)
+            continue
+        vistas.add(chave)
+        notificacao.chave_dedup = chave
+        notificacao.usuario_id = mapa.get(notificacao.destinatario)
+        pendentes.append(notificacao)
+        if len(pendentes) >= LOTE:
+            Notificacao.objects.bulk_update(pendentes, ['chave_dedup', 'usuario'])
+            pendentes = []
+    if pendentes:
+        Notificacao.objects.bulk_update(pendentes, ['chave_dedup', 'usuario'])
+    if duplicadas:
+        Notificacao.objects.filter(id__in=duplicadas).delete()
+
+    nao_lidas = Notificacao.objects.filter(
+        usuario_id=models.OuterRef('pk'), lida=False
+    ).order_by().values('usuario_id').annotate(total=models.Count('id')).values('total')
+    Usuario.objects.update(
+        notificacoes_nao_lidas=Coalesce(models.Subquery(nao_lidas), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0011_notificacao_inbox_campos'),
+        ('coordenador', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(mapear_notificacoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0012_notificacao_inbox_dados'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='notificacao',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='notificacao',
+            name='chave_dedup',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['usuario', 'lida', '-data_envio'], name='notif_usuario_lida_data_idx'),
+        ),
+    ]
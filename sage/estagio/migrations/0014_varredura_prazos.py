@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0013_notificacao_inbox_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VarreduraPrazos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50, unique=True)),
+                ('executado_em', models.DateTimeField()),
+                ('data_referencia', models.DateField()),
+                ('dias_alerta', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Varredura de Prazos',
+                'verbose_name_plural': 'Varreduras de Prazos',
+            },
+        ),
+        migrations.AlterField(
+            model_name='documento',
+            name='prazo_limite',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0015_versao_dados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstagioRemovido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estagio_id', models.PositiveIntegerField(db_index=True)),
+                ('supervisor_id', models.IntegerField(blank=True, null=True)),
+                ('aluno_solicitante_id', models.IntegerField(blank=True, null=True)),
+                ('removido_em', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Estágio Removido',
+                'verbose_name_plural': 'Estágios Removidos',
+            },
+        ),
+        migrations.AddField(
+            model_name='estagio',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordenador', '0002_initial'),
+        ('estagio', '0016_estagio_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pendencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=30)),
+                ('critico', models.BooleanField(default=False)),
+                ('perfil', models.CharField(choices=[('coordenador', 'Coordenador'), ('supervisor', 'Supervisor'), ('aluno', 'Aluno')], max_length=20)),
+                ('referencia_tipo', models.CharField(max_length=20)),
+                ('referencia_id', models.PositiveIntegerField()),
+                ('referencia_nome', models.CharField(blank=True, default='', max_length=255)),
+                ('descricao', models.TextField(blank=True, default='')),
+                ('data_limite', models.DateField(blank=True, null=True)),
+                ('data', models.CharField(blank=True, default='', max_length=32)),
+                ('aluno', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pendencias', to='estagio.aluno')),
+                ('supervisor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pendencias', to='coordenador.supervisor')),
+            ],
+            options={
+                'verbose_name': 'Pendência',
+                'verbose_name_plural': 'Pendências',
+                'ordering': ['-critico', 'data', 'id'],
+                'indexes': [models.Index(fields=['perfil', 'critico', 'data'], name='pend_perfil_idx'), models.Index(fields=['supervisor', 'critico', 'data'], name='pend_supervisor_idx'), models.Index(fields=['aluno', 'critico', 'data'], name='pend_aluno_idx'), models.Index(fields=['referencia_tipo', 'referencia_id'], name='pend_referencia_idx'), models.Index(fields=['tipo', 'data_limite'], name='pend_tipo_limite_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:29
+"""
+Cadeia de versões materializada em Documento (root, depth, is_latest) e
+preenchimento das linhas existentes a partir de `parent`.
+"""
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+def preencher_cadeias(apps, schema_editor):
+    Documento = apps.get_model('estagio', 'Documento')
+
+    pais = dict(Documento.objects.values_list('id', 'parent_id').iterator())
+    com_versoes = {parent_id for parent_id in pais.values() if parent_id is not None}
+    raizes = {}
+    profundidades = {}
+
+    def resolver(doc_id):
+        # Sobe até um nó já resolvido (ou a raiz) e preenche o caminho de volta
+        caminho = []
+        node = doc_id
+        while node not in raizes:
+            caminho.append(node)
+            parent_id = pais.get(node)
+            if parent_id is None or parent_id not in pais or parent_id in caminho:
+                raizes[node] = node
+                profundidades[node] = 0
+                caminho.pop()
+                break
+            node = parent_id
+        for filho in reversed(caminho):
+            parent_id = pais[filho]
+            raizes[filho] = raizes[parent_id]
+            profundidades[filho] = profundidades[parent_id] + 1
+
+    pendentes = []
+    for doc_id in pais:
+        resolver(doc_id)
+        pendentes.append(Documento(
+            id=doc_id,
+            root_id=raizes[doc_id],
+            depth=profundidades[doc_id],
+            is_latest=doc_id not in com_versoes,
+        ))
+        if len(pendentes) >= LOTE:
+            Documento.objects.bulk_update(pendentes, ['root', 'depth', 'is_latest'])
+            pendentes = []
+    if pendentes:
+        Documento.objects.bulk_update(pendentes, ['root', 'depth', 'is_latest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordenador', '0002_initial'),
+        ('estagio', '0018_relatorio_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='is_latest',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chain', to='estagio.documento'),
+        ),
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(fields=['estagio', 'is_latest'], name='documento_estagio_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(fields=['root', 'depth'], name='documento_root_depth_idx'),
+        ),
+        migrations.RunPython(preencher_cadeias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:35
+
+import estagio.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0019_documento_cadeia_versoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoConteudo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255, unique=True)),
+                ('hash', models.CharField(db_index=True, max_length=64)),
+                ('tamanho', models.BigIntegerField(blank=True, null=True)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Arquivo de Documento',
+                'verbose_name_plural': 'Arquivos de Documentos',
+            },
+        ),
+        migrations.AlterField(
+            model_name='documento',
+            name='arquivo',
+            field=models.FileField(storage=estagio.armazenamento.armazenamento_documentos, upload_to='documentos/'),
+        ),
+    ]
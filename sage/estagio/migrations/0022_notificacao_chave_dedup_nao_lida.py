@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0021_upload_parcial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacao',
+            name='chave_dedup',
+            field=models.CharField(editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='notificacao',
+            constraint=models.UniqueConstraint(condition=models.Q(('lida', False)), fields=('chave_dedup',), name='notif_chave_dedup_nao_lida_uniq'),
+        ),
+    ]
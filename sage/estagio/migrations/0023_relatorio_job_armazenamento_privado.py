@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:55
+"""
+Arquivos de RelatorioJob fora de MEDIA_ROOT. Os relatórios já gerados em
+MEDIA_ROOT/relatorios (servidos publicamente) são apagados e os jobs deixam de
+ser reaproveitados; um novo pedido gera o arquivo no armazenamento privado.
+"""
+import estagio.armazenamento
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+
+def remover_relatorios_publicos(apps, schema_editor):
+    RelatorioJob = apps.get_model('estagio', 'RelatorioJob')
+    media = FileSystemStorage(location=settings.MEDIA_ROOT)
+
+    for job in RelatorioJob.objects.filter(arquivo__startswith='relatorios/').iterator():
+        media.delete(job.arquivo.name)
+        job.arquivo = None
+        job.status = 'falhou'
+        job.ultimo_erro = 'Arquivo removido do armazenamento público; gere o relatório novamente.'
+        job.save(update_fields=['arquivo', 'status', 'ultimo_erro'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0022_notificacao_chave_dedup_nao_lida'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatoriojob',
+            name='arquivo',
+            field=models.FileField(blank=True, null=True, storage=estagio.armazenamento.armazenamento_relatorios, upload_to='%Y/%m/'),
+        ),
+        migrations.RunPython(remover_relatorios_publicos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estagio', '0024_email_outbox_reserva'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arquivoconteudo',
+            name='sem_referencias_desde',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,12 +1,16 @@
 # Notificação para registro de alertas enviados
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, NullIf
 from django.utils import timezone
-from django.db import models
+from decimal import Decimal, ROUND_HALF_UP
+import hashlib
+import uuid
 from admin.models import Instituicao
 from users.models import Usuario
 from admin.models import Supervisor
 from admin.models import Empresa
 from admin.models import CursoCoordenador
+from estagio.armazenamento import armazenamento_documentos, armazenamento_relatorios
 
 class Aluno(models.Model):
     """Modelo de aluno especializado de usuário"""
@@ -64,6 +68,9 @@ class Estagio(models.Model):
         default='disponivel'
     )
 
+    # Sincronização incremental do painel (?since=)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return self.titulo
     
@@ -75,52 +82,91 @@ class Estagio(models.Model):
         """
         Vincula um aluno à vaga e atualiza o status - CA7
         Registra o histórico do vínculo - CA8
+        Vaga e aluno ficam travados durante a operação; levanta
+        `estagio.vinculos.ConflitoVinculo` se a vaga não estiver mais disponível
+        ou o aluno já tiver vaga.
         """
-        from estagio.models import VinculoHistorico
-        
-        # Atualiza o status da vaga
-        self.status_vaga = 'ocupada'
-        self.save()
+        from estagio.vinculos import vincular
         
-        # Vincula o aluno ao estágio
-        aluno.estagio = self
-        aluno.save()
-        
-        # Registra no histórico - CA8
-        VinculoHistorico.objects.create(
-            aluno=aluno,
-            estagio=self,
-            acao='vinculado',
-            realizado_por=realizado_por,
-            observacoes=f'Aluno {aluno.nome} vinculado à vaga {self.titulo}'
-        )
+        vincular(self, aluno, realizado_por=realizado_por)
     
     def desvincular_aluno(self, aluno, realizado_por=None, observacoes=None):
         """
         Desvincula um aluno da vaga
         Registra o histórico do desvinculo - CA8
+        Levanta `estagio.vinculos.ConflitoVinculo` se o aluno não estiver mais na vaga.
         """
-        from estagio.models import VinculoHistorico
+        from estagio.vinculos import desvincular
         
-        # Registra no histórico antes de desvincular - CA8
-        VinculoHistorico.objects.create(
-            aluno=aluno,
-            estagio=self,
-            acao='desvinculado',
-            realizado_por=realizado_por,
-            observacoes=observacoes or f'Aluno {aluno.nome} desvinculado da vaga {self.titulo}'
-        )
-        
-        # Atualiza o status da vaga para disponível
-        self.status_vaga = 'disponivel'
-        self.save()
-        
-        # Remove o vínculo do aluno
-        aluno.estagio = None
-        aluno.save()
+        desvincular(self, aluno, realizado_por=realizado_por, observacoes=observacoes)
     
 
 
+class AvaliacaoQuerySet(models.QuerySet):
+    def with_scores(self):
+        """
+        Anota, em SQL e para qualquer quantidade de avaliações:
+        - nota_ponderada: Sum(nota * peso) / Sum(peso) das notas preenchidas (sem arredondar);
+        - criterios_faltantes_total: critérios ativos e obrigatórios ainda sem nota;
+        - avaliacao_completa: nenhum critério obrigatório faltando (CA3).
+
+        Os métodos `calcular_nota_media`, `is_completa` e `get_criterios_faltantes`
+        reaproveitam essas anotações quando presentes.
+        """
+        return self.annotate(
+            nota_ponderada=expressao_nota_ponderada(),
+            criterios_faltantes_total=expressao_criterios_faltantes(),
+            avaliacao_completa=models.Case(
+                models.When(criterios_faltantes_total=0, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+
+def expressao_nota_ponderada(avaliacao_ref='pk'):
+    """Subquery com a média ponderada das notas preenchidas da avaliação `OuterRef(avaliacao_ref)`"""
+    media = NotaCriterio.objects.filter(
+        avaliacao_id=models.OuterRef(avaliacao_ref), nota__isnull=False
+    ).order_by().values('avaliacao_id').annotate(
+        media=models.ExpressionWrapper(
+            models.Sum(models.F('nota') * models.F('criterio__peso'))
+            / NullIf(models.Sum('criterio__peso'), models.Value(0.0)),
+            output_field=models.FloatField(),
+        )
+    ).values('media')
+    return models.Subquery(media, output_field=models.FloatField())
+
+
+def arredondar_nota(nota):
+    """
+    Nota com duas casas como o banco a arredonda no recálculo em lote
+    (`notas_avaliacao._nota_arredondada`): numeric de quatro casas e ROUND,
+    com metades para longe do zero (7.125 -> 7.13, e não 7.12 do round()).
+    """
+    if nota is None:
+        return None
+    quatro_casas = Decimal(repr(nota)).quantize(Decimal('0.0001'), ROUND_HALF_UP)
+    return float(quatro_casas.quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+
+def expressao_criterios_faltantes(avaliacao_ref='pk'):
+    """Quantidade de critérios ativos e obrigatórios sem nota na avaliação `OuterRef(avaliacao_ref)`"""
+    obrigatorios = CriterioAvaliacao.objects.filter(
+        ativo=True, obrigatorio=True
+    ).order_by().values('ativo').annotate(total=models.Count('pk')).values('total')
+    preenchidos = NotaCriterio.objects.filter(
+        avaliacao_id=models.OuterRef(avaliacao_ref),
+        nota__isnull=False,
+        criterio__ativo=True,
+        criterio__obrigatorio=True,
+    ).order_by().values('avaliacao_id').annotate(total=models.Count('pk')).values('total')
+    return models.ExpressionWrapper(
+        Coalesce(models.Subquery(obrigatorios), 0) - Coalesce(models.Subquery(preenchidos), 0),
+        output_field=models.IntegerField(),
+    )
+
+
 class Avaliacao(models.Model):
     """
     Modelo de Avaliação de Desempenho do Estagiário.
@@ -202,6 +248,8 @@ class Avaliacao(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AvaliacaoQuerySet.as_manager()
+
     class Meta:
         ordering = ['-data_avaliacao']
         verbose_name = 'Avaliação'
@@ -213,67 +261,47 @@ class Avaliacao(models.Model):
         aluno_nome = self.aluno.nome if self.aluno else 'Sem aluno'
         return f"Avaliação {self.id} - {aluno_nome} ({self.get_periodo_display()})"
     
+    def _scores(self, recalcular=False):
+        """
+        (nota_ponderada, criterios_faltantes_total) de `with_scores()`: as anotações
+        da própria instância ou, sem elas ou com `recalcular`, uma consulta.
+        """
+        if not recalcular and hasattr(self, 'avaliacao_completa'):
+            return self.nota_ponderada, self.criterios_faltantes_total
+        return Avaliacao.objects.with_scores().filter(pk=self.pk).values_list(
+            'nota_ponderada', 'criterios_faltantes_total'
+        ).first() or (None, 0)
+
     def calcular_nota_media(self):
-        """Calcula a nota média baseada nas notas dos critérios"""
-        notas_criterios = self.notas_criterios.all()
-        if not notas_criterios.exists():
-            return None
-        
-        total_peso = sum(nc.criterio.peso for nc in notas_criterios)
-        if total_peso == 0:
-            return None
-        
-        soma_ponderada = sum(nc.nota * nc.criterio.peso for nc in notas_criterios)
-        return round(soma_ponderada / total_peso, 2)
+        """Calcula a nota média ponderada pelo peso dos critérios"""
+        nota_ponderada, _ = self._scores()
+        return arredondar_nota(nota_ponderada)
     
     def is_completa(self):
         """
         Verifica se a avaliação está completa - CA3
         Todos os critérios obrigatórios devem ter nota
         """
-        from estagio.models import CriterioAvaliacao, NotaCriterio
-        
-        criterios_obrigatorios = CriterioAvaliacao.objects.filter(
-            ativo=True,
-            obrigatorio=True
-        )
-        
-        notas_preenchidas = NotaCriterio.objects.filter(
-            avaliacao=self,
-            nota__isnull=False
-        ).values_list('criterio_id', flat=True)
-        
-        for criterio in criterios_obrigatorios:
-            if criterio.id not in notas_preenchidas:
-                return False
-        
-        return True
+        _, faltantes = self._scores()
+        return faltantes == 0
     
     def get_criterios_faltantes(self):
         """Retorna lista de critérios obrigatórios ainda não preenchidos"""
-        from estagio.models import CriterioAvaliacao, NotaCriterio
-        
-        criterios_obrigatorios = CriterioAvaliacao.objects.filter(
-            ativo=True,
-            obrigatorio=True
-        )
-        
-        notas_preenchidas = NotaCriterio.objects.filter(
-            avaliacao=self,
-            nota__isnull=False
-        ).values_list('criterio_id', flat=True)
-        
-        return criterios_obrigatorios.exclude(id__in=notas_preenchidas)
+        if getattr(self, 'criterios_faltantes_total', None) == 0:
+            return CriterioAvaliacao.objects.none()
+        preenchidos = NotaCriterio.objects.filter(avaliacao=self, nota__isnull=False).values('criterio_id')
+        return CriterioAvaliacao.objects.filter(ativo=True, obrigatorio=True).exclude(id__in=preenchidos)
     
     def enviar(self):
         """
         Envia a avaliação se estiver completa - CA3
         Calcula a nota média e atualiza o status
         """
-        if not self.is_completa():
+        nota_ponderada, faltantes = self._scores(recalcular=True)
+        if faltantes:
             raise ValueError("Avaliação incompleta. Preencha todos os critérios obrigatórios.")
         
-        self.nota = self.calcular_nota_media()
+        self.nota = arredondar_nota(nota_ponderada)
         self.status = 'enviada'
         self.save()
         
@@ -284,10 +312,10 @@ class Avaliacao(models.Model):
         CA4 - Calcula automaticamente a nota final
         Baseada na média ponderada dos critérios de avaliação
         """
-        nota_calculada = self.calcular_nota_media()
-        if nota_calculada is None:
+        nota_ponderada, _ = self._scores(recalcular=True)
+        if nota_ponderada is None:
             raise ValueError("Não há notas suficientes para calcular a nota final.")
-        return nota_calculada
+        return arredondar_nota(nota_ponderada)
     
     def validar_parecer_final(self, parecer_texto):
         """
@@ -322,7 +350,7 @@ class Avaliacao(models.Model):
         from django.utils import timezone
         
         # Verifica se avaliação está completa
-        if not self.is_completa():
+        if self._scores(recalcular=True)[1]:
             raise ValueError("Avaliação incompleta. Preencha todos os critérios obrigatórios.")
         
         # Verifica se já foi enviada
@@ -458,7 +486,8 @@ class Documento(models.Model):
     nome_arquivo = models.CharField(max_length=50)
     tipo = models.CharField(max_length=50)
 
-    arquivo = models.FileField(upload_to='documentos/')
+    # Endereçado por conteúdo: documentos/ab/cd/<sha256><extensão> (ver estagio/armazenamento.py)
+    arquivo = models.FileField(upload_to='documentos/', storage=armazenamento_documentos)
 
     estagio = models.ForeignKey(Estagio, on_delete=models.CASCADE)
     supervisor = models.ForeignKey(Supervisor, on_delete=models.CASCADE)
@@ -466,11 +495,18 @@ class Documento(models.Model):
 
     parent = models.ForeignKey('self', null=True, blank=True, related_name='versions', on_delete=models.SET_NULL)
 
+    # Cadeia de versões materializada: raiz (primeira versão; a própria raiz aponta
+    # para si mesma), distância até a raiz e marcador da versão mais recente.
+    # Mantidos por save() ao criar uma versão com `parent`.
+    root = models.ForeignKey('self', null=True, blank=True, related_name='chain', on_delete=models.SET_NULL)
+    depth = models.PositiveIntegerField(default=0)
+    is_latest = models.BooleanField(default=True, db_index=True)
+
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='enviado')
 
     observacoes_supervisor = models.TextField(null=True, blank=True)
 
-    prazo_limite = models.DateField(null=True, blank=True)
+    prazo_limite = models.DateField(null=True, blank=True, db_index=True)
 
     enviado_por = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL, related_name='documentos_enviados')
     
@@ -481,67 +517,74 @@ class Documento(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['estagio', 'is_latest'], name='documento_estagio_latest_idx'),
+            models.Index(fields=['root', 'depth'], name='documento_root_depth_idx'),
+        ]
+
     def __str__(self):
         return self.nome_arquivo
 
+    def save(self, *args, **kwargs):
+        nova_versao = self._state.adding and self.parent_id is not None
+        if self._state.adding:
+            if self.parent_id is not None:
+                parent = Documento.objects.filter(pk=self.parent_id).values('root_id', 'depth').first() or {}
+                self.root_id = parent.get('root_id') or self.parent_id
+                self.depth = parent.get('depth', 0) + 1
+            self.is_latest = True
+        super().save(*args, **kwargs)
+        if nova_versao:
+            Documento.objects.filter(pk=self.parent_id).update(is_latest=False)
+        if self.root_id is None:
+            # Primeira versão: a raiz da cadeia é o próprio documento
+            Documento.objects.filter(pk=self.pk).update(root_id=self.pk)
+            self.root_id = self.pk
+
+    def get_chain(self):
+        """Todas as versões da cadeia (uma consulta por root_id), da mais antiga à mais recente"""
+        return Documento.objects.filter(root_id=self.root_id or self.pk).order_by('depth', 'versao', 'id')
+
     def get_history(self):
         """
         Retorna lista com a cadeia de versões: a versão atual e todas as versões anteriores.
-        A ordem pode ser do mais antigo para o mais recente se desejado.
+        A ordem é do mais antigo para o mais recente.
         """
+        por_id = {doc.pk: doc for doc in self.get_chain()}
         history = []
-        # navegar para trás até a raiz
-        node = self
-        while node:
+        # navegar para trás até a raiz, em memória
+        node = por_id.get(self.pk, self)
+        while node is not None:
             history.append(node)
-            node = node.parent
-        # history contém [atual, parent, parent.parent, ...]; inverter para mostrar do mais antigo
+            node = por_id.get(node.parent_id)
         return list(reversed(history))
 
     def get_root(self):
         """
         Retorna o documento raiz da cadeia (primeira versão).
         """
-        node = self
-        while node.parent:
-            node = node.parent
-        return node
+        if self.root_id is None or self.root_id == self.pk:
+            return self
+        return Documento.objects.get(pk=self.root_id)
 
     def get_latest(self):
         """
-        Retorna a versão mais recente da cadeia (navega pelos filhos).
+        Retorna a versão mais recente da cadeia.
         """
-        node = self
-        while node.versions.exists():
-            node = node.versions.order_by('-versao').first()
-        return node
+        return self.get_chain().filter(is_latest=True).order_by('-depth', '-versao', '-id').first() or self
 
     def get_full_history(self):
         """
         Retorna toda a cadeia de versões do documento, do mais antigo ao mais recente.
-        Começa do documento raiz e navega até a versão mais recente.
         """
-        # Encontrar o documento raiz
-        root = self.get_root()
-        
-        # Navegar de cima para baixo coletando todas as versões
-        history = [root]
-        node = root
-        while node.versions.exists():
-            # Pega o filho (versão seguinte)
-            child = node.versions.order_by('versao').first()
-            if child:
-                history.append(child)
-                node = child
-            else:
-                break
-        return history
+        return list(self.get_chain()) or [self]
 
     def is_latest_version(self):
         """
         Verifica se este documento é a versão mais recente da cadeia.
         """
-        return not self.versions.exists()
+        return self.is_latest
 
 
 class DocumentoHistorico(models.Model):
@@ -569,6 +612,49 @@ class DocumentoHistorico(models.Model):
     def __str__(self):
         return f"{self.get_acao_display()} - {self.documento.nome_arquivo} - {self.data_hora}"
 
+class ArquivoConteudo(models.Model):
+    """Arquivo de documento endereçado por conteúdo e quantos documentos o referenciam"""
+    nome = models.CharField(max_length=255, unique=True)
+    hash = models.CharField(max_length=64, db_index=True)
+    tamanho = models.BigIntegerField(null=True, blank=True)
+    referencias = models.PositiveIntegerField(default=0)
+    # Início da carência para a varredura apagar o arquivo (None enquanto houver referências)
+    sem_referencias_desde = models.DateTimeField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Arquivo de Documento'
+        verbose_name_plural = 'Arquivos de Documentos'
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias} ref.)"
+
+
+class UploadParcial(models.Model):
+    """Upload de documento recebido em partes, retomável (ver estagio/uploads.py)"""
+    STATUS_CHOICES = [
+        ('em_andamento', 'Em andamento'),
+        ('concluido', 'Concluído'),
+    ]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='uploads_parciais')
+    nome_arquivo = models.CharField(max_length=255)
+    tamanho = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    recebido = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='em_andamento')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Upload em Partes'
+        verbose_name_plural = 'Uploads em Partes'
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.recebido}/{self.tamanho} bytes)"
+
+
 class HorasCumpridas(models.Model):
     aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name='horas')
     data = models.DateField()
@@ -578,20 +664,167 @@ class HorasCumpridas(models.Model):
     def __str__(self):
         return f"{self.data} - {self.quantidade}h"
     
+def gerar_chave_notificacao(destinatario, assunto, referencia):
+    """Hash SHA-256 de (destinatario, assunto, referencia) usado para deduplicação"""
+    bruto = "\x1f".join([destinatario or '', assunto or '', referencia or ''])
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+def resolver_usuario_destinatario(destinatario):
+    """
+    Mapeia o endereço textual de uma notificação para o usuário destinatário.
+    Considera o e-mail/username do usuário e o contato de Aluno, Supervisor e Coordenador.
+    """
+    if not destinatario:
+        return None
+    usuario_id = Usuario.objects.filter(
+        models.Q(email=destinatario) | models.Q(username=destinatario)
+    ).values_list('id', flat=True).first()
+    if usuario_id:
+        return usuario_id
+    for modelo in (Aluno, Supervisor, CursoCoordenador):
+        usuario_id = modelo.objects.filter(contato=destinatario).values_list('usuario_id', flat=True).first()
+        if usuario_id:
+            return usuario_id
+    return None
+
+
+class NotificacaoQuerySet(models.QuerySet):
+    def do_usuario(self, usuario):
+        return self.filter(usuario=usuario)
+
+    def nao_lidas(self):
+        return self.filter(lida=False)
+
+
+class NotificacaoManager(models.Manager.from_queryset(NotificacaoQuerySet)):
+    def registrar(self, destinatario, assunto, mensagem, referencia=None, usuario=None):
+        """
+        Cria a notificação se ainda não existir uma não lida com a mesma chave de
+        deduplicação; depois de lida, o mesmo evento volta a notificar. Informe
+        `usuario` sempre que o chamador o conhecer (evita resolver o destinatário).
+        Retorna (notificacao, criada) como get_or_create.
+        """
+        return self.get_or_create(
+            chave_dedup=gerar_chave_notificacao(destinatario, assunto, referencia),
+            lida=False,
+            defaults={
+                'destinatario': destinatario,
+                'assunto': assunto,
+                'mensagem': mensagem,
+                'referencia': referencia,
+                'usuario': usuario,
+            }
+        )
+
+    def criar_em_lote(self, notificacoes, batch_size=500):
+        """
+        Insere notificações com bulk_create mantendo os contadores de não lidas.
+        `usuario` e `chave_dedup` devem vir preenchidos (save() não é chamado).
+        """
+        from collections import Counter
+        from estagio.signals import agendar_publicacao_contagem
+
+        for notificacao in notificacoes:
+            if not notificacao.chave_dedup:
+                notificacao.chave_dedup = gerar_chave_notificacao(
+                    notificacao.destinatario, notificacao.assunto, notificacao.referencia
+                )
+
+        with transaction.atomic():
+            criadas = self.bulk_create(notificacoes, batch_size=batch_size)
+
+            # Agrupa usuários pelo incremento para atualizar contadores com poucas UPDATEs
+            por_usuario = Counter(n.usuario_id for n in criadas if n.usuario_id and not n.lida)
+            por_incremento = {}
+            for usuario_id, total in por_usuario.items():
+                por_incremento.setdefault(total, []).append(usuario_id)
+            for total, usuario_ids in por_incremento.items():
+                Usuario.objects.filter(pk__in=usuario_ids).update(
+                    notificacoes_nao_lidas=models.F('notificacoes_nao_lidas') + total
+                )
+            for usuario_id in por_usuario:
+                agendar_publicacao_contagem(usuario_id)
+        return criadas
+
+    def marcar_todas_como_lidas(self, usuario):
+        """Marca todas as notificações do usuário como lidas e zera o contador"""
+        with transaction.atomic():
+            total = self.filter(usuario=usuario, lida=False).update(lida=True, data_leitura=timezone.now())
+            if total:
+                from estagio.signals import agendar_publicacao_contagem
+                recalcular_nao_lidas(usuario.pk)
+                agendar_publicacao_contagem(usuario.pk)
+        return total
+
+
+def recalcular_nao_lidas(usuario_id):
+    """Recalcula o contador desnormalizado de não lidas a partir da tabela (uma única UPDATE)"""
+    nao_lidas = Notificacao.objects.filter(
+        usuario_id=models.OuterRef('pk'), lida=False
+    ).order_by().values('usuario_id').annotate(total=models.Count('id')).values('total')
+    Usuario.objects.filter(pk=usuario_id).update(
+        notificacoes_nao_lidas=Coalesce(models.Subquery(nao_lidas), 0)
+    )
+
+
 class Notificacao(models.Model):
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notificacoes'
+    )
     destinatario = models.CharField(max_length=255)
     assunto = models.CharField(max_length=255)
     mensagem = models.TextField()
     data_envio = models.DateTimeField(default=timezone.now)
     referencia = models.CharField(max_length=255, blank=True, null=True)  # Ex: documento_id ou outro identificador
+    lida = models.BooleanField(default=False)
+    data_leitura = models.DateTimeField(null=True, blank=True)
+    # Hash de (destinatario, assunto, referencia) - impede duplicidade entre as não lidas
+    chave_dedup = models.CharField(max_length=64, editable=False)
+
+    objects = NotificacaoManager()
 
     class Meta:
-        unique_together = ('destinatario', 'assunto', 'referencia')  # Impede duplicidade
         ordering = ['-data_envio']  # Mais recentes primeiro
+        indexes = [
+            models.Index(fields=['usuario', 'lida', '-data_envio'], name='notif_usuario_lida_data_idx'),
+        ]
+        constraints = [
+            # Notificação lida (soft delete) não impede que o mesmo evento notifique de novo
+            models.UniqueConstraint(
+                fields=['chave_dedup'], condition=models.Q(lida=False), name='notif_chave_dedup_nao_lida_uniq'
+            ),
+        ]
 
     def __str__(self):
         return f"Notificação para {self.destinatario} - {self.assunto} ({self.data_envio})"
 
+    def save(self, *args, **kwargs):
+        if self.usuario_id is None:
+            self.usuario_id = resolver_usuario_destinatario(self.destinatario)
+        if not self.chave_dedup:
+            self.chave_dedup = gerar_chave_notificacao(self.destinatario, self.assunto, self.referencia)
+        super().save(*args, **kwargs)
+
+    def marcar_como_lida(self):
+        """Marca como lida (soft delete) e decrementa o contador do usuário uma única vez"""
+        with transaction.atomic():
+            alteradas = Notificacao.objects.filter(pk=self.pk, lida=False).update(
+                lida=True, data_leitura=timezone.now()
+            )
+            if alteradas and self.usuario_id:
+                from estagio.signals import agendar_publicacao_contagem
+                Usuario.objects.filter(pk=self.usuario_id, notificacoes_nao_lidas__gt=0).update(
+                    notificacoes_nao_lidas=models.F('notificacoes_nao_lidas') - 1
+                )
+                agendar_publicacao_contagem(self.usuario_id)
+        self.lida = True
+        return bool(alteradas)
+
 
 class FeedbackSupervisor(models.Model):
     """Modelo para armazenar feedbacks do supervisor para o aluno"""
@@ -742,3 +975,171 @@ class VinculoHistorico(models.Model):
     
     def __str__(self):
         return f"{self.get_acao_display()} - {self.aluno.nome} - {self.estagio.titulo} - {self.data_hora}"
+
+
+class EmailOutbox(models.Model):
+    """Fila transacional de e-mails (outbox) drenada pelo worker `enviar_emails`"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou'),
+    ]
+
+    destinatario = models.CharField(max_length=255)
+    assunto = models.CharField(max_length=255)
+    mensagem = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    # Prazo da reserva de um worker (status 'enviando'); vencido, o e-mail volta à fila
+    reservado_ate = models.DateTimeField(null=True, blank=True)
+    ultimo_erro = models.TextField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa'], name='outbox_status_prox_idx'),
+        ]
+        verbose_name = 'E-mail na Fila'
+        verbose_name_plural = 'E-mails na Fila'
+
+    def __str__(self):
+        return f"{self.destinatario} - {self.assunto} ({self.get_status_display()})"
+
+
+class VarreduraPrazos(models.Model):
+    """Marca d'água da última varredura de prazos (comando `notificar_prazos --incremental`)"""
+    nome = models.CharField(max_length=50, unique=True)
+    executado_em = models.DateTimeField()
+    data_referencia = models.DateField()
+    dias_alerta = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = 'Varredura de Prazos'
+        verbose_name_plural = 'Varreduras de Prazos'
+
+    def __str__(self):
+        return f"{self.nome} - {self.executado_em:%d/%m/%Y %H:%M}"
+
+
+class VersaoDados(models.Model):
+    """
+    Contador monotônico de alterações por escopo ('global', 'supervisor:<id>',
+    'aluno:<id>'), usado como ETag das APIs de polling.
+    Incrementado pelos signals em estagio/signals.py (ver estagio/versao_dados.py).
+    """
+    escopo = models.CharField(max_length=100, unique=True)
+    versao = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versão de Dados'
+        verbose_name_plural = 'Versões de Dados'
+
+    def __str__(self):
+        return f"{self.escopo} v{self.versao}"
+
+
+class EstagioRemovido(models.Model):
+    """
+    Tombstone de estágio excluído ou que saiu do escopo de um supervisor/aluno,
+    usado pela sincronização incremental do painel (`api_painel_estagios?since=`).
+    """
+    estagio_id = models.PositiveIntegerField(db_index=True)
+    supervisor_id = models.IntegerField(null=True, blank=True)
+    aluno_solicitante_id = models.IntegerField(null=True, blank=True)
+    removido_em = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Estágio Removido'
+        verbose_name_plural = 'Estágios Removidos'
+
+    def __str__(self):
+        return f"Estágio {self.estagio_id} removido em {self.removido_em:%d/%m/%Y %H:%M}"
+
+
+class Pendencia(models.Model):
+    """
+    Pendência materializada exibida no monitoramento (CA4/CA5).
+
+    Mantida pelos signals de Estagio, Documento, Avaliacao, NotaCriterio,
+    CriterioAvaliacao e Aluno (ver estagio/pendencias.py); o comando
+    `reconstruir_pendencias` refaz a tabela a partir dos dados atuais.
+    """
+    PERFIL_CHOICES = [
+        ('coordenador', 'Coordenador'),
+        ('supervisor', 'Supervisor'),
+        ('aluno', 'Aluno'),
+    ]
+
+    tipo = models.CharField(max_length=30)
+    critico = models.BooleanField(default=False)
+    # Escopo do dono: coordenadores veem todas as linhas do perfil 'coordenador'
+    perfil = models.CharField(max_length=20, choices=PERFIL_CHOICES)
+    supervisor = models.ForeignKey(Supervisor, on_delete=models.CASCADE, null=True, blank=True, related_name='pendencias')
+    aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, null=True, blank=True, related_name='pendencias')
+    referencia_tipo = models.CharField(max_length=20)
+    referencia_id = models.PositiveIntegerField()
+    referencia_nome = models.CharField(max_length=255, blank=True, default='')
+    descricao = models.TextField(blank=True, default='')
+    data_limite = models.DateField(null=True, blank=True)
+    # Chave de ordenação (ISO) equivalente ao campo 'data' das APIs
+    data = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        ordering = ['-critico', 'data', 'id']
+        indexes = [
+            models.Index(fields=['perfil', 'critico', 'data'], name='pend_perfil_idx'),
+            models.Index(fields=['supervisor', 'critico', 'data'], name='pend_supervisor_idx'),
+            models.Index(fields=['aluno', 'critico', 'data'], name='pend_aluno_idx'),
+            models.Index(fields=['referencia_tipo', 'referencia_id'], name='pend_referencia_idx'),
+            models.Index(fields=['tipo', 'data_limite'], name='pend_tipo_limite_idx'),
+        ]
+        verbose_name = 'Pendência'
+        verbose_name_plural = 'Pendências'
+
+    def __str__(self):
+        return f"{self.tipo} ({self.referencia_tipo} {self.referencia_id})"
+
+
+class RelatorioJob(models.Model):
+    """
+    Relatório de estágios gerado em segundo plano pelo comando `processar_relatorios`.
+
+    `filtros` guarda os dados normalizados do RelatorioEstagiosForm; `chave`
+    identifica filtros + escopo do solicitante + versão dos dados, permitindo
+    reaproveitar um job recente com o mesmo resultado (ver estagio/relatorio_jobs.py).
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('falhou', 'Falhou'),
+    ]
+
+    solicitante = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='relatorio_jobs')
+    formato = models.CharField(max_length=10)
+    filtros = models.JSONField(default=dict)
+    chave = models.CharField(max_length=64)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
+    arquivo = models.FileField(upload_to='%Y/%m/', storage=armazenamento_relatorios, null=True, blank=True)
+    total_linhas = models.PositiveIntegerField(null=True, blank=True)
+    duracao = models.FloatField(null=True, blank=True, help_text='Segundos gastos na geração do arquivo')
+    ultimo_erro = models.TextField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='relatorio_job_fila_idx'),
+            models.Index(fields=['chave', 'status'], name='relatorio_job_chave_idx'),
+        ]
+        verbose_name = 'Relatório em Segundo Plano'
+        verbose_name_plural = 'Relatórios em Segundo Plano'
+
+    def __str__(self):
+        return f"Relatório {self.pk} ({self.formato}) - {self.get_status_display()}"
@@ -0,0 +1,211 @@
+"""
+Gravação das notas por critério das avaliações de desempenho.
+
+As notas enviadas pelos formulários são validadas em memória contra os limites
+de cada `CriterioAvaliacao` e, só então, gravadas com um único INSERT ... ON
+CONFLICT (avaliacao, criterio) DO UPDATE. Nota e completude da avaliação são
+recalculadas uma vez ao final (`Avaliacao.objects.with_scores`).
+
+`recalcular_avaliacoes` refaz nota e completude de avaliações já gravadas
+(após mudar o peso ou a obrigatoriedade de um `CriterioAvaliacao`) com UPDATEs
+de subconsultas correlacionadas, em lotes.
+
+`bulk_create` e `update` não disparam signals: pendências e versões dos dados
+são atualizadas aqui, pelo save da avaliação ou explicitamente.
+"""
+from django.db import models, transaction
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import Exact, GreaterThan
+from django.utils import timezone
+
+from estagio import pendencias
+from estagio.models import (
+    Avaliacao, NotaCriterio, arredondar_nota, expressao_criterios_faltantes, expressao_nota_ponderada,
+)
+from estagio.versao_dados import escopos_da_instancia, escopos_de_estagios, incrementar_versoes
+
+
+def validar_notas(criterios, valores, exigir_obrigatorios=True):
+    """
+    Converte e valida as notas enviadas para `criterios` (instâncias de
+    `CriterioAvaliacao` ou o retrato de `criterios_cache`).
+
+    `valores` mapeia o id do critério para (nota_bruta, observacao); critérios
+    ausentes contam como nota vazia. Retorna (notas, erros): `notas` é a lista
+    de (criterio, nota, observacao) a gravar e `erros`, as mensagens de
+    validação (nada deve ser gravado se houver erros).
+    """
+    notas = []
+    erros = []
+    for criterio in criterios:
+        nota_bruta, observacao = valores.get(criterio.id, (None, ''))
+        nota_bruta = (nota_bruta or '').strip() if isinstance(nota_bruta, str) else nota_bruta
+        if nota_bruta in (None, ''):
+            nota = None
+        else:
+            try:
+                nota = float(nota_bruta)
+            except (TypeError, ValueError):
+                erros.append(f'Nota do critério "{criterio.nome}" inválida.')
+                continue
+
+        if nota is not None and not criterio.nota_minima <= nota <= criterio.nota_maxima:
+            erros.append(
+                f'Nota do critério "{criterio.nome}" deve estar entre '
+                f'{criterio.nota_minima} e {criterio.nota_maxima}.'
+            )
+            continue
+        # CA3 - Critério obrigatório
+        if exigir_obrigatorios and criterio.obrigatorio and nota is None:
+            erros.append(f'O critério "{criterio.nome}" é obrigatório.')
+            continue
+        notas.append((criterio, nota, observacao or ''))
+    return notas, erros
+
+
+@transaction.atomic
+def salvar_notas(avaliacao, notas):
+    """
+    Grava as notas (lista de `validar_notas`) com um único upsert e atualiza a
+    avaliação. Retorna True se a avaliação ficou completa.
+    """
+    if notas:
+        NotaCriterio.objects.bulk_create(
+            [
+                NotaCriterio(avaliacao=avaliacao, criterio_id=criterio.id, nota=nota, observacao=observacao)
+                for criterio, nota, observacao in notas
+            ],
+            update_conflicts=True,
+            unique_fields=['avaliacao', 'criterio'],
+            update_fields=['nota', 'observacao'],
+        )
+    return atualizar_situacao(avaliacao)
+
+
+def criar_notas_vazias(avaliacao, criterios):
+    """Uma nota vazia por critério, para preenchimento posterior (um INSERT)"""
+    NotaCriterio.objects.bulk_create(
+        [NotaCriterio(avaliacao=avaliacao, criterio_id=criterio.id, nota=None) for criterio in criterios],
+        ignore_conflicts=True,
+    )
+
+
+def atualizar_situacao(avaliacao):
+    """
+    Recalcula nota e completude da avaliação com uma consulta. Completa, a
+    avaliação em rascunho passa a 'completa' e recebe a nota ponderada.
+    Retorna True se a avaliação está completa.
+    """
+    nota_ponderada, completa = Avaliacao.objects.with_scores().filter(pk=avaliacao.pk).values_list(
+        'nota_ponderada', 'avaliacao_completa'
+    ).get()
+
+    if completa:
+        if avaliacao.status == 'rascunho':
+            avaliacao.status = 'completa'
+        avaliacao.nota = arredondar_nota(nota_ponderada)
+        # O save da avaliação sincroniza pendências e versões pelos signals
+        avaliacao.save(update_fields=['status', 'nota', 'updated_at'])
+    else:
+        pendencias.sincronizar_avaliacoes([avaliacao.pk])
+        incrementar_versoes(escopos_da_instancia(avaliacao))
+    return completa
+
+
+def _nota_arredondada():
+    """
+    Nota ponderada com duas casas, no banco (o PostgreSQL só tem ROUND com casas
+    para numeric). Mesmo arredondamento de `arredondar_nota`, usado ao gravar
+    pelo formulário: as duas formas precisam concordar, ou o recálculo
+    regravaria notas que não mudaram.
+    """
+    return Cast(
+        Round(Cast(expressao_nota_ponderada(), models.DecimalField(max_digits=12, decimal_places=4)), 2),
+        models.FloatField(),
+    )
+
+
+def _com_parecer():
+    return models.Q(parecer_final__isnull=False) & ~models.Q(parecer_final='')
+
+
+def _valores_recalculados(incluir_pareceres=False):
+    """
+    Expressões de nota, status (e nota_final) como o fluxo de edição as gravaria:
+    rascunho completo passa a 'completa', 'completa' que perdeu um critério
+    obrigatório volta a rascunho; avaliações enviadas mantêm o status.
+    """
+    faltantes = expressao_criterios_faltantes()
+    nota = _nota_arredondada()
+    valores = {
+        'nota': models.Case(
+            models.When(Exact(faltantes, 0), then=nota),
+            models.When(status__in=['enviada', 'parecer_emitido'], then=nota),
+            default=models.Value(None),
+            output_field=models.FloatField(),
+        ),
+        'status': models.Case(
+            models.When(Exact(faltantes, 0), status='rascunho', then=models.Value('completa')),
+            models.When(GreaterThan(faltantes, 0), status='completa', then=models.Value('rascunho')),
+            default=models.F('status'),
+            output_field=models.CharField(),
+        ),
+    }
+    if incluir_pareceres:
+        valores['nota_final'] = models.Case(
+            models.When(_com_parecer(), then=nota),
+            default=models.F('nota_final'),
+            output_field=models.FloatField(),
+        )
+    return valores
+
+
+def recalcular_avaliacoes(avaliacoes=None, incluir_pareceres=False, dry_run=False, tamanho_lote=500, progresso=None):
+    """
+    Recalcula nota, status e (com `incluir_pareceres`) nota_final das avaliações,
+    em lotes de `tamanho_lote` ids. Avaliações com parecer final emitido ficam de
+    fora, a menos que `incluir_pareceres` seja True.
+
+    Cada lote faz uma leitura com os valores recalculados e um UPDATE, com as
+    mesmas subconsultas, apenas das avaliações que mudariam. `progresso` recebe
+    (ultimo_id, analisadas, alteradas) ao fim de cada lote. Retorna
+    (analisadas, alteradas); com `dry_run` nada é gravado.
+    """
+    if avaliacoes is None:
+        avaliacoes = Avaliacao.objects.all()
+    if not incluir_pareceres:
+        avaliacoes = avaliacoes.exclude(_com_parecer())
+    valores = _valores_recalculados(incluir_pareceres)
+    campos = list(valores)
+
+    ultimo_id = 0
+    analisadas = alteradas = 0
+    while True:
+        lote = list(
+            avaliacoes.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamanho_lote]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1]
+        analisadas += len(lote)
+
+        recalculadas = Avaliacao.objects.filter(pk__in=lote).annotate(
+            **{f'{campo}_recalculado': expressao for campo, expressao in valores.items()}
+        ).values('pk', 'estagio_id', *campos, *(f'{campo}_recalculado' for campo in campos))
+        alteradas_lote = {
+            linha['pk']: linha['estagio_id'] for linha in recalculadas
+            if any(linha[campo] != linha[f'{campo}_recalculado'] for campo in campos)
+        }
+        alteradas += len(alteradas_lote)
+
+        if alteradas_lote and not dry_run:
+            with transaction.atomic():
+                Avaliacao.objects.filter(pk__in=alteradas_lote).update(
+                    **_valores_recalculados(incluir_pareceres), updated_at=timezone.now()
+                )
+                pendencias.sincronizar_avaliacoes(alteradas_lote)
+                incrementar_versoes(escopos_de_estagios(alteradas_lote.values()))
+
+        if progresso is not None:
+            progresso(ultimo_id, analisadas, alteradas)
+    return analisadas, alteradas
@@ -0,0 +1,104 @@
+"""
+Broker pub/sub para eventos de notificação (SSE).
+
+Os signals de `Notificacao` publicam a contagem atualizada no canal do
+destinatário; o endpoint SSE assina o canal e repassa os eventos ao navegador.
+
+O backend padrão é em memória (um processo). Para múltiplos processos/workers
+ASGI, configure `NOTIFICACOES_BROKER_BACKEND` com o caminho de uma classe que
+implemente a mesma interface de `BaseBroker` (ex.: baseada em Redis pub/sub).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BROKER_BACKEND_PADRAO = 'estagio.notificacoes_broker.LocalBroker'
+
+
+class Assinatura:
+    """Fila de eventos de um cliente conectado, ligada ao event loop que a criou"""
+
+    def __init__(self, canal, maxsize=10):
+        self.canal = canal
+        self.loop = asyncio.get_running_loop()
+        self.fila = asyncio.Queue(maxsize=maxsize)
+
+    def entregar(self, mensagem):
+        """Chamado no event loop da assinatura; descarta o evento mais antigo se a fila encher"""
+        if self.fila.full():
+            self.fila.get_nowait()
+        self.fila.put_nowait(mensagem)
+
+    async def get(self):
+        return await self.fila.get()
+
+
+class BaseBroker:
+    """Interface mínima de um backend de pub/sub"""
+
+    def subscribe(self, canal):
+        """Cria uma assinatura para o canal (deve ser chamado dentro de um event loop)"""
+        raise NotImplementedError
+
+    def unsubscribe(self, assinatura):
+        raise NotImplementedError
+
+    def publish(self, canal, mensagem):
+        """Publica a mensagem para todas as assinaturas do canal (thread-safe)"""
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    """Broker em memória do processo, seguro para publicação a partir de threads síncronas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinaturas = defaultdict(set)
+
+    def subscribe(self, canal):
+        assinatura = Assinatura(canal)
+        with self._lock:
+            self._assinaturas[canal].add(assinatura)
+        return assinatura
+
+    def unsubscribe(self, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.canal)
+            if assinaturas is not None:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._assinaturas[assinatura.canal]
+
+    def publish(self, canal, mensagem):
+        with self._lock:
+            destinos = list(self._assinaturas.get(canal, ()))
+        for assinatura in destinos:
+            try:
+                assinatura.loop.call_soon_threadsafe(assinatura.entregar, mensagem)
+            except RuntimeError:
+                # Event loop já encerrado: cliente desconectou
+                self.unsubscribe(assinatura)
+
+    def total_assinaturas(self, canal=None):
+        with self._lock:
+            if canal is not None:
+                return len(self._assinaturas.get(canal, ()))
+            return sum(len(a) for a in self._assinaturas.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Instância única do backend configurado em NOTIFICACOES_BROKER_BACKEND"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                caminho = getattr(settings, 'NOTIFICACOES_BROKER_BACKEND', BROKER_BACKEND_PADRAO)
+                _broker = import_string(caminho)()
+    return _broker
@@ -0,0 +1,177 @@
+"""
+Estatísticas e agrupamento do painel de status dos estágios.
+
+As contagens por status saem de um único `aggregate(Count(filter=Q()))` e a
+listagem agrupada de uma única consulta ordenada por status, separada em
+Python. O resultado pode ser guardado em cache por perfil durante
+`PAINEL_ESTAGIOS_CACHE_TTL` segundos (0 desativa o cache).
+
+A sincronização incremental (`delta_estagios`) devolve apenas os estágios
+alterados desde o cursor do cliente (`Estagio.updated_at`) e os ids removidos
+do seu escopo (tombstones em `EstagioRemovido`).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# CA1 - Status exibidos no painel
+STATUS_PAINEL = ('analise', 'em_andamento', 'aprovado', 'reprovado')
+
+CAMPOS_LISTAGEM = ('id', 'titulo', 'status', 'empresa__razao_social', 'data_inicio', 'data_fim')
+
+CACHE_PREFIXO = 'painel_estagios'
+
+
+def calcular_estatisticas(estagios):
+    """Total, contagem e percentual por status com uma única consulta"""
+    agregados = estagios.aggregate(
+        total=Count('id'),
+        **{status: Count('id', filter=Q(status=status)) for status in STATUS_PAINEL}
+    )
+    total = agregados['total'] or 0
+
+    estatisticas = {'total': total}
+    for status in STATUS_PAINEL:
+        estatisticas[status] = agregados[status] or 0
+    for status in STATUS_PAINEL:
+        estatisticas[f'percentual_{status}'] = round((estatisticas[status] / total) * 100, 1) if total > 0 else 0
+    return estatisticas
+
+
+def agrupar_por_status(estagios, campos=CAMPOS_LISTAGEM):
+    """Estágios do painel agrupados por status (dicionários de `campos`) com uma única consulta"""
+    grupos = {status: [] for status in STATUS_PAINEL}
+    linhas = estagios.filter(status__in=STATUS_PAINEL).order_by('status', 'id').values(*campos)
+    for linha in linhas:
+        grupos[linha['status']].append(linha)
+    return grupos
+
+
+def _chave_cache(usuario):
+    # Coordenadores compartilham a mesma visão (todos os estágios)
+    if usuario.tipo == 'coordenador':
+        return f'{CACHE_PREFIXO}:coordenador'
+    return f'{CACHE_PREFIXO}:{usuario.tipo}:{usuario.pk}'
+
+
+def obter_dados_painel(usuario, estagios, incluir_grupos=True):
+    """
+    Estatísticas (e, opcionalmente, a listagem agrupada) do painel do usuário,
+    usando o cache por perfil quando `PAINEL_ESTAGIOS_CACHE_TTL` > 0.
+    """
+    ttl = getattr(settings, 'PAINEL_ESTAGIOS_CACHE_TTL', 0)
+    chave = f"{_chave_cache(usuario)}:{'completo' if incluir_grupos else 'estatisticas'}"
+    if ttl > 0:
+        dados = cache.get(chave)
+        if dados is not None:
+            return dados
+
+    dados = {'estatisticas': calcular_estatisticas(estagios)}
+    if incluir_grupos:
+        dados['estagios_por_status'] = agrupar_por_status(estagios)
+
+    if ttl > 0:
+        cache.set(chave, dados, ttl)
+    return dados
+
+
+# ---------------------------------------------------------------------------
+# Sincronização incremental (?since=<cursor>)
+# ---------------------------------------------------------------------------
+
+# Sobreposição aplicada ao cursor para não perder transações que estavam em
+# andamento quando o cursor anterior foi emitido (o cliente mescla por id)
+MARGEM_CURSOR = timedelta(seconds=5)
+
+CAMPOS_DELTA = (
+    'id', 'titulo', 'cargo', 'status', 'empresa__razao_social', 'aluno_solicitante__nome',
+    'data_inicio', 'data_fim', 'carga_horaria', 'updated_at',
+)
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def gerar_cursor(momento=None):
+    return (momento or timezone.now()).isoformat()
+
+
+def ler_cursor(valor):
+    """Converte o cursor recebido em datetime; levanta CursorInvalido se malformado"""
+    momento = parse_datetime(valor or '')
+    if momento is None:
+        raise CursorInvalido(valor)
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+def retencao_tombstones():
+    """Cursores mais antigos que a retenção exigem ressincronização completa"""
+    return timedelta(days=getattr(settings, 'PAINEL_ESTAGIOS_RETENCAO_TOMBSTONES_DIAS', 30))
+
+
+def _tombstones_do_perfil(usuario, perfil_ids):
+    from estagio.models import EstagioRemovido
+
+    if usuario.tipo == 'coordenador':
+        return EstagioRemovido.objects.all()
+    if usuario.tipo == 'supervisor':
+        return EstagioRemovido.objects.filter(supervisor_id=perfil_ids.get('supervisor'))
+    if usuario.tipo == 'aluno':
+        return EstagioRemovido.objects.filter(aluno_solicitante_id=perfil_ids.get('aluno'))
+    return EstagioRemovido.objects.none()
+
+
+def delta_estagios(usuario, perfil_ids, estagios, since, filtro=None):
+    """
+    Estágios visíveis alterados desde `since` e ids que o cliente deve remover.
+
+    `filtro(linha)` indica se a linha alterada ainda pertence à visão do cliente
+    (filtros da tela); linhas alteradas que deixaram de atender vão para
+    `removidos`. Um id só é informado como removido se não estiver mais visível.
+    """
+    agora = timezone.now()
+    if since < agora - retencao_tombstones():
+        return {'completo': True, 'cursor': gerar_cursor(agora)}
+
+    from estagio.models import Estagio
+
+    status_display = dict(Estagio.STATUS_CHOICES)
+    desde = since - MARGEM_CURSOR
+    alterados = []
+    removidos = set()
+    for linha in estagios.filter(updated_at__gte=desde).order_by('updated_at', 'id').values(*CAMPOS_DELTA):
+        linha['status_display'] = status_display.get(linha['status'], linha['status'])
+        if filtro is None or filtro(linha):
+            alterados.append(linha)
+        else:
+            removidos.add(linha['id'])
+
+    ids_removidos = set(
+        _tombstones_do_perfil(usuario, perfil_ids).filter(removido_em__gte=desde).values_list('estagio_id', flat=True)
+    )
+    if ids_removidos:
+        # Estágio que voltou ao escopo (ou foi recriado com o mesmo id) continua visível
+        ids_removidos -= set(estagios.filter(pk__in=ids_removidos).values_list('id', flat=True))
+    removidos |= ids_removidos
+
+    return {
+        'completo': False,
+        'cursor': gerar_cursor(agora),
+        'alterados': alterados,
+        'removidos': sorted(removidos),
+    }
+
+
+def limpar_tombstones():
+    """Remove tombstones mais antigos que a retenção configurada"""
+    from estagio.models import EstagioRemovido
+
+    limite = timezone.now() - retencao_tombstones()
+    return EstagioRemovido.objects.filter(removido_em__lt=limite).delete()[0]
@@ -0,0 +1,302 @@
+"""
+Pendências materializadas do monitoramento (CA4/CA5).
+
+Cada alteração em estágio, documento, avaliação (e suas notas), critério de
+avaliação ou aluno recalcula apenas as linhas de `Pendencia` da referência
+afetada, na mesma transação. As telas e APIs de monitoramento passam a ser
+leituras indexadas, com filtro e paginação feitos no banco.
+
+O prazo de documentos é guardado em `data_limite` e a janela de alerta
+(`JANELA_PRAZO_DIAS`) é aplicada na leitura, de modo que a virada do dia não
+exige recalcular a tabela.
+
+Atualizações em massa (`QuerySet.update`, `bulk_update`) não disparam signals;
+quem as usa deve chamar a função `sincronizar_*` correspondente.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from estagio.models import (
+    Aluno, Avaliacao, Documento, Estagio, Pendencia,
+)
+
+# Constantes para tipos de pendência
+TIPOS_PENDENCIA = {
+    'documento_pendente': {
+        'nome': 'Documento Pendente',
+        'descricao': 'Documentos aguardando envio ou correção',
+        'critico': False,
+    },
+    'documento_ajuste': {
+        'nome': 'Documento com Ajustes Solicitados',
+        'descricao': 'Documentos que precisam de correção',
+        'critico': True,
+    },
+    'documento_prazo': {
+        'nome': 'Documento com Prazo Próximo',
+        'descricao': 'Documentos com prazo de vencimento próximo',
+        'critico': True,
+    },
+    'avaliacao_pendente': {
+        'nome': 'Avaliação Pendente',
+        'descricao': 'Avaliações aguardando preenchimento',
+        'critico': False,
+    },
+    'avaliacao_incompleta': {
+        'nome': 'Avaliação Incompleta',
+        'descricao': 'Avaliações com critérios não preenchidos',
+        'critico': True,
+    },
+    'estagio_analise': {
+        'nome': 'Estágio em Análise',
+        'descricao': 'Estágios aguardando aprovação',
+        'critico': False,
+    },
+    'horas_insuficientes': {
+        'nome': 'Horas Insuficientes',
+        'descricao': 'Alunos com horas abaixo do esperado',
+        'critico': True,
+    },
+}
+
+JANELA_PRAZO_DIAS = 3
+
+# Status de documento que geram cada pendência, por perfil
+STATUS_PRAZO_COORDENADOR = ['enviado', 'ajustes_solicitados', 'corrigido']
+STATUS_PRAZO_ALUNO = ['enviado', 'ajustes_solicitados']
+STATUS_ANALISE_SUPERVISOR = ['enviado', 'corrigido']
+STATUS_AVALIACAO_ABERTA = ['rascunho', 'completa']
+
+# Títulos montados na leitura ({dias} depende da data atual)
+TITULOS = {
+    ('estagio_analise', 'coordenador'): 'Estágio "{nome}" aguardando aprovação',
+    ('documento_prazo', 'coordenador'): 'Documento "{nome}" com prazo em {dias} dia(s)',
+    ('documento_prazo', 'aluno'): 'Documento "{nome}" vence em {dias} dia(s)',
+    ('documento_pendente', 'supervisor'): 'Documento "{nome}" aguardando análise',
+    ('documento_ajuste', 'aluno'): 'Documento "{nome}" precisa de correção',
+    ('avaliacao_incompleta', 'supervisor'): 'Avaliação de {nome} incompleta',
+}
+
+
+def como_dict(pendencia, hoje=None):
+    """Representação usada nas telas e APIs (mesmas chaves das versões anteriores)"""
+    hoje = hoje or timezone.now().date()
+    dias = (pendencia.data_limite - hoje).days if pendencia.data_limite else None
+    titulo = TITULOS.get((pendencia.tipo, pendencia.perfil), '{nome}').format(
+        nome=pendencia.referencia_nome, dias=dias
+    )
+    return {
+        'tipo': pendencia.tipo,
+        'titulo': titulo,
+        'descricao': pendencia.descricao,
+        'referencia_id': pendencia.referencia_id,
+        'referencia_tipo': pendencia.referencia_tipo,
+        'critico': pendencia.critico,
+        'data': pendencia.data,
+        'data_limite': pendencia.data_limite,
+    }
+
+
+def _iso(valor):
+    return valor.isoformat() if valor else ''
+
+
+# ---------------------------------------------------------------------------
+# Montagem das linhas
+# ---------------------------------------------------------------------------
+
+def _linhas_estagio(estagio, nome_aluno):
+    if estagio.status != 'analise':
+        return []
+    return [Pendencia(
+        tipo='estagio_analise',
+        critico=False,
+        perfil='coordenador',
+        referencia_tipo='estagio',
+        referencia_id=estagio.id,
+        referencia_nome=estagio.titulo,
+        descricao=f'Solicitado por {nome_aluno or "N/A"}',
+        data=_iso(estagio.data_solicitacao),
+    )]
+
+
+def _linhas_documento(doc, aluno_ids):
+    linhas = []
+    base = {'referencia_tipo': 'documento', 'referencia_id': doc.id, 'referencia_nome': doc.nome_arquivo}
+
+    if doc.prazo_limite and doc.status in STATUS_PRAZO_COORDENADOR:
+        linhas.append(Pendencia(
+            tipo='documento_prazo', critico=True, perfil='coordenador',
+            descricao=f'Prazo: {doc.prazo_limite.strftime("%d/%m/%Y")}',
+            data_limite=doc.prazo_limite, data=_iso(doc.prazo_limite), **base
+        ))
+
+    if doc.status in STATUS_ANALISE_SUPERVISOR and doc.supervisor_id:
+        linhas.append(Pendencia(
+            tipo='documento_pendente', critico=False, perfil='supervisor', supervisor_id=doc.supervisor_id,
+            descricao=f'Enviado em {doc.data_envio.strftime("%d/%m/%Y")}',
+            data=_iso(doc.data_envio), **base
+        ))
+
+    for aluno_id in aluno_ids:
+        if doc.status == 'ajustes_solicitados':
+            linhas.append(Pendencia(
+                tipo='documento_ajuste', critico=True, perfil='aluno', aluno_id=aluno_id,
+                descricao=doc.observacoes_supervisor or 'Verifique as observações do supervisor',
+                data=_iso(doc.updated_at), **base
+            ))
+        if doc.prazo_limite and doc.status in STATUS_PRAZO_ALUNO:
+            linhas.append(Pendencia(
+                tipo='documento_prazo', critico=True, perfil='aluno', aluno_id=aluno_id,
+                descricao=f'Prazo: {doc.prazo_limite.strftime("%d/%m/%Y")}',
+                data_limite=doc.prazo_limite, data=_iso(doc.prazo_limite), **base
+            ))
+    return linhas
+
+
+def _linhas_avaliacao(avaliacao, nome_aluno):
+    return [Pendencia(
+        tipo='avaliacao_incompleta',
+        critico=True,
+        perfil='supervisor',
+        supervisor_id=avaliacao.supervisor_id,
+        referencia_tipo='avaliacao',
+        referencia_id=avaliacao.id,
+        referencia_nome=nome_aluno or 'N/A',
+        descricao=f'Período: {avaliacao.get_periodo_display()}',
+        data=_iso(avaliacao.created_at),
+    )]
+
+
+# ---------------------------------------------------------------------------
+# Sincronização incremental
+# ---------------------------------------------------------------------------
+
+def _substituir(referencia_tipo, ids, linhas):
+    Pendencia.objects.filter(referencia_tipo=referencia_tipo, referencia_id__in=ids).delete()
+    if linhas:
+        Pendencia.objects.bulk_create(linhas)
+
+
+def sincronizar_estagios(estagio_ids):
+    estagio_ids = list(estagio_ids)
+    linhas = []
+    estagios = Estagio.objects.filter(pk__in=estagio_ids, status='analise').select_related('aluno_solicitante')
+    for estagio in estagios:
+        nome = estagio.aluno_solicitante.nome if estagio.aluno_solicitante else None
+        linhas.extend(_linhas_estagio(estagio, nome))
+    _substituir('estagio', estagio_ids, linhas)
+
+
+def sincronizar_documentos(documento_ids):
+    documento_ids = list(documento_ids)
+    documentos = list(Documento.objects.filter(pk__in=documento_ids))
+    alunos_por_estagio = {}
+    for aluno_id, estagio_id in Aluno.objects.filter(
+        estagio_id__in={d.estagio_id for d in documentos}
+    ).values_list('id', 'estagio_id'):
+        alunos_por_estagio.setdefault(estagio_id, []).append(aluno_id)
+
+    linhas = []
+    for doc in documentos:
+        linhas.extend(_linhas_documento(doc, alunos_por_estagio.get(doc.estagio_id, [])))
+    _substituir('documento', documento_ids, linhas)
+
+
+def sincronizar_avaliacoes(avaliacao_ids=None):
+    """Recalcula as avaliações informadas (ou todas as abertas, se None)"""
+    abertas = Avaliacao.objects.filter(status__in=STATUS_AVALIACAO_ABERTA).select_related('aluno')
+    if avaliacao_ids is None:
+        referencias = None
+    else:
+        referencias = list(avaliacao_ids)
+        abertas = abertas.filter(pk__in=referencias)
+    # Completude calculada no banco para todo o conjunto (Avaliacao.objects.with_scores)
+    linhas = []
+    for avaliacao in abertas.with_scores().filter(avaliacao_completa=False):
+        linhas.extend(_linhas_avaliacao(avaliacao, avaliacao.aluno.nome if avaliacao.aluno else None))
+
+    if referencias is None:
+        Pendencia.objects.filter(referencia_tipo='avaliacao').delete()
+        Pendencia.objects.bulk_create(linhas)
+    else:
+        _substituir('avaliacao', referencias, linhas)
+
+
+def sincronizar_aluno(aluno):
+    """Aluno trocou de estágio ou de nome: refaz suas pendências e as que exibem seu nome"""
+    Pendencia.objects.filter(aluno=aluno).delete()
+    if aluno.estagio_id:
+        sincronizar_documentos(Documento.objects.filter(estagio_id=aluno.estagio_id).values_list('id', flat=True))
+    sincronizar_estagios(aluno.estagios_solicitados.filter(status='analise').values_list('id', flat=True))
+    sincronizar_avaliacoes(aluno.avaliacoes.filter(status__in=STATUS_AVALIACAO_ABERTA).values_list('id', flat=True))
+
+
+def remover_referencia(referencia_tipo, referencia_id):
+    Pendencia.objects.filter(referencia_tipo=referencia_tipo, referencia_id=referencia_id).delete()
+
+
+def reconstruir(batch_size=500):
+    """Recria toda a tabela de pendências; retorna a quantidade de linhas geradas"""
+    Pendencia.objects.all().delete()
+
+    ids = list(Estagio.objects.filter(status='analise').values_list('id', flat=True))
+    for i in range(0, len(ids), batch_size):
+        sincronizar_estagios(ids[i:i + batch_size])
+
+    ids = list(Documento.objects.values_list('id', flat=True))
+    for i in range(0, len(ids), batch_size):
+        sincronizar_documentos(ids[i:i + batch_size])
+
+    ids = list(Avaliacao.objects.filter(status__in=STATUS_AVALIACAO_ABERTA).values_list('id', flat=True))
+    for i in range(0, len(ids), batch_size):
+        sincronizar_avaliacoes(ids[i:i + batch_size])
+
+    return Pendencia.objects.count()
+
+
+# ---------------------------------------------------------------------------
+# Leitura
+# ---------------------------------------------------------------------------
+
+def pendencias_do_usuario(usuario, perfil_ids, hoje=None):
+    """
+    Pendências visíveis ao perfil do usuário, ordenadas por criticidade e data.
+    Prazos de documento só aparecem dentro da janela de alerta.
+    """
+    hoje = hoje or timezone.now().date()
+    if usuario.tipo == 'coordenador':
+        pendencias = Pendencia.objects.filter(perfil='coordenador')
+    elif usuario.tipo == 'supervisor' and perfil_ids.get('supervisor'):
+        pendencias = Pendencia.objects.filter(perfil='supervisor', supervisor_id=perfil_ids['supervisor'])
+    elif usuario.tipo == 'aluno' and perfil_ids.get('aluno'):
+        pendencias = Pendencia.objects.filter(perfil='aluno', aluno_id=perfil_ids['aluno'])
+    else:
+        return Pendencia.objects.none()
+
+    return pendencias.filter(
+        ~Q(tipo='documento_prazo')
+        | Q(data_limite__range=(hoje, hoje + timedelta(days=JANELA_PRAZO_DIAS)))
+    ).order_by('-critico', 'data', 'id')
+
+
+def resumo_por_tipo(pendencias):
+    """Quantidade por tipo (CA4) com uma consulta agrupada"""
+    return {
+        linha['tipo']: {
+            'quantidade': linha['quantidade'],
+            'critico': TIPOS_PENDENCIA.get(linha['tipo'], {}).get('critico', False),
+            'nome': TIPOS_PENDENCIA.get(linha['tipo'], {}).get('nome', linha['tipo']),
+        }
+        for linha in pendencias.order_by().values('tipo').annotate(quantidade=Count('id'))
+    }
+
+
+def totais(pendencias):
+    """Total e total de críticas (CA5) com um único aggregate"""
+    return pendencias.aggregate(
+        total=Count('id'),
+        criticas=Count('id', filter=Q(critico=True)),
+    )
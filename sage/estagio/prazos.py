@@ -0,0 +1,176 @@
+"""
+Varredura de prazos próximos de documentos.
+
+Compartilhada por `verificar_prazos_proximos` e pelo comando `notificar_prazos`.
+A janela de alerta é selecionada no banco já com o contato do aluno anotado;
+as referências já notificadas são carregadas com uma consulta por lote e as
+novas notificações/e-mails são gravados em massa.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from estagio.email_outbox import enfileirar_emails_em_lote
+from estagio.models import Aluno, Documento, Notificacao, VarreduraPrazos, gerar_chave_notificacao
+
+logger = logging.getLogger(__name__)
+
+# CA4 - Documentos já entregues não geram alerta
+STATUS_ENTREGUES = ['aprovado', 'finalizado', 'substituido', 'enviado', 'corrigido']
+
+NOME_VARREDURA = 'prazos_documentos'
+
+
+class ResultadoVarredura:
+    """Resumo de uma execução da varredura"""
+
+    def __init__(self):
+        self.notificacoes = []
+        self.documentos = 0
+        self.ignorados = 0
+        self.duracao = 0.0
+
+    @property
+    def total(self):
+        return len(self.notificacoes)
+
+
+def documentos_na_janela(hoje, dias_alerta, desde=None):
+    """
+    CA1/CA2 - Documentos com prazo entre hoje e hoje + dias_alerta, com o contato
+    e o usuário do aluno do estágio anotados (um único SELECT).
+
+    `desde` (VarreduraPrazos) restringe aos documentos que entraram na janela
+    depois da última varredura ou que foram alterados desde então.
+    """
+    aluno = Aluno.objects.filter(estagio=OuterRef('estagio')).order_by('id')
+    documentos = Documento.objects.filter(
+        prazo_limite__range=(hoje, hoje + timedelta(days=dias_alerta))
+    ).exclude(
+        status__in=STATUS_ENTREGUES
+    )
+    if desde is not None:
+        documentos = documentos.filter(
+            Q(prazo_limite__gt=desde.data_referencia + timedelta(days=desde.dias_alerta))
+            | Q(updated_at__gt=desde.executado_em)
+        )
+    return documentos.annotate(
+        aluno_contato=Subquery(aluno.values('contato')[:1]),
+        aluno_usuario_id=Subquery(aluno.values('usuario_id')[:1]),
+    ).only('id', 'nome_arquivo', 'prazo_limite').order_by('id')
+
+
+def _montar_notificacao(doc, hoje, data_envio):
+    dias_restantes = (doc.prazo_limite - hoje).days
+    destinatario = doc.aluno_contato
+    # CA3 - Informa nome do documento e data limite
+    assunto = f"Alerta: Prazo próximo para o documento {doc.nome_arquivo}"
+    mensagem = f"O prazo para envio do documento '{doc.nome_arquivo}' termina em {dias_restantes} dia(s): {doc.prazo_limite.strftime('%d/%m/%Y')}. Por favor, envie o documento corrigido o quanto antes."
+    # CA5 - Referência única para evitar duplicidade
+    referencia = f"alerta_prazo_{doc.id}_{doc.prazo_limite}"
+    return Notificacao(
+        destinatario=destinatario,
+        assunto=assunto,
+        mensagem=mensagem,
+        referencia=referencia,
+        usuario_id=doc.aluno_usuario_id,
+        chave_dedup=gerar_chave_notificacao(destinatario, assunto, referencia),
+        data_envio=data_envio,
+    )
+
+
+def _processar_lote(lote, hoje, dry_run, resultado):
+    # CA6 - Mesmo horário de envio para todo o lote
+    data_envio = timezone.now()
+    candidatas = []
+    for doc in lote:
+        if not doc.aluno_contato:
+            logger.warning(f"Aluno não encontrado para o estágio do documento {doc.id}")
+            resultado.ignorados += 1
+            continue
+        candidatas.append(_montar_notificacao(doc, hoje, data_envio))
+    if not candidatas:
+        return
+
+    # CA5 - Uma consulta para as referências já notificadas do lote
+    existentes = set(
+        Notificacao.objects.filter(
+            referencia__in=[n.referencia for n in candidatas]
+        ).values_list('destinatario', 'referencia')
+    )
+    novas = []
+    for notificacao in candidatas:
+        chave = (notificacao.destinatario, notificacao.referencia)
+        if chave in existentes:
+            resultado.ignorados += 1
+            continue
+        existentes.add(chave)
+        novas.append(notificacao)
+    if not novas:
+        return
+
+    if dry_run:
+        resultado.notificacoes.extend(novas)
+        return
+
+    try:
+        with transaction.atomic():
+            Notificacao.objects.criar_em_lote(novas)
+    except IntegrityError:
+        # Execução concorrente gravou parte do lote: refaz ignorando as chaves já existentes
+        chaves = set(
+            Notificacao.objects.filter(
+                chave_dedup__in=[n.chave_dedup for n in novas], lida=False
+            ).values_list('chave_dedup', flat=True)
+        )
+        novas = [n for n in novas if n.chave_dedup not in chaves]
+        resultado.ignorados += len(chaves)
+        Notificacao.objects.criar_em_lote(novas)
+
+    enfileirar_emails_em_lote((n.destinatario, n.assunto, n.mensagem) for n in novas)
+    resultado.notificacoes.extend(novas)
+
+
+def escanear_prazos_proximos(dias_alerta=3, batch_size=500, dry_run=False, incremental=False):
+    """
+    Gera os alertas de prazo próximo em lotes de `batch_size` documentos.
+
+    Com `dry_run` nada é gravado e as notificações retornadas não são salvas.
+    Com `incremental` a varredura usa a marca d'água da execução anterior
+    (quando feita com o mesmo `dias_alerta`) e a atualiza ao final.
+    """
+    inicio = time.monotonic()
+    executado_em = timezone.now()
+    hoje = executado_em.date()
+    resultado = ResultadoVarredura()
+
+    desde = None
+    if incremental:
+        desde = VarreduraPrazos.objects.filter(nome=NOME_VARREDURA, dias_alerta=dias_alerta).first()
+
+    lote = []
+    for doc in documentos_na_janela(hoje, dias_alerta, desde=desde).iterator(chunk_size=batch_size):
+        resultado.documentos += 1
+        lote.append(doc)
+        if len(lote) >= batch_size:
+            _processar_lote(lote, hoje, dry_run, resultado)
+            lote = []
+    if lote:
+        _processar_lote(lote, hoje, dry_run, resultado)
+
+    if incremental and not dry_run:
+        VarreduraPrazos.objects.update_or_create(
+            nome=NOME_VARREDURA,
+            defaults={'executado_em': executado_em, 'data_referencia': hoje, 'dias_alerta': dias_alerta},
+        )
+
+    resultado.duracao = time.monotonic() - inicio
+    logger.info(
+        f"Varredura de prazos: {resultado.documentos} documentos, {resultado.total} notificações, "
+        f"{resultado.ignorados} ignorados em {resultado.duracao:.3f}s"
+    )
+    return resultado
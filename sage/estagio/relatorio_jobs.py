@@ -0,0 +1,205 @@
+"""
+Relatórios de estágios gerados em segundo plano.
+
+`api_relatorio_exportar` com `assincrono=1` grava um `RelatorioJob` com os
+filtros validados do RelatorioEstagiosForm e devolve o id do job; o comando
+`processar_relatorios` gera o arquivo em RELATORIOS_ROOT e registra a
+quantidade de linhas e a duração. O cliente acompanha o job pela API de status
+e baixa o arquivo quando concluído.
+
+Os arquivos trazem dados de alunos: ficam fora de MEDIA_ROOT (sem URL pública),
+com nome aleatório, e só são entregues por `baixar_relatorio_job` depois de
+`pode_acessar`.
+
+Pedidos com os mesmos filtros, o mesmo escopo de visibilidade e a mesma versão
+dos dados (`VersaoDados` global) reaproveitam o job em andamento ou concluído
+há menos de `RELATORIO_JOB_REUSO_SEGUNDOS`, em vez de gerar o arquivo de novo.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from estagio.models import RelatorioJob
+from estagio.versao_dados import ESCOPO_GLOBAL, obter_versoes
+
+logger = logging.getLogger(__name__)
+
+# Extensão e content-type do arquivo gerado por formato
+ARQUIVOS_POR_FORMATO = {
+    'json': ('json', 'application/json'),
+    'csv': ('csv', 'text/csv'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': ('html', 'text/html'),
+}
+
+
+def reuso_segundos():
+    return getattr(settings, 'RELATORIO_JOB_REUSO_SEGUNDOS', 900)
+
+
+def timeout_processamento():
+    """Jobs em processamento há mais tempo que isso são considerados abandonados e voltam à fila"""
+    return timedelta(seconds=getattr(settings, 'RELATORIO_JOB_TIMEOUT_SEGUNDOS', 1800))
+
+
+def escopo_relatorio(usuario):
+    """Visibilidade dos estágios do relatório (ver `_estagios_do_relatorio`)"""
+    if usuario.is_superuser or usuario.is_staff or usuario.tipo == 'coordenador':
+        return 'todos'
+    return f'{usuario.tipo}:{usuario.pk}'
+
+
+def calcular_chave(usuario, filtros):
+    versao = obter_versoes([ESCOPO_GLOBAL])[ESCOPO_GLOBAL]
+    bruto = json.dumps(
+        {'escopo': escopo_relatorio(usuario), 'filtros': filtros, 'versao': versao},
+        sort_keys=True,
+    )
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+def enfileirar_relatorio(usuario, form):
+    """
+    Cria (ou reaproveita) o job do relatório descrito pelo formulário validado.
+
+    Retorna (job, reaproveitado).
+    """
+    filtros = form.get_dados_normalizados()
+    chave = calcular_chave(usuario, filtros)
+    limite = timezone.now() - timedelta(seconds=reuso_segundos())
+    existente = RelatorioJob.objects.filter(chave=chave).filter(
+        Q(status__in=['pendente', 'processando']) | Q(status='concluido', concluido_em__gte=limite)
+    ).order_by('-criado_em').first()
+    if existente is not None:
+        return existente, True
+
+    job = RelatorioJob.objects.create(
+        solicitante=usuario,
+        formato=filtros['formato'],
+        filtros=filtros,
+        chave=chave,
+    )
+    logger.info(f"Relatório {job.pk} ({job.formato}) enfileirado por {usuario.pk}")
+    return job, False
+
+
+def pode_acessar(usuario, job):
+    """O solicitante acessa o job; um job reaproveitado vale para quem tem o mesmo escopo"""
+    if usuario.is_superuser or job.solicitante_id == usuario.pk:
+        return True
+    return escopo_relatorio(usuario) == escopo_relatorio(job.solicitante) == 'todos'
+
+
+def reservar_jobs(batch_size=1):
+    """
+    Marca como 'processando' até `batch_size` jobs pendentes (ou abandonados).
+
+    As linhas são travadas com `skip_locked`, permitindo vários workers em paralelo.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            RelatorioJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pendente') | Q(status='processando', iniciado_em__lt=agora - timeout_processamento()))
+            .order_by('criado_em', 'id')[:batch_size]
+        )
+        if jobs:
+            RelatorioJob.objects.filter(pk__in=[j.pk for j in jobs]).update(status='processando', iniciado_em=agora)
+    for job in jobs:
+        job.status = 'processando'
+        job.iniciado_em = agora
+    return jobs
+
+
+def _escrever_relatorio(job, form, destino):
+    """Grava o relatório do job em `destino` (arquivo binário); retorna a quantidade de estágios"""
+    from estagio.exportacao import gerar_csv, gerar_xlsx, linhas_excel
+    from estagio.views import _estagios_do_relatorio, _exportar_pdf, _gerar_relatorio_filtrado
+
+    if job.formato in ('csv', 'excel'):
+        estagios = _estagios_do_relatorio(job.solicitante, form)
+        total = estagios.count()
+        if job.formato == 'csv':
+            for pedaco in gerar_csv(estagios, form.get_opcoes_inclusao()):
+                destino.write(pedaco.encode('utf-8'))
+        else:
+            for pedaco in gerar_xlsx(linhas_excel(estagios, timezone.now().isoformat()), nome_planilha='Estágios'):
+                destino.write(pedaco)
+        return total
+
+    relatorio = _gerar_relatorio_filtrado(job.solicitante, form)
+    if job.formato == 'pdf':
+        destino.write(_exportar_pdf(relatorio).content)
+    else:
+        destino.write(json.dumps({
+            'success': True,
+            'relatorio': relatorio,
+            'filtros': form.get_filtros_ativos(),
+        }, cls=DjangoJSONEncoder).encode('utf-8'))
+    return len(relatorio['estagios'])
+
+
+def gerar_arquivo(job):
+    """Gera o arquivo do job em RELATORIOS_ROOT e registra linhas, duração e status"""
+    from estagio.forms import RelatorioEstagiosForm
+
+    inicio = time.monotonic()
+    try:
+        form = RelatorioEstagiosForm(job.filtros)
+        if not form.is_valid():
+            raise ValueError(f"Filtros inválidos: {form.errors.as_json()}")
+        extensao = ARQUIVOS_POR_FORMATO.get(job.formato, ARQUIVOS_POR_FORMATO['json'])[0]
+        with tempfile.TemporaryFile() as temporario:
+            total = _escrever_relatorio(job, form, temporario)
+            temporario.seek(0)
+            job.arquivo.save(f'relatorio_estagios_{uuid.uuid4().hex}.{extensao}', File(temporario), save=False)
+    except Exception as e:
+        job.status = 'falhou'
+        job.ultimo_erro = str(e)
+        logger.exception(f"Falha ao gerar o relatório {job.pk}")
+    else:
+        job.status = 'concluido'
+        job.total_linhas = total
+        job.ultimo_erro = None
+    job.duracao = time.monotonic() - inicio
+    job.concluido_em = timezone.now()
+    job.save(update_fields=['status', 'arquivo', 'total_linhas', 'duracao', 'ultimo_erro', 'concluido_em'])
+    return job
+
+
+def processar_lote(batch_size=1):
+    """Reserva e gera até `batch_size` relatórios; retorna os jobs processados"""
+    return [gerar_arquivo(job) for job in reservar_jobs(batch_size)]
+
+
+def como_dict(job):
+    """Representação do job para a API de status"""
+    from django.urls import reverse
+
+    dados = {
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'formato': job.formato,
+        'total_linhas': job.total_linhas,
+        'duracao': round(job.duracao, 3) if job.duracao is not None else None,
+        'criado_em': job.criado_em.isoformat() if job.criado_em else None,
+        'concluido_em': job.concluido_em.isoformat() if job.concluido_em else None,
+        'status_url': reverse('api_relatorio_job_status', args=[job.pk]),
+        'download_url': None,
+        'erro': job.ultimo_erro if job.status == 'falhou' else None,
+    }
+    if job.status == 'concluido' and job.arquivo:
+        dados['download_url'] = reverse('baixar_relatorio_job', args=[job.pk])
+    return dados
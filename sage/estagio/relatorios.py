@@ -0,0 +1,193 @@
+"""
+Montagem em lote do relatório de estágios (CA2 - dados completos).
+
+O número de consultas é fixo, independente da quantidade de estágios: a
+listagem vem com empresa, supervisor e aluno em um único SELECT; contagens e
+médias de documentos/avaliações e o total de horas saem de agregações
+agrupadas por estágio/aluno; as amostras de documentos e avaliações de cada
+estágio são carregadas com `Prefetch` fatiado (ROW_NUMBER por estágio).
+
+O resultado é o mesmo dicionário consumido pelas exportações JSON, CSV, Excel e PDF.
+"""
+from collections import Counter
+
+from django.db.models import Avg, Count, Prefetch, Q, Sum
+
+from estagio.models import Avaliacao, Documento, Estagio, HorasCumpridas
+
+# Quantidade de itens listados por estágio
+LIMITE_DOCUMENTOS = 10
+LIMITE_AVALIACOES = 10
+
+STATUS_DOCUMENTO_PENDENTE = ['enviado', 'corrigido']
+STATUS_AVALIACAO_COMPLETA = 'parecer_emitido'
+
+CAMPOS_DOCUMENTO = ('id', 'estagio', 'nome_arquivo', 'tipo', 'status', 'data_envio')
+CAMPOS_AVALIACAO = ('id', 'estagio', 'periodo', 'status', 'nota_final', 'data_avaliacao')
+
+
+def carregar_estagios(estagios, opcoes):
+    """Materializa os estágios com as relações e amostras exigidas pelas opções de inclusão"""
+    estagios = estagios.select_related('empresa', 'supervisor', 'aluno_solicitante__instituicao')
+    prefetches = []
+    if opcoes.get('documentos'):
+        prefetches.append(Prefetch(
+            'documento_set',
+            queryset=Documento.objects.only(*CAMPOS_DOCUMENTO).order_by('id')[:LIMITE_DOCUMENTOS],
+            to_attr='documentos_relatorio',
+        ))
+    if opcoes.get('avaliacoes'):
+        prefetches.append(Prefetch(
+            'avaliacoes',
+            queryset=Avaliacao.objects.only(*CAMPOS_AVALIACAO).order_by('-data_avaliacao', '-id')[:LIMITE_AVALIACOES],
+            to_attr='avaliacoes_relatorio',
+        ))
+    return list(estagios.prefetch_related(*prefetches))
+
+
+def agregados_documentos(estagio_ids):
+    linhas = Documento.objects.filter(estagio_id__in=estagio_ids).order_by().values('estagio_id').annotate(
+        total=Count('id'),
+        aprovados=Count('id', filter=Q(status='aprovado')),
+        pendentes=Count('id', filter=Q(status__in=STATUS_DOCUMENTO_PENDENTE)),
+    )
+    return {linha['estagio_id']: linha for linha in linhas}
+
+
+def agregados_avaliacoes(estagio_ids):
+    linhas = Avaliacao.objects.filter(estagio_id__in=estagio_ids).order_by().values('estagio_id').annotate(
+        total=Count('id'),
+        completas=Count('id', filter=Q(status=STATUS_AVALIACAO_COMPLETA)),
+        nota_media=Avg('nota_final', filter=Q(status=STATUS_AVALIACAO_COMPLETA, nota_final__isnull=False)),
+    )
+    return {linha['estagio_id']: linha for linha in linhas}
+
+
+def agregados_horas(aluno_ids):
+    linhas = HorasCumpridas.objects.filter(aluno_id__in=aluno_ids).order_by().values('aluno_id').annotate(
+        total_registros=Count('id'),
+        total_horas=Sum('quantidade'),
+    )
+    return {linha['aluno_id']: linha for linha in linhas}
+
+
+def montar_dados_estagio(estagio, opcoes, agregados):
+    """Dados de um estágio carregado por `carregar_estagios`, sem consultas adicionais"""
+    dados = {
+        'id': estagio.id,
+        'titulo': estagio.titulo,
+        'cargo': estagio.cargo,
+        'status': estagio.status,
+        'status_display': estagio.get_status_display(),
+        'data_inicio': estagio.data_inicio.isoformat() if estagio.data_inicio else None,
+        'data_fim': estagio.data_fim.isoformat() if estagio.data_fim else None,
+        'carga_horaria': estagio.carga_horaria,
+        'empresa': {
+            'razao_social': estagio.empresa.razao_social,
+            'cnpj': estagio.empresa.cnpj,
+        },
+        'supervisor': {
+            'nome': estagio.supervisor.nome,
+            'cargo': estagio.supervisor.cargo,
+        },
+    }
+
+    aluno = estagio.aluno_solicitante
+
+    # CA2 - Incluir dados do aluno
+    if opcoes.get('aluno') and aluno:
+        dados['aluno'] = {
+            'nome': aluno.nome,
+            'matricula': aluno.matricula,
+            'contato': aluno.contato,
+            'instituicao': aluno.instituicao.nome if aluno.instituicao else None,
+        }
+
+    # CA2 - Incluir documentos
+    if opcoes.get('documentos'):
+        contagem = agregados['documentos'].get(estagio.id, {})
+        dados['documentos'] = {
+            'total': contagem.get('total', 0),
+            'aprovados': contagem.get('aprovados', 0),
+            'pendentes': contagem.get('pendentes', 0),
+            'lista': [
+                {
+                    'id': doc.id,
+                    'nome': doc.nome_arquivo,
+                    'tipo': doc.tipo,
+                    'status': doc.status,
+                    'data_envio': doc.data_envio.isoformat() if doc.data_envio else None,
+                }
+                for doc in estagio.documentos_relatorio
+            ]
+        }
+
+    # CA2 - Incluir avaliações
+    if opcoes.get('avaliacoes'):
+        contagem = agregados['avaliacoes'].get(estagio.id, {})
+        media = contagem.get('nota_media')
+        dados['avaliacoes'] = {
+            'total': contagem.get('total', 0),
+            'completas': contagem.get('completas', 0),
+            'nota_media': round(media, 2) if media else None,
+            'lista': [
+                {
+                    'id': av.id,
+                    'periodo': av.get_periodo_display(),
+                    'status': av.status,
+                    'nota_final': av.nota_final,
+                    'data_avaliacao': av.data_avaliacao.isoformat() if av.data_avaliacao else None,
+                }
+                for av in estagio.avaliacoes_relatorio
+            ]
+        }
+
+    # CA2 - Incluir horas cumpridas
+    if opcoes.get('horas') and aluno:
+        horas = agregados['horas'].get(aluno.id, {})
+        dados['horas'] = {
+            'total_registros': horas.get('total_registros', 0),
+            'total_horas': horas.get('total_horas') or 0,
+            'carga_horaria_estagio': estagio.carga_horaria,
+        }
+
+    return dados
+
+
+def montar_relatorio(estagios, opcoes):
+    """
+    Lista de dados dos estágios e resumo (total, por status, por empresa).
+
+    Executa no máximo seis consultas, qualquer que seja o número de estágios.
+    """
+    lista = carregar_estagios(estagios, opcoes)
+    estagio_ids = [e.id for e in lista]
+    aluno_ids = {e.aluno_solicitante_id for e in lista if e.aluno_solicitante_id}
+
+    agregados = {'documentos': {}, 'avaliacoes': {}, 'horas': {}}
+    if estagio_ids and opcoes.get('documentos'):
+        agregados['documentos'] = agregados_documentos(estagio_ids)
+    if estagio_ids and opcoes.get('avaliacoes'):
+        agregados['avaliacoes'] = agregados_avaliacoes(estagio_ids)
+    if aluno_ids and opcoes.get('horas'):
+        agregados['horas'] = agregados_horas(aluno_ids)
+
+    por_status_codigo = Counter(e.status for e in lista)
+    por_status = {
+        nome: por_status_codigo[codigo]
+        for codigo, nome in Estagio.STATUS_CHOICES
+        if por_status_codigo[codigo] > 0
+    }
+    por_empresa = {}
+    dados = []
+    for estagio in lista:
+        dados.append(montar_dados_estagio(estagio, opcoes, agregados))
+        empresa_nome = estagio.empresa.razao_social
+        por_empresa[empresa_nome] = por_empresa.get(empresa_nome, 0) + 1
+
+    resumo = {
+        'total': len(lista),
+        'por_status': por_status,
+        'por_empresa': por_empresa,
+    }
+    return dados, resumo
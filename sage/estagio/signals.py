@@ -0,0 +1,180 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from estagio import armazenamento, criterios_cache, pendencias
+from estagio.models import (
+    Aluno, Atividade, Avaliacao, CriterioAvaliacao, Documento, Estagio, EstagioRemovido, HorasCumpridas,
+    NotaCriterio, Notificacao,
+)
+from estagio.notificacoes_broker import get_broker
+from estagio.versao_dados import escopos_da_instancia, incrementar_versoes
+from users.models import Usuario
+
+
+def canal_notificacoes(usuario_id):
+    """Canal do broker com os eventos de notificação de um usuário"""
+    return f"usuario:{usuario_id}"
+
+
+def publicar_contagem_notificacoes(usuario_id):
+    """Publica o contador de não lidas do usuário para os clientes SSE"""
+    count = Usuario.objects.filter(pk=usuario_id).values_list('notificacoes_nao_lidas', flat=True).first()
+    if count is not None:
+        get_broker().publish(canal_notificacoes(usuario_id), {'count': count})
+
+
+def agendar_publicacao_contagem(usuario_id):
+    """Publica a nova contagem somente após o commit da transação"""
+    if usuario_id:
+        transaction.on_commit(lambda: publicar_contagem_notificacoes(usuario_id))
+
+
+@receiver(post_save, sender=Notificacao)
+def notificacao_criada(sender, instance, created, **kwargs):
+    """Incrementa o contador de não lidas na mesma transação da criação"""
+    if not created or instance.lida or not instance.usuario_id:
+        return
+    Usuario.objects.filter(pk=instance.usuario_id).update(
+        notificacoes_nao_lidas=F('notificacoes_nao_lidas') + 1
+    )
+    agendar_publicacao_contagem(instance.usuario_id)
+
+
+@receiver(post_delete, sender=Notificacao)
+def notificacao_excluida(sender, instance, **kwargs):
+    """Decrementa o contador se a notificação excluída ainda não havia sido lida"""
+    if instance.lida or not instance.usuario_id:
+        return
+    Usuario.objects.filter(pk=instance.usuario_id, notificacoes_nao_lidas__gt=0).update(
+        notificacoes_nao_lidas=F('notificacoes_nao_lidas') - 1
+    )
+    agendar_publicacao_contagem(instance.usuario_id)
+
+
+@receiver(post_save, sender=Estagio)
+@receiver(post_save, sender=Documento)
+@receiver(post_save, sender=Avaliacao)
+@receiver(post_save, sender=Atividade)
+@receiver(post_save, sender=HorasCumpridas)
+@receiver(post_save, sender=NotaCriterio)
+@receiver(post_delete, sender=Estagio)
+@receiver(post_delete, sender=Documento)
+@receiver(post_delete, sender=Avaliacao)
+@receiver(post_delete, sender=Atividade)
+@receiver(post_delete, sender=HorasCumpridas)
+@receiver(post_delete, sender=NotaCriterio)
+def dados_painel_alterados(sender, instance, **kwargs):
+    """Invalida o ETag das APIs de polling dos escopos afetados pela alteração"""
+    if kwargs.get('raw'):
+        return
+    incrementar_versoes(escopos_da_instancia(instance))
+
+
+@receiver(pre_save, sender=Estagio)
+def estagio_mudou_de_escopo(sender, instance, raw=False, **kwargs):
+    """Registra tombstone para o supervisor/aluno que deixa de ver o estágio"""
+    if raw or instance.pk is None:
+        return
+    anterior = Estagio.objects.filter(pk=instance.pk).values('supervisor_id', 'aluno_solicitante_id').first()
+    if anterior is None:
+        return
+    supervisor_saiu = anterior['supervisor_id'] != instance.supervisor_id
+    aluno_saiu = anterior['aluno_solicitante_id'] != instance.aluno_solicitante_id
+    if supervisor_saiu or aluno_saiu:
+        EstagioRemovido.objects.create(
+            estagio_id=instance.pk,
+            supervisor_id=anterior['supervisor_id'] if supervisor_saiu else None,
+            aluno_solicitante_id=anterior['aluno_solicitante_id'] if aluno_saiu else None,
+        )
+
+
+@receiver(post_delete, sender=Estagio)
+def estagio_excluido(sender, instance, **kwargs):
+    """Tombstone para que clientes em sincronização incremental removam o estágio"""
+    EstagioRemovido.objects.create(
+        estagio_id=instance.pk,
+        supervisor_id=instance.supervisor_id,
+        aluno_solicitante_id=instance.aluno_solicitante_id,
+    )
+
+
+@receiver(post_delete, sender=Documento)
+def documento_excluido(sender, instance, **kwargs):
+    """Excluída a versão mais recente, a anterior volta a ser a mais recente da cadeia"""
+    if instance.is_latest and instance.parent_id:
+        Documento.objects.filter(pk=instance.parent_id, versions__isnull=True).update(is_latest=True)
+
+
+@receiver(post_save, sender=Documento)
+def documento_referencia_arquivo(sender, instance, created, raw=False, **kwargs):
+    """Conta o novo documento nas referências do arquivo endereçado por conteúdo"""
+    if created and not raw and instance.arquivo:
+        armazenamento.registrar_referencia(instance.arquivo.name)
+
+
+@receiver(post_delete, sender=Documento)
+def documento_libera_arquivo(sender, instance, **kwargs):
+    """Remove o arquivo do disco quando nenhum outro documento o referencia"""
+    if instance.arquivo:
+        armazenamento.liberar_referencia(instance.arquivo.name)
+
+
+# ---------------------------------------------------------------------------
+# Pendências materializadas (estagio/pendencias.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Estagio)
+def pendencias_estagio_salvo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pendencias.sincronizar_estagios([instance.pk])
+
+
+@receiver(post_save, sender=Documento)
+def pendencias_documento_salvo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pendencias.sincronizar_documentos([instance.pk])
+
+
+@receiver(post_save, sender=Avaliacao)
+def pendencias_avaliacao_salva(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pendencias.sincronizar_avaliacoes([instance.pk])
+
+
+@receiver(post_save, sender=NotaCriterio)
+@receiver(post_delete, sender=NotaCriterio)
+def pendencias_nota_alterada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pendencias.sincronizar_avaliacoes([instance.avaliacao_id])
+
+
+@receiver(post_save, sender=CriterioAvaliacao)
+@receiver(post_delete, sender=CriterioAvaliacao)
+def pendencias_criterio_alterado(sender, instance, raw=False, **kwargs):
+    """Critérios obrigatórios mudam a completude de todas as avaliações abertas"""
+    if not raw:
+        pendencias.sincronizar_avaliacoes()
+
+
+@receiver(post_save, sender=CriterioAvaliacao)
+@receiver(post_delete, sender=CriterioAvaliacao)
+def criterios_cache_alterado(sender, instance, **kwargs):
+    # De novo após o commit: um processo pode ter guardado os critérios antigos na nova versão
+    criterios_cache.invalidar()
+    transaction.on_commit(criterios_cache.invalidar)
+
+
+@receiver(post_save, sender=Aluno)
+def pendencias_aluno_salvo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pendencias.sincronizar_aluno(instance)
+
+
+@receiver(post_delete, sender=Estagio)
+@receiver(post_delete, sender=Documento)
+@receiver(post_delete, sender=Avaliacao)
+def pendencias_referencia_excluida(sender, instance, **kwargs):
+    referencia_tipo = {Estagio: 'estagio', Documento: 'documento', Avaliacao: 'avaliacao'}[sender]
+    pendencias.remover_referencia(referencia_tipo, instance.pk)
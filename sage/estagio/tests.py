@@ -529,6 +529,904 @@ class EstagioDetalheViewTest(TestCase):
         self.assertContains(response, 'Supervisor Teste')
 
 
+class DocumentoCadeiaVersoesTest(TestCase):
+    """Cadeia de versões materializada em Documento (root, depth, is_latest)"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.instituicao = Instituicao.objects.create(
+            nome="Universidade Versões", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        self.empresa = Empresa.objects.create(
+            razao_social="Empresa Versões", cnpj="11222333000144", numero=2, bairro="Centro", rua="Av"
+        )
+        self.usuario_aluno = Usuario.objects.create_user(
+            username='aluno_versoes@test.com', email='aluno_versoes@test.com', password='senha123', tipo='aluno'
+        )
+        self.supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor_versoes@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Versões", contato="11988888888", cargo="Gerente", empresa=self.empresa
+        )
+        self.coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_versoes@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Versões", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977777777", instituicao=self.instituicao
+        )
+        self.estagio = Estagio.objects.create(
+            titulo="Estágio Versões", cargo="Dev", empresa=self.empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+        )
+        self.aluno = Aluno.objects.create(
+            usuario=self.usuario_aluno, nome="Aluno Versões", matricula="20239999",
+            contato="aluno_versoes@test.com", instituicao=self.instituicao, estagio=self.estagio
+        )
+
+    def _documento(self, parent=None, versao=1.0, status='enviado'):
+        return Documento.objects.create(
+            estagio=self.estagio, supervisor=self.supervisor, coordenador=self.coordenador,
+            data_envio=date.today(), versao=versao, nome_arquivo=f"termo_v{versao}.pdf",
+            tipo="termo_compromisso", status=status, parent=parent,
+        )
+
+    def _cadeia(self):
+        v1 = self._documento()
+        v2 = self._documento(parent=v1, versao=2.0)
+        v3 = self._documento(parent=v2, versao=3.0)
+        return v1, v2, v3
+
+    def test_nova_versao_materializa_raiz_profundidade_e_ultima(self):
+        v1, v2, v3 = self._cadeia()
+        v1.refresh_from_db()
+        v2.refresh_from_db()
+
+        self.assertEqual([v1.root_id, v2.root_id, v3.root_id], [v1.pk] * 3)
+        self.assertEqual([v1.depth, v2.depth, v3.depth], [0, 1, 2])
+        self.assertEqual([v1.is_latest, v2.is_latest, v3.is_latest], [False, False, True])
+
+    def test_cadeia_recuperada_com_uma_consulta(self):
+        v1, v2, v3 = self._cadeia()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(v3.get_history(), [v1, v2, v3])
+        with self.assertNumQueries(1):
+            self.assertEqual(v2.get_full_history(), [v1, v2, v3])
+        with self.assertNumQueries(1):
+            self.assertEqual(v1.get_latest(), v3)
+        with self.assertNumQueries(1):
+            self.assertEqual(v3.get_root(), v1)
+        with self.assertNumQueries(0):
+            self.assertTrue(v3.is_latest_version())
+
+    def test_excluir_ultima_versao_restaura_a_anterior(self):
+        v1, v2, v3 = self._cadeia()
+
+        v3.delete()
+
+        v2.refresh_from_db()
+        self.assertTrue(v2.is_latest)
+        self.assertFalse(Documento.objects.get(pk=v1.pk).is_latest)
+
+    def test_reenviar_documento_cria_versao_na_cadeia(self):
+        original = self._documento(status='reprovado')
+        self.client.login(username='aluno_versoes@test.com', password='senha123')
+
+        self.client.post(reverse('reenviar_documento', args=[original.id]), {
+            'arquivo': SimpleUploadedFile('termo_corrigido.pdf', b'%PDF-1.4 corrigido', content_type='application/pdf'),
+        })
+
+        nova = Documento.objects.get(parent=original)
+        self.assertEqual((nova.root_id, nova.depth, nova.is_latest), (original.pk, 1, True))
+        self.assertFalse(Documento.objects.get(pk=original.pk).is_latest)
+
+        response = self.client.get(reverse('listar_documentos'))
+        self.assertEqual([doc.pk for doc in response.context['documentos']], [nova.pk])
+
+    def test_migracao_preenche_cadeias_existentes(self):
+        import importlib
+        from django.apps import apps
+
+        v1, v2, v3 = self._cadeia()
+        avulso = self._documento(versao=1.0)
+        Documento.objects.update(root=None, depth=0, is_latest=True)
+
+        migracao = importlib.import_module('estagio.migrations.0019_documento_cadeia_versoes')
+        migracao.preencher_cadeias(apps, None)
+
+        valores = dict(
+            (pk, (root_id, depth, is_latest))
+            for pk, root_id, depth, is_latest in Documento.objects.values_list('pk', 'root_id', 'depth', 'is_latest')
+        )
+        self.assertEqual(valores[v1.pk], (v1.pk, 0, False))
+        self.assertEqual(valores[v2.pk], (v1.pk, 1, False))
+        self.assertEqual(valores[v3.pk], (v1.pk, 2, True))
+        self.assertEqual(valores[avulso.pk], (avulso.pk, 0, True))
+
+
+class ValidacaoDocumentoHistoricoTest(TestCase):
+    """Validações do supervisor registradas apenas em DocumentoHistorico"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.instituicao = Instituicao.objects.create(
+            nome="Universidade Validação", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        self.empresa = Empresa.objects.create(
+            razao_social="Empresa Validação", cnpj="11222333000155", numero=2, bairro="Centro", rua="Av"
+        )
+        self.usuario_supervisor = Usuario.objects.create_user(
+            username='supervisor_validacao@test.com', password='senha123', tipo='supervisor'
+        )
+        self.supervisor = Supervisor.objects.create(
+            usuario=self.usuario_supervisor, nome="Supervisor Validação", contato="11988888888",
+            cargo="Gerente", empresa=self.empresa
+        )
+        self.coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_validacao@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Validação", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977777777", instituicao=self.instituicao
+        )
+        self.estagio = Estagio.objects.create(
+            titulo="Estágio Validação", cargo="Dev", empresa=self.empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+        )
+        Aluno.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='aluno_validacao@test.com', email='aluno_validacao@test.com',
+                password='senha123', tipo='aluno'
+            ),
+            nome="Aluno Validação", matricula="20238888", contato="aluno_validacao@test.com",
+            instituicao=self.instituicao, estagio=self.estagio
+        )
+
+    def _documento(self, parent=None, versao=1.0, status='enviado', arquivo=None):
+        return Documento.objects.create(
+            estagio=self.estagio, supervisor=self.supervisor, coordenador=self.coordenador,
+            data_envio=date.today(), versao=versao, nome_arquivo=f"termo_v{versao}.pdf",
+            tipo="termo_compromisso", status=status, parent=parent,
+            arquivo=arquivo or SimpleUploadedFile(f"termo_v{versao}.pdf", b"%PDF-1.4 conteudo"),
+        )
+
+    def _pseudo_versao(self, doc, status, observacoes=None):
+        """Linha gravada pelas views antigas a cada validação"""
+        return Documento.objects.create(
+            estagio=doc.estagio, supervisor=doc.supervisor, coordenador=doc.coordenador,
+            data_envio=date.today(), versao=doc.versao, nome_arquivo=doc.nome_arquivo, tipo=doc.tipo,
+            arquivo=doc.arquivo, parent=doc, status=status, observacoes_supervisor=observacoes,
+        )
+
+    def test_validacao_nao_cria_documento(self):
+        from estagio.validacao_documentos import validar_documento
+
+        doc = self._documento()
+        validar_documento(doc, 'ajustes_solicitados', self.usuario_supervisor, '  Corrigir assinatura ')
+
+        doc.refresh_from_db()
+        self.assertEqual(Documento.objects.count(), 1)
+        self.assertTrue(doc.is_latest)
+        self.assertEqual(doc.status, 'ajustes_solicitados')
+        self.assertEqual(doc.observacoes_supervisor, 'Corrigir assinatura')
+        historico = doc.historico.get()
+        self.assertEqual(historico.acao, 'ajustes_solicitados')
+        self.assertEqual(historico.usuario, self.usuario_supervisor)
+        self.assertEqual(historico.observacoes, 'Corrigir assinatura')
+        self.assertTrue(Notificacao.objects.filter(referencia=f"doc_ajustes_solicitados_{doc.pk}").exists())
+
+    def test_status_invalido(self):
+        from estagio.validacao_documentos import validar_documento
+
+        doc = self._documento()
+        with self.assertRaises(ValueError):
+            validar_documento(doc, 'finalizado', self.usuario_supervisor)
+        self.assertFalse(DocumentoHistorico.objects.exists())
+
+    def test_avaliar_documento_registra_historico(self):
+        doc = self._documento()
+        self.client.login(username='supervisor_validacao@test.com', password='senha123')
+
+        self.client.post(reverse('avaliar_documento', args=[doc.pk]), {'acao': 'aprovar'})
+
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, 'aprovado')
+        self.assertEqual(doc.aprovado_por, self.usuario_supervisor)
+        self.assertEqual(Documento.objects.count(), 1)
+        self.assertEqual(list(doc.historico.values_list('acao', flat=True)), ['aprovado'])
+
+    def test_colapsar_pseudo_versoes(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        v1 = self._documento()
+        ajustes = self._pseudo_versao(v1, 'ajustes_solicitados', 'Falta assinatura')
+        # reenvio do aluno feito a partir da pseudo-versão
+        v2 = self._documento(parent=ajustes, versao=2.0)
+        aprovacao = self._pseudo_versao(v2, 'aprovado')
+        DocumentoHistorico.objects.create(documento=aprovacao, acao='finalizado')
+
+        saida = StringIO()
+        call_command('colapsar_pseudo_versoes', '--dry-run', stdout=saida)
+        self.assertIn('Pseudo-versões encontradas: 2', saida.getvalue())
+        self.assertEqual(Documento.objects.count(), 4)
+
+        call_command('colapsar_pseudo_versoes', '--batch-size', '1', stdout=StringIO())
+
+        self.assertEqual(set(Documento.objects.values_list('id', flat=True)), {v1.pk, v2.pk})
+        v1.refresh_from_db()
+        v2.refresh_from_db()
+        self.assertEqual(v2.parent_id, v1.pk)
+        self.assertEqual([v1.depth, v2.depth], [0, 1])
+        self.assertEqual([v1.is_latest, v2.is_latest], [False, True])
+        self.assertEqual(v2.status, 'aprovado')
+        self.assertEqual(v2.get_history(), [v1, v2])
+
+        ajuste = v1.historico.get()
+        self.assertEqual((ajuste.acao, ajuste.observacoes), ('ajustes_solicitados', 'Falta assinatura'))
+        self.assertEqual(ajuste.usuario, self.usuario_supervisor)
+        self.assertEqual(ajuste.data_hora, ajustes.created_at)
+        self.assertEqual(set(v2.historico.values_list('acao', flat=True)), {'aprovado', 'finalizado'})
+        # o arquivo compartilhado com as pseudo-versões continua disponível
+        self.assertTrue(v1.arquivo.storage.exists(v1.arquivo.name))
+
+
+class ArmazenamentoConteudoTest(TestCase):
+    """Arquivos de documentos endereçados por SHA-256, deduplicados e com contagem de referências"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Arquivos", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            razao_social="Empresa Arquivos", cnpj="11222333000166", numero=2, bairro="Centro", rua="Av"
+        )
+        self.supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor_arquivos@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Arquivos", contato="11988888888", cargo="Gerente", empresa=empresa
+        )
+        self.coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_arquivos@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Arquivos", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977777777", instituicao=instituicao
+        )
+        self.estagio = Estagio.objects.create(
+            titulo="Estágio Arquivos", cargo="Dev", empresa=empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+        )
+
+    def _documento(self, arquivo, versao=1.0):
+        return Documento.objects.create(
+            estagio=self.estagio, supervisor=self.supervisor, coordenador=self.coordenador,
+            data_envio=date.today(), versao=versao, nome_arquivo="termo.pdf",
+            tipo="termo_compromisso", arquivo=arquivo,
+        )
+
+    def test_upload_gravado_pelo_hash_e_deduplicado(self):
+        import hashlib
+        import os
+        from estagio.models import ArquivoConteudo
+
+        conteudo = b"%PDF-1.4 termo de compromisso"
+        hash_hex = hashlib.sha256(conteudo).hexdigest()
+        d1 = self._documento(SimpleUploadedFile("termo.pdf", conteudo))
+        d2 = self._documento(SimpleUploadedFile("termo_reenvio.PDF", conteudo), versao=2.0)
+
+        esperado = f"documentos/{hash_hex[:2]}/{hash_hex[2:4]}/{hash_hex}.pdf"
+        self.assertEqual([d1.arquivo.name, d2.arquivo.name], [esperado, esperado])
+        with d1.arquivo.open('rb') as f:
+            self.assertEqual(f.read(), conteudo)
+        arquivo = ArquivoConteudo.objects.get()
+        self.assertEqual((arquivo.nome, arquivo.hash, arquivo.tamanho, arquivo.referencias),
+                         (esperado, hash_hex, len(conteudo), 2))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, '.envios')), [])
+
+    def test_arquivo_removido_somente_sem_referencias(self):
+        import os
+        from estagio.armazenamento import limpar_arquivos_sem_referencia
+        from estagio.models import ArquivoConteudo
+
+        d1 = self._documento(SimpleUploadedFile("termo.pdf", b"conteudo compartilhado"))
+        d2 = self._documento(SimpleUploadedFile("termo.pdf", b"conteudo compartilhado"), versao=2.0)
+        caminho = d1.arquivo.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            d2.delete()
+        self.assertTrue(os.path.exists(caminho))
+        self.assertEqual(ArquivoConteudo.objects.get().referencias, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            d1.delete()
+        # Sem referências o arquivo espera a carência; só a varredura o apaga
+        self.assertTrue(os.path.exists(caminho))
+        arquivo = ArquivoConteudo.objects.get()
+        self.assertEqual(arquivo.referencias, 0)
+        self.assertIsNotNone(arquivo.sem_referencias_desde)
+
+        self.assertEqual(limpar_arquivos_sem_referencia(), (0, 0))
+        self.assertTrue(os.path.exists(caminho))
+
+        ArquivoConteudo.objects.update(sem_referencias_desde=timezone.now() - timedelta(hours=25))
+        self.assertEqual(limpar_arquivos_sem_referencia(), (1, 0))
+        self.assertFalse(os.path.exists(caminho))
+        self.assertFalse(ArquivoConteudo.objects.exists())
+
+    def test_conteudo_reaproveitado_durante_a_carencia_nao_e_apagado(self):
+        import os
+        from django.core.files.base import ContentFile
+        from estagio.armazenamento import armazenamento_documentos, limpar_arquivos_sem_referencia
+        from estagio.models import ArquivoConteudo
+
+        d1 = self._documento(SimpleUploadedFile("termo.pdf", b"conteudo reenviado"))
+        caminho = d1.arquivo.path
+        d1.delete()
+        ArquivoConteudo.objects.update(sem_referencias_desde=timezone.now() - timedelta(hours=25))
+
+        # Upload do mesmo conteúdo gravado antes do documento existir: o registro recomeça a carência
+        nome = armazenamento_documentos().save('documentos/termo.pdf', ContentFile(b"conteudo reenviado"))
+        self.assertEqual(limpar_arquivos_sem_referencia(), (0, 0))
+        self.assertTrue(os.path.exists(caminho))
+
+        self._documento(nome, versao=2.0)
+        arquivo = ArquivoConteudo.objects.get()
+        self.assertEqual((arquivo.referencias, arquivo.sem_referencias_desde), (1, None))
+
+    def test_varredura_confere_documentos_e_registra_orfaos(self):
+        import os
+        import time
+        from django.core.files.base import ContentFile
+        from django.db import transaction
+        from estagio.armazenamento import armazenamento_documentos, limpar_arquivos_sem_referencia
+        from estagio.models import ArquivoConteudo
+
+        # Documento gravado sem os sinais: a varredura corrige a contagem em vez de apagar
+        d1 = self._documento(SimpleUploadedFile("termo.pdf", b"conteudo sem sinal"))
+        ArquivoConteudo.objects.update(referencias=0, sem_referencias_desde=timezone.now() - timedelta(hours=25))
+        self.assertEqual(limpar_arquivos_sem_referencia(), (0, 0))
+        self.assertTrue(os.path.exists(d1.arquivo.path))
+        self.assertEqual(ArquivoConteudo.objects.get().referencias, 1)
+
+        # Upload cuja transação foi desfeita deixa o arquivo no disco sem registro
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            nome = armazenamento_documentos().save('documentos/termo.pdf', ContentFile(b"upload desfeito"))
+            raise RuntimeError
+        caminho = armazenamento_documentos().path(nome)
+        self.assertFalse(ArquivoConteudo.objects.filter(nome=nome).exists())
+        antigo = time.time() - 25 * 3600
+        os.utime(caminho, (antigo, antigo))
+
+        self.assertEqual(limpar_arquivos_sem_referencia(), (0, 1))
+        self.assertEqual(ArquivoConteudo.objects.get(nome=nome).referencias, 0)
+        self.assertTrue(os.path.exists(caminho))
+
+        ArquivoConteudo.objects.filter(nome=nome).update(sem_referencias_desde=timezone.now() - timedelta(hours=25))
+        self.assertEqual(limpar_arquivos_sem_referencia(), (1, 0))
+        self.assertFalse(os.path.exists(caminho))
+        self.assertTrue(os.path.exists(d1.arquivo.path))
+
+    def test_comando_migra_arquivos_legados(self):
+        from io import StringIO
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from django.core.management import call_command
+        from estagio.models import ArquivoConteudo
+
+        legado = FileSystemStorage(location=self.media_root)
+        legado.save('documentos/antigo.pdf', ContentFile(b"arquivo antigo"))
+        d1 = self._documento('documentos/antigo.pdf')
+        d2 = self._documento('documentos/antigo.pdf', versao=2.0)
+        d3 = self._documento('documentos/sumido.pdf', versao=3.0)
+
+        saida = StringIO()
+        call_command('migrar_armazenamento_documentos', '--dry-run', stdout=saida)
+        self.assertIn('Arquivos a migrar: 2', saida.getvalue())
+        self.assertTrue(legado.exists('documentos/antigo.pdf'))
+
+        saida = StringIO()
+        call_command('migrar_armazenamento_documentos', '--batch-size', '1', stdout=saida)
+        self.assertIn('Arquivos migrados: 1 | documentos atualizados: 2 | ausentes: 1', saida.getvalue())
+
+        d1.refresh_from_db()
+        d2.refresh_from_db()
+        d3.refresh_from_db()
+        self.assertRegex(d1.arquivo.name, r'^documentos/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        self.assertEqual(d2.arquivo.name, d1.arquivo.name)
+        self.assertEqual(d3.arquivo.name, 'documentos/sumido.pdf')
+        self.assertFalse(legado.exists('documentos/antigo.pdf'))
+        self.assertEqual(ArquivoConteudo.objects.get(nome=d1.arquivo.name).referencias, 2)
+        with d1.arquivo.open('rb') as f:
+            self.assertEqual(f.read(), b"arquivo antigo")
+
+
+class DownloadDocumentoTest(TestCase):
+    """Download de documentos com ETag, Last-Modified, Range e envio delegado ao proxy"""
+
+    CONTEUDO = b"%PDF-1.4 0123456789"
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Download", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            razao_social="Empresa Download", cnpj="11222333000177", numero=2, bairro="Centro", rua="Av"
+        )
+        supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor_download@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Download", contato="11988888888", cargo="Gerente", empresa=empresa
+        )
+        Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='outro_supervisor_download@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Outro Supervisor", contato="11988887777", cargo="Gerente", empresa=empresa
+        )
+        coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_download@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Download", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977777777", instituicao=instituicao
+        )
+        estagio = Estagio.objects.create(
+            titulo="Estágio Download", cargo="Dev", empresa=empresa, supervisor=supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+        )
+        Aluno.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='aluno_download@test.com', email='aluno_download@test.com',
+                password='senha123', tipo='aluno'
+            ),
+            nome="Aluno Download", matricula="20237777", contato="aluno_download@test.com",
+            instituicao=instituicao, estagio=estagio
+        )
+        self.documento = Documento.objects.create(
+            estagio=estagio, supervisor=supervisor, coordenador=coordenador,
+            data_envio=date.today(), versao=1.0, nome_arquivo="Termo de Compromisso.pdf",
+            tipo="termo_compromisso", arquivo=SimpleUploadedFile("termo.pdf", self.CONTEUDO),
+        )
+        self.url = reverse('download_documento', args=[self.documento.pk])
+
+    def _login(self, username):
+        self.client.login(username=username, password='senha123')
+
+    def test_download_completo_com_validadores(self):
+        import hashlib
+
+        self._login('aluno_download@test.com')
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTEUDO)
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.CONTEUDO).hexdigest()}"')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+        revalidacao = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidacao.status_code, 304)
+        self.assertEqual(revalidacao['ETag'], response['ETag'])
+        por_data = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(por_data.status_code, 304)
+
+    def test_range(self):
+        self._login('aluno_download@test.com')
+        tamanho = len(self.CONTEUDO)
+
+        parcial = self.client.get(self.url, HTTP_RANGE='bytes=9-12')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(b''.join(parcial.streaming_content), self.CONTEUDO[9:13])
+        self.assertEqual(parcial['Content-Range'], f'bytes 9-12/{tamanho}')
+        self.assertEqual(parcial['Content-Length'], '4')
+
+        sufixo = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(sufixo.streaming_content), self.CONTEUDO[-3:])
+
+        retomada = self.client.get(self.url, HTTP_RANGE='bytes=15-', HTTP_IF_RANGE=parcial['ETag'])
+        self.assertEqual(retomada.status_code, 206)
+        self.assertEqual(b''.join(retomada.streaming_content), self.CONTEUDO[15:])
+
+        fora = self.client.get(self.url, HTTP_RANGE=f'bytes={tamanho}-')
+        self.assertEqual(fora.status_code, 416)
+        self.assertEqual(fora['Content-Range'], f'bytes */{tamanho}')
+
+        # If-Range desatualizado: o arquivo vai inteiro
+        alterado = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"outro"')
+        self.assertEqual(alterado.status_code, 200)
+        self.assertEqual(b''.join(alterado.streaming_content), self.CONTEUDO)
+
+    def test_envio_delegado_ao_proxy(self):
+        self._login('aluno_download@test.com')
+        nome = self.documento.arquivo.name
+
+        with self.settings(DOCUMENTOS_DOWNLOAD_BACKEND='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/media-protegida/{nome}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+        with self.settings(DOCUMENTOS_DOWNLOAD_BACKEND='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.documento.arquivo.path)
+
+    def test_visualizacao_supervisor_e_coordenador(self):
+        supervisor_url = reverse('supervisor:arquivo_documento', args=[self.documento.pk])
+        coordenador_url = reverse('coordenador:arquivo_documento', args=[self.documento.pk])
+
+        self._login('supervisor_download@test.com')
+        response = self.client.get(supervisor_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(b''.join(response.streaming_content), self.CONTEUDO)
+        baixar = self.client.get(supervisor_url, {'download': '1'})
+        self.assertTrue(baixar['Content-Disposition'].startswith('attachment'))
+
+        self._login('outro_supervisor_download@test.com')
+        self.assertEqual(self.client.get(supervisor_url).status_code, 404)
+
+        self._login('coordenador_download@test.com')
+        response = self.client.get(coordenador_url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTEUDO[:4])
+
+
+class DossieEstagioTest(TestCase):
+    """ZIP em streaming com os documentos de um ou vários estágios"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Dossiê", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            razao_social="Empresa Dossiê", cnpj="11222333000188", numero=2, bairro="Centro", rua="Av"
+        )
+        self.supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor_dossie@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Dossiê", contato="11988888888", cargo="Gerente", empresa=empresa
+        )
+        self.coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_dossie@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Dossiê", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977777777", instituicao=instituicao
+        )
+        self.outro_coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='outro_coordenador_dossie@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Outro Coordenador", nome_curso="Direito", codigo_curso=2, carga_horaria=40,
+            contato="11977776666", instituicao=instituicao
+        )
+        self.estagio = Estagio.objects.create(
+            titulo="Estágio Dossiê", cargo="Dev", empresa=empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+            status='em_andamento',
+        )
+        self.outro_estagio = Estagio.objects.create(
+            titulo="Outro Estágio", cargo="QA", empresa=empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+            status='em_andamento',
+        )
+        Estagio.objects.create(
+            titulo="Estágio Reprovado", cargo="QA", empresa=empresa, supervisor=self.supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+            status='reprovado',
+        )
+
+        self.termo_v1 = self._documento(self.estagio, "termo.pdf", b"termo v1")
+        self._documento(self.estagio, "termo.pdf", b"termo v2", parent=self.termo_v1, versao=2.0)
+        self._documento(self.estagio, "relatorio.pdf", b"relatorio", tipo="relatorio_final")
+        self._documento(self.outro_estagio, "termo.pdf", b"outro termo")
+        self._documento(self.outro_estagio, "plano.pdf", b"de outro curso", coordenador=self.outro_coordenador)
+
+    def _documento(self, estagio, nome, conteudo, tipo="termo_compromisso", parent=None, versao=1.0,
+                   coordenador=None):
+        return Documento.objects.create(
+            estagio=estagio, supervisor=self.supervisor, coordenador=coordenador or self.coordenador,
+            data_envio=date.today(), versao=versao, nome_arquivo=nome, tipo=tipo, parent=parent,
+            arquivo=SimpleUploadedFile(nome, conteudo),
+        )
+
+    def _zip(self, response):
+        import io
+        import zipfile
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_dossie_com_versoes_mais_recentes(self):
+        import zipfile
+
+        self.client.login(username='coordenador_dossie@test.com', password='senha123')
+        arquivo = self._zip(self.client.get(reverse('dossie_estagio', args=[self.estagio.pk])))
+
+        self.assertEqual(sorted(arquivo.namelist()), ['relatorio_final/relatorio.pdf', 'termo_compromisso/termo.pdf'])
+        self.assertEqual(arquivo.read('termo_compromisso/termo.pdf'), b"termo v2")
+        self.assertEqual(arquivo.getinfo('relatorio_final/relatorio.pdf').compress_type, zipfile.ZIP_STORED)
+        self.assertIsNone(arquivo.testzip())
+
+    def test_dossie_com_historico_e_deflate(self):
+        import zipfile
+
+        self.client.login(username='supervisor_dossie@test.com', password='senha123')
+        url = reverse('dossie_estagio', args=[self.estagio.pk])
+        arquivo = self._zip(self.client.get(url, {'historico': '1', 'compressao': 'deflate'}))
+
+        self.assertEqual(arquivo.namelist(), [
+            'relatorio_final/v1_relatorio.pdf',
+            'termo_compromisso/v1_termo.pdf',
+            'termo_compromisso/v2_termo.pdf',
+        ])
+        self.assertEqual(arquivo.read('termo_compromisso/v1_termo.pdf'), b"termo v1")
+        self.assertEqual(arquivo.getinfo('termo_compromisso/v2_termo.pdf').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(self.client.get(url, {'compressao': 'bzip2'}).status_code, 400)
+
+    def test_dossie_sem_permissao(self):
+        self.client.login(username='outro_coordenador_dossie@test.com', password='senha123')
+
+        response = self.client.get(reverse('dossie_estagio', args=[self.estagio.pk]))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_dossie_em_lote_pelos_filtros_do_coordenador(self):
+        import os
+
+        os.remove(self.termo_v1.get_latest().arquivo.path)
+        self.client.login(username='coordenador_dossie@test.com', password='senha123')
+        arquivo = self._zip(self.client.get(reverse('dossie_estagios_lote'), {'status': 'em_andamento'}))
+
+        pasta = f'estagio_{self.estagio.pk}_estagio-dossie'
+        outra = f'estagio_{self.outro_estagio.pk}_outro-estagio'
+        self.assertEqual(arquivo.namelist(), [
+            f'{pasta}/relatorio_final/relatorio.pdf',
+            f'{outra}/termo_compromisso/termo.pdf',
+            'arquivos_ausentes.txt',
+        ])
+        self.assertEqual(arquivo.read('arquivos_ausentes.txt').decode(), f'{pasta}/termo_compromisso/termo.pdf\n')
+
+        self.client.login(username='supervisor_dossie@test.com', password='senha123')
+        self.assertEqual(self.client.get(reverse('dossie_estagios_lote')).status_code, 302)
+
+
+class UploadParcialTest(TestCase):
+    """Upload de documentos em partes, retomável, anexado ao fluxo de candidatura"""
+
+    def setUp(self):
+        import hashlib
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root, UPLOAD_PARCIAL_BLOCO_MAX=4)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        instituicao = Instituicao.objects.create(
+            nome="Universidade Upload", contato="1133334444", numero=1, bairro="Centro", rua="Rua"
+        )
+        empresa = Empresa.objects.create(
+            razao_social="Empresa Upload", cnpj="11222333000177", numero=2, bairro="Centro", rua="Av"
+        )
+        self.usuario_aluno = Usuario.objects.create_user(
+            username='aluno_upload@test.com', password='senha123', tipo='aluno'
+        )
+        Aluno.objects.create(
+            usuario=self.usuario_aluno, nome="Aluno Upload", matricula="20235555",
+            contato="11999995555", instituicao=instituicao
+        )
+        self.coordenador = CursoCoordenador.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='coordenador_upload@test.com', password='senha123', tipo='coordenador'
+            ),
+            nome="Coordenador Upload", nome_curso="Computação", codigo_curso=1, carga_horaria=40,
+            contato="11977775555", instituicao=instituicao
+        )
+        supervisor = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor_upload@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Upload", contato="11988885555", cargo="Gerente", empresa=empresa
+        )
+        self.vaga = Estagio.objects.create(
+            titulo="Vaga Upload", cargo="Dev", empresa=empresa, supervisor=supervisor,
+            data_inicio=date.today(), data_fim=date.today() + timedelta(days=90), carga_horaria=20,
+            status='aprovado', status_vaga='disponivel',
+        )
+
+        self.conteudo = b"%PDF-1.4 termo"
+        self.sha256 = hashlib.sha256(self.conteudo).hexdigest()
+        self.client.login(username='aluno_upload@test.com', password='senha123')
+
+    def _iniciar(self, **dados):
+        dados = {'nome_arquivo': 'termo.pdf', 'tamanho': len(self.conteudo), 'sha256': self.sha256, **dados}
+        return self.client.post(reverse('api_iniciar_upload'), dados, content_type='application/json')
+
+    def _parte(self, url, inicio, fim, **cabecalhos):
+        return self.client.put(
+            url, self.conteudo[inicio:fim + 1], content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {inicio}-{fim}/{len(self.conteudo)}', **cabecalhos},
+        )
+
+    def _enviar(self):
+        upload = self._iniciar().json()['upload']
+        for inicio in range(0, len(self.conteudo), upload['bloco_max']):
+            fim = min(inicio + upload['bloco_max'], len(self.conteudo)) - 1
+            self.assertEqual(self._parte(upload['url'], inicio, fim).status_code, 200)
+        return upload
+
+    def test_iniciar_valida_arquivo(self):
+        resposta = self._iniciar()
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()['upload']['offset'], 0)
+        self.assertEqual(self._iniciar(nome_arquivo='termo.exe').status_code, 400)
+        self.assertEqual(self._iniciar(tamanho=11 * 1024 * 1024).status_code, 400)
+        self.assertEqual(self._iniciar(sha256='abc').status_code, 400)
+
+    def test_parte_fora_de_ordem_devolve_offset(self):
+        url = self._iniciar().json()['upload']['url']
+        self.assertEqual(self._parte(url, 0, 3).status_code, 200)
+
+        resposta = self._parte(url, 8, 11)
+        self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(resposta.json()['offset'], 4)
+        # Reenvio da mesma parte após uma reconexão também é recusado
+        self.assertEqual(self._parte(url, 0, 3).status_code, 409)
+        self.assertEqual(self.client.get(url).json()['upload']['offset'], 4)
+
+    def test_checksum_da_parte(self):
+        url = self._iniciar().json()['upload']['url']
+        resposta = self._parte(url, 0, 3, **{'X-Checksum-Sha256': '0' * 64})
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(self.client.get(url).json()['upload']['offset'], 0)
+
+        # A parte recusada não deixa arquivo temporário para trás
+        import os
+        from estagio.models import UploadParcial
+        from estagio.uploads import caminho_parcial
+        caminho = caminho_parcial(UploadParcial.objects.get())
+        self.assertEqual(os.listdir(os.path.dirname(caminho)), [os.path.basename(caminho)])
+
+    def test_finalizar_confere_sha256(self):
+        from estagio.models import UploadParcial
+
+        upload = self._enviar()
+        UploadParcial.objects.filter(token=upload['id']).update(sha256='f' * 64)
+        resposta = self.client.post(reverse('api_finalizar_upload', args=[upload['id']]))
+        self.assertEqual(resposta.status_code, 400)
+        # Arquivo descartado: o envio recomeça do zero
+        self.assertEqual(self.client.get(upload['url']).json()['upload']['offset'], 0)
+
+    def test_finalizar_incompleto_devolve_409(self):
+        url = self._iniciar().json()['upload']['url']
+        self._parte(url, 0, 3)
+        resposta = self.client.post(reverse('api_finalizar_upload', args=[url.rstrip('/').split('/')[-1]]))
+        self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(resposta.json()['offset'], 4)
+
+    def test_upload_de_outro_usuario(self):
+        upload = self._iniciar().json()['upload']
+        Aluno.objects.create(
+            usuario=Usuario.objects.create_user(username='outro_upload@test.com', password='senha123', tipo='aluno'),
+            nome="Outro Aluno", matricula="20235556", contato="11999995556",
+            instituicao=Instituicao.objects.get(nome="Universidade Upload")
+        )
+        self.client.login(username='outro_upload@test.com', password='senha123')
+        self.assertEqual(self.client.get(upload['url']).status_code, 404)
+
+    def test_candidatura_com_upload_concluido(self):
+        import os
+        from estagio.models import UploadParcial
+        from estagio.uploads import caminho_parcial
+
+        upload = self._enviar()
+        resposta = self.client.post(reverse('api_finalizar_upload', args=[upload['id']]))
+        self.assertEqual(resposta.json()['upload']['status'], 'concluido')
+        caminho = caminho_parcial(UploadParcial.objects.get(token=upload['id']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('candidatar_vaga', args=[self.vaga.id]), {
+                'coordenador': self.coordenador.id, 'upload_id': upload['id'],
+            })
+        self.assertRedirects(resposta, reverse('historico_solicitacoes'), fetch_redirect_response=False)
+
+        documento = Documento.objects.get(estagio=self.vaga)
+        self.assertEqual(documento.nome_arquivo, 'termo.pdf')
+        with documento.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+        self.assertFalse(UploadParcial.objects.exists())
+        self.assertFalse(os.path.exists(caminho))
+
+    def test_candidatura_invalida_fecha_arquivo_do_upload(self):
+        from estagio.models import UploadParcial
+
+        upload = self._enviar()
+        self.client.post(reverse('api_finalizar_upload', args=[upload['id']]))
+
+        abertos = []
+
+        def abrir(*args, **kwargs):
+            arquivo = open(*args, **kwargs)
+            abertos.append(arquivo)
+            return arquivo
+
+        with patch('estagio.uploads.open', create=True, side_effect=abrir):
+            # Sem coordenador o formulário é inválido e a view retorna antes de descartar o upload
+            resposta = self.client.post(reverse('candidatar_vaga', args=[self.vaga.id]), {'upload_id': upload['id']})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(abertos), 1)
+        self.assertTrue(abertos[0].closed)
+        # Os arquivos do próprio request não são trocados
+        self.assertNotIn('arquivo', resposta.wsgi_request.FILES)
+        # O upload continua disponível para um novo envio do formulário
+        self.assertTrue(UploadParcial.objects.filter(token=upload['id'], status='concluido').exists())
+
+    def test_limpar_expirados(self):
+        from django.core.management import call_command
+        from estagio.models import UploadParcial
+
+        self._iniciar()
+        UploadParcial.objects.update(atualizado_em=timezone.now() - timedelta(days=2))
+        call_command('limpar_uploads_parciais', stdout=MagicMock())
+        self.assertFalse(UploadParcial.objects.exists())
+
+
 class CadastroAlunoViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -1043,6 +1941,98 @@ class NotificacaoPrazosProximosTest(TestCase):
         # Verifica que foi enviada para o aluno
         self.assertEqual(notificacao.destinatario, self.aluno.contato)
 
+    def _criar_documentos_prazo(self, quantidade, dias=2):
+        Documento.objects.bulk_create([
+            Documento(
+                estagio=self.estagio,
+                supervisor=self.supervisor,
+                coordenador=self.coordenador,
+                data_envio=date.today(),
+                versao=1.0,
+                nome_arquivo=f"doc_{i}.pdf",
+                tipo="relatorio",
+                status='ajustes_solicitados',
+                prazo_limite=date.today() + timedelta(days=dias),
+                enviado_por=self.usuario_aluno
+            )
+            for i in range(quantidade)
+        ])
+
+    def test_varredura_em_lote_consultas_constantes(self):
+        """A varredura não executa consultas por documento e mantém o contador de não lidas"""
+        from estagio.models import EmailOutbox
+        from estagio.prazos import escanear_prazos_proximos
+
+        self._criar_documentos_prazo(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(8) as ctx_pequeno:
+                escanear_prazos_proximos(dias_alerta=3)
+        Notificacao.objects.all().delete()
+        EmailOutbox.objects.all().delete()
+
+        self._criar_documentos_prazo(20)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(len(ctx_pequeno.captured_queries)):
+                resultado = escanear_prazos_proximos(dias_alerta=3)
+
+        self.assertEqual(resultado.total, 23)
+        self.assertEqual(EmailOutbox.objects.count(), 23)
+        self.assertTrue(all(n.usuario_id == self.usuario_aluno.id for n in resultado.notificacoes))
+        self.usuario_aluno.refresh_from_db()
+        self.assertEqual(self.usuario_aluno.notificacoes_nao_lidas, 23)
+
+    def test_varredura_batch_size_divide_lotes(self):
+        """Lotes menores que a janela geram o mesmo resultado"""
+        from estagio.prazos import escanear_prazos_proximos
+
+        self._criar_documentos_prazo(5)
+        resultado = escanear_prazos_proximos(dias_alerta=3, batch_size=2)
+        self.assertEqual(resultado.documentos, 5)
+        self.assertEqual(Notificacao.objects.count(), 5)
+
+    def test_varredura_dry_run_nao_grava(self):
+        """--dry-run lista os alertas sem gravar notificações"""
+        from estagio.models import EmailOutbox
+        from estagio.prazos import escanear_prazos_proximos
+
+        self._criar_documentos_prazo(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = escanear_prazos_proximos(dias_alerta=3, dry_run=True)
+        self.assertEqual(resultado.total, 2)
+        self.assertIsNone(resultado.notificacoes[0].pk)
+        self.assertEqual(Notificacao.objects.count(), 0)
+        self.assertEqual(EmailOutbox.objects.count(), 0)
+
+    def test_varredura_incremental_considera_apenas_alterados(self):
+        """A marca d'água restringe a próxima execução aos documentos alterados"""
+        from estagio.prazos import escanear_prazos_proximos
+
+        self._criar_documentos_prazo(3)
+        primeira = escanear_prazos_proximos(dias_alerta=3, incremental=True)
+        self.assertEqual(primeira.documentos, 3)
+
+        segunda = escanear_prazos_proximos(dias_alerta=3, incremental=True)
+        self.assertEqual(segunda.documentos, 0)
+
+        doc = Documento.objects.order_by('id').first()
+        doc.prazo_limite = date.today() + timedelta(days=1)
+        doc.save()
+        terceira = escanear_prazos_proximos(dias_alerta=3, incremental=True)
+        self.assertEqual(terceira.documentos, 1)
+        self.assertEqual(terceira.total, 1)
+
+    def test_comando_notificar_prazos(self):
+        """O comando reporta total e tempo da varredura"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        self._criar_documentos_prazo(2)
+        saida = StringIO()
+        call_command('notificar_prazos', '--dias', '3', '--batch-size', '1', stdout=saida)
+        self.assertIn('Total de notificações enviadas: 2', saida.getvalue())
+        self.assertIn('tempo:', saida.getvalue())
+        self.assertEqual(Notificacao.objects.count(), 2)
+
 
 # ==================== TESTES DO PAINEL DE STATUS DE ESTÁGIOS ====================
 
@@ -1352,6 +2342,156 @@ class PainelEstagiosViewCA2Test(PainelEstagiosViewBaseTest):
         self.assertEqual(data2['total'], total_inicial + 1)
 
 
+class PainelEstagiosETagTest(PainelEstagiosViewBaseTest):
+    """
+    CA2 - Polling condicional: APIs do painel respondem 304 enquanto a versão
+    dos dados do escopo do usuário não muda.
+    """
+
+    def _get(self, nome, etag=None):
+        extra = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse(nome), **extra)
+
+    def test_polling_sem_alteracao_retorna_304(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        for nome in ('api_painel_estagios', 'api_estatisticas_estagios',
+                     'api_monitoramento_pendencias', 'api_resultados_consolidados'):
+            response = self._get(nome)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            response = self._get(nome, etag)
+            self.assertEqual(response.status_code, 304, nome)
+            self.assertEqual(response.content, b'')
+
+    def test_304_nao_executa_consultas_pesadas(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        etag = self._get('api_painel_estagios')['ETag']
+        with self.assertNumQueries(3):
+            # sessão, usuário e versões do escopo
+            response = self._get('api_painel_estagios', etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_alteracao_invalida_etag_do_escopo(self):
+        self.client.login(username='supervisor@test.com', password='senha123')
+        etag = self._get('api_estatisticas_estagios')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.estagio_analise.status = 'em_andamento'
+            self.estagio_analise.save()
+
+        response = self._get('api_estatisticas_estagios', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['em_andamento'], 2)
+
+    def test_alteracao_de_outro_escopo_mantem_etag(self):
+        from estagio.versao_dados import escopo_supervisor, incrementar_versoes
+
+        self.client.login(username='supervisor@test.com', password='senha123')
+        etag = self._get('api_estatisticas_estagios')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            incrementar_versoes([escopo_supervisor(self.supervisor.id + 1000)])
+
+        self.assertEqual(self._get('api_estatisticas_estagios', etag).status_code, 304)
+
+    def test_alteracao_incrementa_apenas_escopos_lidos_pelos_etags(self):
+        from estagio.models import VersaoDados
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.estagio_analise.status = 'em_andamento'
+            self.estagio_analise.save()
+
+        escopos = set(VersaoDados.objects.values_list('escopo', flat=True))
+        self.assertIn('global', escopos)
+        self.assertIn(f'supervisor:{self.supervisor.id}', escopos)
+        self.assertFalse(any(escopo.startswith('instituicao:') for escopo in escopos))
+
+
+class PainelEstagiosDeltaTest(PainelEstagiosViewBaseTest):
+    """
+    CA2 - Sincronização incremental do painel (?since=<cursor>): apenas
+    estágios alterados e ids removidos desde o último cursor.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Estágios do setup "antigos", fora da margem do cursor
+        Estagio.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.cursor = (timezone.now() - timedelta(minutes=30)).isoformat()
+
+    def _delta(self, **params):
+        params.setdefault('since', self.cursor)
+        return self.client.get(reverse('api_painel_estagios'), params)
+
+    def test_resposta_completa_inclui_cursor(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        data = self.client.get(reverse('api_painel_estagios')).json()
+        self.assertIn('cursor', data)
+        self.assertIn('estagios_por_status', data)
+
+    def test_delta_sem_alteracoes(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        data = self._delta().json()
+        self.assertFalse(data['completo'])
+        self.assertEqual(data['alterados'], [])
+        self.assertEqual(data['removidos'], [])
+        self.assertEqual(data['estatisticas']['total'], 3)
+
+    def test_delta_retorna_apenas_alterados(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        self.estagio_analise.status = 'aprovado'
+        self.estagio_analise.save()
+
+        data = self._delta().json()
+        self.assertEqual([e['id'] for e in data['alterados']], [self.estagio_analise.id])
+        self.assertEqual(data['alterados'][0]['status_display'], 'Aprovado')
+
+    def test_delta_informa_estagio_excluido(self):
+        self.client.login(username='supervisor@test.com', password='senha123')
+        estagio_id = self.estagio_aprovado.id
+        self.estagio_aprovado.delete()
+
+        data = self._delta().json()
+        self.assertEqual(data['removidos'], [estagio_id])
+
+    def test_delta_informa_estagio_que_saiu_do_escopo(self):
+        outro_usuario = Usuario.objects.create_user(
+            username='outro_sup@test.com', email='outro_sup@test.com', password='senha123', tipo='supervisor'
+        )
+        outro = Supervisor.objects.create(
+            usuario=outro_usuario, nome="Outro", contato="11900000000", cargo="Gerente", empresa=self.empresa
+        )
+        self.estagio_em_andamento.supervisor = outro
+        self.estagio_em_andamento.save()
+
+        self.client.login(username='supervisor@test.com', password='senha123')
+        self.assertEqual(self._delta().json()['removidos'], [self.estagio_em_andamento.id])
+
+        self.client.login(username='outro_sup@test.com', password='senha123')
+        data = self._delta().json()
+        self.assertEqual([e['id'] for e in data['alterados']], [self.estagio_em_andamento.id])
+        self.assertEqual(data['removidos'], [])
+
+    def test_delta_respeita_filtro_de_status(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        self.estagio_analise.status = 'reprovado'
+        self.estagio_analise.save()
+
+        data = self._delta(status='analise').json()
+        self.assertEqual(data['alterados'], [])
+        self.assertEqual(data['removidos'], [self.estagio_analise.id])
+
+    def test_cursor_invalido(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        self.assertEqual(self._delta(since='ontem').status_code, 400)
+
+    def test_cursor_expirado_pede_recarga_completa(self):
+        self.client.login(username='coordenador@test.com', password='senha123')
+        antigo = (timezone.now() - timedelta(days=365)).isoformat()
+        self.assertTrue(self._delta(since=antigo).json()['completo'])
+
+
 class PainelEstagiosViewCA3Test(PainelEstagiosViewBaseTest):
     """
     Testes para CA3 - O sistema deve ter acesso restrito conforme perfil do usuário.
@@ -1658,6 +2798,58 @@ class CalcularEstatisticasEstagiosTest(TestCase):
         self.assertEqual(estatisticas['percentual_analise'], 50.0)
         self.assertEqual(estatisticas['percentual_aprovado'], 25.0)
 
+    def _criar_estagios(self, *status_list):
+        for i, status in enumerate(status_list):
+            Estagio.objects.create(
+                titulo=f"Estágio {i}",
+                cargo="Dev",
+                data_inicio=date.today(),
+                data_fim=date.today() + timedelta(days=180),
+                carga_horaria=20,
+                empresa=self.empresa,
+                supervisor=self.supervisor,
+                status=status
+            )
+
+    def test_estatisticas_em_uma_consulta(self):
+        """Total e contagens por status saem de um único aggregate"""
+        from estagio.painel import calcular_estatisticas
+
+        self._criar_estagios('analise', 'em_andamento', 'em_andamento', 'aprovado')
+        with self.assertNumQueries(1):
+            estatisticas = calcular_estatisticas(Estagio.objects.all())
+        self.assertEqual(estatisticas['em_andamento'], 2)
+        self.assertEqual(estatisticas['percentual_em_andamento'], 50.0)
+
+    def test_agrupamento_em_uma_consulta(self):
+        """A listagem agrupada é feita com uma consulta ordenada"""
+        from estagio.painel import agrupar_por_status
+
+        self._criar_estagios('reprovado', 'analise', 'analise')
+        with self.assertNumQueries(1):
+            grupos = agrupar_por_status(Estagio.objects.all())
+        self.assertEqual(len(grupos['analise']), 2)
+        self.assertEqual(len(grupos['reprovado']), 1)
+        self.assertEqual(grupos['aprovado'], [])
+        self.assertEqual(grupos['analise'][0]['empresa__razao_social'], "Empresa")
+
+    def test_cache_por_perfil(self):
+        """Com TTL configurado, a segunda leitura do mesmo perfil não consulta o banco"""
+        from django.core.cache import cache
+        from django.test import override_settings
+        from estagio.painel import obter_dados_painel
+
+        self._criar_estagios('analise')
+        cache.clear()
+        self.addCleanup(cache.clear)
+        estagios = Estagio.objects.filter(supervisor=self.supervisor)
+        with override_settings(PAINEL_ESTAGIOS_CACHE_TTL=60):
+            primeiro = obter_dados_painel(self.usuario_supervisor, estagios)
+            with self.assertNumQueries(0):
+                segundo = obter_dados_painel(self.usuario_supervisor, estagios)
+        self.assertEqual(primeiro, segundo)
+        self.assertEqual(segundo['estatisticas']['analise'], 1)
+
 
 # ==================== TESTES DE MONITORAMENTO DE PENDÊNCIAS E RESULTADOS ====================
 
@@ -2126,6 +3318,129 @@ class MonitoramentoPendenciasViewCA6Test(MonitoramentoPendenciasBaseTest):
         self.assertGreater(resultados['horas']['total_horas'], 0)
 
 
+class PendenciaMaterializadaTest(MonitoramentoPendenciasBaseTest):
+    """
+    Pendências materializadas: mantidas pelos signals, reconstruídas pelo
+    comando e lidas com consultas indexadas.
+    """
+
+    def _documento(self, **kwargs):
+        dados = dict(
+            estagio=self.estagio,
+            supervisor=self.supervisor,
+            coordenador=self.coordenador,
+            data_envio=date.today(),
+            versao=1.0,
+            nome_arquivo="termo.pdf",
+            tipo="termo",
+            status='enviado',
+            enviado_por=self.usuario_aluno
+        )
+        dados.update(kwargs)
+        return Documento.objects.create(**dados)
+
+    def _avaliacao(self):
+        from estagio.models import Avaliacao
+        return Avaliacao.objects.create(
+            supervisor=self.supervisor,
+            estagio=self.estagio,
+            aluno=self.aluno,
+            data_avaliacao=date.today(),
+            status='rascunho'
+        )
+
+    def test_documento_mantem_pendencias_por_perfil(self):
+        from estagio.models import Pendencia
+
+        doc = self._documento(prazo_limite=date.today() + timedelta(days=2))
+        self.assertEqual(
+            set(Pendencia.objects.values_list('tipo', 'perfil')),
+            {('documento_prazo', 'coordenador'), ('documento_pendente', 'supervisor'), ('documento_prazo', 'aluno')}
+        )
+
+        doc.status = 'ajustes_solicitados'
+        doc.save()
+        self.assertEqual(
+            set(Pendencia.objects.filter(perfil='aluno').values_list('tipo', flat=True)),
+            {'documento_ajuste', 'documento_prazo'}
+        )
+        self.assertFalse(Pendencia.objects.filter(perfil='supervisor').exists())
+
+        doc.delete()
+        self.assertFalse(Pendencia.objects.exists())
+
+    def test_prazo_fora_da_janela_nao_aparece(self):
+        from estagio.pendencias import pendencias_do_usuario
+
+        self._documento(prazo_limite=date.today() + timedelta(days=10))
+        self.assertEqual(pendencias_do_usuario(self.usuario_coordenador, {}).count(), 0)
+        hoje_futuro = date.today() + timedelta(days=8)
+        self.assertEqual(pendencias_do_usuario(self.usuario_coordenador, {}, hoje=hoje_futuro).count(), 1)
+
+    def test_avaliacao_incompleta_acompanha_notas(self):
+        from estagio.models import CriterioAvaliacao, NotaCriterio, Pendencia
+
+        criterio = CriterioAvaliacao.objects.create(nome='Pontualidade', obrigatorio=True)
+        avaliacao = self._avaliacao()
+        self.assertTrue(Pendencia.objects.filter(tipo='avaliacao_incompleta', referencia_id=avaliacao.id).exists())
+
+        nota = NotaCriterio.objects.create(avaliacao=avaliacao, criterio=criterio, nota=8)
+        self.assertFalse(Pendencia.objects.filter(tipo='avaliacao_incompleta').exists())
+
+        nota.delete()
+        self.assertTrue(Pendencia.objects.filter(tipo='avaliacao_incompleta').exists())
+
+    def test_aluno_desvinculado_perde_pendencias(self):
+        from estagio.models import Pendencia
+
+        self._documento(status='ajustes_solicitados')
+        self.assertTrue(Pendencia.objects.filter(aluno=self.aluno).exists())
+
+        self.aluno.estagio = None
+        self.aluno.save()
+        self.assertFalse(Pendencia.objects.filter(aluno=self.aluno).exists())
+
+    def test_reconstruir_gera_mesmo_conteudo(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from estagio.models import CriterioAvaliacao, Pendencia
+
+        CriterioAvaliacao.objects.create(nome='Pontualidade', obrigatorio=True)
+        self._avaliacao()
+        self._documento(prazo_limite=date.today() + timedelta(days=1))
+        self._documento(status='ajustes_solicitados', nome_arquivo='relatorio.pdf')
+        campos = ('tipo', 'perfil', 'supervisor_id', 'aluno_id', 'referencia_tipo', 'referencia_id', 'descricao')
+        antes = sorted(Pendencia.objects.values_list(*campos))
+
+        Pendencia.objects.all().delete()
+        saida = StringIO()
+        call_command('reconstruir_pendencias', stdout=saida)
+
+        self.assertEqual(sorted(Pendencia.objects.values_list(*campos)), antes)
+        self.assertIn(f'Pendências reconstruídas: {len(antes)}', saida.getvalue())
+
+    def test_monitoramento_paginado_e_com_consultas_constantes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for i in range(3):
+            self._documento(nome_arquivo=f'doc_{i}.pdf', prazo_limite=date.today() + timedelta(days=1))
+        self.client.login(username='coordenador@test.com', password='senha123')
+        self.client.get(reverse('api_monitoramento_pendencias'))
+
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(reverse('api_monitoramento_pendencias'))
+        for i in range(3, 30):
+            self._documento(nome_arquivo=f'doc_{i}.pdf', prazo_limite=date.today() + timedelta(days=1))
+        with self.assertNumQueries(len(poucos.captured_queries)):
+            response = self.client.get(reverse('api_monitoramento_pendencias'))
+        self.assertEqual(response.json()['total_pendencias'], 30)
+
+        response = self.client.get(reverse('monitoramento_pendencias'), {'page': 2})
+        self.assertEqual(response.context['total_pendencias'], 30)
+        self.assertEqual(len(response.context['pendencias']), 10)
+
+
 class ApiMonitoramentoPendenciasTest(MonitoramentoPendenciasBaseTest):
     """
     Testes para as APIs de monitoramento de pendências.
@@ -3096,3 +4411,865 @@ class FuncoesAuxiliaresRelatorioTest(TestCase):
         
         self.assertTrue(valid)
         self.assertIsNone(error)
+
+
+# ==================== TESTES DA OUTBOX DE E-MAILS ====================
+
+class RelatorioEstagiosConsultasTest(RelatorioEstagiosBaseTest):
+    """
+    Montagem do relatório em lote: número fixo de consultas e mesmos dados
+    para todas as exportações.
+    """
+
+    OPCOES = {'documentos': True, 'avaliacoes': True, 'horas': True, 'aluno': True}
+
+    def _popular(self, estagio, documentos=3, avaliacoes=2):
+        for i in range(documentos):
+            Documento.objects.create(
+                estagio=estagio,
+                supervisor=self.supervisor,
+                coordenador=self.coordenador,
+                data_envio=date.today(),
+                versao=1.0,
+                nome_arquivo=f"doc{i}.pdf",
+                tipo="termo_compromisso",
+                status='aprovado' if i % 3 == 0 else 'enviado',
+            )
+        from estagio.models import Avaliacao
+        for i in range(avaliacoes):
+            Avaliacao.objects.create(
+                supervisor=self.supervisor,
+                estagio=estagio,
+                aluno=estagio.aluno_solicitante,
+                data_avaliacao=date.today() - timedelta(days=i),
+                status='parecer_emitido' if i < 2 else 'rascunho',
+                nota_final=7.0 + i if i < 2 else None,
+            )
+
+    def _novo_estagio(self, indice):
+        aluno = Aluno.objects.create(
+            usuario=Usuario.objects.create_user(
+                username=f'aluno_lote{indice}@test.com', password='senha123', tipo='aluno'
+            ),
+            nome=f"Aluno Lote {indice}",
+            contato=f"lote{indice}@email.com",
+            matricula=f"LT{indice:06d}",
+            instituicao=self.instituicao,
+        )
+        HorasCumpridas.objects.create(aluno=aluno, data=date.today(), quantidade=4, descricao="Horas")
+        estagio = Estagio.objects.create(
+            titulo=f"Estágio Lote {indice}",
+            cargo="Dev",
+            empresa=self.empresa2,
+            supervisor=self.supervisor,
+            data_inicio=date.today(),
+            data_fim=date.today() + timedelta(days=90),
+            carga_horaria=20,
+            status='em_andamento',
+            aluno_solicitante=aluno,
+        )
+        self._popular(estagio)
+        return estagio
+
+    def _consultas(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from estagio.relatorios import montar_relatorio
+
+        with CaptureQueriesContext(connection) as contexto:
+            dados, resumo = montar_relatorio(Estagio.objects.all(), self.OPCOES)
+        return len(contexto.captured_queries), dados, resumo
+
+    def test_numero_de_consultas_independe_da_quantidade_de_estagios(self):
+        self._popular(self.estagio1)
+        consultas_poucos, dados, _ = self._consultas()
+
+        for indice in range(8):
+            self._novo_estagio(indice)
+        consultas_muitos, dados_muitos, resumo = self._consultas()
+
+        self.assertEqual(len(dados), 3)
+        self.assertEqual(len(dados_muitos), 11)
+        self.assertEqual(resumo['total'], 11)
+        self.assertEqual(consultas_poucos, consultas_muitos)
+        self.assertLessEqual(consultas_muitos, 6)
+
+    def test_agregados_e_listas_limitadas_por_estagio(self):
+        self._popular(self.estagio1, documentos=12, avaliacoes=12)
+        HorasCumpridas.objects.create(aluno=self.aluno, data=date.today(), quantidade=6, descricao="Horas")
+        HorasCumpridas.objects.create(aluno=self.aluno, data=date.today(), quantidade=2, descricao="Horas")
+
+        _, dados, resumo = self._consultas()
+        por_id = {d['id']: d for d in dados}
+        estagio1 = por_id[self.estagio1.id]
+
+        self.assertEqual(estagio1['documentos']['total'], 12)
+        self.assertEqual(estagio1['documentos']['aprovados'], 4)
+        self.assertEqual(estagio1['documentos']['pendentes'], 8)
+        self.assertEqual(len(estagio1['documentos']['lista']), 10)
+        self.assertEqual(estagio1['avaliacoes']['total'], 12)
+        self.assertEqual(estagio1['avaliacoes']['completas'], 2)
+        self.assertEqual(estagio1['avaliacoes']['nota_media'], 7.5)
+        self.assertEqual(len(estagio1['avaliacoes']['lista']), 10)
+        # Mais recentes primeiro
+        self.assertEqual(estagio1['avaliacoes']['lista'][0]['data_avaliacao'], date.today().isoformat())
+        self.assertEqual(estagio1['horas'], {'total_registros': 2, 'total_horas': 8, 'carga_horaria_estagio': 20})
+        self.assertEqual(estagio1['aluno']['instituicao'], self.instituicao.nome)
+
+        # Estágio sem documentos/avaliações e sem aluno
+        estagio3 = por_id[self.estagio3.id]
+        self.assertEqual(estagio3['documentos'], {'total': 0, 'aprovados': 0, 'pendentes': 0, 'lista': []})
+        self.assertIsNone(estagio3['avaliacoes']['nota_media'])
+        self.assertNotIn('horas', estagio3)
+        self.assertNotIn('aluno', estagio3)
+
+        self.assertEqual(resumo['por_status'], {'Em análise': 1, 'Em andamento': 1, 'Aprovado': 1})
+        self.assertEqual(resumo['por_empresa'], {'Empresa Teste Relatório': 2, 'Segunda Empresa': 1})
+
+    def test_exportacao_csv_usa_dados_agregados(self):
+        self._popular(self.estagio1, documentos=5, avaliacoes=2)
+        self.client.login(username='coordenador_rel@test.com', password='senha123')
+
+        response = self.client.get(reverse('api_relatorio_exportar'), {
+            'formato': 'csv', 'incluir_documentos': 'on', 'incluir_avaliacoes': 'on', 'incluir_aluno': 'on',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        linhas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        linha = next(l for l in linhas if l.startswith(f'{self.estagio1.id},'))
+        self.assertTrue(linha.endswith(',5,2,2,7.5'))
+
+
+class RelatorioExportacaoStreamingTest(RelatorioEstagiosBaseTest):
+    """
+    Exportação CSV/XLSX em streaming: leitura em lotes e memória constante.
+    """
+
+    def _baixar(self, formato):
+        self.client.login(username='coordenador_rel@test.com', password='senha123')
+        response = self.client.get(reverse('api_relatorio_exportar'), {'formato': formato, 'incluir_aluno': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_lido_em_lotes_contem_todos_os_estagios(self):
+        with self.settings(RELATORIO_EXPORTACAO_LOTE=1):
+            response, conteudo = self._baixar('csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        linhas = conteudo.decode('utf-8-sig').splitlines()
+        self.assertEqual(linhas[0].split(',')[0], 'ID')
+        ids = [int(linha.split(',')[0]) for linha in linhas[1:]]
+        self.assertEqual(ids, sorted([self.estagio1.id, self.estagio2.id, self.estagio3.id]))
+        linha_estagio1 = linhas[1 + ids.index(self.estagio1.id)].split(',')
+        self.assertEqual(linha_estagio1[9:11], ['Aluno Relatório', '20231234'])
+        linha_estagio3 = linhas[1 + ids.index(self.estagio3.id)].split(',')
+        self.assertEqual(linha_estagio3[9:11], ['-', '-'])
+
+    def test_excel_gera_planilha_xlsx(self):
+        import io
+        import zipfile
+        from xml.etree import ElementTree
+
+        response, conteudo = self._baixar('excel')
+
+        self.assertIn('spreadsheetml.sheet', response['Content-Type'])
+        self.assertIn('relatorio_estagios.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            self.assertIn('[Content_Types].xml', arquivo.namelist())
+            self.assertIn('xl/workbook.xml', arquivo.namelist())
+            planilha = ElementTree.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+
+        ns = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        linhas = []
+        for row in planilha.iterfind('.//m:row', ns):
+            valores = []
+            for celula in row.iterfind('m:c', ns):
+                texto = celula.find('m:is/m:t', ns)
+                valores.append(texto.text if texto is not None else celula.find('m:v', ns).text)
+            linhas.append(valores)
+        self.assertEqual(linhas[0], ['Relatório de Estágios'])
+        self.assertIn(['Total de Estágios', '3'], linhas)
+        self.assertIn(['Em andamento', '1'], linhas)
+        indice = linhas.index(['ESTÁGIOS'])
+        self.assertEqual(len(linhas) - indice - 2, 3)
+        self.assertIn('Estágio Desenvolvimento', linhas[indice + 2])
+
+    def test_pico_de_memoria_nao_cresce_com_o_numero_de_linhas(self):
+        from estagio.exportacao import gerar_xlsx, serializar_csv
+        from estagio.management.commands.benchmark_exportacao import (
+            OPCOES, _linhas_sinteticas, _planilha_sintetica, medir,
+        )
+
+        _, pico_csv_pequeno, _ = medir(serializar_csv(_linhas_sinteticas(500), OPCOES))
+        _, pico_csv_grande, _ = medir(serializar_csv(_linhas_sinteticas(10000), OPCOES))
+        _, pico_xlsx_pequeno, _ = medir(gerar_xlsx(_planilha_sintetica(500)))
+        _, pico_xlsx_grande, _ = medir(gerar_xlsx(_planilha_sintetica(10000)))
+
+        self.assertLess(pico_csv_grande, pico_csv_pequeno * 1.5)
+        self.assertLess(pico_xlsx_grande, pico_xlsx_pequeno * 1.5)
+
+
+class RelatorioJobTest(RelatorioEstagiosBaseTest):
+    """
+    Relatórios gerados em segundo plano: fila, worker, status, download e reaproveitamento.
+    """
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.relatorios_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.relatorios_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root, RELATORIOS_ROOT=self.relatorios_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.login(username='coordenador_rel@test.com', password='senha123')
+
+    def _enfileirar(self, **filtros):
+        dados = {'formato': 'csv', 'assincrono': '1', 'incluir_aluno': 'on'}
+        dados.update(filtros)
+        return self.client.post(reverse('api_relatorio_exportar'), dados)
+
+    def _processar(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command('processar_relatorios', '--once', stdout=saida)
+        return saida.getvalue()
+
+    def test_exportacao_assincrona_enfileira_job(self):
+        from estagio.models import RelatorioJob
+
+        response = self._enfileirar()
+
+        self.assertEqual(response.status_code, 202)
+        dados = response.json()
+        self.assertFalse(dados['reaproveitado'])
+        job = RelatorioJob.objects.get(pk=dados['job']['id'])
+        self.assertEqual(job.status, 'pendente')
+        self.assertEqual(job.formato, 'csv')
+        self.assertEqual(job.solicitante, self.usuario_coordenador)
+        self.assertTrue(job.filtros['incluir_aluno'])
+        self.assertFalse(job.filtros['incluir_documentos'])
+        self.assertIsNone(dados['job']['download_url'])
+
+    def test_worker_gera_arquivo_e_status_informa_download(self):
+        import os
+
+        job_id = self._enfileirar().json()['job']['id']
+
+        saida = self._processar()
+
+        self.assertIn(f"Relatório {job_id} (csv): 3 linhas", saida)
+        status = self.client.get(reverse('api_relatorio_job_status', args=[job_id])).json()['job']
+        self.assertEqual(status['status'], 'concluido')
+        self.assertEqual(status['total_linhas'], 3)
+        self.assertIsNotNone(status['duracao'])
+        self.assertEqual(status['download_url'], reverse('baixar_relatorio_job', args=[job_id]))
+
+        from estagio.models import RelatorioJob
+        arquivo = RelatorioJob.objects.get(pk=job_id).arquivo
+        # Fora de MEDIA_ROOT, sem URL pública e com nome que não deriva do id do job
+        self.assertTrue(arquivo.path.startswith(self.relatorios_root))
+        self.assertTrue(os.path.exists(arquivo.path))
+        self.assertNotIn(f'_{job_id}.', arquivo.name)
+        with self.assertRaises(ValueError):
+            arquivo.url
+
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        linhas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(linhas), 4)
+        self.assertIn('Aluno Relatório', linhas[1])
+
+    def test_download_com_x_accel_usa_location_dos_relatorios(self):
+        from estagio.models import RelatorioJob
+
+        job_id = self._enfileirar().json()['job']['id']
+        self._processar()
+
+        with self.settings(DOCUMENTOS_DOWNLOAD_BACKEND='x-accel-redirect'):
+            response = self.client.get(reverse('baixar_relatorio_job', args=[job_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/relatorios-protegidos/{RelatorioJob.objects.get(pk=job_id).arquivo.name}'
+        )
+
+    def test_download_antes_da_conclusao_retorna_conflito(self):
+        job_id = self._enfileirar().json()['job']['id']
+
+        response = self.client.get(reverse('baixar_relatorio_job', args=[job_id]))
+
+        self.assertEqual(response.status_code, 409)
+
+    def test_mesmos_filtros_reaproveitam_job(self):
+        primeiro = self._enfileirar().json()['job']['id']
+        repetido = self._enfileirar().json()
+        self.assertTrue(repetido['reaproveitado'])
+        self.assertEqual(repetido['job']['id'], primeiro)
+
+        # Job concluído continua sendo reaproveitado e já traz o download
+        self._processar()
+        concluido = self._enfileirar()
+        self.assertEqual(concluido.status_code, 200)
+        self.assertEqual(concluido.json()['job']['id'], primeiro)
+        self.assertIsNotNone(concluido.json()['job']['download_url'])
+
+        # Filtros diferentes geram outro job
+        outro = self._enfileirar(status='aprovado').json()
+        self.assertFalse(outro['reaproveitado'])
+        self.assertNotEqual(outro['job']['id'], primeiro)
+
+    def test_alteracao_dos_dados_invalida_reaproveitamento(self):
+        primeiro = self._enfileirar().json()['job']['id']
+        self._processar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.estagio1.titulo = "Estágio Alterado"
+            self.estagio1.save()
+
+        novo = self._enfileirar().json()
+        self.assertFalse(novo['reaproveitado'])
+        self.assertNotEqual(novo['job']['id'], primeiro)
+
+    def test_job_de_outro_usuario_nao_e_acessivel(self):
+        job_id = self._enfileirar().json()['job']['id']
+        self.client.logout()
+        self.client.login(username='aluno_rel@test.com', password='senha123')
+
+        self.assertEqual(self.client.get(reverse('api_relatorio_job_status', args=[job_id])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('baixar_relatorio_job', args=[job_id])).status_code, 403)
+
+    def test_worker_gera_xlsx_e_json(self):
+        import json
+        import zipfile
+        from estagio.models import RelatorioJob
+
+        xlsx = self._enfileirar(formato='excel').json()['job']['id']
+        relatorio_json = self._enfileirar(formato='json').json()['job']['id']
+        self._processar()
+
+        job_xlsx = RelatorioJob.objects.get(pk=xlsx)
+        self.assertEqual(job_xlsx.status, 'concluido')
+        self.assertTrue(job_xlsx.arquivo.name.endswith('.xlsx'))
+        self.assertTrue(zipfile.is_zipfile(job_xlsx.arquivo.path))
+
+        job_json = RelatorioJob.objects.get(pk=relatorio_json)
+        self.assertEqual(job_json.total_linhas, 3)
+        with job_json.arquivo.open('rb') as arquivo:
+            conteudo = json.loads(arquivo.read())
+        self.assertEqual(conteudo['relatorio']['resumo']['total'], 3)
+
+
+class AnaliseNotasTest(RelatorioEstagiosBaseTest):
+    """Distribuição das notas finais por grupo, critério e supervisor"""
+
+    def setUp(self):
+        super().setUp()
+        from estagio.models import Avaliacao, CriterioAvaliacao, NotaCriterio
+
+        self.supervisor2 = Supervisor.objects.create(
+            usuario=Usuario.objects.create_user(
+                username='supervisor2_rel@test.com', password='senha123', tipo='supervisor'
+            ),
+            nome="Supervisor Rigoroso", contato="11977776666", cargo="Gerente", empresa=self.empresa2
+        )
+        criterio = CriterioAvaliacao.objects.create(nome='Técnica', peso=1.0)
+        self.avaliacoes = []
+        for dias, estagio, supervisor, nota in (
+            (30, self.estagio1, self.supervisor, 8.0),
+            (60, self.estagio2, self.supervisor, 9.0),
+            (90, self.estagio1, self.supervisor2, 4.0),
+        ):
+            avaliacao = Avaliacao.objects.create(
+                supervisor=supervisor, estagio=estagio, aluno=self.aluno, data_avaliacao=date.today(),
+                periodo_inicio=date.today() - timedelta(days=dias), periodo_fim=date.today() - timedelta(days=dias - 29),
+                status='parecer_emitido', nota=nota, nota_final=nota,
+            )
+            NotaCriterio.objects.create(avaliacao=avaliacao, criterio=criterio, nota=nota)
+            self.avaliacoes.append(avaliacao)
+        # Sem nota final: fora da análise
+        Avaliacao.objects.create(
+            supervisor=self.supervisor, estagio=self.estagio3, aluno=self.aluno, data_avaliacao=date.today(),
+        )
+
+    def test_distribuicao_criterios_e_leniencia(self):
+        from estagio.analise_notas import calcular_analise
+
+        analise = calcular_analise(agrupar='empresa')
+        self.assertEqual(analise['geral']['quantidade'], 3)
+        self.assertEqual(analise['geral']['media'], 7.0)
+        self.assertEqual(analise['geral']['percentis']['p50'], 8.0)
+        histograma = {faixa['de']: faixa['quantidade'] for faixa in analise['geral']['histograma']}
+        self.assertEqual((histograma[4], histograma[8], histograma[9], sum(histograma.values())), (1, 1, 1, 3))
+
+        self.assertEqual(analise['criterios'], [
+            {'id': analise['criterios'][0]['id'], 'nome': 'Técnica', 'quantidade': 3, 'media': 7.0, 'desvio_padrao': 2.16}
+        ])
+        grupos = {grupo['nome']: grupo['quantidade'] for grupo in analise['grupos']}
+        self.assertEqual(grupos, {'Empresa Teste Relatório': 2, 'Segunda Empresa': 1})
+
+        supervisores = analise['supervisores']
+        self.assertEqual([s['nome'] for s in supervisores], ['Supervisor Relatório', 'Supervisor Rigoroso'])
+        self.assertEqual(supervisores[0]['z_score'], 0.98)
+        self.assertEqual(supervisores[1]['z_score'], -1.39)
+
+    def test_api_filtros_e_permissao(self):
+        url = reverse('api_analise_notas')
+        self.client.login(username='aluno_rel@test.com', password='senha123')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username='coordenador_rel@test.com', password='senha123')
+        self.assertEqual(self.client.get(url, {'agrupar': 'curso'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'empresa': 'abc'}).status_code, 400)
+
+        response = self.client.get(url, {'supervisor': self.supervisor.id, 'agrupar': 'periodo'})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados['geral']['quantidade'], 2)
+        self.assertEqual(dados['grupos'][0]['nome'], 'Mensal')
+
+    def test_cache_por_versao_dos_dados(self):
+        from estagio.analise_notas import obter_analise
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(obter_analise()['geral']['quantidade'], 3)
+        # Só a versão dos dados é consultada
+        with self.assertNumQueries(1):
+            self.assertEqual(obter_analise()['geral']['quantidade'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avaliacoes[0].delete()
+        self.assertEqual(obter_analise()['geral']['quantidade'], 2)
+
+    def test_etag_do_staff_muda_com_os_dados(self):
+        Usuario.objects.create_user(username='staff_rel@test.com', password='senha123', tipo='admin', is_staff=True)
+        self.client.login(username='staff_rel@test.com', password='senha123')
+        url = reverse('api_analise_notas')
+
+        response = self.client.get(url)
+        self.assertEqual(response.json()['geral']['quantidade'], 3)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avaliacoes[0].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['geral']['quantidade'], 2)
+
+
+class EmailOutboxTest(TestCase):
+    """Testes da outbox transacional de e-mails e do worker enviar_emails"""
+
+    def test_enfileira_somente_apos_commit(self):
+        """O e-mail só entra na outbox após o commit da transação"""
+        from estagio.models import EmailOutbox
+        from utils.email import enviar_notificacao_email
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            enviar_notificacao_email(destinatario='aluno@test.com', assunto='Assunto', mensagem='Corpo')
+            self.assertEqual(EmailOutbox.objects.count(), 0)
+
+        self.assertEqual(len(callbacks), 1)
+        item = EmailOutbox.objects.get()
+        self.assertEqual(item.destinatario, 'aluno@test.com')
+        self.assertEqual(item.status, 'pendente')
+
+    def test_nao_envia_smtp_durante_requisicao(self):
+        """Enfileirar não dispara envio síncrono"""
+        from django.core import mail
+        from utils.email import enviar_notificacao_email
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enviar_notificacao_email(destinatario='aluno@test.com', assunto='Assunto', mensagem='Corpo')
+
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_envia_lote_com_uma_conexao(self):
+        """O worker drena a fila em lote reaproveitando a mesma conexão"""
+        from django.core import mail
+        from django.core.management import call_command
+        from estagio.models import EmailOutbox
+        from io import StringIO
+
+        for i in range(5):
+            EmailOutbox.objects.create(destinatario=f'aluno{i}@test.com', assunto=f'Assunto {i}', mensagem='Corpo')
+
+        with patch('estagio.email_outbox.EmailMessage.send', autospec=True, side_effect=lambda msg, **kw: msg.connection.send_messages([msg])) as mock_send:
+            call_command('enviar_emails', '--once', '--batch-size', '2', stdout=StringIO())
+
+        conexoes = {id(call.args[0].connection) for call in mock_send.call_args_list}
+        self.assertEqual(len(conexoes), 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(EmailOutbox.objects.filter(status='enviado').count(), 5)
+        self.assertFalse(EmailOutbox.objects.filter(enviado_em__isnull=True).exists())
+
+    def test_falha_agenda_nova_tentativa_com_backoff(self):
+        """Falhas incrementam tentativas e reagendam com backoff"""
+        from estagio.email_outbox import processar_lote
+        from estagio.models import EmailOutbox
+
+        item = EmailOutbox.objects.create(destinatario='aluno@test.com', assunto='Assunto', mensagem='Corpo')
+
+        with patch('estagio.email_outbox.EmailMessage.send', side_effect=Exception('SMTP indisponível')):
+            processados = processar_lote(batch_size=10)
+
+        item.refresh_from_db()
+        self.assertEqual(processados, 1)
+        self.assertEqual(item.status, 'pendente')
+        self.assertEqual(item.tentativas, 1)
+        self.assertIn('SMTP indisponível', item.ultimo_erro)
+        self.assertGreater(item.proxima_tentativa, timezone.now())
+
+        # Não é reprocessado antes do prazo de backoff
+        self.assertEqual(processar_lote(batch_size=10), 0)
+
+    def test_envio_fora_da_transacao_de_reserva(self):
+        """O SMTP roda sem transação aberta pelo worker e cada resultado é gravado na hora"""
+        from django.db import connection
+        from estagio.email_outbox import processar_lote
+        from estagio.models import EmailOutbox
+
+        EmailOutbox.objects.create(destinatario='a@test.com', assunto='A', mensagem='Corpo')
+        EmailOutbox.objects.create(destinatario='b@test.com', assunto='B', mensagem='Corpo')
+        niveis = len(connection.atomic_blocks)
+        durante_envio = []
+
+        def enviar(mensagem, **kwargs):
+            durante_envio.append((
+                len(connection.atomic_blocks),
+                dict(EmailOutbox.objects.values_list('destinatario', 'status')),
+            ))
+
+        with patch('estagio.email_outbox.EmailMessage.send', autospec=True, side_effect=enviar):
+            self.assertEqual(processar_lote(batch_size=10), 2)
+
+        self.assertEqual([nivel for nivel, _ in durante_envio], [niveis, niveis])
+        self.assertEqual(durante_envio[0][1], {'a@test.com': 'enviando', 'b@test.com': 'enviando'})
+        # O primeiro envio já está gravado quando o segundo começa
+        self.assertEqual(durante_envio[1][1]['a@test.com'], 'enviado')
+        self.assertFalse(EmailOutbox.objects.exclude(status='enviado').exists())
+
+    def test_falha_ao_abrir_conexao_conta_tentativa(self):
+        """Servidor SMTP fora do ar: o lote volta à fila com backoff, sem repetir para sempre"""
+        from estagio.email_outbox import processar_lote
+        from estagio.models import EmailOutbox
+
+        item = EmailOutbox.objects.create(destinatario='aluno@test.com', assunto='Assunto', mensagem='Corpo')
+        conexao = MagicMock()
+        conexao.open.side_effect = ConnectionRefusedError('recusada')
+
+        with self.assertRaises(ConnectionRefusedError):
+            processar_lote(connection=conexao, batch_size=10)
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'pendente')
+        self.assertEqual(item.tentativas, 1)
+        self.assertIsNone(item.reservado_ate)
+        self.assertGreater(item.proxima_tentativa, timezone.now())
+
+    def test_reserva_vencida_volta_a_fila(self):
+        """E-mail reservado por um worker interrompido é enviado depois que a reserva vence"""
+        from datetime import timedelta
+        from estagio.email_outbox import processar_lote, reservar_lote
+        from estagio.models import EmailOutbox
+
+        EmailOutbox.objects.create(destinatario='aluno@test.com', assunto='Assunto', mensagem='Corpo')
+        self.assertEqual(len(reservar_lote()), 1)
+        # Reserva em vigor: nenhum outro worker pega o e-mail
+        self.assertEqual(reservar_lote(), [])
+
+        EmailOutbox.objects.update(reservado_ate=timezone.now() - timedelta(seconds=1))
+        with patch('estagio.email_outbox.EmailMessage.send'):
+            self.assertEqual(processar_lote(batch_size=10), 1)
+        self.assertEqual(EmailOutbox.objects.get().status, 'enviado')
+
+    def test_excede_maximo_de_tentativas(self):
+        """Após o máximo de tentativas o e-mail é marcado como falhou"""
+        from estagio.email_outbox import processar_lote, MAX_TENTATIVAS
+        from estagio.models import EmailOutbox
+
+        item = EmailOutbox.objects.create(
+            destinatario='aluno@test.com', assunto='Assunto', mensagem='Corpo',
+            tentativas=MAX_TENTATIVAS - 1
+        )
+
+        with patch('estagio.email_outbox.EmailMessage.send', side_effect=Exception('Erro')):
+            processar_lote(batch_size=10)
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'falhou')
+
+    def test_metricas_fila_e_latencia(self):
+        """As métricas expõem profundidade da fila e latência de envio"""
+        from estagio.email_outbox import processar_lote, obter_metricas, metricas
+        from estagio.models import EmailOutbox
+
+        metricas.resetar()
+        EmailOutbox.objects.create(destinatario='a@test.com', assunto='A', mensagem='Corpo')
+        EmailOutbox.objects.create(destinatario='b@test.com', assunto='B', mensagem='Corpo')
+        self.assertEqual(obter_metricas()['fila_pendente'], 2)
+
+        processar_lote(batch_size=1)
+
+        dados = obter_metricas()
+        self.assertEqual(dados['fila_pendente'], 1)
+        self.assertEqual(dados['enviados'], 1)
+        self.assertGreaterEqual(dados['latencia_media_ms'], 0)
+
+
+# ==================== TESTES DO CANAL SSE DE NOTIFICAÇÕES ====================
+
+class NotificacaoStreamSSETest(TestCase):
+    """Testes do canal Server-Sent Events que atualiza o badge de notificações"""
+
+    def setUp(self):
+        self.instituicao = Instituicao.objects.create(
+            nome="Universidade Teste",
+            contato="1133334444",
+            numero=123,
+            bairro="Centro",
+            rua="Rua Teste"
+        )
+        self.usuario = Usuario.objects.create_user(
+            username='aluno_sse@test.com',
+            email='aluno_sse@test.com',
+            password='senha123',
+            tipo='aluno'
+        )
+        self.aluno = Aluno.objects.create(
+            usuario=self.usuario,
+            nome='Aluno SSE',
+            contato='aluno_sse@email.com',
+            matricula='20238888',
+            instituicao=self.instituicao
+        )
+        Notificacao.objects.create(
+            destinatario=self.aluno.contato,
+            assunto='Aviso inicial',
+            mensagem='Mensagem',
+            referencia='sse_inicial'
+        )
+
+    def test_wsgi_responde_204_para_fallback(self):
+        """Sem ASGI o endpoint responde 204 e o cliente mantém o polling"""
+        self.client.login(username='aluno_sse@test.com', password='senha123')
+        response = self.client.get(reverse('api_notificacoes_stream'))
+        self.assertEqual(response.status_code, 204)
+
+    def test_poll_continua_disponivel(self):
+        """O endpoint de polling permanece como fallback"""
+        self.client.login(username='aluno_sse@test.com', password='senha123')
+        response = self.client.get(reverse('api_contar_notificacoes_nao_lidas'))
+        self.assertEqual(response.json()['count'], 1)
+
+    async def test_broker_entrega_publicacao_de_outra_thread(self):
+        """O broker local entrega eventos publicados por threads síncronas"""
+        import asyncio
+        import threading
+        from estagio.notificacoes_broker import LocalBroker
+
+        broker = LocalBroker()
+        assinatura = broker.subscribe('canal@test.com')
+        threading.Thread(target=broker.publish, args=('canal@test.com', {'count': 7})).start()
+
+        dados = await asyncio.wait_for(assinatura.get(), timeout=2)
+        self.assertEqual(dados, {'count': 7})
+
+        broker.unsubscribe(assinatura)
+        self.assertEqual(broker.total_assinaturas(), 0)
+
+    async def test_signal_publica_contagem_ao_criar_e_excluir(self):
+        """Criar ou excluir uma Notificacao publica a nova contagem no canal do usuário"""
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from estagio.notificacoes_broker import get_broker
+        from estagio.signals import canal_notificacoes
+
+        assinatura = get_broker().subscribe(canal_notificacoes(self.usuario.pk))
+        try:
+            def criar():
+                with self.captureOnCommitCallbacks(execute=True):
+                    return Notificacao.objects.create(
+                        destinatario=self.aluno.contato,
+                        assunto='Novo aviso',
+                        mensagem='Mensagem',
+                        referencia='sse_novo'
+                    )
+
+            notificacao = await sync_to_async(criar)()
+            dados = await asyncio.wait_for(assinatura.get(), timeout=2)
+            self.assertEqual(dados, {'count': 2})
+
+            def excluir():
+                with self.captureOnCommitCallbacks(execute=True):
+                    notificacao.delete()
+
+            await sync_to_async(excluir)()
+            dados = await asyncio.wait_for(assinatura.get(), timeout=2)
+            self.assertEqual(dados, {'count': 1})
+        finally:
+            get_broker().unsubscribe(assinatura)
+
+    async def test_stream_envia_contagem_inicial_e_atualizacoes(self):
+        """Via ASGI o stream envia a contagem inicial e cada mudança publicada"""
+        import asyncio
+        from estagio.notificacoes_broker import get_broker
+        from estagio.signals import canal_notificacoes
+
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.get(reverse('api_notificacoes_stream'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        conteudo = response.streaming_content.__aiter__()
+        primeiro = (await asyncio.wait_for(conteudo.__anext__(), timeout=2)).decode()
+        self.assertIn('event: contagem', primeiro)
+        self.assertIn('"count": 1', primeiro)
+
+        get_broker().publish(canal_notificacoes(self.usuario.pk), {'count': 5})
+        segundo = (await asyncio.wait_for(conteudo.__anext__(), timeout=2)).decode()
+        self.assertIn('"count": 5', segundo)
+
+
+# ==================== TESTES DO INBOX DE NOTIFICAÇÕES ====================
+
+class NotificacaoInboxTest(TestCase):
+    """Testes do inbox de notificações com FK do usuário, leitura lógica e contador de não lidas"""
+
+    def setUp(self):
+        self.instituicao = Instituicao.objects.create(
+            nome="Universidade Teste",
+            contato="1133334444",
+            numero=123,
+            bairro="Centro",
+            rua="Rua Teste"
+        )
+        self.usuario = Usuario.objects.create_user(
+            username='aluno_inbox@test.com',
+            email='aluno_inbox@test.com',
+            password='senha123',
+            tipo='aluno'
+        )
+        self.aluno = Aluno.objects.create(
+            usuario=self.usuario,
+            nome='Aluno Inbox',
+            contato='aluno_inbox@email.com',
+            matricula='20237777',
+            instituicao=self.instituicao
+        )
+        self.client.login(username='aluno_inbox@test.com', password='senha123')
+
+    def _nao_lidas(self):
+        return Usuario.objects.get(pk=self.usuario.pk).notificacoes_nao_lidas
+
+    def _criar(self, destinatario, referencia):
+        return Notificacao.objects.create(
+            destinatario=destinatario,
+            assunto='Aviso',
+            mensagem='Mensagem',
+            referencia=referencia
+        )
+
+    def test_associa_usuario_pelo_contato_ou_email(self):
+        """Notificações endereçadas ao contato ou ao e-mail chegam ao mesmo inbox"""
+        n1 = self._criar(self.aluno.contato, 'ref_1')
+        n2 = self._criar(self.usuario.email, 'ref_2')
+
+        self.assertEqual(n1.usuario_id, self.usuario.pk)
+        self.assertEqual(n2.usuario_id, self.usuario.pk)
+        self.assertEqual(self._nao_lidas(), 2)
+
+    def test_registrar_deduplica_pela_chave_hash(self):
+        """A mesma combinação destinatário/assunto/referência gera uma única notificação"""
+        _, criada1 = Notificacao.objects.registrar(self.aluno.contato, 'Aviso', 'Mensagem', 'ref_dup')
+        _, criada2 = Notificacao.objects.registrar(self.aluno.contato, 'Aviso', 'Mensagem', 'ref_dup')
+
+        self.assertTrue(criada1)
+        self.assertFalse(criada2)
+        self.assertEqual(Notificacao.objects.filter(referencia='ref_dup').count(), 1)
+        self.assertEqual(len(Notificacao.objects.get(referencia='ref_dup').chave_dedup), 64)
+        self.assertEqual(self._nao_lidas(), 1)
+
+    def test_evento_repetido_notifica_de_novo_depois_de_lido(self):
+        """A chave de deduplicação só vale entre as não lidas"""
+        notificacao, _ = Notificacao.objects.registrar(
+            self.aluno.contato, 'Aviso', 'Mensagem', 'doc_ajustes_1', usuario=self.usuario
+        )
+        notificacao.marcar_como_lida()
+
+        # Com o usuário informado, o destinatário não precisa ser resolvido
+        with patch('estagio.models.resolver_usuario_destinatario') as resolver:
+            _, criada = Notificacao.objects.registrar(
+                self.aluno.contato, 'Aviso', 'Mensagem', 'doc_ajustes_1', usuario=self.usuario
+            )
+        resolver.assert_not_called()
+        self.assertTrue(criada)
+        self.assertEqual(Notificacao.objects.filter(referencia='doc_ajustes_1').count(), 2)
+        self.assertEqual(self._nao_lidas(), 1)
+
+    def test_marcar_como_lida_mantem_registro(self):
+        """Marcar como lida não exclui a notificação e decrementa o contador uma vez"""
+        notificacao = self._criar(self.aluno.contato, 'ref_lida')
+
+        response = self.client.post(reverse('api_marcar_notificacao_lida', args=[notificacao.id]))
+        self.assertEqual(response.status_code, 200)
+        self.client.post(reverse('api_marcar_notificacao_lida', args=[notificacao.id]))
+
+        notificacao.refresh_from_db()
+        self.assertTrue(notificacao.lida)
+        self.assertIsNotNone(notificacao.data_leitura)
+        self.assertEqual(self._nao_lidas(), 0)
+
+    def test_marcar_todas_como_lidas(self):
+        """Marcar todas como lidas atualiza em lote e zera o contador"""
+        for i in range(3):
+            self._criar(self.aluno.contato, f'ref_todas_{i}')
+
+        response = self.client.post(reverse('api_marcar_todas_notificacoes_lidas'))
+
+        self.assertEqual(response.json()['marcadas'], 3)
+        self.assertEqual(Notificacao.objects.do_usuario(self.usuario).nao_lidas().count(), 0)
+        self.assertEqual(self._nao_lidas(), 0)
+
+    def test_excluir_nao_lida_decrementa_contador(self):
+        """Excluir uma notificação não lida mantém o contador consistente"""
+        notificacao = self._criar(self.aluno.contato, 'ref_excluir')
+        self.assertEqual(self._nao_lidas(), 1)
+
+        notificacao.delete()
+        self.assertEqual(self._nao_lidas(), 0)
+
+    def test_contador_nao_consulta_tabela_de_notificacoes(self):
+        """A contagem do badge vem do contador desnormalizado do usuário"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self._criar(self.aluno.contato, 'ref_contador')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_contar_notificacoes_nao_lidas'))
+
+        self.assertEqual(response.json()['count'], 1)
+        self.assertFalse(any('estagio_notificacao' in q['sql'] for q in ctx.captured_queries))
+
+    def test_api_notificacoes_lista_apenas_nao_lidas(self):
+        """O popup lista apenas as notificações não lidas do usuário"""
+        lida = self._criar(self.aluno.contato, 'ref_a')
+        self._criar(self.aluno.contato, 'ref_b')
+        lida.marcar_como_lida()
+
+        data = self.client.get(reverse('api_notificacoes')).json()
+
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['notificacoes'][0]['referencia'], 'ref_b')
@@ -0,0 +1,293 @@
+"""
+Upload de documentos em partes, retomável.
+
+1. `iniciar_upload` registra nome, tamanho e SHA-256 esperados do arquivo.
+2. Cada parte chega num PUT com `Content-Range: bytes ini-fim/total` e é
+   gravada em disco na posição `ini`, que precisa ser igual ao total já
+   recebido; o cliente que perdeu a conexão consulta o status para saber de
+   onde continuar. A parte pode trazer o próprio SHA-256 (`X-Checksum-Sha256`).
+3. `finalizar_upload` confere tamanho e SHA-256 do arquivo montado.
+
+O upload concluído é anexado ao formulário de envio (campo `upload_id`) pelas
+views de solicitação, candidatura e reenvio, que seguem o fluxo normal de
+criação do documento como se o arquivo tivesse vindo no POST multipart.
+
+As partes ficam em MEDIA_ROOT/.envios/parciais, no mesmo sistema de arquivos
+do armazenamento de documentos.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from estagio.armazenamento import PASTA_TEMPORARIA, TAMANHO_BLOCO, armazenamento_documentos
+from estagio.models import UploadParcial
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES_PERMITIDAS = ('.pdf', '.doc', '.docx')
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadInvalido(ValueError):
+    """Pedido de upload recusado (400)"""
+
+
+class ConflitoOffset(Exception):
+    """A parte não começa no total já recebido (409); `offset` indica de onde continuar"""
+
+    def __init__(self, offset):
+        super().__init__(f"O upload continua a partir do byte {offset}.")
+        self.offset = offset
+
+
+def tamanho_maximo():
+    return getattr(settings, 'UPLOAD_PARCIAL_TAMANHO_MAX', 10 * 1024 * 1024)
+
+
+def bloco_maximo():
+    return getattr(settings, 'UPLOAD_PARCIAL_BLOCO_MAX', 2 * 1024 * 1024)
+
+
+def expiracao():
+    """Uploads sem atividade há mais tempo que isso são descartados"""
+    return timedelta(hours=getattr(settings, 'UPLOAD_PARCIAL_EXPIRACAO_HORAS', 24))
+
+
+def caminho_parcial(upload):
+    return armazenamento_documentos().path(os.path.join(PASTA_TEMPORARIA, 'parciais', f'{upload.token}.part'))
+
+
+def _ativos():
+    return UploadParcial.objects.filter(atualizado_em__gte=timezone.now() - expiracao())
+
+
+def obter_upload(usuario, token):
+    """Upload não expirado do usuário, ou None"""
+    return _ativos().filter(usuario=usuario, token=token).first()
+
+
+def iniciar_upload(usuario, nome_arquivo, tamanho, sha256):
+    nome_arquivo = os.path.basename((nome_arquivo or '').strip())
+    sha256 = (sha256 or '').strip().lower()
+    try:
+        tamanho = int(tamanho)
+    except (TypeError, ValueError):
+        raise UploadInvalido("Tamanho inválido.")
+
+    if not nome_arquivo:
+        raise UploadInvalido("Informe o nome do arquivo.")
+    if not nome_arquivo.lower().endswith(EXTENSOES_PERMITIDAS):
+        raise UploadInvalido("Formato de arquivo inválido. Use PDF, DOC ou DOCX.")
+    if tamanho <= 0 or tamanho > tamanho_maximo():
+        raise UploadInvalido(f"O arquivo deve ter entre 1 byte e {tamanho_maximo() // (1024 * 1024)}MB.")
+    if not _SHA256.match(sha256):
+        raise UploadInvalido("Informe o SHA-256 do arquivo (64 caracteres hexadecimais).")
+
+    upload = UploadParcial.objects.create(usuario=usuario, nome_arquivo=nome_arquivo, tamanho=tamanho, sha256=sha256)
+    caminho = caminho_parcial(upload)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    open(caminho, 'wb').close()
+    return upload
+
+
+def intervalo_da_parte(cabecalho, upload):
+    """(início, tamanho) da parte a partir do Content-Range"""
+    encontrado = _CONTENT_RANGE.match((cabecalho or '').strip())
+    if encontrado is None:
+        raise UploadInvalido("Envie a parte com o cabeçalho Content-Range: bytes ini-fim/total.")
+    inicio, fim, total = (int(valor) for valor in encontrado.groups())
+    if total != upload.tamanho or fim < inicio or fim >= total:
+        raise UploadInvalido("Content-Range fora do tamanho declarado do arquivo.")
+    tamanho = fim - inicio + 1
+    if tamanho > bloco_maximo():
+        raise UploadInvalido(f"Cada parte pode ter no máximo {bloco_maximo()} bytes.")
+    return inicio, tamanho
+
+
+def gravar_parte(upload, inicio, tamanho, origem, sha256_parte=None):
+    """
+    Grava `tamanho` bytes lidos de `origem` (a requisição) na posição `inicio`.
+
+    A parte é recebida num arquivo temporário próprio, fora de transação (a
+    leitura do corpo pode demorar em conexões lentas). Só depois a linha do
+    upload é travada para conferir de novo o offset e acrescentar a parte ao
+    arquivo montado, de modo que partes concorrentes do mesmo upload são
+    serializadas sem manter a transação aberta durante a transferência.
+    Retorna o total recebido.
+    """
+    if upload.status != 'em_andamento':
+        raise UploadInvalido("Upload já finalizado.")
+    if inicio != upload.recebido:
+        raise ConflitoOffset(upload.recebido)
+
+    caminho = caminho_parcial(upload)
+    temporario = f'{caminho}.{inicio}.{uuid.uuid4().hex}'
+    try:
+        digest = hashlib.sha256()
+        lidos = 0
+        with open(temporario, 'wb') as destino:
+            while lidos < tamanho:
+                bloco = origem.read(min(TAMANHO_BLOCO, tamanho - lidos))
+                if not bloco:
+                    break
+                digest.update(bloco)
+                destino.write(bloco)
+                lidos += len(bloco)
+        if lidos != tamanho:
+            raise UploadInvalido(f"Parte incompleta: {lidos} de {tamanho} bytes recebidos.")
+        if sha256_parte and digest.hexdigest() != sha256_parte.strip().lower():
+            raise UploadInvalido("SHA-256 da parte não confere.")
+
+        with transaction.atomic():
+            upload = UploadParcial.objects.select_for_update().get(pk=upload.pk)
+            if upload.status != 'em_andamento':
+                raise UploadInvalido("Upload já finalizado.")
+            if inicio != upload.recebido:
+                # Outra requisição gravou esta parte enquanto a recebíamos
+                raise ConflitoOffset(upload.recebido)
+
+            with open(caminho, 'r+b') as destino, open(temporario, 'rb') as parte:
+                # Descarta bytes de uma parte anterior interrompida antes do commit
+                destino.truncate(inicio)
+                destino.seek(inicio)
+                shutil.copyfileobj(parte, destino, TAMANHO_BLOCO)
+
+            upload.recebido = inicio + tamanho
+            upload.save(update_fields=['recebido', 'atualizado_em'])
+    finally:
+        _remover_parcial(temporario)
+    return upload.recebido
+
+
+def finalizar_upload(upload):
+    """
+    Confere tamanho e SHA-256 do arquivo montado e marca o upload como concluído.
+    Se o SHA-256 não conferir, o arquivo é descartado e o upload recomeça do zero.
+    """
+    with transaction.atomic():
+        upload = UploadParcial.objects.select_for_update().get(pk=upload.pk)
+        if upload.status == 'concluido':
+            return upload
+        if upload.recebido != upload.tamanho:
+            raise ConflitoOffset(upload.recebido)
+
+        caminho = caminho_parcial(upload)
+        digest = hashlib.sha256()
+        with open(caminho, 'rb') as origem:
+            for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                digest.update(bloco)
+        if digest.hexdigest() == upload.sha256:
+            upload.status = 'concluido'
+            upload.save(update_fields=['status', 'atualizado_em'])
+            return upload
+
+        # O reinício é gravado antes de sair do bloco atômico; a exceção vem depois do commit
+        with open(caminho, 'wb'):
+            pass
+        upload.recebido = 0
+        upload.save(update_fields=['recebido', 'atualizado_em'])
+    logger.warning(f"Upload {upload.token}: SHA-256 não confere, reiniciado")
+    raise UploadInvalido("SHA-256 do arquivo não confere; envie o arquivo novamente.")
+
+
+def como_dict(upload):
+    return {
+        'id': str(upload.token),
+        'nome_arquivo': upload.nome_arquivo,
+        'tamanho': upload.tamanho,
+        'offset': upload.recebido,
+        'status': upload.status,
+        'bloco_max': bloco_maximo(),
+        'url': reverse('api_upload_parcial', args=[upload.token]),
+    }
+
+
+def anexar_upload(request):
+    """
+    `request.FILES` acrescido, em 'arquivo', do upload concluído indicado no
+    campo `upload_id`. Retorna (arquivos, upload); upload é None sem upload_id
+    ou quando ele não é um upload concluído do usuário.
+
+    O arquivo parcial aberto aqui é fechado por `descartar_upload` ou, quando
+    a view retorna antes (formulário inválido, conflito, erro), por
+    `fecha_upload_anexado`, que precisa decorar a view.
+    """
+    token = request.POST.get('upload_id')
+    if not token or 'arquivo' in request.FILES:
+        return request.FILES, None
+    try:
+        upload = _ativos().filter(usuario=request.user, token=token, status='concluido').first()
+    except ValidationError:
+        # upload_id que não é um UUID
+        return request.FILES, None
+    if upload is None:
+        return request.FILES, None
+
+    arquivos = MultiValueDict(request.FILES.lists())
+    arquivos['arquivo'] = UploadedFile(
+        file=open(caminho_parcial(upload), 'rb'),
+        name=upload.nome_arquivo,
+        size=upload.tamanho,
+    )
+    request.uploads_anexados.append(arquivos['arquivo'])
+    return arquivos, upload
+
+
+def fecha_upload_anexado(view):
+    """
+    Decorador das views que chamam `anexar_upload`: fecha, ao fim da view,
+    os arquivos parciais que ela abriu e não descartou.
+    """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        request.uploads_anexados = []
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            for arquivo in request.uploads_anexados:
+                arquivo.close()
+    return _view
+
+
+def descartar_upload(upload, arquivos=None):
+    """
+    Remove o upload depois que o documento foi criado ou o envio cancelado.
+    Dentro de uma transação, o arquivo parcial só é apagado após o commit.
+    """
+    if arquivos is not None and 'arquivo' in arquivos:
+        arquivos['arquivo'].close()
+    caminho = caminho_parcial(upload)
+    upload.delete()
+    transaction.on_commit(lambda: _remover_parcial(caminho))
+
+
+def _remover_parcial(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def limpar_expirados():
+    """Descarta uploads sem atividade dentro do prazo de expiração; retorna a quantidade"""
+    removidos = 0
+    limite = timezone.now() - expiracao()
+    for upload in UploadParcial.objects.filter(atualizado_em__lt=limite).iterator():
+        descartar_upload(upload)
+        removidos += 1
+    return removidos
@@ -7,6 +7,7 @@ urlpatterns = [
     path('historico-solicitacoes/', views.historico_solicitacoes, name='historico_solicitacoes'),
     path('detalhe/<int:estagio_id>/', views.estagio_detalhe, name='estagio_detalhe'),
     path('detalhe/<int:estagio_id>/historico/', views.historico_estagio, name='historico_estagio'),
+    path('detalhe/<int:estagio_id>/dossie/', views.dossie_estagio, name='dossie_estagio'),
     path('documentos/', views.listar_documentos, name='listar_documentos'),
     path('documentos/<int:documento_id>/download/', views.download_documento, name='download_documento'),
     path('documentos/<int:documento_id>/historico/', views.historico_documento, name='historico_documento'),
@@ -14,10 +15,16 @@ urlpatterns = [
     path('supervisor/horas/', views.supervisor_ver_horas, name='supervisor_ver_horas'),
     path('notificacoes/', views.listar_notificacoes, name='listar_notificacoes'),
     path('notificacoes/<int:notificacao_id>/lida/', views.marcar_notificacao_lida, name='marcar_notificacao_lida'),
+    path('notificacoes/marcar-todas-lidas/', views.marcar_todas_notificacoes_lidas, name='marcar_todas_notificacoes_lidas'),
     path('api/notificacoes/', views.api_notificacoes, name='api_notificacoes'),
     path('api/notificacoes-nao-lidas/', views.api_contar_notificacoes_nao_lidas, name='api_contar_notificacoes_nao_lidas'),
+    path('api/notificacoes/stream/', views.api_notificacoes_stream, name='api_notificacoes_stream'),
     path('api/notificacoes/<int:notificacao_id>/lida/', views.api_marcar_notificacao_lida, name='api_marcar_notificacao_lida'),
+    path('api/notificacoes/marcar-todas-lidas/', views.api_marcar_todas_notificacoes_lidas, name='api_marcar_todas_notificacoes_lidas'),
     path('api/verificar-prazos/', views.api_verificar_prazos, name='api_verificar_prazos'),
+    path('api/uploads/', views.api_iniciar_upload, name='api_iniciar_upload'),
+    path('api/uploads/<uuid:token>/', views.api_upload_parcial, name='api_upload_parcial'),
+    path('api/uploads/<uuid:token>/finalizar/', views.api_finalizar_upload, name='api_finalizar_upload'),
     
     # Rotas de edição do aluno (cadastro movido para rota pública /cadastro/)
     path('aluno/editar/', views.editar_dados_aluno, name='editar_dados_aluno'),
@@ -51,6 +58,10 @@ urlpatterns = [
     path('relatorios/', views.gerar_relatorio_estagios, name='gerar_relatorio_estagios'),
     path('api/relatorios/', views.api_relatorio_estagios, name='api_relatorio_estagios'),
     path('api/relatorios/exportar/', views.api_relatorio_exportar, name='api_relatorio_exportar'),
+    path('api/relatorios/notas/', views.api_analise_notas, name='api_analise_notas'),
+    path('api/relatorios/jobs/<int:job_id>/', views.api_relatorio_job_status, name='api_relatorio_job_status'),
+    path('api/relatorios/jobs/<int:job_id>/download/', views.baixar_relatorio_job, name='baixar_relatorio_job'),
+    path('relatorios/dossie/', views.dossie_estagios_lote, name='dossie_estagios_lote'),
     
     # ========== Sprint 03 - Novas Rotas ==========
     
@@ -0,0 +1,339 @@
+"""
+Validação de documentos pelo supervisor (aprovar, solicitar ajustes, reprovar).
+
+A validação altera o status do próprio documento e é registrada apenas como
+uma entrada de `DocumentoHistorico`. Novas linhas de `Documento` surgem somente
+quando o aluno envia um novo arquivo, de modo que a cadeia de versões contém
+apenas arquivos de fato enviados.
+
+A validação em lote (listas do supervisor e do coordenador) grava status e
+histórico com `bulk_update`/`bulk_create` e envia uma única notificação por
+aluno com todos os documentos dele.
+
+Versões antigas das views gravavam cada validação como um `Documento` filho
+que reaproveitava o arquivo e a versão do pai ("pseudo-versão"); o comando
+`colapsar_pseudo_versoes` converte essas linhas em entradas de histórico.
+"""
+import logging
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from estagio import pendencias
+from estagio.email_outbox import enfileirar_emails_em_lote
+from admin.models import Supervisor
+from estagio.models import Aluno, Documento, DocumentoHistorico, Estagio, Notificacao
+from estagio.versao_dados import escopo_supervisor, escopos_de_estagios, incrementar_versoes
+from utils.email import enviar_notificacao_email
+
+logger = logging.getLogger(__name__)
+
+# Ação recebida pelas views -> status do documento (e ação do histórico)
+STATUS_POR_ACAO = {
+    'aprovar': 'aprovado',
+    'solicitar_ajustes': 'ajustes_solicitados',
+    'reprovar': 'reprovado',
+    # nomes usados pelo endpoint genérico de validação
+    'approve': 'aprovado',
+    'request_changes': 'ajustes_solicitados',
+    'reject': 'reprovado',
+}
+
+STATUS_VALIDACAO = ('aprovado', 'ajustes_solicitados', 'reprovado')
+
+# Ações do coordenador sobre documentos já aprovados pelo supervisor
+STATUS_POR_ACAO_COORDENADOR = {
+    'aprovar': 'finalizado',
+    'solicitar_ajustes': 'ajustes_solicitados',
+    'reprovar': 'reprovado',
+}
+
+# Documentos que cada perfil pode validar em lote
+STATUS_PENDENTES_SUPERVISOR = ('enviado', 'corrigido')
+STATUS_PENDENTES_COORDENADOR = ('aprovado',)
+
+
+def registrar_historico(documento, acao, usuario, observacoes=None):
+    """Registra uma ação no histórico do documento"""
+    return DocumentoHistorico.objects.create(
+        documento=documento,
+        acao=acao,
+        usuario=usuario,
+        observacoes=observacoes
+    )
+
+
+def notificar_aluno(documento, observacoes=None):
+    """Envia ao aluno do estágio o resultado da validação (e-mail e notificação no sistema)"""
+    aluno = Aluno.objects.filter(estagio_id=documento.estagio_id).select_related('usuario').first()
+    if not aluno or not aluno.usuario or not aluno.usuario.email:
+        return
+
+    status_display = documento.get_status_display()
+    assunto = f"Documento {documento.tipo or 'Documento'} - {status_display}"
+    mensagem = f"Seu documento '{documento.nome_arquivo}' foi {status_display.lower()}"
+    if documento.supervisor_id:
+        mensagem += f" pelo supervisor {documento.supervisor.nome}"
+    mensagem += ".\n\n"
+    if observacoes:
+        mensagem += f"Observações:\n{observacoes}\n\n"
+    mensagem += "Acesse o sistema para mais detalhes."
+
+    enviar_notificacao_email(destinatario=aluno.usuario.email, assunto=assunto, mensagem=mensagem)
+    try:
+        Notificacao.objects.registrar(
+            destinatario=aluno.usuario.email,
+            assunto=assunto,
+            mensagem=mensagem,
+            referencia=f"doc_{documento.status}_{documento.id}",
+            usuario=aluno.usuario,
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao criar notificação: {str(e)}")
+
+
+@transaction.atomic
+def validar_documento(documento, status, usuario, observacoes=None, supervisor=None, notificar=True):
+    """
+    Aplica a validação `status` ('aprovado', 'ajustes_solicitados' ou 'reprovado')
+    ao documento, registra a entrada no histórico e notifica o aluno.
+
+    Retorna a entrada de `DocumentoHistorico` criada.
+    """
+    if status not in STATUS_VALIDACAO:
+        raise ValueError(f"Status de validação inválido: {status}")
+    observacoes = (observacoes or '').strip() or None
+
+    documento.status = status
+    if supervisor is not None:
+        documento.supervisor = supervisor
+    if observacoes:
+        documento.observacoes_supervisor = observacoes
+    documento.aprovado_por = usuario
+    documento.data_aprovacao = timezone.now()
+    documento.save()
+
+    historico = registrar_historico(documento, status, usuario, observacoes)
+    if notificar:
+        notificar_aluno(documento, observacoes)
+    return historico
+
+
+# ---------------------------------------------------------------------------
+# Validação em lote
+# ---------------------------------------------------------------------------
+
+def _notificacoes_agrupadas(destinatarios, status, referencia, autor='', observacoes=None):
+    """
+    Uma notificação por destinatário com todos os documentos dele.
+    `destinatarios` mapeia (usuario_id, email) -> documentos.
+    """
+    status_display = dict(Documento.STATUS_CHOICES).get(status, status)
+    notificacoes = []
+    for (usuario_id, email), documentos in destinatarios.items():
+        if len(documentos) == 1:
+            assunto = f"Documento {documentos[0].tipo or 'Documento'} - {status_display}"
+        else:
+            assunto = f"{len(documentos)} documentos - {status_display}"
+        mensagem = f"Documentos {status_display.lower()}{autor}:\n"
+        mensagem += ''.join(f"- {d.nome_arquivo} ({d.tipo or 'Documento'})\n" for d in documentos)
+        if observacoes:
+            mensagem += f"\nObservações:\n{observacoes}\n"
+        mensagem += "\nAcesse o sistema para mais detalhes."
+        notificacoes.append(Notificacao(
+            destinatario=email, assunto=assunto, mensagem=mensagem, referencia=referencia, usuario_id=usuario_id,
+        ))
+    return notificacoes
+
+
+def _notificar_lote(documentos, status, observacoes, notificar_supervisores):
+    """Agrupa os documentos por aluno (e por supervisor) e grava notificações e e-mails em lote"""
+    referencia = f"doc_{status}_lote_{uuid.uuid4().hex[:16]}"
+
+    por_estagio = defaultdict(list)
+    for documento in documentos:
+        por_estagio[documento.estagio_id].append(documento)
+    alunos = defaultdict(list)
+    for estagio_id, usuario_id, email in Aluno.objects.filter(
+        estagio_id__in=por_estagio, usuario__isnull=False
+    ).exclude(usuario__email='').values_list('estagio_id', 'usuario_id', 'usuario__email'):
+        alunos[(usuario_id, email)].extend(por_estagio[estagio_id])
+    notificacoes = _notificacoes_agrupadas(alunos, status, referencia, observacoes=observacoes)
+
+    if notificar_supervisores:
+        contatos = {
+            supervisor_id: (usuario_id, email)
+            for supervisor_id, usuario_id, email in Supervisor.objects.filter(
+                pk__in={d.supervisor_id for d in documentos}
+            ).exclude(usuario__email='').values_list('id', 'usuario_id', 'usuario__email')
+        }
+        supervisores = defaultdict(list)
+        for documento in documentos:
+            if documento.supervisor_id in contatos:
+                supervisores[contatos[documento.supervisor_id]].append(documento)
+        notificacoes += _notificacoes_agrupadas(supervisores, status, referencia, ' pelo coordenador', observacoes)
+
+    if notificacoes:
+        Notificacao.objects.criar_em_lote(notificacoes)
+        enfileirar_emails_em_lote((n.destinatario, n.assunto, n.mensagem) for n in notificacoes)
+    return notificacoes
+
+
+@transaction.atomic
+def validar_documentos_em_lote(documentos, status, usuario, observacoes=None, coordenador=False):
+    """
+    Aplica `status` a todos os documentos de `documentos` (queryset já restrito
+    ao que o usuário pode validar) com um único `bulk_update`, registra o
+    histórico com `bulk_create` e notifica cada aluno uma única vez.
+
+    `coordenador=True` registra a aprovação final: 'finalizado' mantém a data
+    de aprovação do supervisor, inicia os estágios ainda em análise e também
+    notifica os supervisores. Retorna a lista de documentos alterados.
+    """
+    if status not in STATUS_VALIDACAO + ('finalizado',):
+        raise ValueError(f"Status de validação inválido: {status}")
+    observacoes = (observacoes or '').strip() or None
+
+    lote = list(documentos.select_for_update().only(
+        'id', 'estagio_id', 'supervisor_id', 'tipo', 'nome_arquivo', 'status',
+        'observacoes_supervisor', 'aprovado_por', 'data_aprovacao', 'updated_at',
+    ))
+    if not lote:
+        return []
+
+    agora = timezone.now()
+    campos = ['status', 'data_aprovacao', 'updated_at']
+    if observacoes:
+        campos.append('observacoes_supervisor')
+    if not coordenador:
+        campos.append('aprovado_por')
+    for documento in lote:
+        documento.status = status
+        documento.updated_at = agora
+        if observacoes:
+            documento.observacoes_supervisor = observacoes
+        if not coordenador:
+            documento.aprovado_por = usuario
+        if not (coordenador and documento.data_aprovacao):
+            documento.data_aprovacao = agora
+    Documento.objects.bulk_update(lote, campos)
+
+    if coordenador and status == 'finalizado':
+        observacoes_historico = observacoes or "Aprovação final do coordenador"
+    else:
+        observacoes_historico = observacoes
+    DocumentoHistorico.objects.bulk_create([
+        DocumentoHistorico(documento=documento, acao=status, usuario=usuario, observacoes=observacoes_historico)
+        for documento in lote
+    ])
+
+    estagio_ids = {documento.estagio_id for documento in lote}
+    if coordenador and status == 'finalizado':
+        iniciados = list(Estagio.objects.filter(pk__in=estagio_ids, status='analise').values_list('id', flat=True))
+        if iniciados:
+            # update() não preenche o auto_now: sem updated_at o delta do painel (?since=) não veria a mudança
+            Estagio.objects.filter(pk__in=iniciados).update(status='em_andamento', updated_at=agora)
+            pendencias.sincronizar_estagios(iniciados)
+
+    # bulk_update/update não disparam os signals de Documento e Estagio
+    pendencias.sincronizar_documentos([documento.pk for documento in lote])
+    incrementar_versoes(
+        escopos_de_estagios(estagio_ids) | {escopo_supervisor(d.supervisor_id) for d in lote if d.supervisor_id}
+    )
+
+    _notificar_lote(lote, status, observacoes, notificar_supervisores=coordenador)
+    logger.info(f"{len(lote)} documentos marcados como '{status}' em lote por {usuario}")
+    return lote
+
+
+# ---------------------------------------------------------------------------
+# Conversão das pseudo-versões antigas em histórico
+# ---------------------------------------------------------------------------
+
+def pseudo_versoes():
+    """Documentos filhos que repetem o arquivo e a versão do pai: validações gravadas como versão"""
+    return Documento.objects.filter(
+        parent__isnull=False,
+        arquivo=F('parent__arquivo'),
+        versao=F('parent__versao'),
+        status__in=STATUS_VALIDACAO,
+    )
+
+
+def _recalcular_profundidades(root_ids):
+    """Refaz depth e is_latest das cadeias após a remoção de nós intermediários"""
+    for root_id in root_ids:
+        nos = list(Documento.objects.filter(root_id=root_id).only('id', 'parent_id', 'depth', 'is_latest'))
+        filhos = defaultdict(list)
+        for no in nos:
+            filhos[no.parent_id].append(no)
+        alterados = []
+        fila = [(no, 0) for no in nos if no.pk == root_id or no.parent_id is None]
+        while fila:
+            no, depth = fila.pop()
+            is_latest = not filhos[no.pk]
+            if (no.depth, no.is_latest) != (depth, is_latest):
+                no.depth, no.is_latest = depth, is_latest
+                alterados.append(no)
+            fila.extend((filho, depth + 1) for filho in filhos[no.pk] if filho.pk != no.pk)
+        if alterados:
+            Documento.objects.bulk_update(alterados, ['depth', 'is_latest'])
+
+
+@transaction.atomic
+def colapsar_lote(batch_size=500):
+    """
+    Converte até `batch_size` pseudo-versões em entradas de `DocumentoHistorico`
+    do documento real mais próximo e remove as linhas duplicadas.
+
+    Filhos (reenvios) de uma pseudo-versão passam a apontar para o documento
+    real; o histórico já associado a ela também é transferido. Retorna a
+    quantidade de linhas removidas.
+    """
+    lote = list(
+        pseudo_versoes().select_related('supervisor').order_by('id')[:batch_size]
+    )
+    if not lote:
+        return 0
+
+    # Documento real de cada pseudo-versão (o pai pode ser outra pseudo-versão do lote)
+    alvo = {}
+    for pseudo in lote:
+        alvo[pseudo.pk] = alvo.get(pseudo.parent_id, pseudo.parent_id)
+    por_alvo = defaultdict(list)
+    for pseudo in lote:
+        por_alvo[alvo[pseudo.pk]].append(pseudo.pk)
+    ids = list(alvo)
+
+    for real_id, grupo in por_alvo.items():
+        Documento.objects.filter(parent_id__in=grupo).exclude(pk__in=ids).update(parent_id=real_id)
+        DocumentoHistorico.objects.filter(documento_id__in=grupo).update(documento_id=real_id)
+
+    historicos = DocumentoHistorico.objects.bulk_create([
+        DocumentoHistorico(
+            documento_id=alvo[pseudo.pk],
+            acao=pseudo.status,
+            usuario_id=pseudo.supervisor.usuario_id if pseudo.supervisor_id else None,
+            observacoes=pseudo.observacoes_supervisor,
+        )
+        for pseudo in lote
+    ])
+    # auto_now_add ignora o valor informado no INSERT: a data original vai num UPDATE em lote
+    for historico, pseudo in zip(historicos, lote):
+        historico.data_hora = pseudo.created_at
+    if all(h.pk for h in historicos):
+        DocumentoHistorico.objects.bulk_update(historicos, ['data_hora'])
+
+    # O status do documento real acompanha a última validação quando ela era a versão atual
+    for pseudo in lote:
+        if pseudo.is_latest:
+            Documento.objects.filter(pk=alvo[pseudo.pk]).update(status=pseudo.status)
+
+    root_ids = {pseudo.root_id for pseudo in lote if pseudo.root_id}
+    Documento.objects.filter(pk__in=ids).delete()
+    _recalcular_profundidades(root_ids)
+    logger.info(f"{len(ids)} pseudo-versões de documentos convertidas em histórico")
+    return len(ids)
@@ -0,0 +1,169 @@
+"""
+Versão dos dados por escopo para GET condicional (ETag / 304) nas APIs de polling.
+
+Cada alteração em Estagio, Documento, Avaliacao (e suas notas), Atividade ou
+HorasCumpridas incrementa, após o commit, o contador do escopo global e dos escopos de
+supervisor e aluno afetados. As APIs do painel calculam o ETag a
+partir das versões dos escopos visíveis ao usuário, de modo que um polling sem
+alterações recebe 304 sem executar as consultas pesadas.
+
+Atualizações em massa (`QuerySet.update`, `bulk_create`, `bulk_update`) não
+disparam signals; quem as usa deve chamar `incrementar_versoes` explicitamente.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from estagio.models import VersaoDados
+
+ESCOPO_GLOBAL = 'global'
+
+
+def escopo_supervisor(supervisor_id):
+    return f'supervisor:{supervisor_id}'
+
+
+def escopo_aluno(aluno_id):
+    return f'aluno:{aluno_id}'
+
+
+def _aplicar_incrementos(escopos):
+    atualizados = set(VersaoDados.objects.filter(escopo__in=escopos).values_list('escopo', flat=True))
+    if atualizados:
+        VersaoDados.objects.filter(escopo__in=atualizados).update(versao=F('versao') + 1)
+    novos = [VersaoDados(escopo=escopo, versao=1) for escopo in escopos if escopo not in atualizados]
+    if novos:
+        # Criação concorrente do mesmo escopo também resulta em versão != 0
+        VersaoDados.objects.bulk_create(novos, ignore_conflicts=True)
+
+
+def incrementar_versoes(escopos):
+    """Incrementa os escopos informados após o commit da transação atual"""
+    escopos = sorted({e for e in escopos if e})
+    if escopos:
+        transaction.on_commit(lambda: _aplicar_incrementos(escopos))
+
+
+def obter_versoes(escopos):
+    """Versão atual de cada escopo (0 para escopos nunca alterados)"""
+    versoes = dict(VersaoDados.objects.filter(escopo__in=escopos).values_list('escopo', 'versao'))
+    return {escopo: versoes.get(escopo, 0) for escopo in escopos}
+
+
+# ---------------------------------------------------------------------------
+# Escopos afetados por uma instância
+# ---------------------------------------------------------------------------
+
+def escopos_de_alunos(aluno_ids):
+    """Escopos dos alunos (sem consulta: vale também para aluno excluído na mesma transação)"""
+    return {escopo_aluno(a) for a in aluno_ids if a}
+
+
+def escopos_de_estagio(estagio_id, supervisor_id=None, aluno_solicitante_id=None):
+    """Escopos de um estágio: global, supervisor, aluno solicitante e alunos vinculados"""
+    from estagio.models import Aluno, Estagio
+
+    escopos = {ESCOPO_GLOBAL}
+    if estagio_id is None:
+        return escopos
+    if supervisor_id is None and aluno_solicitante_id is None:
+        dados = Estagio.objects.filter(pk=estagio_id).values('supervisor_id', 'aluno_solicitante_id').first() or {}
+        supervisor_id = dados.get('supervisor_id')
+        aluno_solicitante_id = dados.get('aluno_solicitante_id')
+    if supervisor_id:
+        escopos.add(escopo_supervisor(supervisor_id))
+    aluno_ids = set(Aluno.objects.filter(estagio_id=estagio_id).values_list('id', flat=True))
+    aluno_ids.add(aluno_solicitante_id)
+    escopos |= escopos_de_alunos(aluno_ids)
+    return escopos
+
+
+def escopos_de_estagios(estagio_ids):
+    """Escopos de vários estágios com duas consultas (para atualizações em lote)"""
+    from estagio.models import Aluno, Estagio
+
+    escopos = {ESCOPO_GLOBAL}
+    estagio_ids = {e for e in estagio_ids if e}
+    if not estagio_ids:
+        return escopos
+    aluno_ids = set()
+    for supervisor_id, aluno_solicitante_id in Estagio.objects.filter(pk__in=estagio_ids).values_list(
+        'supervisor_id', 'aluno_solicitante_id'
+    ):
+        if supervisor_id:
+            escopos.add(escopo_supervisor(supervisor_id))
+        aluno_ids.add(aluno_solicitante_id)
+    aluno_ids.update(Aluno.objects.filter(estagio_id__in=estagio_ids).values_list('id', flat=True))
+    escopos |= escopos_de_alunos(aluno_ids)
+    return escopos
+
+
+def escopos_da_instancia(instance):
+    """Escopos afetados pela alteração de Estagio, Documento, Avaliacao, Atividade ou HorasCumpridas"""
+    from estagio.models import Estagio, HorasCumpridas, NotaCriterio
+
+    if isinstance(instance, NotaCriterio):
+        # Notas alteram a completude da avaliação exibida nas pendências
+        from estagio.models import Avaliacao
+        avaliacao = Avaliacao.objects.filter(pk=instance.avaliacao_id).first()
+        return escopos_da_instancia(avaliacao) if avaliacao else {ESCOPO_GLOBAL}
+
+    if isinstance(instance, Estagio):
+        return escopos_de_estagio(instance.pk, instance.supervisor_id, instance.aluno_solicitante_id)
+
+    if isinstance(instance, HorasCumpridas):
+        # Supervisores veem as horas dos alunos dos estágios que supervisionam
+        supervisor_ids = Estagio.objects.filter(
+            aluno_solicitante_id=instance.aluno_id
+        ).values_list('supervisor_id', flat=True)
+        escopos = {ESCOPO_GLOBAL} | {escopo_supervisor(s) for s in supervisor_ids}
+        return escopos | escopos_de_alunos({instance.aluno_id})
+
+    escopos = escopos_de_estagio(getattr(instance, 'estagio_id', None))
+    if getattr(instance, 'supervisor_id', None):
+        escopos.add(escopo_supervisor(instance.supervisor_id))
+    if getattr(instance, 'aluno_id', None):
+        escopos |= escopos_de_alunos({instance.aluno_id})
+    return escopos
+
+
+# ---------------------------------------------------------------------------
+# ETag das APIs de polling
+# ---------------------------------------------------------------------------
+
+def escopos_do_usuario(request):
+    """Escopos cujos dados aparecem nas APIs do painel para o perfil do usuário"""
+    from users.perfil import get_perfil
+
+    usuario = request.user
+    # Staff e superusuários veem todos os estágios (relatórios e análise de notas), como o coordenador
+    if usuario.is_superuser or usuario.is_staff or usuario.tipo == 'coordenador':
+        return [ESCOPO_GLOBAL]
+    ids = get_perfil(request).ids
+    if usuario.tipo == 'supervisor':
+        return [escopo_supervisor(ids.get('supervisor'))]
+    if usuario.tipo == 'aluno':
+        return [escopo_aluno(ids.get('aluno'))]
+    return []
+
+
+def etag_dados_usuario(request, *args, **kwargs):
+    """
+    ETag para `django.views.decorators.http.condition`: combina a rota, o
+    usuário/perfil, a data atual (prazos dependem do dia), a query string e as
+    versões dos escopos visíveis.
+    """
+    if not request.user.is_authenticated:
+        return None
+    versoes = obter_versoes(escopos_do_usuario(request))
+    partes = [
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        str(request.user.pk),
+        request.user.tipo or '',
+        str(getattr(request.user, 'perfil_versao', 0)),
+        timezone.localdate().isoformat(),
+    ] + [f'{escopo}={versao}' for escopo, versao in sorted(versoes.items())]
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()[:32]
@@ -3,27 +3,42 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.utils.timezone import now
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from admin.models import CursoCoordenador,Supervisor
 from .forms import EstagioForm, DocumentoForm, AlunoCadastroForm, HorasCumpridasForm, SupervisorAlunoSelectForm
 from .models import Estagio, Documento, DocumentoHistorico, HorasCumpridas, Notificacao, FeedbackSupervisor
+from .painel import (
+    CursorInvalido, calcular_estatisticas, delta_estagios, gerar_cursor, ler_cursor, obter_dados_painel,
+)
+from .versao_dados import etag_dados_usuario
+from .pendencias import TIPOS_PENDENCIA, como_dict, pendencias_do_usuario, resumo_por_tipo, totais
+from .relatorios import montar_relatorio
+from .validacao_documentos import STATUS_POR_ACAO, validar_documento
+from .uploads import anexar_upload, descartar_upload, fecha_upload_anexado
+from .vinculos import ConflitoVinculo, candidatar
 from users.models import Usuario
 from estagio.models import Aluno
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.cache import cache_control
 from django.db import transaction
 from decimal import Decimal, InvalidOperation
 from utils.email import enviar_notificacao_email
 from django.utils.dateparse import parse_date
-from utils.decorators import aluno_required, supervisor_required
+from utils.decorators import aluno_required, coordenador_required, supervisor_required
 from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 @login_required
 @aluno_required
+@fecha_upload_anexado
 def solicitar_estagio(request):
     """
     View para aluno solicitar estágio criando uma nova vaga.
@@ -31,8 +46,9 @@ def solicitar_estagio(request):
     O vínculo só acontece após aprovação do coordenador.
     """
     if request.method == "POST":
+        arquivos, upload = anexar_upload(request)
         estagio_form = EstagioForm(request.POST)
-        documento_form = DocumentoForm(request.POST, request.FILES)
+        documento_form = DocumentoForm(request.POST, arquivos)
 
         # Valida os dois formulários
         if estagio_form.is_valid() and documento_form.is_valid():
@@ -42,8 +58,8 @@ def solicitar_estagio(request):
             estagio.status_vaga = "disponivel"  # Vaga fica disponível até aprovação
             
             try:
-                usuario = Usuario.objects.get(id=request.user.id)
-                aluno = Aluno.objects.get(usuario=usuario)
+                usuario = request.user
+                aluno = request.perfil.aluno
                 estagio.aluno_solicitante = aluno  # Salva o aluno que solicitou
                 estagio.save()
                 
@@ -80,6 +96,8 @@ def solicitar_estagio(request):
                 usuario=usuario,
                 observacoes="Documento inicial enviado"
             )
+            if upload is not None:
+                descartar_upload(upload, arquivos)
 
             # Enviar notificação para o coordenador
             coordenador_email = coordenador.usuario.email if coordenador.usuario.email else 'coordenador@example.com'
@@ -111,10 +129,8 @@ def solicitar_estagio(request):
 def acompanhar_estagios(request):
     """View para listar as solicitações de estágio do aluno logado"""  
     try:
-        # Busca o usuário logado
-        usuario = Usuario.objects.get(id=request.user.id)
         # Busca o aluno vinculado a este usuário
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         # Como Aluno tem FK para Estagio, verificamos se existe estágio vinculado
         if aluno.estagio:
@@ -149,8 +165,7 @@ def acompanhar_estagios(request):
 def historico_solicitacoes(request):
     """View para listar o histórico de todas as solicitações de estágio do aluno"""
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         from django.db.models import Q
         
@@ -175,10 +190,10 @@ def estagio_detalhe(request, estagio_id):
     """View para exibir detalhes de um estágio"""
     estagio = get_object_or_404(Estagio, id=estagio_id)
     
-    # Buscar apenas a versão mais recente de cada documento (documentos que não têm filhos)
+    # Buscar apenas a versão mais recente de cada documento
     documentos = Documento.objects.filter(
         estagio=estagio,
-        versions__isnull=True  # Não tem filhos = é a versão mais recente
+        is_latest=True  # Versão mais recente da cadeia (campo indexado)
     ).select_related('aprovado_por').order_by('-created_at')
     
     return render(request, "estagio/estagio_detalhe.html", {
@@ -187,38 +202,39 @@ def estagio_detalhe(request, estagio_id):
     })
 
 
-@login_required
-def historico_estagio(request, estagio_id):
-    """View para visualizar o histórico completo de todos os documentos de um estágio"""
-    estagio = get_object_or_404(Estagio, id=estagio_id)
-    
-    # Verificar permissão - aluno, supervisor ou coordenador
-    usuario = Usuario.objects.get(id=request.user.id)
-    tem_permissao = False
-    
+def _pode_ver_documentos_estagio(request, estagio):
+    """Aluno do estágio, seu supervisor ou coordenador responsável por algum documento dele"""
     try:
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         if estagio == aluno.estagio:
-            tem_permissao = True
+            return True
     except Aluno.DoesNotExist:
         pass
     
     try:
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         if estagio.supervisor == supervisor:
-            tem_permissao = True
+            return True
     except Supervisor.DoesNotExist:
         pass
     
     try:
-        coordenador = CursoCoordenador.objects.get(usuario=usuario)
+        coordenador = request.perfil.coordenador
         # Verifica se coordenador tem permissão sobre algum documento deste estágio
         if Documento.objects.filter(estagio=estagio, coordenador=coordenador).exists():
-            tem_permissao = True
+            return True
     except CursoCoordenador.DoesNotExist:
         pass
+    return False
+
+
+@login_required
+def historico_estagio(request, estagio_id):
+    """View para visualizar o histórico completo de todos os documentos de um estágio"""
+    estagio = get_object_or_404(Estagio, id=estagio_id)
     
-    if not tem_permissao:
+    # Verificar permissão - aluno, supervisor ou coordenador
+    if not _pode_ver_documentos_estagio(request, estagio):
         messages.error(request, "Você não tem permissão para visualizar este histórico.")
         return redirect('dashboard')
     
@@ -254,16 +270,14 @@ def historico_estagio(request, estagio_id):
 def listar_documentos(request):
     """View para listar todos os documentos enviados pelo aluno"""
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         # Buscar todos os documentos relacionados aos estágios do aluno
-        # Filtrar apenas a versão mais recente de cada cadeia (documentos que não têm filhos)
+        # Filtrar apenas a versão mais recente de cada cadeia
         if aluno.estagio:
-            # Buscar apenas documentos que são a versão mais recente (não têm filhos)
             documentos = Documento.objects.filter(
                 estagio=aluno.estagio,
-                versions__isnull=True  # Não tem filhos = é a versão mais recente
+                is_latest=True  # Versão mais recente da cadeia (campo indexado)
             ).select_related('aprovado_por').order_by('-created_at')
         else:
             documentos = []
@@ -280,9 +294,8 @@ def download_documento(request, documento_id):
     documento = get_object_or_404(Documento, id=documento_id)
     
     # Verificar se o usuário tem permissão para baixar
-    usuario = Usuario.objects.get(id=request.user.id)
     try:
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         if documento.estagio != aluno.estagio:
             messages.error(request, "Você não tem permissão para acessar este documento.")
             return redirect("listar_documentos")
@@ -290,8 +303,12 @@ def download_documento(request, documento_id):
         # Verificar se é supervisor ou coordenador
         pass
     
-    from django.http import FileResponse
-    return FileResponse(documento.arquivo.open('rb'), as_attachment=True, filename=documento.nome_arquivo)
+    # ?visualizar=1 exibe o arquivo no navegador em vez de baixá-lo
+    from .downloads import servir_arquivo
+    return servir_arquivo(
+        request, documento.arquivo, documento.nome_arquivo,
+        as_attachment=not request.GET.get('visualizar'),
+    )
 
 
 @login_required
@@ -314,25 +331,25 @@ def historico_documento(request, documento_id):
         )
         
         # Verificar permissão - aluno, supervisor ou coordenador
-        usuario = Usuario.objects.get(id=request.user.id)
+        usuario = request.user
         tem_permissao = False
         
         try:
-            aluno = Aluno.objects.get(usuario=usuario)
+            aluno = request.perfil.aluno
             if documento.estagio == aluno.estagio:
                 tem_permissao = True
         except Aluno.DoesNotExist:
             pass
         
         try:
-            supervisor = Supervisor.objects.get(usuario=usuario)
+            supervisor = request.perfil.supervisor
             if documento.estagio.supervisor == supervisor:
                 tem_permissao = True
         except Supervisor.DoesNotExist:
             pass
         
         try:
-            coordenador = CursoCoordenador.objects.get(usuario=usuario)
+            coordenador = request.perfil.coordenador
             if documento.coordenador == coordenador:
                 tem_permissao = True
         except CursoCoordenador.DoesNotExist:
@@ -424,11 +441,12 @@ def supervisor_requerir_ajustes(request, documento_id):
                 enviar_notificacao_email(destinatario=recipient, assunto=subject, mensagem=message)
                 # Criar notificação no sistema
                 try:
-                    Notificacao.objects.get_or_create(
+                    Notificacao.objects.registrar(
                         destinatario=recipient,
                         assunto=subject,
+                        mensagem=message,
                         referencia=f"doc_ajustes_{doc.id}",
-                        defaults={'mensagem': message}
+                        usuario=aluno.usuario,
                     )
                 except Exception as e:
                     logger.warning(f"Erro ao criar notificação: {str(e)}")
@@ -447,11 +465,10 @@ def supervisor_requerir_ajustes(request, documento_id):
 
 
 @login_required
-@transaction.atomic
 def supervisor_aprovar_documento(request, documento_id):
     """Aprovar documento: registra supervisor, define status e notifica o aluno."""
     try:
-        supervisor_obj = Supervisor.objects.get(usuario=request.user)
+        supervisor_obj = request.perfil.supervisor
     except Supervisor.DoesNotExist:
         messages.error(request, "Permissão negada.")
         return redirect("acompanhar_estagios")
@@ -459,60 +476,7 @@ def supervisor_aprovar_documento(request, documento_id):
     doc = get_object_or_404(Documento, pk=documento_id)
 
     if request.method == 'POST':
-        doc.status = 'aprovado'
-        doc.supervisor = supervisor_obj
-        doc.save()
-
-        # registrar validação como um Documento filho (histórico)
-        try:
-            Documento.objects.create(
-                data_envio=now().date(),
-                versao=doc.versao,
-                nome_arquivo=doc.nome_arquivo,
-                tipo=doc.tipo,
-                arquivo=doc.arquivo,
-                estagio=doc.estagio,
-                supervisor=supervisor_obj,
-                coordenador=doc.coordenador,
-                parent=doc,
-                status='aprovado',
-                observacoes_supervisor=None,
-                enviado_por=doc.enviado_por,
-            )
-        except Exception:
-            pass
-
-        # descobrir destinatário
-        recipient_email = None
-        try:
-            aluno = Aluno.objects.get(estagio=doc.estagio)
-            if aluno and aluno.usuario and aluno.usuario.email:
-                recipient_email = aluno.usuario.email
-        except Exception:
-            recipient_email = None
-
-        if recipient_email:
-            assunto = f"Documento aprovado: {doc.nome_arquivo}"
-            mensagem = (
-                f"Seu documento '{doc.nome_arquivo}' foi aprovado pelo supervisor {supervisor_obj.nome}.\n\n"
-                "Acesse o sistema para mais informações."
-            )
-            enviar_notificacao_email(
-                destinatario=recipient_email,
-                assunto=assunto,
-                mensagem=mensagem,
-            )
-            # Criar notificação no sistema
-            try:
-                Notificacao.objects.get_or_create(
-                    destinatario=recipient_email,
-                    assunto=assunto,
-                    referencia=f"doc_aprovado_{doc.id}",
-                    defaults={'mensagem': mensagem}
-                )
-            except Exception as e:
-                logger.warning(f"Erro ao criar notificação: {str(e)}")
-
+        validar_documento(doc, 'aprovado', request.user, supervisor=supervisor_obj)
         messages.success(request, "Documento aprovado com sucesso.")
         return redirect('estagio_detalhe', estagio_id=doc.estagio.id)
 
@@ -520,11 +484,10 @@ def supervisor_aprovar_documento(request, documento_id):
 
 
 @login_required
-@transaction.atomic
 def supervisor_reprovar_documento(request, documento_id):
     """Reprovar documento: registra supervisor, salva observações e notifica o aluno."""
     try:
-        supervisor_obj = Supervisor.objects.get(usuario=request.user)
+        supervisor_obj = request.perfil.supervisor
     except Supervisor.DoesNotExist:
         messages.error(request, "Permissão negada.")
         return redirect("acompanhar_estagios")
@@ -532,59 +495,8 @@ def supervisor_reprovar_documento(request, documento_id):
     doc = get_object_or_404(Documento, pk=documento_id)
 
     if request.method == 'POST':
-        observacoes = request.POST.get('observacoes', '').strip()
-        doc.status = 'reprovado'
-        doc.supervisor = supervisor_obj
-        if observacoes:
-            doc.observacoes_supervisor = observacoes
-        doc.save()
-
-        # registrar validação como um Documento filho (histórico)
-        try:
-            Documento.objects.create(
-                data_envio=now().date(),
-                versao=doc.versao,
-                nome_arquivo=doc.nome_arquivo,
-                tipo=doc.tipo,
-                arquivo=doc.arquivo,
-                estagio=doc.estagio,
-                supervisor=supervisor_obj,
-                coordenador=doc.coordenador,
-                parent=doc,
-                status='reprovado',
-                observacoes_supervisor=observacoes or None,
-                enviado_por=doc.enviado_por,
-            )
-        except Exception:
-            pass
-
-        # descobrir destinatário
-        recipient_email = None
-        try:
-            aluno = Aluno.objects.get(estagio=doc.estagio)
-            if aluno and aluno.usuario and aluno.usuario.email:
-                recipient_email = aluno.usuario.email
-        except Exception:
-            recipient_email = None
-
-        if recipient_email:
-            assunto = f"Documento reprovado: {doc.nome_arquivo}"
-            mensagem = f"Seu documento '{doc.nome_arquivo}' foi reprovado pelo supervisor {supervisor_obj.nome}.\n\n"
-            if observacoes:
-                mensagem += f"Observações:\n{observacoes}\n\n"
-            mensagem += "Por favor, acesse o sistema para mais detalhes."
-            enviar_notificacao_email(destinatario=recipient_email, assunto=assunto, mensagem=mensagem)
-            # Criar notificação no sistema
-            try:
-                Notificacao.objects.get_or_create(
-                    destinatario=recipient_email,
-                    assunto=assunto,
-                    referencia=f"doc_reprovado_{doc.id}",
-                    defaults={'mensagem': mensagem}
-                )
-            except Exception as e:
-                logger.warning(f"Erro ao criar notificação: {str(e)}")
-
+        observacoes = request.POST.get('observacoes', '')
+        validar_documento(doc, 'reprovado', request.user, observacoes, supervisor=supervisor_obj)
         messages.success(request, "Documento reprovado e observações registradas.")
         return redirect('estagio_detalhe', estagio_id=doc.estagio.id)
 
@@ -592,15 +504,14 @@ def supervisor_reprovar_documento(request, documento_id):
 
 
 @login_required
-@transaction.atomic
 def supervisor_validar_documento(request, documento_id):
     """Endpoint genérico para validar (aprovar, solicitar ajustes, reprovar).
 
     Recebe `action` no POST: 'approve' | 'request_changes' | 'reject'.
-    Registra uma entrada como um `Documento` filho (histórico) e notifica o aluno.
+    Registra a validação no histórico do documento e notifica o aluno.
     """
     try:
-        supervisor_obj = Supervisor.objects.get(usuario=request.user)
+        supervisor_obj = request.perfil.supervisor
     except Supervisor.DoesNotExist:
         messages.error(request, "Permissão negada.")
         return redirect('acompanhar_estagios')
@@ -608,73 +519,13 @@ def supervisor_validar_documento(request, documento_id):
     doc = get_object_or_404(Documento, pk=documento_id)
 
     if request.method == 'POST':
-        action = request.POST.get('action')
-        observacoes = request.POST.get('observacoes', '').strip()
-
-        if action == 'approve':
-            doc.status = 'aprovado'
-            acao = 'aprovado'
-        elif action == 'request_changes':
-            doc.status = 'ajustes_solicitados'
-            acao = 'ajustes_solicitados'
-        elif action == 'reject':
-            doc.status = 'reprovado'
-            acao = 'reprovado'
-        else:
+        acao = STATUS_POR_ACAO.get(request.POST.get('action'))
+        if acao is None:
             messages.error(request, 'Ação inválida.')
             return redirect('estagio_detalhe', estagio_id=doc.estagio.id)
 
-        doc.supervisor = supervisor_obj
-        if observacoes:
-            doc.observacoes_supervisor = observacoes
-        doc.save()
-
-        # registrar validação como Documento filho (histórico)
-        try:
-            Documento.objects.create(
-                data_envio=now().date(),
-                versao=doc.versao,
-                nome_arquivo=doc.nome_arquivo,
-                tipo=doc.tipo,
-                arquivo=doc.arquivo,
-                estagio=doc.estagio,
-                supervisor=supervisor_obj,
-                coordenador=doc.coordenador,
-                parent=doc,
-                status=acao,
-                observacoes_supervisor=observacoes or None,
-                enviado_por=doc.enviado_por,
-            )
-        except Exception:
-            pass
-
-        # notificar aluno/remetente
-        recipient = None
-        try:
-            aluno = Aluno.objects.get(estagio=doc.estagio)
-            if aluno and aluno.usuario and aluno.usuario.email:
-                recipient = aluno.usuario.email
-        except Exception:
-            recipient = None
-
-        if recipient:
-            assunto = f"Resultado da validação do documento: {doc.nome_arquivo}"
-            texto = f"Seu documento '{doc.nome_arquivo}' foi {acao} pelo supervisor {supervisor_obj.nome}.\n\n"
-            if observacoes:
-                texto += f"Observações:\n{observacoes}\n\n"
-            texto += "Acesse o sistema para mais detalhes."
-            enviar_notificacao_email(destinatario=recipient, assunto=assunto, mensagem=texto)
-            # Criar notificação no sistema
-            try:
-                Notificacao.objects.get_or_create(
-                    destinatario=recipient,
-                    assunto=assunto,
-                    referencia=f"doc_{acao}_{doc.id}",
-                    defaults={'mensagem': texto}
-                )
-            except Exception as e:
-                logger.warning(f"Erro ao criar notificação: {str(e)}")
-
+        observacoes = request.POST.get('observacoes', '')
+        validar_documento(doc, acao, request.user, observacoes, supervisor=supervisor_obj)
         messages.success(request, f"Documento {acao} com sucesso.")
         return redirect('estagio_detalhe', estagio_id=doc.estagio.id)
 
@@ -682,20 +533,85 @@ def supervisor_validar_documento(request, documento_id):
     return render(request, 'estagio/validar_documento.html', {'documento': doc})
 
 
+def _resposta_zip(gerador, nome_arquivo):
+    response = StreamingHttpResponse(gerador, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
+
+
+@login_required
+def dossie_estagio(request, estagio_id):
+    """
+    ZIP com a versão mais recente de cada documento do estágio, gerado em streaming.
+
+    ?historico=1 inclui todas as versões; ?compressao=deflate recompacta os arquivos.
+    """
+    from .dossie import COMPRESSOES, documentos_do_dossie, gerar_dossie
+
+    estagio = get_object_or_404(Estagio, id=estagio_id)
+    if not _pode_ver_documentos_estagio(request, estagio):
+        messages.error(request, "Você não tem permissão para baixar os documentos deste estágio.")
+        return redirect('dashboard')
+
+    compressao = request.GET.get('compressao', 'stored')
+    if compressao not in COMPRESSOES:
+        return JsonResponse({'success': False, 'error': 'Compressão inválida.'}, status=400)
+    com_historico = bool(request.GET.get('historico'))
+
+    documentos = documentos_do_dossie([estagio], com_historico)
+    return _resposta_zip(
+        gerar_dossie(documentos, com_historico, compressao),
+        f'dossie_estagio_{estagio.id}.zip',
+    )
+
+
+@login_required
+@coordenador_required
+def dossie_estagios_lote(request):
+    """
+    Um único ZIP com os documentos de todos os estágios que atendem aos filtros
+    do relatório (período, status, empresa, supervisor), uma pasta por estágio.
+
+    O coordenador recebe apenas os documentos sob sua responsabilidade.
+    """
+    from .dossie import COMPRESSOES, documentos_do_dossie, gerar_dossie
+    from .forms import RelatorioEstagiosForm
+
+    form = RelatorioEstagiosForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+    compressao = request.GET.get('compressao', 'stored')
+    if compressao not in COMPRESSOES:
+        return JsonResponse({'success': False, 'error': 'Compressão inválida.'}, status=400)
+    com_historico = bool(request.GET.get('historico'))
+
+    try:
+        coordenador = request.perfil.coordenador
+    except CursoCoordenador.DoesNotExist:
+        coordenador = None  # administradores recebem todos os documentos
+
+    estagios = _aplicar_filtros_relatorio(Estagio.objects.all(), form.cleaned_data)
+    documentos = documentos_do_dossie(estagios, com_historico, coordenador=coordenador)
+    return _resposta_zip(
+        gerar_dossie(documentos, com_historico, compressao, por_estagio=True),
+        f'dossie_estagios_{timezone.localdate():%Y%m%d}.zip',
+    )
+
+
 @login_required
 def documento_validacoes(request, documento_id):
     """Exibe o histórico de validações para um documento específico."""
     # checar permissão: supervisor ou aluno dono do estagio
     doc = get_object_or_404(Documento, pk=documento_id)
 
-    # obter lista de validações relacionadas
-    validacoes = doc.validacoes.order_by('-criado_em') if hasattr(doc, 'validacoes') else []
+    validacoes = doc.historico.select_related('usuario').order_by('-data_hora')
 
     return render(request, 'estagio/documento_validacoes.html', {'documento': doc, 'validacoes': validacoes})
 
 
 @login_required
 @transaction.atomic
+@fecha_upload_anexado
 def aluno_reenviar_documento(request, documento_id):
     """
     Aluno reenvia documento corrigido.
@@ -707,8 +623,8 @@ def aluno_reenviar_documento(request, documento_id):
 
     # validar que o usuário logado é o aluno responsável pelo estágio do documento
     try:
-        usuario_obj = Usuario.objects.get(pk=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario_obj)
+        usuario_obj = request.user
+        aluno = request.perfil.aluno
 
         # agora usamos a variável aluno corretamente:
         if aluno.estagio != old.estagio:
@@ -727,7 +643,8 @@ def aluno_reenviar_documento(request, documento_id):
 
     # POST: criar nova versão do documento
     if request.method == "POST":
-        uploaded_file = request.FILES.get('arquivo')
+        arquivos, upload = anexar_upload(request)
+        uploaded_file = arquivos.get('arquivo')
         if not uploaded_file:
             messages.error(request, "Arquivo não enviado.")
             return redirect("estagio_detalhe", estagio_id=old.estagio.id)
@@ -758,6 +675,8 @@ def aluno_reenviar_documento(request, documento_id):
             status='enviado',
             enviado_por=usuario_obj,
         )
+        if upload is not None:
+            descartar_upload(upload, arquivos)
 
         # marcar documento antigo como substituído
         old.status = 'substituido'
@@ -777,6 +696,7 @@ def aluno_reenviar_documento(request, documento_id):
 
 @login_required
 @aluno_required
+@fecha_upload_anexado
 def reenviar_documento(request, documento_id):
     """Permite ao aluno reenviar um documento após ajustes solicitados ou reprovação"""
     print(f"[DEBUG] reenviar_documento chamado - documento_id: {documento_id}, method: {request.method}")
@@ -805,7 +725,8 @@ def reenviar_documento(request, documento_id):
     
     if request.method == "POST":
         print("[DEBUG] Método POST detectado")
-        arquivo = request.FILES.get('arquivo')
+        arquivos, upload = anexar_upload(request)
+        arquivo = arquivos.get('arquivo')
         observacoes = request.POST.get('observacoes', '')
         print(f"[DEBUG] Arquivo recebido: {arquivo.name if arquivo else 'None'}, Observações: {observacoes}")
         
@@ -849,8 +770,11 @@ def reenviar_documento(request, documento_id):
                     versao=documento_original.versao + 1,
                     supervisor=documento_original.supervisor,
                     coordenador=documento_original.coordenador,
+                    parent=documento_original,
                     enviado_por=request.user
                 )
+                if upload is not None:
+                    descartar_upload(upload, arquivos)
                 
                 # Registrar criação no histórico
                 DocumentoHistorico.objects.create(
@@ -883,6 +807,91 @@ def reenviar_documento(request, documento_id):
     return redirect('listar_documentos')
 
 
+# ==================== UPLOAD EM PARTES ====================
+
+def _resposta_erro_upload(erro):
+    from .uploads import ConflitoOffset
+
+    if isinstance(erro, ConflitoOffset):
+        return JsonResponse({'success': False, 'error': str(erro), 'offset': erro.offset}, status=409)
+    return JsonResponse({'success': False, 'error': str(erro)}, status=400)
+
+
+@login_required
+@aluno_required
+@require_POST
+def api_iniciar_upload(request):
+    """
+    Inicia um upload em partes. Recebe nome_arquivo, tamanho e sha256 (JSON ou
+    formulário) e devolve o id do upload e a URL para enviar as partes.
+    """
+    from .uploads import UploadInvalido, como_dict, iniciar_upload
+
+    if request.content_type == 'application/json':
+        try:
+            dados = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'JSON inválido.'}, status=400)
+    else:
+        dados = request.POST
+    try:
+        upload = iniciar_upload(request.user, dados.get('nome_arquivo'), dados.get('tamanho'), dados.get('sha256'))
+    except UploadInvalido as e:
+        return _resposta_erro_upload(e)
+    return JsonResponse({'success': True, 'upload': como_dict(upload)}, status=201)
+
+
+@login_required
+@aluno_required
+def api_upload_parcial(request, token):
+    """
+    GET: status e offset do upload (de onde continuar após uma reconexão).
+    PUT: envia uma parte (Content-Range: bytes ini-fim/total; opcional X-Checksum-Sha256).
+    DELETE: cancela o upload.
+    """
+    from .uploads import (
+        ConflitoOffset, UploadInvalido, como_dict, descartar_upload, gravar_parte,
+        intervalo_da_parte, obter_upload,
+    )
+
+    upload = obter_upload(request.user, token)
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Upload não encontrado ou expirado.'}, status=404)
+
+    if request.method == 'GET':
+        return JsonResponse({'success': True, 'upload': como_dict(upload)})
+    if request.method == 'DELETE':
+        descartar_upload(upload)
+        return JsonResponse({'success': True})
+    if request.method != 'PUT':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'}, status=405)
+
+    try:
+        inicio, tamanho = intervalo_da_parte(request.headers.get('Content-Range'), upload)
+        # Lê o corpo direto do stream, sem passar pelo limite de DATA_UPLOAD_MAX_MEMORY_SIZE
+        upload.recebido = gravar_parte(upload, inicio, tamanho, request, request.headers.get('X-Checksum-Sha256'))
+    except (ConflitoOffset, UploadInvalido) as e:
+        return _resposta_erro_upload(e)
+    return JsonResponse({'success': True, 'upload': como_dict(upload)})
+
+
+@login_required
+@aluno_required
+@require_POST
+def api_finalizar_upload(request, token):
+    """Confere o SHA-256 do arquivo montado; o id do upload concluído vai no campo upload_id dos formulários de envio"""
+    from .uploads import ConflitoOffset, UploadInvalido, como_dict, finalizar_upload, obter_upload
+
+    upload = obter_upload(request.user, token)
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Upload não encontrado ou expirado.'}, status=404)
+    try:
+        upload = finalizar_upload(upload)
+    except (ConflitoOffset, UploadInvalido) as e:
+        return _resposta_erro_upload(e)
+    return JsonResponse({'success': True, 'upload': como_dict(upload)})
+
+
 def cadastrar_aluno(request):
     """View pública para cadastro de dados pessoais e acadêmicos do aluno.
     Permite que um usuário não autenticado se cadastre como aluno,
@@ -892,19 +901,19 @@ def cadastrar_aluno(request):
     """
     # Se usuário está autenticado, verificar se já tem perfil
     if request.user.is_authenticated:
-        usuario = Usuario.objects.get(id=request.user.id)
+        usuario = request.user
         
         # Impedir supervisores e coordenadores de se cadastrarem como alunos
-        if hasattr(request.user, 'supervisor'):
+        if request.perfil.is_supervisor:
             messages.error(request, 'Supervisores não podem se cadastrar como alunos.')
             return redirect('dashboard')
         
-        if hasattr(request.user, 'cursocoordenador'):
+        if request.perfil.is_coordenador:
             messages.error(request, 'Coordenadores não podem se cadastrar como alunos.')
             return redirect('dashboard')
         
         # Verifica se o usuário já é aluno
-        if Aluno.objects.filter(usuario=usuario).exists():
+        if request.perfil.is_aluno:
             messages.info(request, 'Você já possui um cadastro de aluno.')
             return redirect('editar_dados_aluno')
     else:
@@ -981,7 +990,7 @@ def cadastrar_aluno(request):
 @login_required
 @aluno_required
 def editar_dados_aluno(request):
-    usuario = Usuario.objects.get(id=request.user.id)
+    usuario = request.user
     aluno = get_object_or_404(Aluno, usuario=usuario)
     if request.method == 'POST':
         form = AlunoCadastroForm(request.POST, instance=aluno)
@@ -1003,7 +1012,7 @@ def editar_dados_aluno(request):
 @login_required
 @aluno_required
 def cadastrar_horas(request):
-    usuario = Usuario.objects.get(id=request.user.id)
+    usuario = request.user
     aluno = get_object_or_404(Aluno, usuario=usuario)
     # Parametriza a meta de horas obrigatórias conforme a carga_horaria do estágio
     if aluno.estagio and aluno.estagio.carga_horaria:
@@ -1057,165 +1066,155 @@ def supervisor_ver_horas(request):
 @login_required
 def listar_notificacoes(request):
     """View para listar as notificações do usuário logado"""
-    try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        # Busca o aluno vinculado ao usuário para obter o email
-        try:
-            aluno = Aluno.objects.get(usuario=usuario)
-            email_destinatario = aluno.usuario.email
-        except Aluno.DoesNotExist:
-            # Se não for aluno, tenta buscar como supervisor ou coordenador
-            try:
-                supervisor = Supervisor.objects.get(usuario=usuario)
-                email_destinatario = supervisor.usuario.email
-            except Supervisor.DoesNotExist:
-                try:
-                    coordenador = CursoCoordenador.objects.get(usuario=usuario)
-                    email_destinatario = coordenador.usuario.email
-                except CursoCoordenador.DoesNotExist:
-                    email_destinatario = usuario.email
-        
-        # Busca notificações enviadas para o email do usuário
-        notificacoes = Notificacao.objects.filter(destinatario=email_destinatario).order_by('-data_envio')
-    except Usuario.DoesNotExist:
-        notificacoes = []
+    # Consulta pelo índice (usuario, lida, data_envio)
+    notificacoes = Notificacao.objects.do_usuario(request.user).order_by('lida', '-data_envio')
     
-    return render(request, 'estagio/listar_notificacoes.html', {'notificacoes': notificacoes})
+    return render(request, 'estagio/listar_notificacoes.html', {
+        'notificacoes': notificacoes,
+        'nao_lidas': request.user.notificacoes_nao_lidas,
+    })
 
 
 @login_required
 def marcar_notificacao_lida(request, notificacao_id):
-    """Marca uma notificação como lida (exclui da lista)"""
+    """Marca uma notificação como lida (mantém o registro no histórico)"""
     notificacao = get_object_or_404(Notificacao, id=notificacao_id)
     # Verifica se o usuário tem permissão
-    try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        try:
-            aluno = Aluno.objects.get(usuario=usuario)
-            email_destinatario = aluno.contato
-        except Aluno.DoesNotExist:
-            try:
-                supervisor = Supervisor.objects.get(usuario=usuario)
-                email_destinatario = supervisor.contato
-            except Supervisor.DoesNotExist:
-                try:
-                    coordenador = CursoCoordenador.objects.get(usuario=usuario)
-                    email_destinatario = coordenador.contato
-                except CursoCoordenador.DoesNotExist:
-                    email_destinatario = usuario.email
-        
-        if notificacao.destinatario == email_destinatario:
-            notificacao.delete()
-            messages.success(request, 'Notificação removida com sucesso.')
-        else:
-            messages.error(request, 'Você não tem permissão para remover esta notificação.')
-    except Usuario.DoesNotExist:
-        messages.error(request, 'Usuário não encontrado.')
+    if notificacao.usuario_id == request.user.id:
+        notificacao.marcar_como_lida()
+        messages.success(request, 'Notificação marcada como lida.')
+    else:
+        messages.error(request, 'Você não tem permissão para alterar esta notificação.')
+    
+    return redirect('listar_notificacoes')
+
+
+@login_required
+@require_POST
+def marcar_todas_notificacoes_lidas(request):
+    """Marca todas as notificações do usuário como lidas"""
+    total = Notificacao.objects.marcar_todas_como_lidas(request.user)
+    if total:
+        messages.success(request, f'{total} notificação(ões) marcada(s) como lida(s).')
+    else:
+        messages.info(request, 'Não há notificações não lidas.')
     
     return redirect('listar_notificacoes')
 
 
 @login_required
 def api_notificacoes(request):
-    """API que retorna as notificações do usuário logado em formato JSON para o popup"""
-    try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        # Busca o email do usuário conforme seu tipo
-        try:
-            aluno = Aluno.objects.get(usuario=usuario)
-            email_destinatario = aluno.contato
-        except Aluno.DoesNotExist:
-            try:
-                supervisor = Supervisor.objects.get(usuario=usuario)
-                email_destinatario = supervisor.contato
-            except Supervisor.DoesNotExist:
-                try:
-                    coordenador = CursoCoordenador.objects.get(usuario=usuario)
-                    email_destinatario = coordenador.contato
-                except CursoCoordenador.DoesNotExist:
-                    email_destinatario = usuario.email
-        
-        # Busca notificações enviadas para o email do usuário
-        notificacoes = Notificacao.objects.filter(destinatario=email_destinatario).order_by('-data_envio')[:10]
-        
-        data = {
-            'count': notificacoes.count(),
-            'total': notificacoes.count(),
-            'notificacoes': [
-                {
-                    'id': n.id,
-                    'assunto': n.assunto,
-                    'mensagem': n.mensagem,
-                    'data_envio': n.data_envio.strftime('%d/%m/%Y %H:%M'),
-                    'referencia': n.referencia
-                } for n in notificacoes
-            ]
-        }
-    except Usuario.DoesNotExist:
-        data = {'count': 0, 'total': 0, 'notificacoes': []}
+    """API que retorna as notificações não lidas do usuário logado em formato JSON para o popup"""
+    # Consulta pelo índice (usuario, lida, data_envio)
+    notificacoes = list(
+        Notificacao.objects.do_usuario(request.user).nao_lidas().order_by('-data_envio')[:10]
+    )
+    
+    data = {
+        'count': len(notificacoes),
+        'total': request.user.notificacoes_nao_lidas,
+        'notificacoes': [
+            {
+                'id': n.id,
+                'assunto': n.assunto,
+                'mensagem': n.mensagem,
+                'data_envio': n.data_envio.strftime('%d/%m/%Y %H:%M'),
+                'referencia': n.referencia
+            } for n in notificacoes
+        ]
+    }
     
     return JsonResponse(data)
 
 
 @login_required
 def api_contar_notificacoes_nao_lidas(request):
-    """API que retorna o número de notificações - para badge na navbar"""
+    """API que retorna o número de notificações não lidas - para badge na navbar"""
+    # Contador desnormalizado carregado junto com o usuário: nenhuma consulta extra
+    return JsonResponse({'count': request.user.notificacoes_nao_lidas})
+
+
+def _formatar_evento_sse(evento, dados):
+    """Serializa um evento no formato text/event-stream"""
+    return f"event: {evento}\ndata: {json.dumps(dados)}\n\n"
+
+
+async def _stream_contagem_notificacoes(canal, count_inicial):
+    """
+    Gerador assíncrono do canal SSE: envia a contagem inicial, depois cada
+    mudança publicada no broker, com heartbeat periódico. A conexão é
+    encerrada após NOTIFICACOES_SSE_TIMEOUT e o EventSource reconecta sozinho.
+    """
+    from django.conf import settings
+    from .notificacoes_broker import get_broker
+    
+    heartbeat = getattr(settings, 'NOTIFICACOES_SSE_HEARTBEAT', 25)
+    duracao = getattr(settings, 'NOTIFICACOES_SSE_TIMEOUT', 300)
+    
+    broker = get_broker()
+    assinatura = broker.subscribe(canal)
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        # Busca o email do usuário conforme seu tipo
-        try:
-            aluno = Aluno.objects.get(usuario=usuario)
-            email_destinatario = aluno.contato
-        except Aluno.DoesNotExist:
+        yield "retry: 5000\n" + _formatar_evento_sse('contagem', {'count': count_inicial})
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + duracao
+        while True:
+            restante = limite - loop.time()
+            if restante <= 0:
+                break
             try:
-                supervisor = Supervisor.objects.get(usuario=usuario)
-                email_destinatario = supervisor.contato
-            except Supervisor.DoesNotExist:
-                try:
-                    coordenador = CursoCoordenador.objects.get(usuario=usuario)
-                    email_destinatario = coordenador.contato
-                except CursoCoordenador.DoesNotExist:
-                    email_destinatario = usuario.email
-        
-        # Conta todas as notificações não deletadas
-        count = Notificacao.objects.filter(destinatario=email_destinatario).count()
-        
-        return JsonResponse({'count': count})
-    except Usuario.DoesNotExist:
-        return JsonResponse({'count': 0})
+                dados = await asyncio.wait_for(assinatura.get(), timeout=min(heartbeat, restante))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+            else:
+                yield _formatar_evento_sse('contagem', dados)
+    finally:
+        broker.unsubscribe(assinatura)
+
+
+@login_required
+async def api_notificacoes_stream(request):
+    """
+    Canal Server-Sent Events com a contagem de notificações para o badge da navbar.
+    Só é servido via ASGI (sage/asgi.py); em WSGI responde 204 e o navegador
+    continua usando o polling de api_contar_notificacoes_nao_lidas.
+    """
+    from .signals import canal_notificacoes
+    
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    usuario = await request.auser()
+    
+    response = StreamingHttpResponse(
+        _stream_contagem_notificacoes(canal_notificacoes(usuario.pk), usuario.notificacoes_nao_lidas),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
 def api_marcar_notificacao_lida(request, notificacao_id):
-    """API para marcar uma notificação como lida (remove) via AJAX"""
+    """API para marcar uma notificação como lida via AJAX"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Método não permitido'}, status=405)
     
-    try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        try:
-            aluno = Aluno.objects.get(usuario=usuario)
-            email_destinatario = aluno.contato
-        except Aluno.DoesNotExist:
-            try:
-                supervisor = Supervisor.objects.get(usuario=usuario)
-                email_destinatario = supervisor.contato
-            except Supervisor.DoesNotExist:
-                try:
-                    coordenador = CursoCoordenador.objects.get(usuario=usuario)
-                    email_destinatario = coordenador.contato
-                except CursoCoordenador.DoesNotExist:
-                    email_destinatario = usuario.email
-        
-        notificacao = get_object_or_404(Notificacao, id=notificacao_id)
-        
-        if notificacao.destinatario == email_destinatario:
-            notificacao.delete()
-            return JsonResponse({'success': True})
-        else:
-            return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
-    except Usuario.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Usuário não encontrado'}, status=404)
+    notificacao = get_object_or_404(Notificacao, id=notificacao_id)
+    
+    if notificacao.usuario_id == request.user.id:
+        notificacao.marcar_como_lida()
+        return JsonResponse({'success': True})
+    else:
+        return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
+
+
+@login_required
+@require_POST
+def api_marcar_todas_notificacoes_lidas(request):
+    """API para marcar todas as notificações do usuário como lidas via AJAX"""
+    total = Notificacao.objects.marcar_todas_como_lidas(request.user)
+    return JsonResponse({'success': True, 'marcadas': total})
 
 
 def verificar_prazos_proximos(dias_alerta=3):
@@ -1227,56 +1226,9 @@ def verificar_prazos_proximos(dias_alerta=3):
     CA5 - Impede notificações duplicadas
     CA6 - Registra data e hora do envio
     """
-    logger = logging.getLogger(__name__)
-    
-    hoje = timezone.now().date()
-    notificacoes_enviadas = []
-    
-    # CA1 - Identifica documentos com prazos próximos
-    # CA4 - Exclui documentos já entregues
-    documentos = Documento.objects.filter(
-        prazo_limite__isnull=False
-    ).exclude(
-        status__in=['aprovado', 'finalizado', 'substituido', 'enviado', 'corrigido']
-    )
-    
-    for doc in documentos:
-        if doc.prazo_limite:
-            dias_restantes = (doc.prazo_limite - hoje).days
-            # CA2 - Verifica se está dentro do período de alerta
-            if 0 <= dias_restantes <= dias_alerta:
-                try:
-                    aluno = Aluno.objects.get(estagio=doc.estagio)
-                    destinatario = aluno.contato
-                    # CA3 - Informa nome do documento e data limite
-                    assunto = f"Alerta: Prazo próximo para o documento {doc.nome_arquivo}"
-                    mensagem = f"O prazo para envio do documento '{doc.nome_arquivo}' termina em {dias_restantes} dia(s): {doc.prazo_limite.strftime('%d/%m/%Y')}. Por favor, envie o documento corrigido o quanto antes."
-                    # CA5 - Referência única para evitar duplicidade
-                    referencia = f"alerta_prazo_{doc.id}_{doc.prazo_limite}"
-                    
-                    # CA5 - Impede notificações duplicadas
-                    if not Notificacao.objects.filter(destinatario=destinatario, referencia=referencia).exists():
-                        try:
-                            enviar_notificacao_email(destinatario=destinatario, assunto=assunto, mensagem=mensagem)
-                        except Exception:
-                            pass  # Continua mesmo se email falhar
-                        
-                        # CA6 - Registra data e hora do envio
-                        notificacao = Notificacao.objects.create(
-                            destinatario=destinatario,
-                            assunto=assunto,
-                            mensagem=mensagem,
-                            referencia=referencia,
-                            data_envio=timezone.now()
-                        )
-                        notificacoes_enviadas.append(notificacao)
-                        logger.info(f"Notificação enviada para {destinatario} sobre documento {doc.id}")
-                except Aluno.DoesNotExist:
-                    logger.warning(f"Aluno não encontrado para o estágio do documento {doc.id}")
-                except Exception as e:
-                    logger.error(f"Erro ao notificar documento {doc.id}: {e}")
-    
-    return notificacoes_enviadas
+    from estagio.prazos import escanear_prazos_proximos
+
+    return escanear_prazos_proximos(dias_alerta=dias_alerta).notificacoes
 
 
 @login_required
@@ -1305,8 +1257,7 @@ def listar_feedbacks(request):
     from .models import FeedbackSupervisor
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         # Busca feedbacks do aluno ordenados por data (mais recente primeiro)
         feedbacks = FeedbackSupervisor.objects.filter(
@@ -1328,8 +1279,7 @@ def consultar_horas(request):
     Task 20929 - Exibir mensagem quando não houver horas cadastradas
     """
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         # Busca horas do aluno ordenadas por data (mais recente primeiro)
         horas_list = HorasCumpridas.objects.filter(aluno=aluno).order_by('-data')
@@ -1374,7 +1324,7 @@ def enviar_feedback_aluno(request, aluno_id=None):
     Task 20943 - Enviar notificação por email ao aluno
     """
     try:
-        supervisor_obj = Supervisor.objects.get(usuario=request.user)
+        supervisor_obj = request.perfil.supervisor
     except Supervisor.DoesNotExist:
         messages.error(request, "Permissão negada. Você não é um supervisor.")
         return redirect('dashboard')
@@ -1429,11 +1379,12 @@ def enviar_feedback_aluno(request, aluno_id=None):
                     )
                     
                     # Registrar notificação no banco
-                    Notificacao.objects.get_or_create(
+                    Notificacao.objects.registrar(
                         destinatario=email_aluno,
                         assunto=assunto,
+                        mensagem=mensagem,
                         referencia=f"feedback_{feedback.id}",
-                        defaults={'mensagem': mensagem}
+                        usuario=aluno.usuario,
                     )
             except Exception as e:
                 logger.warning(f"Erro ao enviar email de feedback: {str(e)}")
@@ -1491,8 +1442,7 @@ def listar_pareceres_aluno(request):
     from estagio.models import Avaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         # Busca avaliações com parecer disponível para consulta
         avaliacoes_com_parecer = Avaliacao.objects.filter(
@@ -1539,8 +1489,7 @@ def consultar_parecer(request, avaliacao_id):
     from estagio.models import Avaliacao
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         
         # Busca avaliação garantindo que pertence ao aluno e está disponível
         avaliacao = get_object_or_404(
@@ -1607,7 +1556,7 @@ def painel_estagios(request):
     estagios_por_status = _agrupar_estagios_por_status(estagios)
     
     # Estatísticas gerais
-    estatisticas = _calcular_estatisticas_estagios(estagios)
+    estatisticas = obter_dados_painel(usuario, estagios, incluir_grupos=False)['estatisticas']
     
     # Filtros aplicados
     filtro_status = request.GET.get('status', '')
@@ -1626,11 +1575,14 @@ def painel_estagios(request):
         'filtro_status': filtro_status,
         'filtro_empresa': filtro_empresa,
         'perfil_usuario': usuario.tipo,
+        'cursor_sincronizacao': gerar_cursor(),
     }
     return render(request, 'estagio/painel_estagios.html', context)
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_dados_usuario)
 def api_painel_estagios(request):
     """
     API para atualização automática do painel de estágios.
@@ -1640,33 +1592,54 @@ def api_painel_estagios(request):
     CA3 - O sistema deve ter acesso restrito conforme perfil do usuário
     
     Retorna dados JSON para atualização via AJAX/polling.
+    
+    Com `?since=<cursor>` retorna apenas os estágios alterados e os ids
+    removidos desde o cursor (filtros opcionais `status` e `empresa`, os mesmos
+    do painel); o cliente mescla o delta e usa o novo `cursor` na próxima chamada.
     """
     usuario = request.user
     
     # CA3 - Controle de acesso por perfil
     estagios = _filtrar_estagios_por_perfil(usuario)
     
-    # CA1 - Agrupamento por status
-    estagios_por_status = _agrupar_estagios_por_status(estagios)
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            momento = ler_cursor(since)
+        except CursorInvalido:
+            return JsonResponse({'error': 'Cursor inválido'}, status=400)
+        
+        filtro_status = request.GET.get('status', '')
+        filtro_empresa = request.GET.get('empresa', '').lower()
+        
+        def atende_filtros(linha):
+            if filtro_status and linha['status'] != filtro_status:
+                return False
+            return not filtro_empresa or filtro_empresa in (linha['empresa__razao_social'] or '').lower()
+        
+        dados = delta_estagios(usuario, request.perfil.ids, estagios, momento, filtro=atende_filtros)
+        dados['timestamp'] = timezone.now().isoformat()
+        dados['estatisticas'] = obter_dados_painel(usuario, estagios, incluir_grupos=False)['estatisticas']
+        return JsonResponse(dados)
     
-    # Estatísticas
-    estatisticas = _calcular_estatisticas_estagios(estagios)
+    # CA1 - Estatísticas e agrupamento por status (uma consulta cada)
+    painel = obter_dados_painel(usuario, estagios)
     
     # CA2 - Dados para atualização automática
     dados = {
         'timestamp': timezone.now().isoformat(),
-        'estatisticas': estatisticas,
-        'estagios_por_status': {
-            status: list(qs.values('id', 'titulo', 'status', 'empresa__razao_social', 'data_inicio', 'data_fim'))
-            for status, qs in estagios_por_status.items()
-        },
-        'total_estagios': estagios.count(),
+        'estatisticas': painel['estatisticas'],
+        'estagios_por_status': painel['estagios_por_status'],
+        'total_estagios': painel['estatisticas']['total'],
+        'cursor': gerar_cursor(),
     }
     
     return JsonResponse(dados)
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_dados_usuario)
 def api_estatisticas_estagios(request):
     """
     API para obter estatísticas dos estágios em tempo real.
@@ -1679,7 +1652,7 @@ def api_estatisticas_estagios(request):
     # CA3 - Controle de acesso por perfil
     estagios = _filtrar_estagios_por_perfil(usuario)
     
-    estatisticas = _calcular_estatisticas_estagios(estagios)
+    estatisticas = dict(obter_dados_painel(usuario, estagios, incluir_grupos=False)['estatisticas'])
     estatisticas['timestamp'] = timezone.now().isoformat()
     
     return JsonResponse(estatisticas)
@@ -1776,71 +1749,13 @@ def _calcular_estatisticas_estagios(estagios):
     
     CA1 - Estatísticas por status para exibição no painel
     """
-    total = estagios.count()
-    
-    estatisticas = {
-        'total': total,
-        'analise': estagios.filter(status='analise').count(),
-        'em_andamento': estagios.filter(status='em_andamento').count(),
-        'aprovado': estagios.filter(status='aprovado').count(),
-        'reprovado': estagios.filter(status='reprovado').count(),
-    }
-    
-    # Percentuais
-    if total > 0:
-        estatisticas['percentual_analise'] = round((estatisticas['analise'] / total) * 100, 1)
-        estatisticas['percentual_em_andamento'] = round((estatisticas['em_andamento'] / total) * 100, 1)
-        estatisticas['percentual_aprovado'] = round((estatisticas['aprovado'] / total) * 100, 1)
-        estatisticas['percentual_reprovado'] = round((estatisticas['reprovado'] / total) * 100, 1)
-    else:
-        estatisticas['percentual_analise'] = 0
-        estatisticas['percentual_em_andamento'] = 0
-        estatisticas['percentual_aprovado'] = 0
-        estatisticas['percentual_reprovado'] = 0
-    
-    return estatisticas
+    return calcular_estatisticas(estagios)
 
 
 # ==================== MONITORAMENTO DE PENDÊNCIAS E RESULTADOS ====================
 
-# Constantes para tipos de pendência
-TIPOS_PENDENCIA = {
-    'documento_pendente': {
-        'nome': 'Documento Pendente',
-        'descricao': 'Documentos aguardando envio ou correção',
-        'critico': False,
-    },
-    'documento_ajuste': {
-        'nome': 'Documento com Ajustes Solicitados',
-        'descricao': 'Documentos que precisam de correção',
-        'critico': True,
-    },
-    'documento_prazo': {
-        'nome': 'Documento com Prazo Próximo',
-        'descricao': 'Documentos com prazo de vencimento próximo',
-        'critico': True,
-    },
-    'avaliacao_pendente': {
-        'nome': 'Avaliação Pendente',
-        'descricao': 'Avaliações aguardando preenchimento',
-        'critico': False,
-    },
-    'avaliacao_incompleta': {
-        'nome': 'Avaliação Incompleta',
-        'descricao': 'Avaliações com critérios não preenchidos',
-        'critico': True,
-    },
-    'estagio_analise': {
-        'nome': 'Estágio em Análise',
-        'descricao': 'Estágios aguardando aprovação',
-        'critico': False,
-    },
-    'horas_insuficientes': {
-        'nome': 'Horas Insuficientes',
-        'descricao': 'Alunos com horas abaixo do esperado',
-        'critico': True,
-    },
-}
+PENDENCIAS_POR_PAGINA = 20
+LIMITE_PENDENCIAS_CRITICAS = 20
 
 
 @login_required
@@ -1858,14 +1773,20 @@ def monitoramento_pendencias(request):
     QUANDO o usuário acessar o monitoramento
     ENTÃO deve visualizar alertas e resultados consolidados
     """
+    from django.core.paginator import Paginator
+    
     usuario = request.user
+    hoje = timezone.now().date()
     
-    # CA4 - Obtém pendências agrupadas por tipo
-    pendencias = _obter_pendencias_por_perfil(usuario)
-    pendencias_por_tipo = _agrupar_pendencias_por_tipo(pendencias)
+    # CA4 - Pendências do perfil (tabela materializada, leitura indexada)
+    pendencias = pendencias_do_usuario(usuario, request.perfil.ids, hoje=hoje)
+    pendencias_por_tipo = resumo_por_tipo(pendencias)
     
-    # CA5 - Identifica pendências críticas
-    pendencias_criticas = _filtrar_pendencias_criticas(pendencias)
+    # CA5 - Pendências críticas em destaque
+    total_criticas = totais(pendencias)['criticas']
+    pendencias_criticas = [
+        como_dict(p, hoje) for p in pendencias.filter(critico=True)[:LIMITE_PENDENCIAS_CRITICAS]
+    ]
     
     # CA6 - Resultados consolidados
     resultados_consolidados = _consolidar_resultados(usuario)
@@ -1873,28 +1794,34 @@ def monitoramento_pendencias(request):
     # Filtro por tipo de pendência
     filtro_tipo = request.GET.get('tipo', '')
     if filtro_tipo and filtro_tipo in TIPOS_PENDENCIA:
-        pendencias = [p for p in pendencias if p['tipo'] == filtro_tipo]
+        pendencias = pendencias.filter(tipo=filtro_tipo)
     
     # Filtro por criticidade
     filtro_critico = request.GET.get('critico', '')
     if filtro_critico == 'true':
-        pendencias = [p for p in pendencias if p['critico']]
+        pendencias = pendencias.filter(critico=True)
+    
+    paginator = Paginator(pendencias, PENDENCIAS_POR_PAGINA)
+    pagina = paginator.get_page(request.GET.get('page'))
     
     context = {
-        'pendencias': pendencias,
+        'pendencias': [como_dict(p, hoje) for p in pagina],
+        'page_obj': pagina,
         'pendencias_por_tipo': pendencias_por_tipo,
         'pendencias_criticas': pendencias_criticas,
         'resultados_consolidados': resultados_consolidados,
         'tipos_pendencia': TIPOS_PENDENCIA,
         'filtro_tipo': filtro_tipo,
         'filtro_critico': filtro_critico,
-        'total_pendencias': len(pendencias),
-        'total_criticas': len(pendencias_criticas),
+        'total_pendencias': paginator.count,
+        'total_criticas': total_criticas,
     }
     return render(request, 'estagio/monitoramento_pendencias.html', context)
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_dados_usuario)
 def api_monitoramento_pendencias(request):
     """
     API para atualização automática do monitoramento de pendências.
@@ -1904,30 +1831,22 @@ def api_monitoramento_pendencias(request):
     CA6 - Resultados consolidados
     """
     usuario = request.user
+    hoje = timezone.now().date()
     
     # CA4 - Pendências por tipo
-    pendencias = _obter_pendencias_por_perfil(usuario)
-    pendencias_por_tipo = _agrupar_pendencias_por_tipo(pendencias)
-    
-    # CA5 - Pendências críticas
-    pendencias_criticas = _filtrar_pendencias_criticas(pendencias)
+    pendencias = pendencias_do_usuario(usuario, request.perfil.ids, hoje=hoje)
+    contagem = totais(pendencias)
     
     # CA6 - Resultados consolidados
     resultados_consolidados = _consolidar_resultados(usuario)
     
     dados = {
         'timestamp': timezone.now().isoformat(),
-        'total_pendencias': len(pendencias),
-        'total_criticas': len(pendencias_criticas),
-        'pendencias_por_tipo': {
-            tipo: {
-                'quantidade': len(lista),
-                'critico': TIPOS_PENDENCIA.get(tipo, {}).get('critico', False),
-                'nome': TIPOS_PENDENCIA.get(tipo, {}).get('nome', tipo),
-            }
-            for tipo, lista in pendencias_por_tipo.items()
-        },
-        'pendencias_criticas': pendencias_criticas[:10],  # Limita a 10 mais recentes
+        'total_pendencias': contagem['total'],
+        'total_criticas': contagem['criticas'],
+        'pendencias_por_tipo': resumo_por_tipo(pendencias),
+        # CA5 - Limita às 10 críticas mais relevantes
+        'pendencias_criticas': [como_dict(p, hoje) for p in pendencias.filter(critico=True)[:10]],
         'resultados_consolidados': resultados_consolidados,
     }
     
@@ -1948,8 +1867,7 @@ def api_pendencias_por_tipo(request, tipo):
         return JsonResponse({'error': 'Tipo de pendência inválido'}, status=400)
     
     # Obtém pendências do tipo específico
-    pendencias = _obter_pendencias_por_perfil(usuario)
-    pendencias_filtradas = [p for p in pendencias if p['tipo'] == tipo]
+    pendencias_filtradas = _obter_pendencias_por_perfil(usuario, request.perfil.ids, tipo=tipo)
     
     dados = {
         'tipo': tipo,
@@ -1963,6 +1881,8 @@ def api_pendencias_por_tipo(request, tipo):
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_dados_usuario)
 def api_resultados_consolidados(request):
     """
     API para obter resultados consolidados.
@@ -1977,161 +1897,23 @@ def api_resultados_consolidados(request):
     return JsonResponse(resultados)
 
 
-def _obter_pendencias_por_perfil(usuario):
+def _obter_pendencias_por_perfil(usuario, perfil_ids=None, tipo=None):
     """
     Obtém todas as pendências conforme o perfil do usuário.
     Retorna lista de dicionários com informações das pendências.
     """
-    pendencias = []
-    
-    if usuario.tipo == 'coordenador':
-        pendencias.extend(_obter_pendencias_coordenador())
-    elif usuario.tipo == 'supervisor':
-        pendencias.extend(_obter_pendencias_supervisor(usuario))
-    elif usuario.tipo == 'aluno':
-        pendencias.extend(_obter_pendencias_aluno(usuario))
-    
-    # Ordena por criticidade (críticas primeiro) e depois por data
-    pendencias.sort(key=lambda x: (not x['critico'], x.get('data', '')))
-    
-    return pendencias
-
-
-def _obter_pendencias_coordenador():
-    """Obtém pendências para o perfil de coordenador"""
-    pendencias = []
-    hoje = timezone.now().date()
-    
-    # Estágios em análise aguardando aprovação
-    estagios_analise = Estagio.objects.filter(status='analise')
-    for estagio in estagios_analise:
-        pendencias.append({
-            'tipo': 'estagio_analise',
-            'titulo': f'Estágio "{estagio.titulo}" aguardando aprovação',
-            'descricao': f'Solicitado por {estagio.aluno_solicitante.nome if estagio.aluno_solicitante else "N/A"}',
-            'referencia_id': estagio.id,
-            'referencia_tipo': 'estagio',
-            'critico': False,
-            'data': estagio.data_solicitacao.isoformat() if estagio.data_solicitacao else '',
-        })
-    
-    # Documentos com prazo próximo (3 dias)
-    prazo_limite = hoje + timedelta(days=3)
-    documentos_prazo = Documento.objects.filter(
-        prazo_limite__lte=prazo_limite,
-        prazo_limite__gte=hoje,
-        status__in=['enviado', 'ajustes_solicitados', 'corrigido']
-    )
-    for doc in documentos_prazo:
-        dias_restantes = (doc.prazo_limite - hoje).days
-        pendencias.append({
-            'tipo': 'documento_prazo',
-            'titulo': f'Documento "{doc.nome_arquivo}" com prazo em {dias_restantes} dia(s)',
-            'descricao': f'Prazo: {doc.prazo_limite.strftime("%d/%m/%Y")}',
-            'referencia_id': doc.id,
-            'referencia_tipo': 'documento',
-            'critico': True,
-            'data': doc.prazo_limite.isoformat(),
-        })
-    
-    return pendencias
-
-
-def _obter_pendencias_supervisor(usuario):
-    """Obtém pendências para o perfil de supervisor"""
-    pendencias = []
-    hoje = timezone.now().date()
-    
-    try:
-        supervisor = Supervisor.objects.get(usuario=usuario)
-    except Supervisor.DoesNotExist:
-        return pendencias
-    
-    # Documentos aguardando análise do supervisor
-    documentos_pendentes = Documento.objects.filter(
-        supervisor=supervisor,
-        status__in=['enviado', 'corrigido']
-    )
-    for doc in documentos_pendentes:
-        pendencias.append({
-            'tipo': 'documento_pendente',
-            'titulo': f'Documento "{doc.nome_arquivo}" aguardando análise',
-            'descricao': f'Enviado em {doc.data_envio.strftime("%d/%m/%Y")}',
-            'referencia_id': doc.id,
-            'referencia_tipo': 'documento',
-            'critico': False,
-            'data': doc.data_envio.isoformat(),
-        })
-    
-    # Avaliações incompletas
-    from estagio.models import Avaliacao
-    avaliacoes_incompletas = Avaliacao.objects.filter(
-        supervisor=supervisor,
-        status__in=['rascunho', 'completa']
-    )
-    for avaliacao in avaliacoes_incompletas:
-        if not avaliacao.is_completa():
-            pendencias.append({
-                'tipo': 'avaliacao_incompleta',
-                'titulo': f'Avaliação de {avaliacao.aluno.nome if avaliacao.aluno else "N/A"} incompleta',
-                'descricao': f'Período: {avaliacao.get_periodo_display()}',
-                'referencia_id': avaliacao.id,
-                'referencia_tipo': 'avaliacao',
-                'critico': True,
-                'data': avaliacao.created_at.isoformat() if avaliacao.created_at else '',
-            })
-    
-    return pendencias
-
-
-def _obter_pendencias_aluno(usuario):
-    """Obtém pendências para o perfil de aluno"""
-    pendencias = []
+    if perfil_ids is None:
+        perfil_ids = {
+            'supervisor': Supervisor.objects.filter(usuario=usuario).values_list('id', flat=True).first(),
+            'aluno': Aluno.objects.filter(usuario=usuario).values_list('id', flat=True).first(),
+        }
     hoje = timezone.now().date()
+    pendencias = pendencias_do_usuario(usuario, perfil_ids, hoje=hoje)
+    if tipo:
+        pendencias = pendencias.filter(tipo=tipo)
     
-    try:
-        aluno = Aluno.objects.get(usuario=usuario)
-    except Aluno.DoesNotExist:
-        return pendencias
-    
-    # Documentos com ajustes solicitados
-    if aluno.estagio:
-        documentos_ajuste = Documento.objects.filter(
-            estagio=aluno.estagio,
-            status='ajustes_solicitados'
-        )
-        for doc in documentos_ajuste:
-            pendencias.append({
-                'tipo': 'documento_ajuste',
-                'titulo': f'Documento "{doc.nome_arquivo}" precisa de correção',
-                'descricao': doc.observacoes_supervisor or 'Verifique as observações do supervisor',
-                'referencia_id': doc.id,
-                'referencia_tipo': 'documento',
-                'critico': True,
-                'data': doc.updated_at.isoformat() if doc.updated_at else '',
-            })
-        
-        # Documentos com prazo próximo
-        prazo_limite = hoje + timedelta(days=3)
-        documentos_prazo = Documento.objects.filter(
-            estagio=aluno.estagio,
-            prazo_limite__lte=prazo_limite,
-            prazo_limite__gte=hoje,
-            status__in=['enviado', 'ajustes_solicitados']
-        )
-        for doc in documentos_prazo:
-            dias_restantes = (doc.prazo_limite - hoje).days
-            pendencias.append({
-                'tipo': 'documento_prazo',
-                'titulo': f'Documento "{doc.nome_arquivo}" vence em {dias_restantes} dia(s)',
-                'descricao': f'Prazo: {doc.prazo_limite.strftime("%d/%m/%Y")}',
-                'referencia_id': doc.id,
-                'referencia_tipo': 'documento',
-                'critico': True,
-                'data': doc.prazo_limite.isoformat(),
-            })
-    
-    return pendencias
+    # Ordenadas por criticidade (críticas primeiro) e depois por data
+    return [como_dict(p, hoje) for p in pendencias]
 
 
 def _agrupar_pendencias_por_tipo(pendencias):
@@ -2494,6 +2276,49 @@ def api_relatorio_estagios(request):
     })
 
 
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_dados_usuario)
+def api_analise_notas(request):
+    """
+    API com a distribuição das notas finais das avaliações (coordenadores).
+    
+    Filtros opcionais `empresa`, `supervisor`, `instituicao` (ids) e `periodo`;
+    `agrupar` escolhe um deles para os percentis e histogramas por grupo.
+    Retorna também média e desvio padrão por critério e o z-score de
+    leniência de cada supervisor (ver estagio/analise_notas.py).
+    """
+    from .analise_notas import AGRUPAMENTOS, obter_analise
+    from .models import Avaliacao
+    
+    usuario = request.user
+    if usuario.tipo != 'coordenador' and not usuario.is_staff:
+        return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
+    
+    filtros = {}
+    for agrupamento in AGRUPAMENTOS:
+        valor = request.GET.get(agrupamento, '').strip()
+        if not valor:
+            continue
+        if agrupamento == 'periodo':
+            if valor not in dict(Avaliacao.PERIODO_CHOICES):
+                return JsonResponse({'success': False, 'error': 'Período inválido'}, status=400)
+            filtros[agrupamento] = valor
+        elif valor.isdigit():
+            filtros[agrupamento] = int(valor)
+        else:
+            return JsonResponse({'success': False, 'error': f'Filtro {agrupamento} inválido'}, status=400)
+    
+    agrupar = request.GET.get('agrupar', '').strip() or None
+    if agrupar is not None and agrupar not in AGRUPAMENTOS:
+        return JsonResponse({
+            'success': False,
+            'error': f"agrupar deve ser um de {', '.join(AGRUPAMENTOS)}"
+        }, status=400)
+    
+    return JsonResponse({'success': True, **obter_analise(filtros, agrupar)})
+
+
 @login_required  
 def api_relatorio_exportar(request):
     """
@@ -2503,9 +2328,6 @@ def api_relatorio_exportar(request):
     CA2 - Inclui todos os dados selecionados
     """
     from .forms import RelatorioEstagiosForm
-    import csv
-    from io import StringIO, BytesIO
-    from django.http import HttpResponse
     
     data = request.POST if request.method == 'POST' else request.GET
     form = RelatorioEstagiosForm(data)
@@ -2516,14 +2338,26 @@ def api_relatorio_exportar(request):
             'errors': form.errors
         }, status=400)
     
-    relatorio = _gerar_relatorio_filtrado(request.user, form)
+    # Geração em segundo plano: devolve o job para acompanhamento pela API de status
+    if data.get('assincrono') in ('1', 'true', 'on'):
+        from .relatorio_jobs import como_dict, enfileirar_relatorio
+        job, reaproveitado = enfileirar_relatorio(request.user, form)
+        return JsonResponse({
+            'success': True,
+            'reaproveitado': reaproveitado,
+            'job': como_dict(job),
+        }, status=200 if job.status == 'concluido' else 202)
+    
     formato = form.cleaned_data.get('formato', 'json')
     
+    # CSV e Excel são gerados em streaming, sem montar o relatório em memória
     if formato == 'csv':
-        return _exportar_csv(relatorio)
+        return _exportar_csv(_estagios_do_relatorio(request.user, form), form.get_opcoes_inclusao())
     elif formato == 'excel':
-        return _exportar_excel(relatorio)
-    elif formato == 'pdf':
+        return _exportar_excel(_estagios_do_relatorio(request.user, form))
+    
+    relatorio = _gerar_relatorio_filtrado(request.user, form)
+    if formato == 'pdf':
         return _exportar_pdf(relatorio)
     else:
         return JsonResponse({
@@ -2533,50 +2367,45 @@ def api_relatorio_exportar(request):
         })
 
 
-def _exportar_excel(relatorio):
-    """Exporta relatório para formato Excel (CSV com extensão xlsx simulada)"""
-    from django.http import HttpResponse
-    import csv
-    from io import StringIO
-    
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';')
-    
-    # Cabeçalho
-    writer.writerow(['Relatório de Estágios'])
-    writer.writerow(['Data de Geração', relatorio.get('data_geracao', '')])
-    writer.writerow([])
-    
-    # Resumo
-    writer.writerow(['RESUMO'])
-    resumo = relatorio.get('resumo', {})
-    writer.writerow(['Total de Estágios', resumo.get('total', 0)])
-    writer.writerow([])
-    
-    # Por Status
-    writer.writerow(['Por Status'])
-    for status, count in resumo.get('por_status', {}).items():
-        writer.writerow([status, count])
-    writer.writerow([])
-    
-    # Estágios
-    writer.writerow(['ESTÁGIOS'])
-    writer.writerow(['ID', 'Título', 'Cargo', 'Status', 'Empresa', 'Supervisor', 'Data Início', 'Data Fim'])
+@login_required
+def api_relatorio_job_status(request, job_id):
+    """API de acompanhamento de um relatório gerado em segundo plano"""
+    from .models import RelatorioJob
+    from .relatorio_jobs import como_dict, pode_acessar
     
-    for estagio in relatorio.get('estagios', []):
-        writer.writerow([
-            estagio.get('id', ''),
-            estagio.get('titulo', ''),
-            estagio.get('cargo', ''),
-            estagio.get('status_display', ''),
-            estagio.get('empresa', {}).get('razao_social', ''),
-            estagio.get('supervisor', {}).get('nome', ''),
-            estagio.get('data_inicio', ''),
-            estagio.get('data_fim', ''),
-        ])
-    
-    response = HttpResponse(output.getvalue(), content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_estagios.xls"'
+    job = get_object_or_404(RelatorioJob.objects.select_related('solicitante'), id=job_id)
+    if not pode_acessar(request.user, job):
+        return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
+    return JsonResponse({'success': True, 'job': como_dict(job)})
+
+
+@login_required
+def baixar_relatorio_job(request, job_id):
+    """Download do arquivo de um relatório concluído"""
+    from .downloads import servir_arquivo
+    from .models import RelatorioJob
+    from .relatorio_jobs import ARQUIVOS_POR_FORMATO, pode_acessar
+    
+    job = get_object_or_404(RelatorioJob.objects.select_related('solicitante'), id=job_id)
+    if not pode_acessar(request.user, job):
+        return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
+    if job.status != 'concluido' or not job.arquivo:
+        return JsonResponse({'success': False, 'error': 'Relatório ainda não disponível', 'status': job.status}, status=409)
+    
+    extensao = ARQUIVOS_POR_FORMATO.get(job.formato, ARQUIVOS_POR_FORMATO['json'])[0]
+    return servir_arquivo(request, job.arquivo, nome_download=f'relatorio_estagios.{extensao}')
+
+
+def _exportar_excel(estagios):
+    """Exporta o relatório como planilha .xlsx gerada em streaming"""
+    from .exportacao import gerar_xlsx, linhas_excel
+    
+    linhas = linhas_excel(estagios, timezone.now().isoformat())
+    response = StreamingHttpResponse(
+        gerar_xlsx(linhas, nome_planilha='Estágios'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = 'attachment; filename="relatorio_estagios.xlsx"'
     return response
 
 
@@ -2682,12 +2511,28 @@ def _gerar_relatorio_filtrado(usuario, form):
     Returns:
         dict: Relatório com estágios e dados relacionados
     """
-    from .models import Estagio, Documento, Avaliacao, HorasCumpridas, Aluno
-    from admin.models import CursoCoordenador, Supervisor
+    estagios = _estagios_do_relatorio(usuario, form)
+    
+    # CA2 - Opções de inclusão de dados
+    opcoes = form.get_opcoes_inclusao() if hasattr(form, 'get_opcoes_inclusao') else {}
     
+    # CA2 - Monta dados completos de cada estágio com número fixo de consultas
+    dados_estagios, resumo = montar_relatorio(estagios, opcoes)
+    relatorio = {
+        'estagios': dados_estagios,
+        'resumo': resumo,
+        'periodo': form.get_filtros_ativos().get('periodo') if hasattr(form, 'get_filtros_ativos') else None,
+        'data_geracao': timezone.now().isoformat(),
+    }
+    
+    return relatorio
+
+
+def _estagios_do_relatorio(usuario, form):
+    """Queryset de estágios do relatório: perfil do usuário e filtros do formulário"""
     # Para admin/superuser/coordenador, buscar todos os estágios
     if usuario.is_superuser or usuario.is_staff or usuario.tipo == 'coordenador':
-        estagios = Estagio.objects.all().select_related('empresa', 'supervisor', 'aluno_solicitante')
+        estagios = Estagio.objects.all()
     else:
         # Base queryset conforme perfil do usuário
         estagios = _obter_estagios_por_perfil(usuario)
@@ -2696,40 +2541,7 @@ def _gerar_relatorio_filtrado(usuario, form):
     cleaned_data = form.cleaned_data if hasattr(form, 'cleaned_data') else {}
     if cleaned_data.get('data_inicio') and cleaned_data.get('data_fim'):
         estagios = _aplicar_filtros_relatorio(estagios, cleaned_data)
-    
-    # CA2 - Opções de inclusão de dados
-    opcoes = form.get_opcoes_inclusao() if hasattr(form, 'get_opcoes_inclusao') else {}
-    
-    # Monta relatório com dados completos
-    relatorio = {
-        'estagios': [],
-        'resumo': {
-            'total': estagios.count(),
-            'por_status': {},
-            'por_empresa': {},
-        },
-        'periodo': form.get_filtros_ativos().get('periodo') if hasattr(form, 'get_filtros_ativos') else None,
-        'data_geracao': timezone.now().isoformat(),
-    }
-    
-    # Contabiliza por status
-    for status_code, status_nome in Estagio.STATUS_CHOICES:
-        count = estagios.filter(status=status_code).count()
-        if count > 0:
-            relatorio['resumo']['por_status'][status_nome] = count
-    
-    # CA2 - Monta dados completos de cada estágio
-    for estagio in estagios.select_related('empresa', 'supervisor'):
-        dados_estagio = _montar_dados_estagio(estagio, opcoes)
-        relatorio['estagios'].append(dados_estagio)
-        
-        # Contabiliza por empresa
-        empresa_nome = estagio.empresa.razao_social
-        if empresa_nome not in relatorio['resumo']['por_empresa']:
-            relatorio['resumo']['por_empresa'][empresa_nome] = 0
-        relatorio['resumo']['por_empresa'][empresa_nome] += 1
-    
-    return relatorio
+    return estagios
 
 
 def _obter_estagios_por_perfil(usuario):
@@ -2816,140 +2628,16 @@ def _aplicar_filtros_relatorio(estagios, filtros):
     return estagios
 
 
-def _montar_dados_estagio(estagio, opcoes):
-    """
-    Monta dados completos de um estágio para o relatório.
-    
-    CA2 - Inclusão de dados completos do estágio
+def _exportar_csv(estagios, opcoes):
     """
-    from .models import Documento, Avaliacao, HorasCumpridas
-    
-    dados = {
-        'id': estagio.id,
-        'titulo': estagio.titulo,
-        'cargo': estagio.cargo,
-        'status': estagio.status,
-        'status_display': estagio.get_status_display(),
-        'data_inicio': estagio.data_inicio.isoformat() if estagio.data_inicio else None,
-        'data_fim': estagio.data_fim.isoformat() if estagio.data_fim else None,
-        'carga_horaria': estagio.carga_horaria,
-        'empresa': {
-            'razao_social': estagio.empresa.razao_social,
-            'cnpj': estagio.empresa.cnpj,
-        },
-        'supervisor': {
-            'nome': estagio.supervisor.nome,
-            'cargo': estagio.supervisor.cargo,
-        },
-    }
-    
-    # CA2 - Incluir dados do aluno
-    if opcoes.get('aluno') and estagio.aluno_solicitante:
-        dados['aluno'] = {
-            'nome': estagio.aluno_solicitante.nome,
-            'matricula': estagio.aluno_solicitante.matricula,
-            'contato': estagio.aluno_solicitante.contato,
-            'instituicao': estagio.aluno_solicitante.instituicao.nome if estagio.aluno_solicitante.instituicao else None,
-        }
-    
-    # CA2 - Incluir documentos
-    if opcoes.get('documentos'):
-        documentos = Documento.objects.filter(estagio=estagio)
-        dados['documentos'] = {
-            'total': documentos.count(),
-            'aprovados': documentos.filter(status='aprovado').count(),
-            'pendentes': documentos.filter(status__in=['enviado', 'corrigido']).count(),
-            'lista': [
-                {
-                    'id': doc.id,
-                    'nome': doc.nome_arquivo,
-                    'tipo': doc.tipo,
-                    'status': doc.status,
-                    'data_envio': doc.data_envio.isoformat() if doc.data_envio else None,
-                }
-                for doc in documentos[:10]  # Limita a 10 documentos
-            ]
-        }
-    
-    # CA2 - Incluir avaliações
-    if opcoes.get('avaliacoes'):
-        avaliacoes = Avaliacao.objects.filter(estagio=estagio)
-        dados['avaliacoes'] = {
-            'total': avaliacoes.count(),
-            'completas': avaliacoes.filter(status='parecer_emitido').count(),
-            'nota_media': _calcular_nota_media_avaliacoes(avaliacoes),
-            'lista': [
-                {
-                    'id': av.id,
-                    'periodo': av.get_periodo_display(),
-                    'status': av.status,
-                    'nota_final': av.nota_final,
-                    'data_avaliacao': av.data_avaliacao.isoformat() if av.data_avaliacao else None,
-                }
-                for av in avaliacoes[:10]  # Limita a 10 avaliações
-            ]
-        }
-    
-    # CA2 - Incluir horas cumpridas
-    if opcoes.get('horas') and estagio.aluno_solicitante:
-        horas = HorasCumpridas.objects.filter(aluno=estagio.aluno_solicitante)
-        total_horas = horas.aggregate(total=Sum('quantidade'))['total'] or 0
-        dados['horas'] = {
-            'total_registros': horas.count(),
-            'total_horas': total_horas,
-            'carga_horaria_estagio': estagio.carga_horaria,
-        }
-    
-    return dados
-
-
-def _exportar_csv(relatorio):
-    """
-    Exporta o relatório em formato CSV.
+    Exporta o relatório em formato CSV, em streaming.
     
     CA1 - Exportação conforme filtros
     """
-    from django.http import HttpResponse
-    import csv
+    from .exportacao import gerar_csv
     
-    response = HttpResponse(content_type='text/csv')
+    response = StreamingHttpResponse(gerar_csv(estagios, opcoes), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="relatorio_estagios.csv"'
-    response.write('\ufeff')  # BOM para Excel reconhecer UTF-8
-    
-    writer = csv.writer(response)
-    
-    # Cabeçalho
-    writer.writerow([
-        'ID', 'Título', 'Cargo', 'Status', 'Data Início', 'Data Fim',
-        'Carga Horária', 'Empresa', 'Supervisor', 'Aluno', 'Matrícula',
-        'Total Documentos', 'Docs Aprovados', 'Total Avaliações', 'Nota Média'
-    ])
-    
-    # Dados
-    for estagio in relatorio.get('estagios', []):
-        aluno_nome = estagio.get('aluno', {}).get('nome', '-')
-        aluno_matricula = estagio.get('aluno', {}).get('matricula', '-')
-        docs = estagio.get('documentos', {})
-        avs = estagio.get('avaliacoes', {})
-        
-        writer.writerow([
-            estagio.get('id'),
-            estagio.get('titulo'),
-            estagio.get('cargo'),
-            estagio.get('status_display'),
-            estagio.get('data_inicio'),
-            estagio.get('data_fim'),
-            estagio.get('carga_horaria'),
-            estagio.get('empresa', {}).get('razao_social'),
-            estagio.get('supervisor', {}).get('nome'),
-            aluno_nome,
-            aluno_matricula,
-            docs.get('total', 0),
-            docs.get('aprovados', 0),
-            avs.get('total', 0),
-            avs.get('nota_media', '-'),
-        ])
-    
     return response
 
 
@@ -3016,8 +2704,7 @@ def listar_vagas_disponiveis(request):
     
     # Verifica se o aluno já tem estágio ativo
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         tem_estagio_ativo = aluno.estagio is not None
         
         # Verifica se tem solicitação pendente
@@ -3051,8 +2738,7 @@ def detalhe_vaga(request, estagio_id):
     tem_estagio_ativo = False
     solicitacao_pendente = None
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        aluno = request.perfil.aluno
         tem_estagio_ativo = aluno.estagio is not None
         solicitacao_pendente = Estagio.objects.filter(
             aluno_solicitante=aluno,
@@ -3071,6 +2757,7 @@ def detalhe_vaga(request, estagio_id):
 
 @login_required
 @aluno_required
+@fecha_upload_anexado
 def candidatar_vaga(request, estagio_id):
     """
     View para ALUNO se candidatar a uma vaga existente.
@@ -3084,8 +2771,8 @@ def candidatar_vaga(request, estagio_id):
         return redirect('listar_vagas_disponiveis')
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        aluno = Aluno.objects.get(usuario=usuario)
+        usuario = request.user
+        aluno = request.perfil.aluno
     except (Usuario.DoesNotExist, Aluno.DoesNotExist):
         messages.error(request, "Erro: Aluno não encontrado.")
         return redirect('listar_vagas_disponiveis')
@@ -3110,38 +2797,45 @@ def candidatar_vaga(request, estagio_id):
         return redirect('listar_vagas_disponiveis')
     
     if request.method == 'POST':
-        documento_form = DocumentoForm(request.POST, request.FILES)
+        arquivos, upload = anexar_upload(request)
+        documento_form = DocumentoForm(request.POST, arquivos)
         
         if documento_form.is_valid():
-            # Atualiza a vaga com o aluno solicitante
-            vaga.aluno_solicitante = aluno
-            vaga.status = 'analise'  # Muda para análise
-            vaga.save()
-            
             # Recupera o coordenador selecionado
             coordenador = documento_form.cleaned_data['coordenador']
             
-            # Cria o documento
-            documento = documento_form.save(commit=False)
-            documento.data_envio = now().date()
-            documento.estagio = vaga
-            documento.supervisor = vaga.supervisor
-            documento.coordenador = coordenador
-            documento.versao = 1.0
-            documento.tipo = 'termo_compromisso'
-            # Truncar nome do arquivo para caber no campo (max 50 chars)
-            nome_arquivo = documento.arquivo.name if documento.arquivo else 'documento.pdf'
-            documento.nome_arquivo = nome_arquivo[:50]
-            documento.enviado_por = usuario
-            documento.save()
-            
-            # Registrar no histórico
-            DocumentoHistorico.objects.create(
-                documento=documento,
-                acao='enviado',
-                usuario=usuario,
-                observacoes=f"Candidatura do aluno {aluno.nome} para a vaga {vaga.titulo}"
-            )
+            try:
+                with transaction.atomic():
+                    # Atualiza a vaga com o aluno solicitante (status 'analise'), com vaga e aluno
+                    # travados: dois alunos não conseguem se candidatar à mesma vaga
+                    candidatar(vaga, aluno)
+                    
+                    # Cria o documento
+                    documento = documento_form.save(commit=False)
+                    documento.data_envio = now().date()
+                    documento.estagio = vaga
+                    documento.supervisor = vaga.supervisor
+                    documento.coordenador = coordenador
+                    documento.versao = 1.0
+                    documento.tipo = 'termo_compromisso'
+                    # Truncar nome do arquivo para caber no campo (max 50 chars)
+                    nome_arquivo = documento.arquivo.name if documento.arquivo else 'documento.pdf'
+                    documento.nome_arquivo = nome_arquivo[:50]
+                    documento.enviado_por = usuario
+                    documento.save()
+                    
+                    # Registrar no histórico
+                    DocumentoHistorico.objects.create(
+                        documento=documento,
+                        acao='enviado',
+                        usuario=usuario,
+                        observacoes=f"Candidatura do aluno {aluno.nome} para a vaga {vaga.titulo}"
+                    )
+                    if upload is not None:
+                        descartar_upload(upload, arquivos)
+            except ConflitoVinculo as e:
+                messages.error(request, str(e))
+                return redirect('listar_vagas_disponiveis')
             
             # Notificar coordenador
             try:
@@ -3187,8 +2881,7 @@ def listar_atividades_pendentes(request):
     """
     from estagio.models import Atividade
     
-    usuario = Usuario.objects.get(id=request.user.id)
-    supervisor = Supervisor.objects.get(usuario=usuario)
+    supervisor = request.perfil.supervisor
     
     # Buscar atividades pendentes dos estágios supervisionados
     atividades = Atividade.objects.filter(
@@ -3266,8 +2959,7 @@ def confirmar_atividade(request, atividade_id):
         return redirect('listar_atividades_pendentes')
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Confirmar atividade
         atividade.confirmar(supervisor)
@@ -3315,8 +3007,7 @@ def rejeitar_atividade(request, atividade_id):
         return redirect('detalhe_atividade', atividade_id=atividade_id)
     
     try:
-        usuario = Usuario.objects.get(id=request.user.id)
-        supervisor = Supervisor.objects.get(usuario=usuario)
+        supervisor = request.perfil.supervisor
         
         # Rejeitar atividade
         atividade.rejeitar(supervisor, justificativa)
@@ -3346,12 +3037,13 @@ def formulario_avaliacao(request, estagio_id):
     CA1 - Avaliação com critérios previamente definidos
     CA2 - Salvamento associado ao período correto
     """
-    from estagio.models import Avaliacao, CriterioAvaliacao, NotaCriterio
+    from estagio.models import Avaliacao
+    from estagio.criterios_cache import criterios_ativos
+    from estagio.notas_avaliacao import salvar_notas, validar_notas
     
     estagio = get_object_or_404(Estagio, id=estagio_id)
     
-    usuario = Usuario.objects.get(id=request.user.id)
-    supervisor = Supervisor.objects.get(usuario=usuario)
+    supervisor = request.perfil.supervisor
     
     # Verificar se o supervisor é responsável pelo estágio
     if estagio.supervisor != supervisor:
@@ -3361,8 +3053,8 @@ def formulario_avaliacao(request, estagio_id):
     # Buscar aluno do estágio
     aluno = Aluno.objects.filter(estagio=estagio).first()
     
-    # Buscar critérios ativos
-    criterios = CriterioAvaliacao.objects.filter(ativo=True).order_by('ordem', 'nome')
+    # Critérios ativos (cache versionado, ver estagio/criterios_cache.py)
+    criterios = criterios_ativos().criterios
     
     if request.method == 'POST':
         # Processar dados do formulário
@@ -3383,40 +3075,31 @@ def formulario_avaliacao(request, estagio_id):
                 messages.error(request, 'A data fim deve ser posterior à data início.')
                 raise ValueError("Período inválido")
             
-            # Criar avaliação
-            avaliacao = Avaliacao.objects.create(
-                supervisor=supervisor,
-                estagio=estagio,
-                aluno=aluno,
-                periodo=periodo,
-                periodo_inicio=periodo_inicio_date,
-                periodo_fim=periodo_fim_date,
-                data_avaliacao=timezone.now().date(),
-                status='rascunho'
-            )
+            # Valida as notas dos critérios antes de criar a avaliação
+            notas, erros = validar_notas(criterios, {
+                criterio.id: (request.POST.get(f'criterio_{criterio.id}'), request.POST.get(f'obs_{criterio.id}', ''))
+                for criterio in criterios
+            }, exigir_obrigatorios=False)
+            if erros:
+                for erro in erros:
+                    messages.error(request, erro)
+                raise ValueError("Notas inválidas")
             
-            # Processar notas dos critérios
-            for criterio in criterios:
-                nota_valor = request.POST.get(f'criterio_{criterio.id}')
-                observacao = request.POST.get(f'obs_{criterio.id}', '')
+            with transaction.atomic():
+                # Criar avaliação
+                avaliacao = Avaliacao.objects.create(
+                    supervisor=supervisor,
+                    estagio=estagio,
+                    aluno=aluno,
+                    periodo=periodo,
+                    periodo_inicio=periodo_inicio_date,
+                    periodo_fim=periodo_fim_date,
+                    data_avaliacao=timezone.now().date(),
+                    status='rascunho'
+                )
                 
-                if nota_valor:
-                    try:
-                        nota_float = float(nota_valor)
-                        NotaCriterio.objects.create(
-                            avaliacao=avaliacao,
-                            criterio=criterio,
-                            nota=nota_float,
-                            observacao=observacao
-                        )
-                    except (ValueError, TypeError):
-                        pass
-            
-            # Verificar se está completa e atualizar status
-            if avaliacao.is_completa():
-                avaliacao.status = 'completa'
-                avaliacao.nota = avaliacao.calcular_nota_media()
-                avaliacao.save()
+                # Grava as notas e atualiza status e nota se estiver completa
+                salvar_notas(avaliacao, notas)
             
             messages.success(request, 'Avaliação salva com sucesso!')
             return redirect('emitir_parecer', avaliacao_id=avaliacao.id)
@@ -3450,8 +3133,7 @@ def emitir_parecer(request, avaliacao_id):
         id=avaliacao_id
     )
     
-    usuario = Usuario.objects.get(id=request.user.id)
-    supervisor = Supervisor.objects.get(usuario=usuario)
+    supervisor = request.perfil.supervisor
     
     # Verificar permissão
     if avaliacao.supervisor != supervisor:
@@ -0,0 +1,197 @@
+"""
+Vínculo de alunos às vagas sem condição de corrida.
+
+Vincular, desvincular, aprovar um estágio e candidatar-se a uma vaga leem
+`status_vaga` e `aluno.estagio` e gravam com base nisso. Aqui cada operação
+roda numa transação que primeiro trava as linhas da vaga e do aluno
+(`select_for_update`, sempre nessa ordem, para não haver deadlock entre
+operações concorrentes) e só então confere o estado: quem chega depois espera
+a trava, relê o estado já alterado e recebe `ConflitoVinculo`, em vez de
+ocupar a mesma vaga duas vezes.
+
+As gravações usam `save(update_fields=...)`, de modo que os signals de
+pendências e versões dos dados continuam valendo. No SQLite (sem travas de
+linha) a serialização das escritas do próprio banco impede a reserva dupla:
+a transação concorrente falha ao gravar.
+
+`metricas` acumula, por processo, as operações, os conflitos e o tempo de
+espera pelas travas.
+"""
+import logging
+import threading
+import time
+
+from django.db import transaction
+
+from estagio.models import Aluno, Estagio, VinculoHistorico
+
+logger = logging.getLogger(__name__)
+
+
+class ConflitoVinculo(Exception):
+    """O estado da vaga ou do aluno mudou e a operação não pode ser feita"""
+
+
+class _Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.resetar()
+
+    def resetar(self):
+        with self._lock:
+            self.operacoes = 0
+            self.conflitos = 0
+            self.espera_total = 0.0
+            self.espera_max = 0.0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.operacoes += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+
+    def registrar_conflito(self):
+        with self._lock:
+            self.conflitos += 1
+
+    def snapshot(self):
+        with self._lock:
+            media = self.espera_total / self.operacoes if self.operacoes else 0.0
+            return {
+                'operacoes': self.operacoes,
+                'conflitos': self.conflitos,
+                'espera_trava_media_ms': round(media * 1000, 2),
+                'espera_trava_max_ms': round(self.espera_max * 1000, 2),
+            }
+
+
+metricas = _Metricas()
+
+
+def obter_metricas():
+    """Operações, conflitos e espera pelas travas de vínculo neste processo"""
+    return metricas.snapshot()
+
+
+def _travar(estagio, aluno=None):
+    """Relê vaga e aluno com as linhas travadas até o fim da transação"""
+    inicio = time.monotonic()
+    vaga = Estagio.objects.select_for_update().get(pk=estagio.pk)
+    aluno_travado = Aluno.objects.select_for_update().get(pk=aluno.pk) if aluno is not None else None
+    metricas.registrar_espera(time.monotonic() - inicio)
+    return vaga, aluno_travado
+
+
+def _conflito(mensagem):
+    metricas.registrar_conflito()
+    logger.warning(f"Conflito de vínculo: {mensagem}")
+    return ConflitoVinculo(mensagem)
+
+
+def _ocupar(vaga, aluno, realizado_por, observacoes, campos_vaga=('status_vaga',)):
+    """Ocupa a vaga já travada e vincula o aluno já travado (CA7), registrando o histórico (CA8)"""
+    vaga.status_vaga = 'ocupada'
+    vaga.save(update_fields=[*campos_vaga, 'updated_at'])
+    if aluno is None:
+        return
+    aluno.estagio = vaga
+    aluno.save(update_fields=['estagio'])
+    VinculoHistorico.objects.create(
+        aluno=aluno,
+        estagio=vaga,
+        acao='vinculado',
+        realizado_por=realizado_por,
+        observacoes=observacoes,
+    )
+
+
+def _atualizar_instancias(estagio, vaga, aluno=None, aluno_travado=None):
+    """Reflete o estado gravado nas instâncias recebidas pelo chamador"""
+    estagio.status = vaga.status
+    estagio.status_vaga = vaga.status_vaga
+    estagio.aluno_solicitante_id = vaga.aluno_solicitante_id
+    estagio.updated_at = vaga.updated_at
+    if aluno is not None:
+        aluno.estagio = aluno_travado.estagio
+
+
+@transaction.atomic
+def vincular(estagio, aluno, realizado_por=None, observacoes=None):
+    """Vincula o aluno à vaga disponível; `ConflitoVinculo` se a vaga foi ocupada ou o aluno já tem vaga"""
+    vaga, aluno_travado = _travar(estagio, aluno)
+    if vaga.status_vaga != 'disponivel':
+        raise _conflito(f'A vaga "{vaga.titulo}" não está mais disponível.')
+    if aluno_travado.estagio_id is not None:
+        raise _conflito(f'O aluno {aluno_travado.nome} já está vinculado a uma vaga ativa.')
+
+    _ocupar(vaga, aluno_travado, realizado_por, observacoes or f'Aluno {aluno_travado.nome} vinculado à vaga {vaga.titulo}')
+    _atualizar_instancias(estagio, vaga, aluno, aluno_travado)
+
+
+@transaction.atomic
+def desvincular(estagio, aluno, realizado_por=None, observacoes=None):
+    """Desvincula o aluno e libera a vaga; `ConflitoVinculo` se ele já não estiver nessa vaga"""
+    vaga, aluno_travado = _travar(estagio, aluno)
+    if aluno_travado.estagio_id != vaga.pk:
+        raise _conflito(f'O aluno {aluno_travado.nome} não está vinculado à vaga "{vaga.titulo}".')
+
+    # Histórico registrado antes de desvincular - CA8
+    VinculoHistorico.objects.create(
+        aluno=aluno_travado,
+        estagio=vaga,
+        acao='desvinculado',
+        realizado_por=realizado_por,
+        observacoes=observacoes or f'Aluno {aluno_travado.nome} desvinculado da vaga {vaga.titulo}',
+    )
+    vaga.status_vaga = 'disponivel'
+    vaga.save(update_fields=['status_vaga', 'updated_at'])
+    aluno_travado.estagio = None
+    aluno_travado.save(update_fields=['estagio'])
+    _atualizar_instancias(estagio, vaga, aluno, aluno_travado)
+
+
+@transaction.atomic
+def aprovar(estagio, realizado_por=None, observacoes=None):
+    """
+    Aprova o estágio, ocupa a vaga e vincula o aluno solicitante lido pelo
+    chamador. `ConflitoVinculo` se o solicitante mudou, se a vaga já foi
+    ocupada (inclusive por uma aprovação concorrente) ou se o aluno já está
+    vinculado a uma vaga.
+    """
+    aluno = Aluno(pk=estagio.aluno_solicitante_id) if estagio.aluno_solicitante_id else None
+    vaga, aluno_travado = _travar(estagio, aluno)
+    if vaga.aluno_solicitante_id != estagio.aluno_solicitante_id:
+        # O solicitante mudou depois que o chamador leu (e validou) o estágio
+        raise _conflito(f'A solicitação do estágio "{vaga.titulo}" foi alterada; recarregue a página.')
+    if vaga.status_vaga != 'disponivel':
+        raise _conflito(f'A vaga "{vaga.titulo}" já está ocupada ou encerrada.')
+    if aluno_travado is not None and aluno_travado.estagio_id is not None:
+        raise _conflito(f'O aluno {aluno_travado.nome} já está vinculado a uma vaga ativa.')
+
+    vaga.status = 'aprovado'
+    _ocupar(vaga, aluno_travado, realizado_por, observacoes, campos_vaga=('status', 'status_vaga'))
+    _atualizar_instancias(estagio, vaga)
+    return aluno_travado
+
+
+@transaction.atomic
+def candidatar(estagio, aluno):
+    """
+    Registra a candidatura do aluno à vaga (status 'analise'). Chamada dentro
+    da transação que cria o documento da candidatura; `ConflitoVinculo`
+    se a vaga deixou de estar disponível, o aluno já tem vaga ou já tem outra
+    solicitação pendente.
+    """
+    vaga, aluno_travado = _travar(estagio, aluno)
+    if not vaga.is_disponivel():
+        raise _conflito('Esta vaga não está mais disponível.')
+    if aluno_travado.estagio_id is not None:
+        raise _conflito('Você já está vinculado a um estágio.')
+    if Estagio.objects.filter(aluno_solicitante=aluno_travado, status='analise').exists():
+        raise _conflito('Você já possui uma solicitação pendente. Aguarde a análise do coordenador.')
+
+    vaga.aluno_solicitante = aluno_travado
+    vaga.status = 'analise'
+    vaga.save(update_fields=['aluno_solicitante', 'status', 'updated_at'])
+    _atualizar_instancias(estagio, vaga)
+    return vaga
@@ -3,6 +3,11 @@ ASGI config for sage project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The notification badge stream (``api_notificacoes_stream``) is an async
+Server-Sent Events view and must be served through this entry point
+(e.g. ``uvicorn sage.asgi:application``); under WSGI it answers 204 and the
+browser falls back to polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
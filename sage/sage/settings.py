@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.perfil',
             ],
         },
     },
@@ -157,6 +159,56 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', f'SAGE <{EMAIL_HOST_USER}>')
 
+# Notificações em tempo real (SSE) - servidas via ASGI (sage/asgi.py)
+NOTIFICACOES_BROKER_BACKEND = os.environ.get('NOTIFICACOES_BROKER_BACKEND', 'estagio.notificacoes_broker.LocalBroker')
+NOTIFICACOES_SSE_HEARTBEAT = 25
+NOTIFICACOES_SSE_TIMEOUT = 300
+
+# Cache por perfil das estatísticas do painel de estágios (segundos; 0 desativa)
+PAINEL_ESTAGIOS_CACHE_TTL = int(os.environ.get('PAINEL_ESTAGIOS_CACHE_TTL', '0'))
+# Retenção dos tombstones da sincronização incremental do painel (cursores mais antigos recarregam tudo)
+PAINEL_ESTAGIOS_RETENCAO_TOMBSTONES_DIAS = 30
+
+# Linhas lidas por lote (cursor no servidor) nas exportações CSV/XLSX em streaming
+RELATORIO_EXPORTACAO_LOTE = 2000
+# Relatórios em segundo plano: reaproveitamento de jobs com os mesmos filtros e
+# tempo após o qual um job em processamento é considerado abandonado (segundos)
+RELATORIO_JOB_REUSO_SEGUNDOS = 900
+RELATORIO_JOB_TIMEOUT_SEGUNDOS = 1800
+# Arquivos dos relatórios em segundo plano: fora de MEDIA_ROOT (servido publicamente
+# em /media/), entregues só pela view de download; o prefixo é a location interna
+# do nginx para RELATORIOS_ROOT quando DOCUMENTOS_DOWNLOAD_BACKEND = 'x-accel-redirect'
+RELATORIOS_ROOT = os.path.join(BASE_DIR, 'relatorios')
+RELATORIOS_X_ACCEL_PREFIXO = '/relatorios-protegidos/'
+
+# Envio dos arquivos de documentos (estagio/downloads.py): 'django' transmite pelo worker;
+# 'x-accel-redirect' (nginx, location interna apontando para MEDIA_ROOT no prefixo abaixo)
+# e 'x-sendfile' (Apache/lighttpd) delegam o envio ao proxy após a checagem de permissão
+DOCUMENTOS_DOWNLOAD_BACKEND = os.environ.get('DOCUMENTOS_DOWNLOAD_BACKEND', 'django')
+DOCUMENTOS_X_ACCEL_PREFIXO = '/media-protegida/'
+# Tempo que um arquivo de documento fica no disco sem documentos antes de ser
+# apagado pelo comando limpar_arquivos_documentos
+DOCUMENTOS_ARQUIVOS_CARENCIA_HORAS = 24
+
+# Upload de documentos em partes (estagio/uploads.py): tamanho máximo do arquivo,
+# de cada parte enviada por PUT e horas sem atividade até o upload expirar
+# (uploads expirados são removidos pelo comando limpar_uploads_parciais)
+UPLOAD_PARCIAL_TAMANHO_MAX = 10 * 1024 * 1024
+UPLOAD_PARCIAL_BLOCO_MAX = 2 * 1024 * 1024
+UPLOAD_PARCIAL_EXPIRACAO_HORAS = 24
+
+# Segundos que cada versão dos critérios de avaliação ativos fica no cache
+# (estagio/criterios_cache.py); a versão é trocada ao salvar ou excluir um critério
+CRITERIOS_AVALIACAO_CACHE_TTL = 24 * 60 * 60
+# Sem um cache compartilhado entre os processos (CACHES usa o LocMemCache
+# padrão), segundos até os demais workers relerem os critérios do banco
+CRITERIOS_AVALIACAO_CACHE_LOCAL_TTL = 60
+
+# Análise das notas finais (estagio/analise_notas.py): segundos no cache por
+# versão dos dados e nota máxima usada nas faixas do histograma
+ANALISE_NOTAS_CACHE_TTL = 60 * 60
+ANALISE_NOTAS_NOTA_MAXIMA = 10
+
 X_FRAME_OPTIONS = 'ALLOWALL'
 
 # Django REST Framework Configuration
@@ -0,0 +1,6 @@
+from users.perfil import get_perfil
+
+
+def perfil(request):
+    """Expõe `perfil` aos templates (resolvido sob demanda, uma vez por requisição)"""
+    return {'perfil': get_perfil(request)}
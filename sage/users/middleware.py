@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from users.perfil import resolver_perfil
+
+
+class PerfilMiddleware:
+    """
+    Disponibiliza `request.perfil` (papel do usuário e e-mail de notificação).
+
+    A resolução é preguiçosa: só acontece se a view ou o decorator acessar o
+    perfil, e usa o cache da sessão enquanto a versão do perfil não mudar.
+    Deve vir depois de SessionMiddleware e AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.perfil = SimpleLazyObject(lambda: resolver_perfil(request))
+        return self.get_response(request)
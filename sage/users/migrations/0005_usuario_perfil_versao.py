@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_usuario_tipo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='perfil_versao',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_usuario_perfil_versao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='notificacoes_nao_lidas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
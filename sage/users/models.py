@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import Permission
 
@@ -105,6 +105,28 @@ class Usuario(AbstractUser):
         verbose_name='Nível de Acesso'
     )
     
+    # Incrementado quando Aluno/Supervisor/CursoCoordenador do usuário muda (ver users.perfil)
+    perfil_versao = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Contador desnormalizado de notificações não lidas (mantido por estagio.Notificacao)
+    notificacoes_nao_lidas = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Campos alterados apenas via UPDATE atômico; nunca regravados a partir da instância
+    CAMPOS_CONTADORES = ('perfil_versao', 'notificacoes_nao_lidas')
+    
+    def save(self, *args, **kwargs):
+        """
+        Não sobrescreve os contadores com valores em memória desatualizados:
+        eles são sempre alterados via UPDATE atômico (users.perfil.invalidar_perfil,
+        estagio.Notificacao).
+        """
+        if not self._state.adding and self.pk and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_CONTADORES
+            ]
+        super().save(*args, **kwargs)
+    
     def aplicar_permissoes_nivel(self):
         """
         CA2 - Aplica as permissões do nível de acesso ao usuário.
@@ -141,3 +163,21 @@ def usuario_nivel_acesso_changed(sender, instance, created, **kwargs):
         instance.aplicar_permissoes_nivel()
 
 
+
+
+# ==================== SIGNALS PARA INVALIDAÇÃO DO PERFIL EM SESSÃO ====================
+
+@receiver(post_save, sender='estagio.Aluno')
+@receiver(post_delete, sender='estagio.Aluno')
+@receiver(post_save, sender='coordenador.Supervisor')
+@receiver(post_delete, sender='coordenador.Supervisor')
+@receiver(post_save, sender='coordenador.CursoCoordenador')
+@receiver(post_delete, sender='coordenador.CursoCoordenador')
+def perfil_alterado(sender, instance, **kwargs):
+    """
+    Invalida o perfil cacheado na sessão quando o papel do usuário é criado,
+    alterado ou removido.
+    """
+    from users.perfil import invalidar_perfil
+    if instance.usuario_id:
+        invalidar_perfil(instance.usuario_id)
@@ -0,0 +1,146 @@
+"""
+Resolução do perfil (papel) do usuário autenticado.
+
+Substitui a cadeia `Aluno -> Supervisor -> CursoCoordenador` repetida nas views
+por uma única consulta com LEFT JOINs, resolvida no máximo uma vez por
+requisição (`request.perfil`) e guardada na sessão. O cache da sessão é
+invalidado pelo campo `Usuario.perfil_versao`, incrementado sempre que um
+Aluno, Supervisor ou CursoCoordenador é salvo ou excluído.
+"""
+
+SESSION_KEY = '_perfil'
+
+# Ordem de precedência usada historicamente nas views
+PAPEIS = ('aluno', 'supervisor', 'coordenador')
+
+
+def _modelos():
+    from admin.models import Supervisor, CursoCoordenador
+    from estagio.models import Aluno
+    return {'aluno': Aluno, 'supervisor': Supervisor, 'coordenador': CursoCoordenador}
+
+
+class Perfil:
+    """Papel do usuário e endereço usado como destinatário de notificações"""
+
+    def __init__(self, usuario, ids=None, email_notificacao=None, objetos=None):
+        self.usuario = usuario
+        self.ids = ids or {}
+        self._objetos = objetos or {}
+        self.email_notificacao = email_notificacao or getattr(usuario, 'email', '') or ''
+
+    @property
+    def tipo(self):
+        for papel in PAPEIS:
+            if self.ids.get(papel):
+                return papel
+        return None
+
+    @property
+    def is_admin(self):
+        return bool(self.usuario and self.usuario.is_authenticated and self.usuario.is_admin())
+
+    @property
+    def is_aluno(self):
+        return bool(self.ids.get('aluno'))
+
+    @property
+    def is_supervisor(self):
+        return bool(self.ids.get('supervisor'))
+
+    @property
+    def is_coordenador(self):
+        return bool(self.ids.get('coordenador'))
+
+    def _obter(self, papel):
+        modelo = _modelos()[papel]
+        pk = self.ids.get(papel)
+        if not pk:
+            raise modelo.DoesNotExist(f"Usuário não possui perfil de {papel}.")
+        if papel not in self._objetos:
+            self._objetos[papel] = modelo.objects.get(pk=pk)
+        return self._objetos[papel]
+
+    @property
+    def aluno(self):
+        """Objeto Aluno do usuário; levanta Aluno.DoesNotExist se não houver"""
+        return self._obter('aluno')
+
+    @property
+    def supervisor(self):
+        """Objeto Supervisor do usuário; levanta Supervisor.DoesNotExist se não houver"""
+        return self._obter('supervisor')
+
+    @property
+    def coordenador(self):
+        """Objeto CursoCoordenador do usuário; levanta CursoCoordenador.DoesNotExist se não houver"""
+        return self._obter('coordenador')
+
+    def to_session(self):
+        return {
+            'usuario_id': self.usuario.pk,
+            'versao': self.usuario.perfil_versao,
+            'email_usuario': self.usuario.email,
+            'ids': self.ids,
+            'email_notificacao': self.email_notificacao,
+        }
+
+
+def _resolver_do_banco(usuario):
+    """Resolve os três papéis com uma única consulta (LEFT JOIN nas relações 1-1)"""
+    from users.models import Usuario
+
+    completo = Usuario.objects.select_related('aluno', 'supervisor', 'cursocoordenador').get(pk=usuario.pk)
+    objetos = {}
+    for papel, relacao in (('aluno', 'aluno'), ('supervisor', 'supervisor'), ('coordenador', 'cursocoordenador')):
+        obj = getattr(completo, relacao, None)
+        if obj is not None:
+            objetos[papel] = obj
+
+    email = usuario.email
+    for papel in PAPEIS:
+        if papel in objetos:
+            email = objetos[papel].contato
+            break
+
+    ids = {papel: obj.pk for papel, obj in objetos.items()}
+    return Perfil(usuario, ids=ids, email_notificacao=email, objetos=objetos)
+
+
+def resolver_perfil(request):
+    """Resolve o perfil do usuário da requisição usando o cache da sessão quando válido"""
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        return Perfil(None)
+
+    sessao = getattr(request, 'session', None)
+    dados = sessao.get(SESSION_KEY) if sessao is not None else None
+    if (
+        dados
+        and dados.get('usuario_id') == usuario.pk
+        and dados.get('versao') == usuario.perfil_versao
+        and dados.get('email_usuario') == usuario.email
+    ):
+        return Perfil(usuario, ids=dados['ids'], email_notificacao=dados['email_notificacao'])
+
+    perfil = _resolver_do_banco(usuario)
+    if sessao is not None:
+        sessao[SESSION_KEY] = perfil.to_session()
+    return perfil
+
+
+def get_perfil(request):
+    """Retorna `request.perfil`, resolvendo-o caso o middleware não tenha rodado"""
+    perfil = getattr(request, 'perfil', None)
+    if perfil is None:
+        perfil = resolver_perfil(request)
+        request.perfil = perfil
+    return perfil
+
+
+def invalidar_perfil(usuario_id):
+    """Incrementa a versão do perfil, invalidando o cache de todas as sessões do usuário"""
+    from django.db.models import F
+    from users.models import Usuario
+
+    Usuario.objects.filter(pk=usuario_id).update(perfil_versao=F('perfil_versao') + 1)
@@ -1907,4 +1907,116 @@ class VisualizarNivelAcessoViewTest(TestCase):
         url = reverse('users:visualizar_nivel_acesso', args=[99999])
         response = self.client.get(url)
         
-        self.assertEqual(response.status_code, 404)
\ No newline at end of file
+        self.assertEqual(response.status_code, 404)
+
+# ==================== TESTES DO PERFIL EM SESSÃO (request.perfil) ====================
+
+class PerfilMiddlewareTest(TestCase):
+    """
+    Testes para a resolução do perfil do usuário (request.perfil).
+    O papel e o e-mail de notificação são resolvidos com uma única consulta,
+    guardados na sessão e invalidados quando o papel do usuário muda.
+    """
+    
+    def setUp(self):
+        from admin.models import Instituicao
+        from estagio.models import Aluno
+        
+        self.client = Client()
+        self.instituicao = Instituicao.objects.create(
+            nome="Universidade Teste",
+            contato="1133334444",
+            numero=123,
+            bairro="Centro",
+            rua="Rua Teste"
+        )
+        self.usuario = Usuario.objects.create_user(
+            username='aluno_perfil@test.com',
+            email='aluno_perfil@test.com',
+            password='senha123',
+            tipo='aluno'
+        )
+        self.aluno = Aluno.objects.create(
+            usuario=self.usuario,
+            nome='Aluno Perfil',
+            contato='contato_aluno@test.com',
+            matricula='20239999',
+            instituicao=self.instituicao
+        )
+        self.client.login(username='aluno_perfil@test.com', password='senha123')
+    
+    def test_resolve_papel_e_email_notificacao(self):
+        """O perfil identifica o papel e usa o contato do aluno como destinatário"""
+        from django.test import RequestFactory
+        from users.perfil import resolver_perfil
+        
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+        request.session = {}
+        
+        with self.assertNumQueries(1):
+            perfil = resolver_perfil(request)
+            self.assertTrue(perfil.is_aluno)
+            self.assertFalse(perfil.is_supervisor)
+            self.assertEqual(perfil.tipo, 'aluno')
+            self.assertEqual(perfil.email_notificacao, 'contato_aluno@test.com')
+            self.assertEqual(perfil.aluno, self.aluno)
+    
+    def test_perfil_em_cache_na_sessao(self):
+        """Com o perfil na sessão, nenhuma consulta extra é feita para o papel"""
+        from django.test import RequestFactory
+        from users.perfil import resolver_perfil
+        
+        request = RequestFactory().get('/')
+        request.user = Usuario.objects.get(pk=self.usuario.pk)
+        request.session = {}
+        resolver_perfil(request)
+        
+        with self.assertNumQueries(0):
+            perfil = resolver_perfil(request)
+            self.assertTrue(perfil.is_aluno)
+            self.assertEqual(perfil.email_notificacao, 'contato_aluno@test.com')
+    
+    def test_invalida_cache_quando_papel_muda(self):
+        """Alterar o Aluno incrementa a versão e força nova resolução"""
+        from django.test import RequestFactory
+        from users.perfil import resolver_perfil
+        
+        request = RequestFactory().get('/')
+        request.user = Usuario.objects.get(pk=self.usuario.pk)
+        request.session = {}
+        resolver_perfil(request)
+        
+        self.aluno.contato = 'novo_contato@test.com'
+        self.aluno.save()
+        
+        request.user = Usuario.objects.get(pk=self.usuario.pk)
+        perfil = resolver_perfil(request)
+        self.assertEqual(perfil.email_notificacao, 'novo_contato@test.com')
+    
+    def test_save_usuario_nao_sobrescreve_versao(self):
+        """Salvar um Usuario com versão desatualizada em memória não reverte a invalidação"""
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        versao = usuario.perfil_versao
+        
+        self.aluno.save()
+        usuario.first_name = 'Novo Nome'
+        usuario.save()
+        
+        self.assertEqual(Usuario.objects.get(pk=self.usuario.pk).perfil_versao, versao + 1)
+    
+    def test_endpoint_notificacoes_reutiliza_perfil_da_sessao(self):
+        """Requisições seguintes não repetem a cadeia Aluno/Supervisor/Coordenador"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('api_contar_notificacoes_nao_lidas')
+        self.client.get(url)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, 200)
+        tabelas_papel = ('estagio_aluno', 'coordenador_supervisor', 'coordenador_cursocoordenador')
+        consultas_papel = [q for q in ctx.captured_queries if any(t in q['sql'] for t in tabelas_papel)]
+        self.assertEqual(consultas_papel, [])
@@ -1,6 +1,7 @@
 from django.shortcuts import redirect
 from django.contrib import messages
 from functools import wraps
+from users.perfil import get_perfil
 
 
 def admin_required(view_func):
@@ -41,7 +42,7 @@ def supervisor_required(view_func):
             return view_func(request, *args, **kwargs)
         
         # Verifica se o usuário é um supervisor
-        if not hasattr(request.user, 'supervisor'):
+        if not get_perfil(request).is_supervisor:
             messages.error(request, 'Acesso negado. Esta área é restrita a supervisores.')
             return redirect('dashboard')
         
@@ -61,7 +62,7 @@ def coordenador_required(view_func):
             return view_func(request, *args, **kwargs)
         
         # Verifica se o usuário é um coordenador
-        if not hasattr(request.user, 'cursocoordenador'):
+        if not get_perfil(request).is_coordenador:
             messages.error(request, 'Acesso negado. Esta área é restrita a coordenadores.')
             return redirect('dashboard')
         
@@ -77,7 +78,7 @@ def coordenador_only_required(view_func):
             return redirect('login')
         
         # Verifica se o usuário é um coordenador
-        if not hasattr(request.user, 'cursocoordenador'):
+        if not get_perfil(request).is_coordenador:
             messages.error(request, 'Acesso negado. Esta área é restrita a coordenadores.')
             return redirect('dashboard')
         
@@ -97,7 +98,7 @@ def aluno_required(view_func):
             return view_func(request, *args, **kwargs)
         
         # Verifica se o usuário é um aluno
-        if not hasattr(request.user, 'aluno'):
+        if not get_perfil(request).is_aluno:
             messages.error(request, 'Acesso negado. Esta área é restrita a alunos.')
             return redirect('dashboard')
         
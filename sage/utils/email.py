@@ -1,10 +1,11 @@
-from django.core.mail import send_mail
-
 def enviar_notificacao_email(destinatario, assunto, mensagem):
-    send_mail(
-        subject=assunto,
-        message=mensagem,
-        from_email=None,  # usa DEFAULT_FROM_EMAIL
-        recipient_list=[destinatario],
-        fail_silently=False,
-    )
+    """
+    Enfileira um e-mail de notificação na outbox transacional.
+
+    O registro só é gravado após o commit da transação corrente, e o envio é
+    feito em lote pelo comando `enviar_emails`, mantendo o SMTP fora do ciclo
+    da requisição.
+    """
+    from estagio.email_outbox import enfileirar_email
+    enfileirar_email(destinatario=destinatario, assunto=assunto, mensagem=mensagem)
+